@@ -6,8 +6,8 @@ Functions to generate .C files from the branches.py files and the base cutflow c
 TODO: List out files that are generated
 """
 
-import os, sys
-from Core import compileC, compiledir
+import os, sys, re
+from Core import compileC, writeGenerated
 filedir = os.path.dirname(os.path.abspath(__file__))
 
 class PhysicsObjectBase:
@@ -126,6 +126,7 @@ class PhysicsObjectBase:
 
 AllObjects = None
 obs = None
+usedBranches = None
 
 def setupBranches(modules, name=None, location=None, outputdump=[]):
     global AllObjects
@@ -374,20 +375,85 @@ def setupBranches(modules, name=None, location=None, outputdump=[]):
                     print "     %30s : Declared as: %-30s In input file: %-30s" % btuple
 
         full_str = template_full % kw
-        filepath = filedir+'/../libs/Branches_generated.C'
-        if not os.path.isfile(filepath) or not open(filepath, 'r').read() == full_str:
-            open(filepath, 'w').write(full_str)
+        # CutFlow_Base.C (and the sources including it) include it by name, from the include path
+        filepath = writeGenerated('Branches_generated.C', full_str, include=True)
         compileC(filepath)
         from ROOT import AnalysisFramework
         AllObjects = AnalysisFramework.Branches.AllObjects
         return True
     return False
 
+def analyseBranchUsage(sources, outputdump=[]):
+    # Static analysis of which members of AllObjects are read by the given C++ (or python) sources.
+    # Fills usedBranches = {objectname: set of element names}, used by NTupleTools.setBranchAddresses to enable only those.
+    #
+    # A member counts as used when accessed as <alias>->instance.member or <alias>.instance.member, where
+    # <alias> is 'ao' or any variable declared as an AllObjects pointer/reference in the same file.
+    # To stay on the safe side, the whole object is used if the instance (or its struct type) escapes
+    # in any other way, e.g. passed by reference to a function. Dumped branches and counters are always used.
+    global usedBranches
+
+    if not obs:
+        print "Need to setup with a Branch.py (or similar) file first!"
+        return False
+
+    skip = ['Loader.C', 'PostLoader.C', 'WhiteBoard.C', 'CutFlowHist.C', 'CutFlow_Base.C', 'Branches_generated.C', 'ForkItem_generated.C']
+    instances = dict([(name.lower(), name) for name in obs])
+    used = dict([(name, set()) for name in obs])
+
+    # Follow local includes, so that headers of the cutflows and tools are analysed too
+    files = []
+    queue = [os.path.abspath(s) for s in sources]
+    while queue:
+        path = queue.pop(0)
+        if path in files or os.path.basename(path) in skip or not os.path.isfile(path):
+            continue
+        files.append(path)
+        for inc in re.findall(r'#include\s*"([^"]+)"', open(path).read()):
+            queue.append(os.path.normpath(os.path.join(os.path.dirname(path), inc)))
+
+    for path in files:
+        text = open(path).read()
+        text = re.sub(r'//[^\n]*|/\*.*?\*/', '', text, flags=re.S) if path.endswith(('.C', '.cxx', '.h')) else re.sub(r'#[^\n]*', '', text)
+        aliases = set(['ao'] + re.findall(r'AllObjects\s*[*&]\s*(\w+)', text))
+        for alias in aliases:
+            for instance, member in re.findall(r'\b%s\s*(?:->|\.)\s*(\w+)(?:\s*\.\s*(\w+))?' % re.escape(alias), text):
+                if not instance in instances:
+                    continue
+                name = instances[instance]
+                if member and member in obs[name].elemsList():
+                    used[name].add(member)
+                else:
+                    used[name].update(obs[name].elemsList())
+        for name in obs:
+            if re.search(r'\b%s\s*[*&]' % name, text):
+                used[name].update(obs[name].elemsList())
+
+    if not outputdump:
+        outputdump = []
+    for name in obs:
+        if outputdump is True or name in outputdump:
+            if obs[name].dumplist is True:
+                used[name].update(obs[name].elemsList())
+            else:
+                used[name].update(obs[name].dumplist)
+        if obs[name].n:
+            used[name].add('n')
+
+    usedBranches = dict([(name, used[name]) for name in obs if used[name]])
+
+    total = sum([len(obs[name].elemsList()) for name in obs])
+    print "@@@@@ Branch usage analysed in %i files: %i out of %i branches will be read" % (len(files), sum([len(u) for u in usedBranches.values()]), total)
+    for name in sorted(obs.keys()):
+        print "     %20s : %4i / %4i" % (name, len(used[name]), len(obs[name].elemsList()))
+    return True
+
 def setupForkItem(doRemoveUnselected = False, outputdump=[]):
     if obs:
         if not outputdump:
             outputdump = []
         kw = {}
+        kw['CoreDir'] = filedir
         kw['DeclareFork'] = ''
         kw['InitVectors'] = ''
         kw['BackupContent'] = ''
@@ -431,9 +497,7 @@ def setupForkItem(doRemoveUnselected = False, outputdump=[]):
                     kw['SaveContent'] += oneCopy('ao->'+name.lower()+'.'+bname, name.lower()+'_saved_'+bname, btype)
                     kw['LoadContent'] += oneCopy(name.lower()+'_saved_'+bname, 'ao->'+name.lower()+'.'+bname, btype)
         full_str = template_fork % kw
-        filepath = filedir+'/../libs/ForkItem_generated.C'
-        if not os.path.isfile(filepath) or not open(filepath, 'r').read() == full_str:
-            open(filepath, 'w').write(full_str)
+        filepath = writeGenerated('ForkItem_generated.C', full_str)
         compileC(filepath)
         return True
     return False
@@ -658,7 +722,7 @@ template_fork = """/*
 
 #pragma once
 
-#include "../Core/CutFlow_Base.C"
+#include "%(CoreDir)s/CutFlow_Base.C"
 #include <iostream>
 
 namespace AnalysisFramework
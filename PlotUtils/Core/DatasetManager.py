@@ -6,46 +6,127 @@ Functions to parse and check sample names in both the Files/*D3PD_datasets.txt a
 TODO: Show examples of usage?
 """
 
-import os
+import os, hashlib, cPickle
 
 tags = ['@', '#', '~', '=', '-']
 comment = '//'
 filedir = os.path.dirname(os.path.abspath(__file__))
 
+# Parsed dataset and sample files are cached in memory and on disk (pickled), and reparsed only if the file changes
+cachedir = filedir + '/../libs/cache/datasets'
+_parsed = {}
+
+def loadCached(filename, parse):
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime)
+    if path in _parsed and _parsed[path][0] == stamp:
+        return _parsed[path][1]
+    cachepath = cachedir + '/' + hashlib.sha1(path).hexdigest() + '.pkl'
+    try:
+        with open(cachepath, 'rb') as f:
+            cachedstamp, data = cPickle.load(f)
+        if not cachedstamp == stamp:
+            data = None
+    except Exception:
+        data = None
+    if data is None:
+        data = parse(path)
+        try:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+            temppath = '%s.%i.tmp' % (cachepath, os.getpid())
+            with open(temppath, 'wb') as f:
+                cPickle.dump((stamp, data), f, cPickle.HIGHEST_PROTOCOL)
+            os.rename(temppath, cachepath)
+        except (IOError, OSError):
+            pass # Caching is only an optimisation
+    _parsed[path] = (stamp, data)
+    return data
+
+def parseDatasets(filename):
+    datasets = []
+    current_tag = {}
+    for t in tags:
+        current_tag[t] = 'DEFAULT'
+    for line in open(filename):
+        line = line.strip()
+        if line.startswith(comment):
+            continue
+        for t in tags:
+            if line.startswith(t):
+                current_tag[t] = line.strip(t+' ')
+        if line.startswith('mc') or line.startswith('data') or line.startswith('group') or line.startswith('user'):
+            line = line.strip('/')
+            datasets.append( (line, current_tag.values()) )
+    return datasets
+
+def parseSamples(filename):
+    samples = []
+    h = {}
+    for line in open(filename):
+        tokens = line.strip().split(',')
+        if not h:
+            for i in range(len(tokens)):
+                h[tokens[i].strip('"')] = i
+        else:
+            entry = {}
+            for header in h:
+                entry[header] = tokens[h[header]].strip('"')
+            samples.append(entry)
+    return samples
+
 class DatasetManager:
     def __init__(self, filelist = []):
         self.list_ = []
         for filename in filelist:
-            current_tag = {}
-            for t in tags:
-                current_tag[t] = 'DEFAULT'
-            for line in open(filename):
-                line = line.strip()
-                if line.startswith(comment):
-                    continue
-                for t in tags:
-                    if line.startswith(t):
-                        current_tag[t] = line.strip(t+' ')
-                if line.startswith('mc') or line.startswith('data') or line.startswith('group') or line.startswith('user'):
-                    line = line.strip('/')
-                    self.list_.append( (line, current_tag.values()) )
+            self.list_ += loadCached(filename, parseDatasets)
+        self.buildIndex()
+
+    def buildIndex(self):
+        # Index the datasets by truncated name (for the prefix matching of contains, check, getTags and getHiggsMass),
+        # by tag and by DSID. Lookups of a given pathname are memoised, as the same sample is checked many times.
+        self.nameindex = {}
+        self.tagindex = {}
+        self.idindex = {}
+        for i, (name_, tags_) in enumerate(self.list_):
+            self.nameindex.setdefault(self.truncate(name_, remove_simrecotags=False), []).append(i)
+            for t in tags_:
+                self.tagindex.setdefault(t, set()).add(i)
+            self.idindex.setdefault(self.truncate(name_).split('.')[0], []).append(i)
+        self.matches = {}
+
+    def match(self, pathname):
+        # Indices (in file order) of the datasets whose truncated name is a prefix of the truncated pathname
+        if not pathname in self.matches:
+            truncated = self.truncate(pathname, remove_simrecotags=False)
+            indices = []
+            for n in range(len(truncated)+1):
+                indices += self.nameindex.get(truncated[:n], [])
+            self.matches[pathname] = sorted(indices)
+        return self.matches[pathname]
+
+    def selectByTags(self, tags):
+        # Indices (in file order) of the datasets having all the tags
+        if tags == []:
+            return range(len(self.list_))
+        selected = None
+        for item in tags:
+            current = self.tagindex.get(item, set())
+            selected = current if selected is None else selected & current
+        return sorted(selected)
+
+    def getDSID(self, dsid):
+        # Datasets with a given DSID (as returned by getListID)
+        return [self.list_[i][0] for i in self.idindex.get(str(dsid), [])]
 
     def getList(self, truncate=False, tags = [], filter_str=''):
         if type(tags) == str:
             tags = [tags]
         output = []
-        for name_, tags_ in self.list_:
-            triggered = False
-            filtered = False
-            if tags == []:
-                triggered = True
-            else:
-                for item in tags:
-                    if item in tags_:
-                        triggered = True
-                    else:
-                        filtered = True
-            if triggered and not filtered and filter_str in name_:
+        for i in self.selectByTags(tags):
+            name_ = self.list_[i][0]
+            if filter_str in name_:
                 if truncate:
                     name_ = self.truncate(name_)
                 output.append(name_)
@@ -55,78 +136,61 @@ class DatasetManager:
         if type(tags) == str:
             tags = [tags]
         output = []
-        for name_, tags_ in self.list_:
-            triggered = False
-            filtered = False
-            if tags == []:
-                triggered = True
-            else:
-                for item in tags:
-                    if item in tags_:
-                        triggered = True
-                    else:
-                        filtered = True
-            if triggered and not filtered and filter_str in name_:
+        for i in self.selectByTags(tags):
+            name_ = self.list_[i][0]
+            if filter_str in name_:
                 name_ = self.truncate(name_)
                 output.append(name_.split('.')[0])
         return output
 
     def getHiggsMass(self, pathname):
-        pathname = self.truncate(pathname, remove_simrecotags=False)
-
-        for name_, tags_ in self.list_:
+        for i in self.match(pathname):
+            name_, tags_ = self.list_[i]
             name_ = self.truncate(name_, remove_simrecotags=False)
-            if pathname.startswith(name_):
-                if not self.check(pathname, ['Signal']):
+            if not self.check(pathname, ['Signal']):
+                return None
+            if "ggF" in tags_:
+                index = name_.find('_ggH')
+                if index < 0:
+                    return None
+                return int(name_[index+4:].split('_')[0])
+            elif "VBF" in tags_:
+                index = name_.find('_VBFH')
+                if index < 0:
                     return None
-                if "ggF" in tags_:
-                    index = name_.find('_ggH')
-                    if index < 0:
-                        return None
-                    return int(name_[index+4:].split('_')[0])
-                elif "VBF" in tags_:
-                    index = name_.find('_VBFH')
-                    if index < 0:
-                        return None
-                    return int(name_[index+5:].split('_')[0])
-                elif "WH" in tags_:
-                    index = name_.find('WH')
-                    if index < 0:
-                        return None
-                    return int(name_[index+2:].split('_')[0])
-                elif "ZH" in tags_:
-                    index = name_.find('ZH')
-                    if index < 0:
-                        return None
-                    return int(name_[index+2:].split('_')[0])
-                elif "MSSMggA" in tags_:
-                    index = name_.find('MA')
-                    if index < 0:
-                        return None
-                    return int(name_[index+2:].split('TB')[0])
-                elif "MSSMbbA" in tags_:
-                    index = name_.find('MA')
-                    if index < 0:
-                        return None
-                    return int(name_[index+2:].split('TB')[0])
-                elif "LFV" in tags_:
-                    return 125
-                else:
+                return int(name_[index+5:].split('_')[0])
+            elif "WH" in tags_:
+                index = name_.find('WH')
+                if index < 0:
                     return None
+                return int(name_[index+2:].split('_')[0])
+            elif "ZH" in tags_:
+                index = name_.find('ZH')
+                if index < 0:
+                    return None
+                return int(name_[index+2:].split('_')[0])
+            elif "MSSMggA" in tags_:
+                index = name_.find('MA')
+                if index < 0:
+                    return None
+                return int(name_[index+2:].split('TB')[0])
+            elif "MSSMbbA" in tags_:
+                index = name_.find('MA')
+                if index < 0:
+                    return None
+                return int(name_[index+2:].split('TB')[0])
+            elif "LFV" in tags_:
+                return 125
+            else:
+                return None
         return None
 
     def getTags(self, pathname):
-        pathname = self.truncate(pathname, remove_simrecotags=False)
-
-        for name_, tags_ in self.list_:
-            name_ = self.truncate(name_, remove_simrecotags=False)
-            if pathname.startswith(name_):
-                return tags_
+        for i in self.match(pathname):
+            return self.list_[i][1]
         return []
 
     def getListSamples(self, samplesfile='Files/samples.csv', genericPath=False):
-        samples = []
-        h = {}
 	
 	filename = None
 	if not genericPath:
@@ -134,47 +198,30 @@ class DatasetManager:
 	else:
 	   filename = samplesfile
         
-	for line in open(filename):
-            tokens = line.strip().split(',')
-            if not h:
-                for i in range(len(tokens)):
-                    h[tokens[i].strip('"')] = i
-            else:
-                entry = {}
-                for header in h:
-		    #print("token: {0}".format(tokens[h[header]]))
-                    entry[header] = tokens[h[header]].strip('"')
-                samples.append(entry)
+        # NB: return copies, as callers may modify the entries
+        samples = [dict(entry) for entry in loadCached(filename, parseSamples)]
         return samples
 
     def contains(self, pathname):
-        pathname = self.truncate(pathname, remove_simrecotags=False)
-
-        for name_, tags_ in self.list_:
-            name_ = self.truncate(name_, remove_simrecotags=False)
-            if pathname.startswith(name_):
-                return True
-        return False
+        return bool(self.match(pathname))
 
     def check(self, pathname, tags=[]):
         if type(tags) == str:
             tags = [tags]
-        pathname = self.truncate(pathname, remove_simrecotags=False)
 
-        for name_, tags_ in self.list_:
-            name_ = self.truncate(name_, remove_simrecotags=False)
-            if pathname.startswith(name_):
-                filtered = False
-                if tags == []:
-                    print "Need to provide list of tags to check!"
-                    return False
-                else:
-                    for t in tags:
-                        if not t in tags_:
-                            filtered = True
-                            break
-                if not filtered:
-                    return True
+        for i in self.match(pathname):
+            name_, tags_ = self.list_[i]
+            filtered = False
+            if tags == []:
+                print "Need to provide list of tags to check!"
+                return False
+            else:
+                for t in tags:
+                    if not t in tags_:
+                        filtered = True
+                        break
+            if not filtered:
+                return True
         return False
 
     def truncate(self, name, remove_simrecotags=False):
@@ -6,12 +6,19 @@ Sets up the cutflow chain, event loop, and runs it
 TODO:   - List out not-so-obvious features for debugging
         - Some comments explaning what's going on
         - Fix experimental PROOF
+
+Kernel.run can also split the input entries in ranges processed by a pool of worker
+processes (Kernel.nworkers > 1), each writing to its own shard file: the shards are then
+merged by the parent into the same output a serial run would give.
+
+With Kernel.compiledloop, the entries are processed by the compiled EventLoop (Core/EventLoop.C),
+which only returns to python when switching to a new tree of the chain, at checkpoints and at the end.
 """
 
-import sys, glob, math, time, os
+import sys, glob, math, time, os, multiprocessing, json, Queue
 
 from Core import makeVectorString, NTupleTools, checkInputs, parseInputArgs
-from ROOT import TNamed, TH1D, TFile, TObjString, TProof, TPySelector, TDSet, TTree
+from ROOT import TNamed, TH1D, TFile, TObjString, TProof, TPySelector, TDSet, TTree, TObject
 
 class Kernel(TNamed):
     def __init__(self):
@@ -32,6 +39,14 @@ class Kernel(TNamed):
         self.outputtree = None
         self._tempVec = []
         self._tempTree = {}
+        self.nworkers = 1
+        self.shard = None
+        self.pollInterval = 10 # Seconds between checks of the worker processes in runParallel
+        self.checkpoint = 0
+        self.checkpointpath = None
+        self.outputfilepath = None
+        self.resume = False
+        self.compiledloop = False
 
     def getDefaultOutputTree(self):
         if not self.outputtree:
@@ -179,21 +194,138 @@ class Kernel(TNamed):
             cutflow.append((flow.name, numbers))
         return cutflow
 
+    def getProfileFromFlowChain(self, flowlist):
+        # Same structure as the cutflow, but for every flow: (flowname, {streamlet: (calls, passed, walltime, cputime)})
+        profile = []
+        for i in range(len(flowlist)):
+            flow = flowlist[i]
+            try:
+                flows = list(flow.nextList)
+            except:
+                flows = [flow]
+            numbers = {}
+            for flow in flows:
+                for streamlet in flow.profiledStreamlets:
+                    p = flow.profiles[streamlet]
+                    if not streamlet:
+                        streamlet = "All"
+                    calls, passed, walltime, cputime = numbers.get(streamlet, (0, 0, 0.0, 0.0))
+                    numbers[streamlet] = (calls + p.calls, passed + p.passed, walltime + p.wallTime, cputime + p.cpuTime)
+            profile.append((flows[0].name, numbers))
+        return profile
+
+    def getFlowItems(self):
+        # All the flow items of the chain, in order, including those in forks
+        items = []
+        for flow in self.FlowList:
+            items.append(flow)
+            try:
+                items += list(flow.nextList)
+            except:
+                pass
+        return items
+
+    def getOutputTrees(self):
+        trees = [(self.treename, self.outputtree)]
+        for t in sorted(self._tempTree.keys()):
+            trees.append((t, self._tempTree[t]))
+        return trees
+
+    def saveCheckpoint(self, nextentry, entryNumbers):
+        # Flush the output trees and save their headers in the output file, then record the next entry
+        # and the counters of each flow in a sidecar file. The sidecar is replaced atomically, so that it
+        # always describes output trees which have been fully written.
+        for t, tree in self.getOutputTrees():
+            tree.AutoSave("SaveSelf;FlushBaskets")
+        state = {
+            'treename'   : self.treename,
+            'outputfile' : self.outputfilepath,
+            'inputpath'  : sorted(NTupleTools.listifyInputFiles(self.inputpath)),
+            'entries'    : list(entryNumbers),
+            'nextentry'  : nextentry,
+            'trees'      : dict([(t, tree.GetEntries()) for t, tree in self.getOutputTrees()]),
+            'flows'      : [],
+        }
+        for flow in self.getFlowItems():
+            totals = []
+            for streamlet in flow.streamlets:
+                totalEvents = flow.totalEvents[streamlet]
+                totals.append((streamlet, totalEvents.passed, totalEvents.failed, totalEvents.passedW, totalEvents.failedW))
+            state['flows'].append((flow.name, totals))
+        temppath = '%s.%i.tmp' % (self.checkpointpath, os.getpid())
+        with open(temppath, 'w') as f:
+            json.dump(state, f)
+        os.rename(temppath, self.checkpointpath)
+        print "\r@@@@@ Checkpoint saved, next entry:", nextentry
+
+    def loadCheckpoint(self, entryNumbers):
+        # Restore the flow counters saved in the checkpoint, and return the entry to resume from (None: from scratch)
+        with open(self.checkpointpath) as f:
+            state = json.load(f)
+        if not state['treename'] == self.treename or \
+                not state['inputpath'] == sorted(NTupleTools.listifyInputFiles(self.inputpath)) or \
+                not state['entries'] == list(entryNumbers):
+            print "@@@@@ ERROR: Checkpoint", self.checkpointpath, "was made by a different job (tree, input files or entries)! Remove it to start from scratch."
+            sys.exit(1)
+        # If the job was killed between the AutoSave of the trees and the rename of the sidecar, the trees are one
+        # checkpoint ahead of it: the entries since the checkpoint can't be told apart, so empty the trees and start over
+        mismatch = [ (t, tree) for t, tree in self.getOutputTrees() if not tree.GetEntries() == state['trees'].get(t) ]
+        if mismatch:
+            for t, tree in mismatch:
+                print "@@@@@ WARNING: Output tree", t, "has", tree.GetEntries(), "entries, but the checkpoint expects", state['trees'].get(t)
+            print "@@@@@ WARNING: Ignoring checkpoint", self.checkpointpath, "- starting from scratch"
+            for t, tree in self.getOutputTrees():
+                tree.Reset()
+            return None
+        flows = self.getFlowItems()
+        if not [flow.name for flow in flows] == [name for name, totals in state['flows']]:
+            print "@@@@@ ERROR: Checkpoint", self.checkpointpath, "was made with a different flow chain!"
+            sys.exit(1)
+        for flow, (name, totals) in zip(flows, state['flows']):
+            for streamlet, passed, failed, passedW, failedW in totals:
+                flow.setTotalEvents(str(streamlet), passed, failed, passedW, failedW)
+        print "@@@@@ Resuming from checkpoint", self.checkpointpath, "at entry", state['nextentry']
+        return state['nextentry']
+
+    def removeCheckpoint(self):
+        if self.checkpoint and self.checkpointpath and os.path.isfile(self.checkpointpath):
+            os.remove(self.checkpointpath)
+
     def run(self, entryNumbers = ()):
         if not self.FlowList:
             raise Exception("Nothing defined in CutFlow!")
+        if self.nworkers > 1 and self.shard is None:
+            if self.checkpoint:
+                print "@@@@@ WARNING: Checkpointing is not supported when running on worker processes, it will be disabled"
+                self.checkpoint = 0
+            return self.runParallel(self.nworkers, entryNumbers)
         firstflow_process = self.setupFlowChain(self.FlowList)
 
+        # Only now, in the process which writes the output (i.e. after any fork of the workers)
+        NTupleTools.enableWriterThreads()
+
         self.inputtree = NTupleTools.loadNTuple(self.treename, self.inputpath)
         NTupleTools.setBranchAddresses(self.inputtree, self.ao)
+        NTupleTools.configureInputTree(self.inputtree, NTupleTools.activeBranches(self.inputtree))
+        prefetcher = None
+        if NTupleTools.inputSettings['prefetch']:
+            prefetcher = NTupleTools.FilePrefetcher(self.inputtree)
+            prefetcher.prefetch(self.inputtree.GetTreeNumber()+1)
+        readstats = NTupleTools.getReadStats()
         num = self.inputtree.GetEntries()
         if entryNumbers:
             start, end = entryNumbers
             if end > num:
                 end = num
-            allentries = xrange(start, end)
         else:
-            allentries = xrange(num)
+            start, end = 0, num
+        checkpoint = self.checkpoint if self.shard is None else 0
+        if checkpoint and self.resume:
+            resumefrom = self.loadCheckpoint(entryNumbers)
+            if resumefrom is not None:
+                start = resumefrom
+        allentries = xrange(start, end)
+        nextcheckpoint = start + checkpoint - 1 if checkpoint else -1
         printmod = int(round(num/1000))
         wb_resetToDefaultValues = self.wb.resetToDefaultValues
         ao_resetToDefaultValues = self.ao.resetToDefaultValues
@@ -206,25 +338,65 @@ class Kernel(TNamed):
         outputtree_Fill = self.outputtree.Fill
         sys_stdout_flush = sys.stdout.flush
 
+        loop = None
+        if self.compiledloop:
+            from ROOT import AnalysisFramework
+            # Release the GIL during the loop, so that the prefetching threads can run meanwhile. This requires that
+            # the flows of the chain don't call back into Python: they must all be compiled C++ flows
+            for flag in ['_threaded', '__release_gil__']: # PyROOT, cppyy
+                try:
+                    setattr(AnalysisFramework.CutFlows.EventLoop.process, flag, True)
+                except (AttributeError, TypeError):
+                    pass
+            loop = AnalysisFramework.CutFlows.EventLoop(self.inputtree, self.wb, self.ao, self.FlowList[0])
+            loop.printmod = printmod
+
         print
         print "Number of input entries:", num
         try:
             current_tree_num = 0
-            for i in allentries:
-                wb_resetToDefaultValues()
-                ao_resetToDefaultValues()
-                if not inputtree_GetTreeNumber() == current_tree_num:
-                    current_tree_num = inputtree_GetTreeNumber()
-                    print "Switching to tree number %i in TChain..." % (current_tree_num)
-                    NTupleTools.setBranchAddresses(self.inputtree, self.ao)
-                    ao_forceResetToDefaultValues()
-                inputtree_GetEntry(i)
-                ao_resetSelected()
-                if printmod and i % printmod == 0:
-                    print "\r%.1f%%" % (i*100./num),
-                    sys_stdout_flush()
-                passflow = firstflow_process()
+            if loop:
+                i = start
+                while i < end:
+                    stop = min(end, nextcheckpoint+1) if checkpoint else end
+                    i = loop.process(i, stop)
+                    if i < stop:
+                        current_tree_num = inputtree_GetTreeNumber()
+                        loop.currentTree = current_tree_num
+                        print "Switching to tree number %i in TChain..." % (current_tree_num)
+                        NTupleTools.setBranchAddresses(self.inputtree, self.ao)
+                        ao_forceResetToDefaultValues()
+                        if prefetcher:
+                            prefetcher.prefetch(current_tree_num+1)
+                    elif i == nextcheckpoint+1:
+                        self.saveCheckpoint(i, entryNumbers)
+                        nextcheckpoint += checkpoint
+            else:
+                for i in allentries:
+                    wb_resetToDefaultValues()
+                    ao_resetToDefaultValues()
+                    if not inputtree_GetTreeNumber() == current_tree_num:
+                        current_tree_num = inputtree_GetTreeNumber()
+                        print "Switching to tree number %i in TChain..." % (current_tree_num)
+                        NTupleTools.setBranchAddresses(self.inputtree, self.ao)
+                        ao_forceResetToDefaultValues()
+                        if prefetcher:
+                            prefetcher.prefetch(current_tree_num+1)
+                    inputtree_GetEntry(i)
+                    ao_resetSelected()
+                    if printmod and i % printmod == 0:
+                        print "\r%.1f%%" % (i*100./num),
+                        sys_stdout_flush()
+                    passflow = firstflow_process()
+                    if i == nextcheckpoint:
+                        self.saveCheckpoint(i+1, entryNumbers)
+                        nextcheckpoint += checkpoint
         except Exception, e:
+            if loop:
+                i = loop.currentEntry
+            if not self.shard is None:
+                print "@@@@@ Crash detected at entry", i, "in worker", self.shard, "- ErrorMessage :", e
+                raise
             crashedflow = None
             for fl in range(len(self.FlowList)):
                 flow = self.FlowList[fl]
@@ -244,6 +416,10 @@ class Kernel(TNamed):
             else:
                 print "@@@@@ Crash detected at entry", i, "but unable to determine which flow"
             print "    ErrorMessage :", e
+            if checkpoint:
+                print "@@@@@ Rerun the job to resume from the last checkpoint in", self.checkpointpath
+                if not sys.stdin.isatty():
+                    sys.exit(1)
             print "@@@@@ Starting interactive session so you can inspect your variables...use Ctrl-D to exit"
             print
             import code
@@ -258,10 +434,22 @@ class Kernel(TNamed):
         print
         print "Setting tree weight to", self.outputtree.GetWeight()
         print "Number of entries to write in default tree:", self.outputtree.GetEntries()
+        if prefetcher:
+            prefetcher.stop()
+        NTupleTools.printReadStats(self.inputtree, readstats, prefetcher)
+
+        if not self.shard is None:
+            # Worker of runParallel: the trees are written by _runShard, everything else is merged by the parent
+            return
+
+        if self.wb.doProfile:
+            profile = self.getProfileFromFlowChain(self.FlowList)
+            NTupleTools.printFlowProfile(profile)
 
         if self.treename.startswith('SystematicsUP/') or self.treename.startswith('SystematicsDOWN/'):
             # Do the write operation (might take a while if the tree is huge)
-            self.outputtree.Write()
+            self.outputtree.Write("", TObject.kOverwrite if checkpoint else 0)
+            self.removeCheckpoint()
             return
 
         if self._tempTree:
@@ -285,12 +473,22 @@ class Kernel(TNamed):
         cutflow = self.getCutFlowFromFlowChain(self.FlowList)
         cutFlowHist = NTupleTools.makeCutFlowHistogram(cutflow)
 
+        # Save the flow profile next to it
+        if self.wb.doProfile:
+            print "Creating FlowProfile histogram. Bins labeled as FlowNumber/Quantity/FlowName/Streamlet."
+            flowProfileHist = NTupleTools.makeFlowProfileHistogram(profile)
+
         # Copy the Lumi XML strings across to the new ntuple
         NTupleTools.copyLumi(self.inputpath)
 
         # Do the write operation (might take a while if the tree is huge)
-        NTupleTools.outputFile.Write()
+        # NB: checkpoints have already written the trees once, overwrite them instead of adding new cycles
+        NTupleTools.outputFile.Write("", TObject.kOverwrite if checkpoint else 0)
+
+        self.removeCheckpoint()
+        self.moveOutputFile()
 
+    def moveOutputFile(self):
         # Move the output file to the output location
         options = parseInputArgs()
         if not options.noProof:
@@ -300,6 +498,178 @@ class Kernel(TNamed):
                 os.makedirs(dirname)
             os.rename(basename, self.outputpath)
 
+    def getShardRanges(self, nworkers, entryNumbers = ()):
+        # Split the entries to be processed in (at most) nworkers contiguous ranges
+        tree = NTupleTools.loadNTuple(self.treename, self.inputpath)
+        num = tree.GetEntries()
+        del tree
+        if entryNumbers:
+            start, end = entryNumbers
+            if end > num:
+                end = num
+        else:
+            start, end = 0, num
+        step = max(int(math.ceil(float(end - start) / nworkers)), 1)
+        return [ (first, min(first + step, end)) for first in xrange(start, end, step) ]
+
+    def runParallel(self, nworkers, entryNumbers = ()):
+        ranges = self.getShardRanges(nworkers, entryNumbers)
+        if len(ranges) < 2:
+            print "@@@@@ Not enough entries to split among workers, running serially"
+            self.nworkers = 1
+            return self.run(entryNumbers)
+
+        shardpaths = [ '%s.shard%i.root' % (os.path.splitext(self.outputpath)[0], i) for i in range(len(ranges)) ]
+
+        print
+        print "@@@@@ Running on %i worker processes, entry ranges:" % (len(ranges))
+        for i in range(len(ranges)):
+            print '     %3i : [%i, %i) ->' % (i, ranges[i][0], ranges[i][1]), shardpaths[i]
+
+        # The workers are forked, so they inherit the whole configured flow chain.
+        # Each worker sends back the names of the trees it wrote, their weight, the cutflow and the total events
+        queue = multiprocessing.Queue()
+        workers = []
+        for i in range(len(ranges)):
+            worker = multiprocessing.Process(target=self._runShard, args=(i, ranges[i], shardpaths[i], queue))
+            worker.start()
+            workers.append(worker)
+        # Poll the queue, so that a worker which dies w/o reporting back (e.g. killed, or crashed in ROOT) does not hang the parent:
+        # once it is gone, whatever it may have sent is drained from the queue, and it is otherwise marked as failed
+        results = [None] * len(ranges)
+        pending = set(range(len(ranges)))
+        while pending:
+            try:
+                i, result = queue.get(timeout=self.pollInterval)
+                results[i] = result
+                pending.discard(i)
+            except Queue.Empty:
+                dead = [i for i in pending if not workers[i].is_alive()]
+                if not dead:
+                    continue
+                while True:
+                    try:
+                        i, result = queue.get(timeout=1)
+                        results[i] = result
+                        pending.discard(i)
+                    except Queue.Empty:
+                        break
+                for i in dead:
+                    if i in pending:
+                        print "@@@@@ Worker %i died w/o reporting back (exit code %s)" % (i, workers[i].exitcode)
+                        pending.discard(i)
+        for worker in workers:
+            worker.join()
+        failed = [i for i in range(len(ranges)) if results[i] is None or workers[i].exitcode]
+        if failed:
+            raise Exception("Workers %s failed, shards are left in %s" % (failed, os.path.dirname(os.path.abspath(self.outputpath))))
+
+        print
+        print "@@@@@ Merging %i shards into %s" % (len(ranges), self.outputpath)
+
+        # The (empty) default tree of this process is replaced by the merged one
+        if self.outputtree:
+            self.outputtree.SetDirectory(0)
+
+        from ROOT import TChain
+        merged = []
+        for t in results[0]['trees']:
+            chain = TChain(t)
+            for shardpath in shardpaths:
+                chain.Add(shardpath)
+            if "/" in t:
+                dirname, treename = t.split('/')
+                if not NTupleTools.outputFile.GetDirectory(dirname):
+                    NTupleTools.outputFile.mkdir(dirname)
+                NTupleTools.outputFile.cd(dirname)
+            else:
+                treename = t
+                NTupleTools.outputFile.cd()
+            tree = chain.CloneTree(-1, 'fast')
+            tree.SetName(treename)
+            tree.SetWeight(results[0]['weight'])
+            merged.append(tree)
+            print '     %30s : ' % (t), tree.GetEntries()
+            del chain
+        NTupleTools.outputFile.cd()
+
+        if self.treename.startswith('SystematicsUP/') or self.treename.startswith('SystematicsDOWN/'):
+            for tree in merged:
+                tree.Write()
+            self.removeShards(shardpaths)
+            return
+
+        # Make (or copy if exist) the total events histogram
+        totalEventsHistogram = NTupleTools.getTotalEventsHistogram(self.inputpath)
+        if totalEventsHistogram:
+            print "TotalEvents histogram already exist. Using it instead."
+        else:
+            passed = sum([result['totalevents'][0] for result in results])
+            passedW = sum([result['totalevents'][1] for result in results])
+            totalEventsHistogram = NTupleTools.makeTotalEventsHistogramFromNumbers(passed, passedW)
+            print "Creating TotalEvents histogram. Bin 1 = raw, Bin 2 = weighted."
+        print "Sample name (" + self.samplename + ") stored in TotalEvents.GetTitle()"
+        totalEventsHistogram.SetTitle(self.samplename)
+
+        # Save the cutflow, summed over the shards
+        print "Creating CutFlow histogram. Bins labeled as FlowNumber/FlowName/Streamlet."
+        cutflow = NTupleTools.mergeCutFlows([result['cutflow'] for result in results])
+        cutFlowHist = NTupleTools.makeCutFlowHistogram(cutflow)
+
+        # Save the flow profile, summed over the shards
+        if self.wb.doProfile:
+            profile = NTupleTools.mergeCutFlows([result['profile'] for result in results], placeholder=None)
+            NTupleTools.printFlowProfile(profile)
+            print "Creating FlowProfile histogram. Bins labeled as FlowNumber/Quantity/FlowName/Streamlet."
+            flowProfileHist = NTupleTools.makeFlowProfileHistogram(profile)
+
+        # Copy the Lumi XML strings across to the new ntuple (once, not per shard)
+        NTupleTools.copyLumi(self.inputpath)
+
+        # Do the write operation (might take a while if the tree is huge)
+        NTupleTools.outputFile.Write()
+
+        self.removeShards(shardpaths)
+        self.moveOutputFile()
+
+    def removeShards(self, shardpaths):
+        for shardpath in shardpaths:
+            try:
+                os.remove(shardpath)
+            except OSError:
+                print "@@@@@ WARNING: Cannot remove", shardpath
+
+    def _runShard(self, shard, entryNumbers, shardpath, queue):
+        # Runs in the worker process: redirect all the output trees to the shard file.
+        # NB: the output file inherited from the parent is neither written nor closed here!
+        result = None
+        try:
+            self.shard = shard
+            NTupleTools.outputFile = NTupleTools.configureOutputFile(TFile.Open(shardpath, 'RECREATE'))
+            if self.outputtree:
+                if "/" in self.treename:
+                    dirname = self.treename.split('/')[0]
+                    NTupleTools.outputFile.mkdir(dirname)
+                    self.outputtree.SetDirectory(NTupleTools.outputFile.GetDirectory(dirname))
+                else:
+                    self.outputtree.SetDirectory(NTupleTools.outputFile)
+            self.run(entryNumbers)
+            weight = self.inputtree.GetWeight()
+            for t in self._tempTree:
+                self._tempTree[t].SetWeight(weight)
+            NTupleTools.outputFile.Write()
+            NTupleTools.outputFile.Close()
+            totalEvents = self.totalflow.totalEvents[""]
+            result = {
+                'trees'       : [self.treename] + sorted(self._tempTree.keys()),
+                'weight'      : weight,
+                'cutflow'     : self.getCutFlowFromFlowChain(self.FlowList),
+                'totalevents' : (totalEvents.passed, totalEvents.passedW),
+                'profile'     : self.getProfileFromFlowChain(self.FlowList) if self.wb.doProfile else None,
+            }
+        finally:
+            queue.put((shard, result))
+
 
 #def RunProof(treename, inputpath, outputpath, entries = (), cores = None):
 #    inputpath = checkInputs(inputpath)
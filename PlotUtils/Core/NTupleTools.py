@@ -6,16 +6,38 @@ Functions to parse/create/read ntuple inputs and outputs
 TODO: Show examples of usage?
 """
 
-import os, sys, math, glob
+import os, sys, math, glob, threading, Queue
 #from ROOT import TH1D, TFile, TObjString, TProofOutputFile, TObjArray
 from ROOT import TH1D, TFile, TObjString, TObjArray
 
-from Core import CodeGenerator, compileMinimal, listifyInputFiles, parseInputArgs
+from Core import CodeGenerator, compileMinimal, listifyInputFiles, parallelMap, parseInputArgs
 
 filedir = os.path.dirname(os.path.abspath(__file__))
 
 outputFile = None
 outputProofFile = None
+resumeOutput = False
+
+# Output tuning (see configureOutput)
+outputSettings = {
+    'basketsize'    : None,
+    'compression'   : None,
+    'autoflush'     : None,
+    'writerthreads' : 0,
+}
+implicitMT = False
+compressionAlgorithms = {'ZLIB': 1, 'LZMA': 2, 'LZ4': 4}
+
+# Metadata of the input files, gathered once per list of inputs (see gatherMetadata)
+metadataCache = {}
+metadataWorkers = 8
+
+# Input tuning (see configureInput)
+inputSettings = {
+    'cachesize'    : None,
+    'learnentries' : None,
+    'prefetch'     : False,
+}
 
 def printBranchesFromFile(treename, inputpath):
     from ROOT import TChain
@@ -31,11 +53,18 @@ def setBranchAddresses(tree, allobjects):
         print "Need to setup with a Branch.py (or similar) file first!"
         return
 
+    # If the branch usage has been analysed (see CodeGenerator.analyseBranchUsage), unused branches are left disabled
+    used = CodeGenerator.usedBranches
+
     from ROOT import AddressOf
     tree.SetBranchStatus("*", 0)
     for name in sorted(obs.keys()):
+        if not used is None and not name in used:
+            continue
         o = getattr(allobjects, name.lower())
         for bname in obs[name].elemsList():
+            if not used is None and not bname in used[name]:
+                continue
             bname, baddress, btype, bdefault, bbranch = obs[name].findBranch(bname)
             if tree.GetBranch(baddress):
                 tree.SetBranchStatus(baddress, 1)
@@ -56,6 +85,202 @@ def loadNTuple(treename, inputdir):
         tree.Add(l)
     return tree
 
+def configureOutput(basketsize=None, compression=None, autoflush=None, writerthreads=0):
+    # basketsize    : size in bytes of the baskets of all the output branches (ROOT default: 32000)
+    # compression   : 'ALGORITHM:LEVEL', with ALGORITHM in ZLIB, LZMA, LZ4, e.g. 'LZ4:4' (ROOT default: 'ZLIB:1')
+    # autoflush     : flush the baskets every N entries (N > 0) or every -N bytes (N < 0), so that the final
+    #                 Write() only has the last cluster left to write
+    # writerthreads : if > 0, ROOT's implicit multithreading compresses the baskets of the output branches on a pool
+    #                 of this size (needs ROOT >= 6.10). This only parallelises the compression within Fill/FlushBaskets,
+    #                 which still block the event loop. IMT is enabled by enableWriterThreads, in the process which
+    #                 writes the output, so that no process is forked while its thread pool is running.
+    if compression:
+        algorithm, level = (compression.split(':') + ['1'])[:2]
+        if not algorithm.upper() in compressionAlgorithms:
+            print "@@@@@ ERROR: Unknown compression algorithm", algorithm, "- choose among", ', '.join(sorted(compressionAlgorithms.keys()))
+            sys.exit(1)
+        try:
+            level = int(level)
+        except ValueError:
+            level = -1
+        if not 0 <= level <= 9:
+            print "@@@@@ ERROR: Invalid compression level in", compression, "- must be an integer between 0 and 9"
+            sys.exit(1)
+        compression = (compressionAlgorithms[algorithm.upper()], level)
+    outputSettings['basketsize'] = basketsize
+    outputSettings['compression'] = compression
+    outputSettings['autoflush'] = autoflush
+    outputSettings['writerthreads'] = writerthreads
+
+def enableWriterThreads():
+    # Enable ROOT's implicit multithreading for the compression of the output baskets (see configureOutput).
+    # To be called right before the event loop of the process writing the output: once the thread pool is running,
+    # this process must not fork anymore (see gatherMetadata)
+    global implicitMT
+    writerthreads = outputSettings['writerthreads']
+    if not writerthreads or implicitMT:
+        return
+    import ROOT
+    if hasattr(ROOT.ROOT, 'EnableImplicitMT'):
+        ROOT.ROOT.EnableImplicitMT(writerthreads)
+        implicitMT = True
+        print "@@@@@ Output baskets will be compressed on", writerthreads, "threads"
+    else:
+        print "@@@@@ WARNING: This ROOT version does not support implicit multithreading, output baskets will be compressed on the main thread"
+
+def configureOutputFile(f):
+    if f and outputSettings['compression']:
+        algorithm, level = outputSettings['compression']
+        f.SetCompressionAlgorithm(algorithm)
+        f.SetCompressionLevel(level)
+    return f
+
+def configureOutputTree(tree):
+    if outputSettings['basketsize']:
+        tree.SetBasketSize("*", outputSettings['basketsize'])
+    if outputSettings['autoflush']:
+        tree.SetAutoFlush(outputSettings['autoflush'])
+    if outputSettings['writerthreads'] and hasattr(tree, 'SetImplicitMT'):
+        tree.SetImplicitMT(True)
+    return tree
+
+def configureInput(cachesize=None, learnentries=None, prefetch=False):
+    # cachesize    : size in bytes of the TTreeCache of the input chains (0 disables it, None keeps the ROOT default)
+    # learnentries : number of entries of the learning phase of the cache, during which the branches which are read
+    #                are recorded (ROOT default: 100). Not used when the cache is seeded with the branches to read
+    # prefetch     : prefetch the baskets asynchronously (TFile.AsyncPrefetching), and read the next file of the
+    #                chain ahead in a background thread (see FilePrefetcher)
+    inputSettings['cachesize'] = cachesize
+    inputSettings['learnentries'] = learnentries
+    inputSettings['prefetch'] = prefetch
+    from ROOT import gEnv, TTreeCache
+    if learnentries:
+        TTreeCache.SetLearnEntries(learnentries)
+    if prefetch:
+        gEnv.SetValue("TFile.AsyncPrefetching", 1)
+
+def configureInputTree(tree, branches=None):
+    # If branches is given (e.g. activeBranches(tree)), the cache is seeded with them and the learning phase is skipped
+    if inputSettings['cachesize'] is None:
+        return tree
+    tree.SetCacheSize(inputSettings['cachesize'])
+    if inputSettings['cachesize'] and branches:
+        for b in branches:
+            tree.AddBranchToCache(b, True)
+        if hasattr(tree, 'StopCacheLearningPhase'):
+            tree.StopCacheLearningPhase()
+    return tree
+
+def activeBranches(tree):
+    # Names of the top-level branches enabled in the current tree of the chain (e.g. by setBranchAddresses)
+    if not tree.GetTree():
+        tree.LoadTree(0)
+    return [b.GetName() for b in tree.GetListOfBranches() if tree.GetBranchStatus(b.GetName())]
+
+def getReadStats():
+    return TFile.GetFileBytesRead(), TFile.GetFileReadCalls()
+
+def printReadStats(tree=None, since=(0, 0), prefetcher=None):
+    # Bytes read and read calls (on all the files, since the getReadStats() snapshot), and the efficiency of the cache of tree
+    bytesread = TFile.GetFileBytesRead() - since[0]
+    readcalls = TFile.GetFileReadCalls() - since[1]
+    print "Input read statistics:"
+    print "    Bytes read          : %.1f MB" % (bytesread/1024.**2)
+    print "    Read calls          : %i (%.1f kB per call)" % (readcalls, bytesread/1024./readcalls if readcalls else 0.)
+    cache = tree.GetReadCache(tree.GetCurrentFile()) if tree and tree.GetCurrentFile() else None
+    if cache:
+        print "    Cache size          : %.1f MB" % (cache.GetBufferSize()/1024.**2)
+        print "    Cache hit ratio     : %.1f%%" % (cache.GetEfficiency()*100.)
+        print "    Cached branches     : %i" % (cache.GetCachedBranches().GetEntries() if cache.GetCachedBranches() else 0)
+    elif tree:
+        print "    Cache               : none"
+    if prefetcher:
+        print "    Prefetched ahead    : %.1f MB in %i files" % (prefetcher.bytesprefetched/1024.**2, len(prefetcher.requested))
+
+class FilePrefetcher:
+    # Reads the files of a chain ahead of the event loop in a background thread, so that they are already in the
+    # page cache when the chain switches to them, instead of being read with small random reads from the storage.
+    # Only plain paths are prefetched: remote files (root://, http://, ...) rely on TFile.AsyncPrefetching.
+    # Only the next file(s) should be requested (see follow), and stop() must be called once the loop is over.
+    blocksize = 8*1024*1024
+
+    def __init__(self, tree):
+        self.files = [f.GetTitle() for f in tree.GetListOfFiles()] if hasattr(tree, 'GetListOfFiles') else []
+        self.requested = set()
+        self.queue = Queue.Queue()
+        self.thread = None
+        self.follower = None
+        self.stopped = threading.Event()
+        self.bytesprefetched = 0
+
+    def prefetch(self, index):
+        # Queue the index-th file of the chain (files are read in the order they are requested)
+        if index >= len(self.files) or index in self.requested:
+            return
+        path = self.files[index]
+        if '://' in path or not os.path.isfile(path):
+            return
+        self.requested.add(index)
+        self.queue.put(path)
+        if not self.thread:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def follow(self, current, ahead=1, interval=0.5):
+        # For loops which don't come back to Python when the chain switches file (e.g. compiled ones): keep the
+        # ahead files following the one being read prefetched, polling current() (its index in the chain) until stop()
+        self.requested = set()
+        self.bytesprefetched = 0
+        self.stopped.clear()
+        def watch():
+            while not self.stopped.is_set():
+                index = current()
+                for i in range(index+1, index+1+ahead):
+                    self.prefetch(i)
+                self.stopped.wait(interval)
+        self.prefetch(current()+1)
+        self.follower = threading.Thread(target=watch)
+        self.follower.daemon = True
+        self.follower.start()
+
+    def stop(self):
+        # Stop the background threads: the file being prefetched is dropped, as well as those still queued
+        self.stopped.set()
+        if self.follower:
+            self.follower.join()
+            self.follower = None
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.queue = Queue.Queue()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            path = self.queue.get()
+            if path is None:
+                break
+            try:
+                f = open(path, 'rb')
+                while not self.stopped.is_set():
+                    data = f.read(self.blocksize)
+                    if not data:
+                        break
+                    self.bytesprefetched += len(data)
+                f.close()
+            except IOError, e:
+                print "@@@@@ WARNING: Cannot prefetch", path, "-", e
+
+def outputFilePath(outputpath):
+    # The file which is actually written during the job: w/ PROOF, a temporary file in the current directory,
+    # which is only moved to outputpath at the end (see Kernel.moveOutputFile)
+    options = parseInputArgs()
+    if options.noProof:
+        return os.path.abspath(outputpath)
+    return os.path.abspath('.temp.' + os.path.basename(outputpath))
+
 def makeOutputFile(outputpath, recreate=True):
     global outputFile
     global outputProofFile
@@ -73,6 +298,7 @@ def makeOutputFile(outputpath, recreate=True):
         basename = '.temp.' + os.path.basename(outputpath)
         outputProofFile = TProofOutputFile(basename)
         outputFile = outputProofFile.OpenFile(opt)
+    configureOutputFile(outputFile)
 
 def makeNTuple(treename, allobjects, dump):
     obs = CodeGenerator.obs
@@ -91,7 +317,14 @@ def makeNTuple(treename, allobjects, dump):
     else:
         if outputFile:
             outputFile.cd()
-    tree = TTree(treename, "NTuple output of AnalysisFramework")
+
+    # When resuming from a checkpoint, keep filling the tree saved in the output file
+    tree = None
+    if resumeOutput and outputFile:
+        tree = gROOT.CurrentDirectory().Get(treename)
+    resumed = bool(tree)
+    if not resumed:
+        tree = TTree(treename, "NTuple output of AnalysisFramework")
 
     if not dump:
         objdumplist = []
@@ -109,78 +342,145 @@ def makeNTuple(treename, allobjects, dump):
         for bname in obs[name].elemsList():
             bname, baddress, btype, bdefault, bbranch = obs[name].findBranch(bname)
             if not (obs[name].dumplist is True or bname in obs[name].dumplist): continue
-            if bbranch:
+            if resumed:
+                if bbranch:
+                    tree.SetBranchAddress(baddress, AddressOf(o, bname))
+                else:
+                    tree.SetBranchAddress(baddress, getattr(o, bname))
+            elif bbranch:
                 tree.Branch(baddress, AddressOf(o, bname), baddress+bbranch)
             else:
                 tree.Branch(baddress, btype, getattr(o, bname))
-    return tree
+    if resumed:
+        print "Resuming tree", treename, "with", tree.GetEntries(), "entries"
+        return tree
+    return configureOutputTree(tree)
+
+def readFileMetadata(path):
+    # All the metadata of one input file, as plain python objects (so that they can be sent back by worker processes)
+    meta = {'totalevents': None, 'cutflow': None, 'lumi': [], 'systematics': []}
+    f = TFile.Open(path)
+    if not f or f.IsZombie():
+        print "@@@@@ WARNING: Cannot open", path, "to read its metadata"
+        return meta
+    htemp = f.Get("TotalEvents")
+    title = htemp.GetTitle() if htemp else None
+    if not htemp: htemp = f.Get("cutflow")
+    if htemp:
+        meta['totalevents'] = (title, htemp.GetBinContent(1), htemp.GetBinContent(2))
+    heach = f.Get("CutFlow")
+    if heach:
+        meta['cutflow'] = []
+        for i in range(heach.GetNbinsX()):
+            label = heach.GetBinLabel(i+1)
+            if not label:
+                break
+            meta['cutflow'].append( (label, heach.GetBinContent(i+1)) )
+    l = f.GetDirectory("Lumi")
+    if l:
+        keys = l.GetListOfKeys()
+        for entry in range(keys.GetEntries()):
+            objstr = l.Get(keys.At(entry).GetName() + ";" + str(keys.At(entry).GetCycle()))
+            if objstr:
+                meta['lumi'].append( (keys.At(entry).GetName(), objstr.GetString().Data()) )
+    for dirname in ['SystematicsUP', 'SystematicsDOWN']:
+        l = f.GetDirectory(dirname)
+        if l:
+            keys = l.GetListOfKeys()
+            for entry in range(keys.GetEntries()):
+                meta['systematics'].append(dirname + '/' + keys.At(entry).GetName())
+    f.Close()
+    return meta
 
-def getTotalEventsHistogram(inputdir):
+def gatherMetadata(inputdir):
+    # Reads the metadata of all the input files (TotalEvents, CutFlow, Lumi and the systematics trees) with a single
+    # open per file, on a pool of metadataWorkers processes, and keeps them for the rest of the job
     inputpath = listifyInputFiles(inputdir)
+    key = tuple(inputpath)
+    if key in metadataCache:
+        return metadataCache[key]
 
-    if outputFile:
-        outputFile.cd()
-    totalEventsHistogram = TH1D("TotalEvents", "", 2, 1, 3)
+    # The CutFlow histograms are CutFlowHist, which keep their own bin labels
     try:
-        for d in inputpath:
-            f = TFile.Open(d)
-            htemp = f.Get("TotalEvents")
-            if not htemp: htemp = f.Get("cutflow")
-            else: totalEventsHistogram.SetTitle(htemp.GetTitle())
-            for i in range(1, 3):
-                totalEventsHistogram.SetBinContent(i, totalEventsHistogram.GetBinContent(i) + htemp.GetBinContent(i))
-            f.Close()
-        return totalEventsHistogram
+        from ROOT import AnalysisFramework
+        AnalysisFramework.CutFlows.CutFlowHist
     except:
+        compileMinimal()
+
+    # No forks once the implicit multithreading pool is running, it could deadlock the children
+    nworkers = min(metadataWorkers, len(inputpath)) if not implicitMT else 1
+    if nworkers > 1:
+        files, failed = parallelMap(readFileMetadata, inputpath, nworkers)
+        # A file which crashed its worker (e.g. corrupted) is treated as one which cannot be opened: no retry here,
+        # it would take the whole job down
+        for index in sorted(failed):
+            print "@@@@@ WARNING: Cannot read the metadata of", inputpath[index], "(" + failed[index] + ")"
+            files[index] = {'totalevents': None, 'cutflow': None, 'lumi': [], 'systematics': []}
+    else:
+        files = [readFileMetadata(d) for d in inputpath]
+
+    # Merge the files: TotalEvents is only available if every file has it, the cutflows are summed by bin label
+    totalevents = [0., 0.]
+    title = ""
+    cutflow = {}
+    for meta in files:
+        if totalevents is not None and meta['totalevents']:
+            t, passed, passedW = meta['totalevents']
+            if t is not None:
+                title = t
+            totalevents = [totalevents[0] + passed, totalevents[1] + passedW]
+        else:
+            totalevents = None
+        for label, content in meta['cutflow'] or []:
+            cutflow[label] = cutflow.get(label, 0.) + content
+
+    metadata = {
+        'files'       : files,
+        'totalevents' : (title, totalevents[0], totalevents[1]) if totalevents is not None and files else None,
+        'cutflow'     : cutflow,
+        'lumi'        : [entry for meta in files for entry in meta['lumi']],
+        'systematics' : files[0]['systematics'] if files else [],
+    }
+    metadataCache[key] = metadata
+    return metadata
+
+def getTotalEventsHistogram(inputdir):
+    totalevents = gatherMetadata(inputdir)['totalevents']
+    if not totalevents:
         return None
 
+    if outputFile:
+        outputFile.cd()
+    title, passed, passedW = totalevents
+    totalEventsHistogram = TH1D("TotalEvents", title, 2, 1, 3)
+    totalEventsHistogram.SetBinContent(1, passed)
+    totalEventsHistogram.SetBinContent(2, passedW)
+    return totalEventsHistogram
+
 def makeTotalEventsHistogram(flow):
+    totalEvents = flow.totalEvents[""]
+    return makeTotalEventsHistogramFromNumbers(totalEvents.passed, totalEvents.passedW)
+
+def makeTotalEventsHistogramFromNumbers(passed, passedW):
     if outputFile:
         outputFile.cd()
     totalEventsHistogram = TH1D("TotalEvents", "", 2, 1, 3)
-    totalEvents = flow.totalEvents[""]
-    totalEventsHistogram.SetBinContent(1, totalEvents.passed)
-    totalEventsHistogram.SetBinContent(2, totalEvents.passedW)
+    totalEventsHistogram.SetBinContent(1, passed)
+    totalEventsHistogram.SetBinContent(2, passedW)
     return totalEventsHistogram
 
 def getCutFlowFromHistogram(inputdir):
-    try:
-        from ROOT import AnalysisFramework
-    except:
-        compileMinimal()
-        from ROOT import AnalysisFramework
-    CutFlowHist = AnalysisFramework.CutFlows.CutFlowHist
-
-    inputpath = listifyInputFiles(inputdir)
-
-    htemp = CutFlowHist("CutFlow", "CutFlow output of AnalysisFramework", 400000, 0, 1)
-    for d in inputpath:
-        f = TFile.Open(d)
-        heach = f.Get("CutFlow")
-        #for i in range(heach.GetNbinsX()):
-        #    if not heach.GetBinLabel(i+1):
-        #        break
-        #    print i+1, heach.GetBinLabel(i+1)
-        col = TObjArray()
-        col.Add(heach)
-        htemp.Merge(col)
-        f.Close()
-
-    #xaxis = htemp.GetXaxis()
     temp = {}
-    for i in range(htemp.GetNbinsX()):
-        label = htemp.GetBinLabel(i+1)
-        if not label:
-            continue
+    for label, content in gatherMetadata(inputdir)['cutflow'].iteritems():
         flownum = int(label.split('/')[0])
         isweighted = label.split('/')[1] == 'W'
         flowname = label.split('/')[2]
         streamlet = label.split('/')[3]
         if isweighted:
             raw = 0.
-            weighted = htemp.GetBinContent(i+1)
+            weighted = content
         else:
-            raw = htemp.GetBinContent(i+1)
+            raw = content
             weighted = 0.
         if not flownum in temp:
             temp[flownum] = (flowname, {})
@@ -199,6 +499,25 @@ def getCutFlowFromHistogram(inputdir):
         cutflow.append(temp[i])
     return cutflow
 
+def mergeCutFlows(cutflows, placeholder={"All": (0, 0.0)}):
+    # Sum cutflows (as given by Kernel.getCutFlowFromFlowChain, or flow profiles) of the same flow chain run on different entries.
+    # Empty flows of a cutflow are filled with a placeholder "All" streamlet, which must not show up next to the real ones.
+    merged = []
+    for flows in zip(*cutflows):
+        numbers = {}
+        for flowname, each in flows:
+            if placeholder and each == placeholder:
+                continue
+            for streamlet, values in each.iteritems():
+                if streamlet in numbers:
+                    numbers[streamlet] = tuple([a+b for a, b in zip(numbers[streamlet], values)])
+                else:
+                    numbers[streamlet] = tuple(values)
+        if not numbers and placeholder:
+            numbers = dict(placeholder)
+        merged.append((flows[0][0], numbers))
+    return merged
+
 def makeCutFlowHistogram(cutflow):
     try:
         from ROOT import AnalysisFramework
@@ -228,44 +547,59 @@ def makeCutFlowHistogram(cutflow):
     print 'Created CutFlow histogram with', index, 'entries.'
     return cutFlowHist
 
-def copyLumi(inputdir):
-    inputpath = listifyInputFiles(inputdir)
+def makeFlowProfileHistogram(profile):
+    if outputFile:
+        outputFile.cd()
+    nbins = 4 * sum([len(numbers) for flowname, numbers in profile])
+    flowProfileHist = TH1D("FlowProfile", "Flow profile output of AnalysisFramework", max(nbins, 1), 0, 1)
+    index = 0
+    for flownum in range(len(profile)):
+        flowname, numbers = profile[flownum]
+        for streamlet in sorted(numbers.keys()):
+            for quantity, value in zip(['N', 'P', 'T', 'C'], numbers[streamlet]):
+                index += 1
+                flowProfileHist.SetBinContent(index, value)
+                flowProfileHist.GetXaxis().SetBinLabel(index, str(flownum) + '/' + quantity + '/' + flowname + '/' + streamlet)
+    print 'Created FlowProfile histogram with', index, 'entries (N = calls, P = passed, T = wall time [s], C = CPU time [s]).'
+    return flowProfileHist
+
+def printFlowProfile(profile):
+    # Flows ranked by the wall time spent in them (excluding the following flows).
+    # Rej/ms is the fraction of the events rejected per ms spent in the flow per event:
+    # cheap cuts w/ high rejection are the best candidates to be moved earlier in the chain.
+    rows = []
+    for flowname, numbers in profile:
+        for streamlet, (calls, passed, walltime, cputime) in numbers.iteritems():
+            if not calls:
+                continue
+            rows.append((walltime, cputime, calls, passed, flowname, streamlet))
+    if not rows:
+        print "No flow has been profiled!"
+        return
+    rows.sort(reverse=True)
+    totaltime = sum([row[0] for row in rows])
+    print
+    print '-' * 124
+    print "%30s %24s %10s %8s %11s %11s %9s %7s %9s" % ("FlowName", "Streamlet", "Calls", "Pass", "Wall [s]", "CPU [s]", "us/call", "Share", "Rej/ms")
+    print '-' * 124
+    for walltime, cputime, calls, passed, flowname, streamlet in rows:
+        percall = walltime / calls
+        rejection = (1. - float(passed) / calls) / (percall * 1e3) if percall else 0.
+        print "%30s %24s %10d %7.1f%% %11.3f %11.3f %9.2f %6.1f%% %9.1f" % (flowname[:30], streamlet[:24], calls, 100. * passed / calls, walltime, cputime, percall * 1e6, 100. * walltime / totaltime if totaltime else 0., rejection)
+    print '-' * 124
+    print "%30s %24s %10s %8s %11.3f %11.3f" % ("Total", "", "", "", totaltime, sum([row[1] for row in rows]))
+    print
 
+def copyLumi(inputdir):
     lumidir = outputFile.mkdir("Lumi")
-    for d in inputpath:
-        f = TFile.Open(d)
-        try:
-            l  = f.GetDirectory("Lumi")
-            keys = l.GetListOfKeys()
-            for entry in range(keys.GetEntries()):
-                objstr = l.Get(keys.At(entry).GetName() + ";" + str(keys.At(entry).GetCycle()))
-                if objstr:
-                    lumidir.cd()
-                    objnew = TObjString(objstr.GetString().Data())
-                    objnew.Write(keys.At(entry).GetName())
-        except:
-            pass
-        f.Close()
+    lumidir.cd()
+    for name, string in gatherMetadata(inputdir)['lumi']:
+        objnew = TObjString(string)
+        objnew.Write(name)
     outputFile.cd()
 
 def getSystematicNames(inputdir):
-    inputpath = listifyInputFiles(inputdir)
-
-    d = inputpath[0]
-    f = TFile.Open(d)
-
-    systlist = []
-    l  = f.GetDirectory("SystematicsUP")
-    if l:
-        keys = l.GetListOfKeys()
-        for entry in range(keys.GetEntries()):
-            systlist.append('SystematicsUP/' + keys.At(entry).GetName())
-    l  = f.GetDirectory("SystematicsDOWN")
-    if l:
-        keys = l.GetListOfKeys()
-        for entry in range(keys.GetEntries()):
-            systlist.append('SystematicsDOWN/' + keys.At(entry).GetName())
-    return systlist
+    return list(gatherMetadata(inputdir)['systematics'])
 
 def printCutFlow(cutflow, suppressStreamlet=[], denameStreamlet=[], suppressEmpty=False):
     currentheadings = None
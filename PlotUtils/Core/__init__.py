@@ -7,23 +7,228 @@ TODO: Show example of joboptions file setup here?
 """
 
 print "@@@@@ Initialising the analysis framework"
-import os, sys, copy, glob, optparse
+import os, sys, copy, glob, optparse, hashlib, re, shutil, socket, json, time
 
 filedir = os.path.dirname(os.path.abspath(__file__))
 compiledir = 'libs'
+compiledsources = []
+usebuildcache = True
+buildkey = ''
+buildcachemaxage = 30 # Days after which the entries of the build cache which haven't been used are removed (None: never)
+prunedcaches = set()
+generatedincludes = {}
 
 def compileC(filename, target=None):
     global compiledir
+    if not filename in compiledsources:
+        compiledsources.append(filename)
     if not target is None:
         originaldir = compiledir
         compiledir = target
     from ROOT import gSystem
-    if not gSystem.CompileMacro(filename, "k-", "", filedir+"/../"+compiledir):
+    if usebuildcache:
+        success = compileCached(filename, filedir+"/../"+compiledir)
+    else:
+        success = gSystem.CompileMacro(filename, "k-", "", filedir+"/../"+compiledir)
+    if not success:
         print "@@@@@ ERROR: Failed to compile", filename
         sys.exit(1)
     if not target is None:
         compiledir = originaldir
 
+def hashSource(filename, digest, seen):
+    # Feed the content of a source, and of all its local includes (generated sources included), to the digest
+    path = os.path.abspath(filename)
+    if path in seen or not os.path.isfile(path):
+        return
+    seen.add(path)
+    text = open(path).read()
+    digest.update(os.path.basename(path) + '\n' + text)
+    for inc in re.findall(r'#include\s*"([^"]+)"', text):
+        for incdir in [os.path.dirname(path)] + [ flag[2:] for flag in generatedincludes.values() ]:
+            if os.path.isfile(os.path.join(incdir, inc)):
+                hashSource(os.path.join(incdir, inc), digest, seen)
+                break
+
+def writeGenerated(name, content, include=False):
+    # Generated sources are written to <compiledir>/cache/generated/<hash of their content>/name, so that concurrent
+    # jobs generating different sources never overwrite each other's. W/ include, the directory is put on the include
+    # path (in place of the one of a previous version of the same source), for the sources which include it by name.
+    # Returns the path of the source.
+    dirpath = os.path.abspath(filedir+"/../"+compiledir) + '/cache/generated/' + hashlib.sha1(content).hexdigest()[:16]
+    filepath = dirpath + '/' + name
+    if not os.path.isfile(filepath):
+        if not os.path.isdir(dirpath):
+            try:
+                os.makedirs(dirpath)
+            except OSError:
+                pass # Created in the meantime by another job
+        temppath = '%s.%s.%i.tmp' % (filepath, socket.gethostname(), os.getpid())
+        with open(temppath, 'w') as f:
+            f.write(content)
+        os.rename(temppath, filepath)
+    touchCacheEntry(dirpath)
+    if include:
+        from ROOT import gSystem
+        flag = '-I' + dirpath
+        previous = generatedincludes.get(name)
+        if previous is None:
+            gSystem.AddIncludePath(flag)
+        elif previous != flag:
+            gSystem.SetIncludePath(str(gSystem.GetIncludePath()).replace(previous, flag))
+        generatedincludes[name] = flag
+    return filepath
+
+def touchCacheEntry(path):
+    # Mark an entry of the build cache as used (see pruneBuildCache)
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+def pruneBuildCache(builddir, maxage):
+    # Remove the libraries, the generated sources and the leftovers of interrupted builds in builddir/cache
+    # which haven't been used for more than maxage days
+    cache = os.path.abspath(builddir) + '/cache'
+    cutoff = time.time() - maxage*24*3600
+    removed = 0
+    for path in glob.glob(cache + '/*') + glob.glob(cache + '/generated/*'):
+        if path == cache + '/generated' or not os.path.isdir(path):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path)
+                removed += 1
+        except OSError:
+            pass # Removed in the meantime by another job
+    if removed:
+        print "@@@@@ Removed", removed, "entries unused for more than", maxage, "days from the build cache", cache
+
+def compileCached(filename, builddir):
+    # Libraries are cached in builddir/cache, keyed on the content of the source (and its local includes),
+    # the ROOT and compiler versions, the compilation flags and the key of the previously compiled library,
+    # so that anything a library is built against is part of its key.
+    # A missing library is built in a private directory, which is then renamed: concurrent jobs never see
+    # a partially written library, and if two jobs build the same one, the first rename wins.
+    global buildkey
+    from ROOT import gSystem, gROOT
+    if buildcachemaxage is not None and not builddir in prunedcaches:
+        prunedcaches.add(builddir)
+        pruneBuildCache(builddir, buildcachemaxage)
+    digest = hashlib.sha1()
+    digest.update('\n'.join([buildkey, gROOT.GetVersion(), gSystem.GetBuildCompilerVersion(), gSystem.GetIncludePath(), gSystem.GetFlagsOpt(), str(gSystem.GetAclicMode())]))
+    hashSource(filename, digest, set())
+    buildkey = digest.hexdigest()
+
+    name = os.path.splitext(os.path.basename(filename))[0] + '_C'
+    cachedir = os.path.abspath(builddir) + '/cache/' + name + '.' + buildkey[:16]
+    library = cachedir + '/' + name + '.' + gSystem.GetSoExt()
+
+    if os.path.isfile(library):
+        print "@@@@@ Using cached library", library
+        touchCacheEntry(cachedir)
+    else:
+        tempdir = '%s.tmp.%s.%i' % (cachedir, socket.gethostname(), os.getpid())
+        if not os.path.isdir(tempdir):
+            os.makedirs(tempdir)
+        if not gSystem.CompileMacro(filename, "kc-", tempdir + '/' + name, tempdir):
+            shutil.rmtree(tempdir, ignore_errors=True)
+            return False
+        try:
+            os.rename(tempdir, cachedir)
+            print "@@@@@ Cached library", library
+        except OSError:
+            # Another job cached the very same library in the meantime: use that one
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+    return gSystem.Load(library) >= 0
+
+def parallelMap(function, args, nworkers, initializer=None, initargs=(), pollinterval=1):
+    # Evaluate function(arg) for each arg on nworkers forked processes, as multiprocessing.Pool.map would, but w/o hanging
+    # if a worker dies (e.g. killed, or crashed in ROOT): each worker reports on its own pipe, the task a dead worker was
+    # running is marked as failed, and a new worker takes over the remaining ones.
+    # Returns the list of the results (None for the failed tasks) and a dictionary { index of the task : reason of the failure }.
+    # NB: as w/ Pool.map, the arguments and the results must be picklable, the function itself is inherited by the fork
+    import multiprocessing
+    tasks = multiprocessing.Queue()
+    for index, arg in enumerate(args):
+        tasks.put((index, arg))
+    nworkers = max(1, min(nworkers, len(args)))
+    for i in range(nworkers):
+        tasks.put(None)
+
+    def startWorker():
+        # The pipe is written synchronously: unlike a Queue, nothing is lost in a feeder thread if the worker crashes
+        receiver, sender = multiprocessing.Pipe(False)
+        worker = multiprocessing.Process(target=_parallelWorker, args=(function, tasks, sender, initializer, initargs))
+        worker.start()
+        sender.close()
+        return [worker, receiver, None] # The last item is the index of the task it is running
+
+    workers = [startWorker() for i in range(nworkers)]
+    outputs = [None] * len(args)
+    failed = {}
+    pending = set(range(len(args)))
+
+    def receive(entry):
+        try:
+            kind, index, value = entry[1].recv()
+        except (EOFError, IOError):
+            return False
+        if kind == 'start':
+            entry[2] = index
+            return True
+        entry[2] = None
+        pending.discard(index)
+        if kind == 'done':
+            outputs[index] = value
+        else:
+            failed[index] = value
+        return True
+
+    while pending and workers:
+        timeout = float(pollinterval)/len(workers)
+        for entry in list(workers):
+            worker, receiver, index = entry
+            if receiver.poll(timeout):
+                if receive(entry):
+                    continue
+            elif worker.is_alive():
+                continue
+            # The worker is gone, and so is whatever it had to send
+            worker.join()
+            workers.remove(entry)
+            index = entry[2]
+            if index in pending:
+                print "@@@@@ Worker process died (exit code %s) while running task %i" % (worker.exitcode, index)
+                failed[index] = 'worker died w/ exit code %s' % worker.exitcode
+                pending.discard(index)
+            if worker.exitcode and pending:
+                workers.append(startWorker()) # Takes over the sentinel the dead worker didn't consume
+    # Tasks taken by a worker which died before reporting them
+    for index in pending:
+        failed[index] = 'lost by a dead worker'
+    for worker, receiver, index in workers:
+        worker.join()
+    return outputs, failed
+
+def _parallelWorker(function, tasks, sender, initializer, initargs):
+    import traceback
+    if initializer:
+        initializer(*initargs)
+    while True:
+        item = tasks.get()
+        if item is None:
+            break
+        index, arg = item
+        sender.send(('start', index, None))
+        try:
+            sender.send(('done', index, function(arg)))
+        except Exception, e:
+            traceback.print_exc()
+            sender.send(('error', index, '%s: %s' % (e.__class__.__name__, e)))
+    sender.close()
+
 def makeVectorString(strlist):
     from ROOT import std
     vec = std.vector('string')()
@@ -45,6 +250,20 @@ def parseInputArgs():
                       help='Use PROOF with number of cores (default or 0 = all cores on machine)')
     parser.add_option('-n', '--noProof', default=False, action='store_true',
                       help='Override all configuration and disable PROOF')
+    parser.add_option('-j', '--nWorkers', default=None, type='int',
+                      help='Split the input entries among this number of local worker processes, and merge their outputs')
+    parser.add_option('-t', '--profileFlows', default=False, action='store_true',
+                      help='Profile the time spent and the pass rate in each flow of the chain')
+    parser.add_option('-l', '--compiledLoop', default=False, action='store_true',
+                      help='Run the event loop in compiled code (Core/EventLoop.C) instead of python')
+    parser.add_option('-k', '--checkpoint', default=None, type='int',
+                      help='Save a checkpoint every this number of entries, and resume from it if the job is rerun')
+    parser.add_option('--cacheSize', default=None, type='float',
+                      help='Size (in MB) of the TTreeCache of the input chain, seeded with the branches to read (0 disables it)')
+    parser.add_option('--learnEntries', default=None, type='int',
+                      help='Number of entries of the learning phase of the TTreeCache')
+    parser.add_option('--prefetch', default=False, action='store_true',
+                      help='Prefetch the input baskets asynchronously, and read the next input file ahead in the background')
     parser.add_option('-f', '--stdinFiles', default=False, action='store_true',
                       help='Read input files from stdin')
     parser.add_option('-c', '--cutFlowSuppress', default=None,
@@ -135,9 +354,14 @@ def compileAll(
         removeunselected    = False,
         cutflows            = [],
         toolset             = 'LepHad2011',
+        prunebranches       = False,
+        extrasources        = [],
+        buildcache          = True,
     ):
     global compiledir
+    global usebuildcache
     compiledir = 'libs/' + toolset
+    usebuildcache = buildcache
 
     from ROOT import gSystem
     gSystem.SetAclicMode(gSystem.kOpt)
@@ -169,6 +393,11 @@ def compileAll(
     import CutFlows
     CutFlows.load(cutflows)
     compileC(filedir+"/PostLoader.C")
+    compileC(filedir+"/EventLoop.C")
+
+    # Only read the branches used by the compiled cutflows and tools (plus any python source using them), and the dumped ones
+    if prunebranches:
+        CodeGenerator.analyseBranchUsage(compiledsources + list(extrasources), outputdump)
 
 def compileMinimal(compiletarget = 'libs/minimal'):
     global compiledir
@@ -189,14 +418,57 @@ def setupApp(
         corrections         = [],
         systematics         = [],
         debugmode           = False,
+        nworkers            = 1,
+        profile             = False,
+        basketsize          = None,
+        compression         = None,
+        autoflush           = None,
+        writerthreads       = 0,
+        checkpoint          = 0,
+        compiledloop        = False,
+        cachesize           = None,
+        learnentries        = None,
+        prefetch            = False,
         
     ):
 
+    # Output tuning, see NTupleTools.configureOutput
+    NTupleTools.configureOutput(basketsize, compression, autoflush, writerthreads)
+
     # Make output file
     if treename.startswith('SystematicsUP/') or treename.startswith('SystematicsDOWN/'):
         recreate = False
     else:
         recreate = True
+
+    options = parseInputArgs()
+
+    # Input read-ahead, see NTupleTools.configureInput
+    if options.cacheSize is not None:
+        cachesize = int(options.cacheSize*1024**2)
+    NTupleTools.configureInput(cachesize, options.learnEntries or learnentries, prefetch or options.prefetch)
+
+    # Resume from the checkpoint of a previous run of this job, if any
+    if options.checkpoint:
+        checkpoint = options.checkpoint
+    checkpointpath = outputpath + '.' + treename.replace('/', '_') + '.checkpoint'
+    resume = bool(checkpoint) and os.path.isfile(checkpointpath)
+    # The checkpoint is only valid for the output file it was saved with (e.g. w/ PROOF, the temporary file in the
+    # directory the job was run from): if that's not the file this run would update, start from scratch
+    outputfilepath = NTupleTools.outputFilePath(outputpath)
+    if resume:
+        try:
+            with open(checkpointpath) as f:
+                checkpointfile = json.load(f).get('outputfile')
+        except (IOError, ValueError), e:
+            checkpointfile = None
+        if not checkpointfile == outputfilepath or not os.path.isfile(outputfilepath):
+            print "@@@@@ WARNING: Checkpoint", checkpointpath, "was saved with output file", checkpointfile, "but this run writes", outputfilepath, "(or it is missing) - starting from scratch"
+            resume = False
+    if resume:
+        print "@@@@@ Found checkpoint", checkpointpath, "- the output file will be updated"
+        recreate = False
+        NTupleTools.resumeOutput = True
     NTupleTools.makeOutputFile(outputpath, recreate)
 
     # Check sample name against the dataset manager to see if it's recognised
@@ -216,6 +488,10 @@ def setupApp(
     kernel.outputpath = outputpath
     kernel.outputdump = outputdump
     kernel.samplename = samplename
+    kernel.checkpoint = checkpoint
+    kernel.checkpointpath = checkpointpath
+    kernel.outputfilepath = outputfilepath
+    kernel.resume = resume
 
     from ROOT import AnalysisFramework
     kernel.ao = CodeGenerator.AllObjects()
@@ -223,10 +499,18 @@ def setupApp(
     kernel.corrections = corrections
     kernel.systematics = systematics
 
+    # Override the number of worker processes from commandline arguments if exists
+    options = parseInputArgs()
+    if options.nWorkers:
+        nworkers = options.nWorkers
+    kernel.nworkers = nworkers
+    kernel.compiledloop = compiledloop or options.compiledLoop
+
     kernel.wb = AnalysisFramework.CutFlows.WhiteBoard()
     kernel.wb.debugMode = debugmode
     kernel.wb.doDump = not outputdump == False
     kernel.wb.doRemoveUnselected = removeunselected
+    kernel.wb.doProfile = profile or options.profileFlows
 
     kernel.wb.isMC11a = dm.check(samplename, 'mc11a')
     kernel.wb.isMC11b = dm.check(samplename, 'mc11b')
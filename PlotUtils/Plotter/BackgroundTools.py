@@ -4,13 +4,13 @@ __author__     = "KG, Marco Milesi, Francesco Nuti"
 __email__      = "Kong.Guan.Tan@cern.ch, marco.milesi@cern.ch, francesco.nuti@cern.ch"
 __maintainer__ = "Marco Milesi"
 
-import sys, glob, os, array, inspect, math
+import sys, glob, os, array, inspect, math, hashlib
 
 from ROOT import TFile, TH1, TH1D, TH1F, TH1I, TH2, TH2D, TH2F, TH2I, TObjString, TTree, TChain, TObjArray, TDirectoryFile, TNamed, TObject
-from ROOT import gROOT, gPad, THStack, TColor, TCanvas, TPad, TLine, TLegend, kBlack, kWhite, kRed, kGray, kBlue, TMath, TGraphAsymmErrors, TLatex, gStyle
+from ROOT import gROOT, gDirectory, gPad, THStack, TColor, TCanvas, TPad, TLine, TLegend, kBlack, kWhite, kRed, kGray, kBlue, TMath, TGraphAsymmErrors, TLatex, gStyle
 
 sys.path.append(os.path.abspath(os.path.curdir))
-from Core import NTupleTools, DatasetManager, listifyInputFiles
+from Core import NTupleTools, DatasetManager, listifyInputFiles, parallelMap
 
 gROOT.Reset()
 gROOT.LoadMacro(os.path.abspath(os.path.curdir)+"/Plotter/AtlasStyle.C")
@@ -18,11 +18,34 @@ gROOT.LoadMacro(os.path.abspath(os.path.curdir)+"/Plotter/AtlasStyle.C")
 from ROOT import SetAtlasStyle
 SetAtlasStyle()
 
+# MultiHistFiller is compiled (w/ ACLiC) only when the booking mode is first used, not on import
+
+_multihistfiller = os.path.abspath(os.path.curdir)+"/Plotter/MultiHistFiller.C+"
+
+def getMultiHistFiller():
+    global _multihistfiller
+    if type(_multihistfiller) is str:
+        gROOT.LoadMacro(_multihistfiller)
+        from ROOT import MultiHistFiller
+        # The loop doesn't call back into Python: release the GIL, so that the prefetching threads can run meanwhile
+        for flag in ['_threaded', '__release_gil__']: # PyROOT, cppyy
+            try:
+                setattr(MultiHistFiller.fill, flag, True)
+            except (AttributeError, TypeError):
+                pass
+        _multihistfiller = MultiHistFiller
+    return _multihistfiller
+
+from Plotter.CacheTools import DiskCache, HistCache, TreeMetadata
+from Plotter.PlotStore import PlotContent, ProcessInfo
+
 class Inputs:
 
     def __init__(self):
 
         self.alltrees = {}
+        self.treespecs = {}
+        self.metadata = None
         self.sampleids = {}
         self.nomtree = 'physics'
         self.friendtrees = []
@@ -39,7 +62,7 @@ class Inputs:
 
     def registerTree(self, filegroup, nomtree = 'physics', systrees=[], ismc=True, isembedding=False, isdata=False, sample={}, resetTreeWeight=False):
 
-	# This function add a tree to TChain contained in self.alltrees = {}.
+	# This function add a tree to TChain contained in self.alltrees = {}. The TChain is actually built (from self.treespecs) only when first requested.
 	# In this dictionary each group and subgroup is separated and has its proper TChain.
 	# This function create the TChain for the group specified if not exist and if already exist add the tree founded to this chain.
 	# I'm not very sure of the role of the sampleid variable. Can do this for many samples (all those in filegroup) and for many trees (for the nominal and for all those in systrees)
@@ -73,50 +96,133 @@ class Inputs:
 
         if not self.readGFW2:
             for filepath in filelist:
-                f = TFile.Open(filepath,"UPDATE")
-                for treename in treelist:
-                    t = f.Get(treename)
-                    if not t:
-                        print ("WARNING: tree {0} in file {1} cannot be found during tree registration".format(treename,filepath))
-                        return False
-                    if ismc and ( t.GetWeight() == 1.0 or resetTreeWeight ):
-                        print("Weighting tree w/ Xsec weight...")
-                        weight = float(sample['xsection']) * float(sample['efficiency']) * float(sample['kfactor']) * 1e3 # To get the weight in fb (assuming the Xsec is in pb)
-                        h = f.Get("TotalEventsW")
-                        if not h:
-                            print ("WARNING: histogram named TotalEventsW in file {1} couldn't be found!".format(filepath))
-                            return False
-                        weight /= h.GetBinContent(2)
-                        t.SetWeight(weight)
-                        t.Write(t.GetName(),t.kOverwrite)
-                f.Close()
-
-        # Add the TTrees into a TChain
+                if not self.setTreeWeights(filepath, treelist, ismc, sample, resetTreeWeight):
+                    return False
+
+        # Register the TTrees: the TChain for each group/subgroup is built the first time it is requested
 
         for filepath in filelist:
 	    for treename in treelist:
-                if not treename in self.alltrees:
-                    self.alltrees[treename] = {}
-                processes = self.alltrees[treename]
+                if not treename in self.treespecs:
+                    self.treespecs[treename] = {}
+                processes = self.treespecs[treename]
                 if not group in processes:
                     processes[group] = {}
                 if not subgroup in processes[group]:
-                    processes[group][subgroup] = TChain(treename)
-                    processes[group][subgroup].SetTitle(prefix+treename+group+subgroup)
-                processes[group][subgroup].Add(filepath)
+                    processes[group][subgroup] = { 'title' : prefix+treename+group+subgroup, 'files' : [], 'friends' : [] }
+                spec = processes[group][subgroup]
+                spec['files'].append(filepath)
                 # Add friend trees to *this* tree (if any)
                 if self.friendtrees:
                     for friendname in self.friendtrees:
                         friendfilepath = filepath + self.friendfile_extension
-                        processes[group][subgroup].AddFriend(friendname,friendfilepath)
+                        spec['friends'].append( (friendname,friendfilepath) )
                 if sampleid:
-                    processes[group][subgroup].SetTitle(processes[group][subgroup].GetTitle()+'_'+sampleid)
+                    spec['title'] += '_'+sampleid
                     if not treename in self.sampleids:
                         self.sampleids[treename] = {}
                     self.sampleids[treename][sampleid] = (group, subgroup) # Seems that using sampleid you can then recover the info about the group and the subgroup...
 
         return True
 
+    # Get the weights of the trees and the sum of weights of a file from the metadata sidecar (if available),
+    # opening the file (read-only) only if they are not cached yet. The file is opened in UPDATE mode only if a weight has to be changed.
+
+    def readTreeMetadata(self, filepath, treelist):
+
+        f = TFile.Open(filepath)
+        if not f or f.IsZombie():
+            return None
+        entry = { 'weights' : {}, 'sumw' : None }
+        for treename in treelist:
+            t = f.Get(treename)
+            entry['weights'][treename] = t.GetWeight() if t else None
+        h = f.Get("TotalEventsW")
+        if h:
+            entry['sumw'] = h.GetBinContent(2)
+        f.Close()
+        if self.metadata:
+            self.metadata.set(filepath, entry)
+        return entry
+
+    def setTreeWeights(self, filepath, treelist, ismc, sample, resetTreeWeight):
+
+        entry = self.metadata.get(filepath) if self.metadata else None
+        if not entry or any( not treename in entry['weights'] for treename in treelist ):
+            entry = self.readTreeMetadata(filepath, treelist)
+        if not entry:
+            print ("WARNING: file {0} cannot be opened during tree registration".format(filepath))
+            return False
+
+        towrite = []
+        for treename in treelist:
+            weight = entry['weights'][treename]
+            if weight is None:
+                print ("WARNING: tree {0} in file {1} cannot be found during tree registration".format(treename,filepath))
+                return False
+            if ismc and ( weight == 1.0 or resetTreeWeight ):
+                if entry['sumw'] is None:
+                    print ("WARNING: histogram named TotalEventsW in file {0} couldn't be found!".format(filepath))
+                    return False
+                newweight = float(sample['xsection']) * float(sample['efficiency']) * float(sample['kfactor']) * 1e3 # To get the weight in fb (assuming the Xsec is in pb)
+                newweight /= entry['sumw']
+                if weight != newweight:
+                    towrite.append( (treename, newweight) )
+
+        if towrite:
+            print("Weighting tree w/ Xsec weight...")
+            f = TFile.Open(filepath,"UPDATE")
+            for treename, weight in towrite:
+                t = f.Get(treename)
+                t.SetWeight(weight)
+                t.Write(t.GetName(),t.kOverwrite)
+            f.Close()
+            self.readTreeMetadata(filepath, treelist)
+
+        return True
+
+    # Build the TChain of a group/subgroup (and its friends) from its registration
+
+    def buildTree(self, treename, group, subgroup):
+
+        spec = self.treespecs[treename][group][subgroup]
+        chain = TChain(treename)
+        chain.SetTitle(spec['title'])
+        for filepath in spec['files']:
+            chain.Add(filepath)
+        for friendname, friendfilepath in spec['friends']:
+            chain.AddFriend(friendname,friendfilepath)
+        # The branches read depend on the formulas, so the TTreeCache relies on its learning phase (see NTupleTools.configureInput)
+        NTupleTools.configureInputTree(chain)
+        return chain
+
+    # Drop all the TChains built so far: they will be rebuilt from scratch when requested.
+    # Used by forked worker processes, which must not read through the file descriptors (and offsets) shared w/ the parent
+
+    def reopenTrees(self):
+
+        self.alltrees = {}
+
+    # Fingerprint of all the registered input files (path, size and modification time, friends included),
+    # which changes whenever any of the inputs is replaced or rewritten. Files which cannot be stat'ed are reported as missing.
+
+    def fingerprint(self):
+
+        files = set()
+        for processes in self.treespecs.itervalues():
+            for subgroups in processes.itervalues():
+                for spec in subgroups.itervalues():
+                    files.update(spec['files'])
+                    files.update( friendfilepath for friendname, friendfilepath in spec['friends'] )
+        tokens = []
+        for filepath in sorted(files):
+            try:
+                st = os.stat(filepath)
+                tokens.append('%s:%d:%d' % (os.path.abspath(filepath), st.st_size, int(st.st_mtime)))
+            except OSError:
+                tokens.append('%s:missing' % os.path.abspath(filepath))
+        return hashlib.sha1('\n'.join(tokens)).hexdigest()
+
     # Load a tree from the list of all trees
 
     def getTree(self, treename='physics', group='', subgroup='', sampleid=None):
@@ -128,14 +234,18 @@ class Inputs:
             group, subgroup = self.sampleids[self.nomtree][sampleid]
 
         if treename.startswith('SystematicsUP/') or treename.startswith('SystematicsDOWN/'):
-            if self.getTree(self.nomtree, group, subgroup).GetTitle().startswith('$ISDATA$'): # In case of data the tree to be considered is the nominal
+            if self.treespecs[self.nomtree][group][subgroup]['title'].startswith('$ISDATA$'): # In case of data the tree to be considered is the nominal
                 treename = self.nomtree
 
         try:
             tree = self.alltrees[treename][group][subgroup]
-        except:
-            tree = None
-            print("WARNING: Could not reach tree {0} in group {1}, subgroup {2}".format(treename, group, subgroup))
+        except KeyError:
+            try:
+                tree = self.buildTree(treename, group, subgroup)
+                self.alltrees.setdefault(treename, {}).setdefault(group, {})[subgroup] = tree
+            except KeyError:
+                tree = None
+                print("WARNING: Could not reach tree {0} in group {1}, subgroup {2}".format(treename, group, subgroup))
 
 	#print("\nTree: {0} - Xsec weight = {1}".format(tree.GetName(),tree.GetWeight()))
         return tree
@@ -174,13 +284,13 @@ class Inputs:
         return treelist
 
     def getTreenameList(self):
-        return self.alltrees.keys()
+        return self.treespecs.keys()
 
     def getGroupList(self):
-        return self.alltrees[self.nomtree].keys()
+        return self.treespecs[self.nomtree].keys()
 
     def getSubGroupList(self, group=''):
-        return self.alltrees[self.nomtree][group].keys()
+        return self.treespecs[self.nomtree][group].keys()
 
     def getSysIndexes(self, sampleID, branchID):
 
@@ -320,28 +430,87 @@ class Cut:
     # A Cut is defined by a name and a set of rules defined in the cut string,
     # but can be also the composition of several cuts specified in the cut list parameter.
 
+    # Cut strings which do not select anything: they are left out of the TTreeFormula of composite cuts
+
+    dummies = ['1', '(1)', '( 1 )']
+
     def __init__(self, cutname, cutstr, cutlist=None):
         self.cutname    = cutname
         self.cutstr     = cutstr
         if cutlist is None:
             cutlist = [self]
+        else:
+            cutlist = self.canonicalList(cutlist)
         self.cutlist     = cutlist
         self.cutnamelist = [c.cutname for c in cutlist]
 
+        if not self.isLeaf():
+            self.cutstr = self.canonicalstr
+
+    # The canonical form of the selection does not depend on the order in which the cuts have been combined,
+    # on repeated cuts or on whitespace: it is used for the TTreeFormula of composite cuts and, through
+    # its hash (cutkey), to identify the cut in the SubProcess caches.
+    # Both are evaluated on the fly, as the cut strings of registered cuts can be overridden after their creation.
+
+    @property
+    def canonicalstr(self):
+        return self.canonicalString(self.cutlist)
+
+    @property
+    def cutkey(self):
+        return hashlib.sha1(self.canonicalstr).hexdigest()
+
+    @staticmethod
+    def normalise(cutstr):
+        return ' '.join(cutstr.split())
+
+    def isLeaf(self):
+        return len(self.cutlist) == 1 and self.cutlist[0] is self
+
+    def leaves(self):
+        if self.isLeaf():
+            return [self]
+        leaves = []
+        for c in self.cutlist:
+            leaves.extend(c.leaves())
+        return leaves
+
+    # Flatten a list of cuts into its elementary cuts, removing duplicates (by name or by selection)
+    # and sorting them by name
+
+    @classmethod
+    def canonicalList(cls, cutlist):
+        newlist = []
+        names, strings = set(), set()
+        for c in sorted([ leaf for c in cutlist for leaf in c.leaves() ], key=lambda x: x.cutname):
+            normstr = cls.normalise(c.cutstr)
+            if c.cutname in names or normstr in strings: continue # Don't use the same cut more than once!
+            names.add(c.cutname)
+            strings.add(normstr)
+            newlist.append(c)
+        return newlist
+
+    @classmethod
+    def canonicalString(cls, cutlist):
+        strings = sorted(set( cls.normalise(c.cutstr) for c in cutlist ))
+        strings = [ s for s in strings if not s in cls.dummies ] # Add only non-dummy cuts to the TTreeFormula
+        if not strings:
+            return '1'
+        if len(strings) == 1:
+            return strings[0]
+        return ' && '.join( '( %s )' % s for s in strings )
+
     # Removes a cut, provided it's found in the list of cuts
 
     def removeCut(self, cut):
-        newlistnames = []
-        newliststr = []
         newlist = []
         for c in self.cutlist:
-            if c.cutname == cut.cutname: continue
-            newlistnames.append(c.cutname)
-            newliststr.append(c.cutstr)
+            if c.cutname == cut.cutname or self.normalise(c.cutstr) == self.normalise(cut.cutstr): continue
             newlist.append(c)
-        newname = ' AND '.join(newlistnames)
-        newstr  = ' && '.join(newliststr)
-        return Cut(newname, newstr, newlist)
+        newname = ' AND '.join([c.cutname for c in newlist])
+        if len(newlist) == 1:
+            return newlist[0]
+        return Cut(newname, None, newlist)
 
     # Substitute a cut w/ another cut
 
@@ -354,22 +523,12 @@ class Cut:
 
     def __and__(self, othercut):
         if not othercut:
-            newname = self.cutname
-            newstr = self.cutstr
-            newlist = self.cutlist
-        else:
-            newlistnames = []
-            newliststr = []
-            newlist = []
-            for c in sorted(self.cutlist + othercut.cutlist, key=lambda x: x.cutname):
-                if c.cutname in newlistnames: continue # Don't use the same cut more than once!
-                newlistnames.append(c.cutname)
-                if not any( s == c.cutstr for s in ['( 1 )','1'] ): # Add only non-dummy cuts to the TTreeFormula
-                    newliststr.append(c.cutstr)
-                newlist.append(c)
-            newname = ' AND '.join(newlistnames)
-            newstr  = ' && '.join(newliststr)
-        return Cut(newname, newstr, newlist)
+            return Cut(self.cutname, self.cutstr, self.cutlist)
+        newlist = self.canonicalList(self.cutlist + othercut.cutlist)
+        if len(newlist) == 1:
+            return newlist[0]
+        newname = ' AND '.join([c.cutname for c in newlist])
+        return Cut(newname, None, newlist)
 
     # Bitwise OR of two cuts. Should be called in this way: cut1 | cut2
 
@@ -411,6 +570,10 @@ class VariableDB:
     # This class contains the list of all the variables, cuts, systematics and categories to be used to analyse our data.
     # Info are registered using the register methods.
     # Info stored in this DB can be retrieved at any time using the getter methods...
+    #
+    # Variables and cuts can also be declared w/ the declare methods: only their definition is kept, and the objects are built
+    # the first time they are requested (w/ the getter methods, or when iterating over varlist). Combined w/ select(), only
+    # the variables and cuts actually needed by the selected categories and variables are ever built.
 
     def __init__(self):
         self.vardb = {}
@@ -418,18 +581,32 @@ class VariableDB:
         self.systdb = {}
         self.categorydb = {}
         self.systlist = []
-        self.varlist = []
+        self.varnamelist = []
         self.cutlist = []
         self.categorylist = []
+        self.vardecl = {}
+        self.cutdecl = {}
+        self.varselection = None
 
     def registerVar(self, var):
+        if not var.shortname in self.vardb and not var.shortname in self.vardecl:
+            self.varnamelist.append(var.shortname)
         self.vardb[var.shortname] = var
-        self.varlist.append(var)
+
+    def declareVar(self, **kw):
+        if not kw['shortname'] in self.vardb and not kw['shortname'] in self.vardecl:
+            self.varnamelist.append(kw['shortname'])
+        self.vardb.pop(kw['shortname'], None)
+        self.vardecl[kw['shortname']] = kw
 
     def registerCut(self, cut):
         self.cutdb[cut.cutname] = cut
         self.cutlist.append(cut)
 
+    def declareCut(self, cutname, cutstr):
+        self.cutdb.pop(cutname, None)
+        self.cutdecl[cutname] = cutstr
+
     def registerSystematics(self, syst):
         self.systdb[syst.name] = syst
         self.systlist.append(syst)
@@ -444,21 +621,41 @@ class VariableDB:
         self.categorydb[category.name] = category
         self.categorylist.append(category)
 
+    # Restrict the variables in varlist to the given names (None: all the variables)
+
+    def select(self, variables=None):
+        self.varselection = set(variables) if variables is not None else None
+
+    def varnames(self):
+        return list(self.varnamelist)
+
+    # The selected variables, in order of registration
+
+    @property
+    def varlist(self):
+        return [ self.getVar(name) for name in self.varnamelist if self.varselection is None or name in self.varselection ]
+
     def getVar(self, name):
+        if not name in self.vardb:
+            self.vardb[name] = Variable(**self.vardecl.pop(name))
         return self.vardb[name]
 
     def getCut(self, cutname):
+        if not cutname in self.cutdb:
+            cut = Cut(cutname, self.cutdecl.pop(cutname))
+            self.cutdb[cutname] = cut
+            self.cutlist.append(cut)
         return self.cutdb[cutname]
 
     def getCuts(self, cutlist):
         cut = None
         for cutname in cutlist:
             if not cutname: continue
-            if not self.cutdb[cutname]: continue
+            if not self.getCut(cutname): continue
             if not cut:
-                cut = self.cutdb[cutname]
+                cut = self.getCut(cutname)
             else:
-                cut = cut & self.cutdb[cutname]
+                cut = cut & self.getCut(cutname)
         return cut
 
     def getSyst(self, name):
@@ -467,11 +664,46 @@ class VariableDB:
     def getCategory(self, name):
         return self.categorydb[name]
 
+    def printSummary(self):
+        print("\nVariableDB: {0} variables ({1} declared but never built), {2} cuts ({3} declared but never built), {4} categories, {5} systematics\n".format(len(self.varnamelist), len(self.vardecl), len(self.cutdb) + len(self.cutdecl), len(self.cutdecl), len(self.categorylist), len(self.systlist)))
+
 class SubProcess:
 
-    histcache = {}
+    # The histogram cache has a memory budget: set SubProcess.histcache.maxsize (in bytes) to enable LRU eviction
+
+    histcache = HistCache()
     numcache = {}
 
+    # When booking is switched on, hist() and numberstats() only register their (variable, cut, weight, binning) request
+    # against the tree, and return empty placeholders. All the booked requests are then filled by fillBookings()
+    # with a single loop per TChain, and subsequent calls will be served from the caches.
+
+    booking = False
+    bookings = {}
+
+    # Optional persistent cache (a CacheTools.DiskCache), consulted before any projection on the trees
+
+    diskcache = None
+
+    # When useentrylists is switched on, the entries of a tree passing the base cut of a SubProcess are selected
+    # once in a TEntryList, and all the following projections w/ that (tree, base cut) only loop on those entries
+
+    useentrylists = False
+    entrylists = {}
+
+    # Optional alternative backend for the projections (a NumPyTools.NumPyBackend). Projections it cannot handle
+    # fall back to TTree::Project
+
+    backend = None
+
+    # One NTupleTools.FilePrefetcher per TChain, for the loops of fillBookings()
+
+    prefetchers = {}
+
+    # Number of entries read from the trees by the loops of this process (TTree::Project, TEntryList preselections, MultiHistFiller)
+
+    entriesread = 0
+
     def __init__(self, tree, basecut=None, baseweight=1.0, eventweight=None, debug=False):
         treename = tree.GetName()
         self.name = 'SubProcess:'+tree.GetTitle()+'_EVTWGT_'+str(eventweight)
@@ -510,6 +742,112 @@ class SubProcess:
             name = name.replace(c, '_')
         return name
 
+    @staticmethod
+    def selectionString(weight, cutstr):
+
+        # The TTreeFormula selection for TTree::Project: the event weight (if any) times the cut
+
+        if weight:
+            return '%s * (%s)' % (weight, cutstr)
+        return '%s' % (cutstr)
+
+    def book(self, cachename, kind, h, varexp, weight, cutstr):
+
+        # Register a projection to be filled later on by fillBookings()
+
+        key = self.tree.GetTitle()
+        if not key in self.bookings:
+            self.bookings[key] = (self.tree, {})
+        tree, booked = self.bookings[key]
+        if not cachename in booked:
+            booked[cachename] = (kind, h, varexp, weight, cutstr)
+
+    def entryList(self):
+
+        # Returns the TEntryList of the entries passing the base cut (None if not needed), computing it on the first call
+
+        if not self.useentrylists or not self.basecut or self.basecut.canonicalstr == '1':
+            return None
+        key = (self.tree.GetTitle(), self.basecut.cutkey)
+        if not key in self.entrylists:
+            elistname = 'ELIST%d' % len(self.entrylists)
+            nselected = self.tree.Draw('>>'+elistname, self.basecut.canonicalstr, 'entrylist')
+            SubProcess.entriesread += self.tree.GetEntries()
+            elist = gDirectory.Get(elistname)
+            if elist:
+                elist.SetDirectory(0) # Don't let the current output file own (and delete) it
+            print("\nPreselected {0} entries w/ base cut {1} on tree {2}".format(nselected, self.basecut.cutname, self.tree.GetTitle()))
+            self.entrylists[key] = elist
+        return self.entrylists[key]
+
+    def project(self, h, varexp, selection):
+
+        # TTree::Project, restricted to the entries of the base cut TEntryList (if any)
+
+        if self.backend and self.backend.project(self.tree, h, varexp, selection):
+            return
+        elist = self.entryList()
+        if elist:
+            self.tree.SetEntryList(elist)
+        self.tree.Project(h.GetName(), varexp, selection)
+        if elist:
+            self.tree.SetEntryList(0)
+        SubProcess.entriesread += elist.GetN() if elist else self.tree.GetEntries()
+
+    @classmethod
+    def startBooking(cls):
+        cls.booking = True
+
+    @classmethod
+    def fillBookings(cls):
+
+        # Fill all the booked histograms w/ one loop per TChain, and store the results in the caches
+
+        cls.booking = False
+
+        for key in sorted(cls.bookings.keys()):
+            tree, booked = cls.bookings[key]
+            filler = getMultiHistFiller()(tree)
+            unbooked = []
+            for cachename, (kind, h, varexp, weight, cutstr) in booked.iteritems():
+                if not filler.book(h, varexp, weight or '', cutstr):
+                    unbooked.append(cachename)
+            print("\nFilling {0} booked histograms ({1} distinct variable/cut pairs) w/ a single loop on tree {2}...".format(filler.size(), filler.ngroups(), key))
+            prefetcher = None
+            if NTupleTools.inputSettings['prefetch']:
+                # The loop is compiled, so the prefetcher follows the file it is reading, keeping the next one prefetched
+                if not key in cls.prefetchers:
+                    cls.prefetchers[key] = NTupleTools.FilePrefetcher(tree)
+                prefetcher = cls.prefetchers[key]
+                prefetcher.follow(filler.treeNumber, ahead=1)
+            readstats = NTupleTools.getReadStats()
+            try:
+                SubProcess.entriesread += filler.fill()
+            finally:
+                if prefetcher:
+                    prefetcher.stop()
+            NTupleTools.printReadStats(tree, readstats, prefetcher)
+            # Bookings whose formulas could not be compiled by MultiHistFiller are filled one by one, as w/o booking
+            if unbooked:
+                print("WARNING: {0} booked histograms could not be filled in the single loop, falling back to TTree::Project".format(len(unbooked)))
+            for cachename in unbooked:
+                kind, h, varexp, weight, cutstr = booked[cachename]
+                selection = cls.selectionString(weight, cutstr)
+                if not ( cls.backend and cls.backend.project(tree, h, varexp, selection) ):
+                    tree.Project(h.GetName(), varexp, selection)
+                    SubProcess.entriesread += tree.GetEntries()
+            for cachename, (kind, h, varexp, weight, cutstr) in booked.iteritems():
+                if cls.diskcache:
+                    cls.diskcache.store(tree, varexp, cls.selectionString(weight, cutstr), h)
+                if kind == 'NUM':
+                    cls.numcache[cachename] = h.GetBinContent(1), h.GetBinError(1)
+                    del h
+                else:
+                    cls.histcache[cachename] = h
+            del filler
+
+        cls.bookings = {}
+
     def subprocess(self, tree=None, cut=None, weight=1.0, eventweight=None, clearbasecut=False, debug=False):
         if clearbasecut:
             self.basecut = None
@@ -540,8 +878,8 @@ class SubProcess:
             cut = self.basecut
 
         if cut:
-            cutstr = cut.cutstr
-            cachename = self.name+'_CUT_'+cut.cutname
+            cutstr = cut.canonicalstr
+            cachename = self.name+'_CUT_'+cut.cutkey
         else:
             cutstr = '1'
             cachename = self.name+'_NOCUT'
@@ -551,21 +889,36 @@ class SubProcess:
             num, stat = self.numcache[cachename]
             return num * self.baseweight * weight, stat * self.baseweight * weight
 
+        if self.eventweight and eventweight:
+            weightstr = '%s * %s' % (self.eventweight, eventweight)
+        else:
+            weightstr = self.eventweight
+        selection = self.selectionString(weightstr, cutstr)
+
         h = TH1D('NUM'+cachename, 'NUM'+cachename, 1, 0., 2.)
         h.Sumw2()
 
-        if self.eventweight and eventweight:
-            self.tree.Project('NUM'+cachename, '1.0', '%s * %s * (%s)' % (self.eventweight, eventweight, cutstr))
-            if self.debug:
+        if self.diskcache and self.diskcache.load(self.tree, '1.0', selection, h):
+            self.numcache[cachename] = h.GetBinContent(1), h.GetBinError(1)
+            del h
+            num, stat = self.numcache[cachename]
+            return num * self.baseweight * weight, stat * self.baseweight * weight
+
+        if self.booking:
+            if not self.tree.GetTitle() in self.bookings or not cachename in self.bookings[self.tree.GetTitle()][1]:
+                self.book(cachename, 'NUM', h, '1.0', weightstr, cutstr)
+            return 0., 0.
+
+        self.project(h, '1.0', selection)
+        if self.debug:
+            if self.eventweight and eventweight:
                 print("\nApplying TTreeFormula string:\n\n{0}->Project(\"1\",\"{1} * {2} * {3} * ( {4} )\")\n".format(self.tree.GetName(), self.baseweight, self.eventweight, eventweight, cutstr))
-        elif self.eventweight :
-            self.tree.Project('NUM'+cachename, '1.0', '%s * (%s)' % (self.eventweight, cutstr))
-            if self.debug:
+            elif self.eventweight:
                 print("\nApplying TTreeFormula string:\n\n{0}->Project(\"1\",\"{1} * {2} * ( {3} )\")\n".format(self.tree.GetName(), self.baseweight, self.eventweight, cutstr))
-        else:
-            self.tree.Project('NUM'+cachename, '1.0', '%s' % (cutstr))
-            if self.debug:
+            else:
                 print("\nApplying TTreeFormula string:\n\n{0}->Project(\"1\",\"{1} * ( {2} )\")\n".format(self.tree.GetName(), self.baseweight, cutstr))
+        if self.diskcache:
+            self.diskcache.store(self.tree, '1.0', selection, h)
         self.numcache[cachename] = h.GetBinContent(1), h.GetBinError(1)
         del h
 
@@ -606,34 +959,49 @@ class SubProcess:
             binname = 'Default'
 
         if cut:
-            cutstr = cut.cutstr
-            cachename = self.name+'_VAR_'+var.shortname+'_CUT_'+cut.cutname+'_BIN_'+binname
+            cutstr = cut.canonicalstr
+            cachename = self.name+'_VAR_'+var.shortname+'_CUT_'+cut.cutkey+'_BIN_'+binname
         else:
             cutstr = '1'
             cachename = self.name+'_VAR_'+var.shortname+'_NOCUT'+'_BIN_'+binname
         cachename = self.rootNameFriendly(cachename)
 
-        if cachename in self.histcache:
-            h = self.histcache[cachename].Clone()
-            h.SetName(self.histcache[cachename].GetName()+str(weight))
-            h.SetTitle(self.histcache[cachename].GetTitle()+str(weight))
+        cached = self.histcache.get(cachename)
+        if cached is not None:
+            h = cached.Clone()
+            h.SetName(cached.GetName()+str(weight))
+            h.SetTitle(cached.GetTitle()+str(weight))
             h.__imul__(self.baseweight * weight)
             return h
 
-        self.histcache[cachename] = var.makeHist('HIST'+cachename, 'HIST'+cachename, category)
+        selection = self.selectionString(self.eventweight, cutstr)
 
-        if self.eventweight:
-            self.tree.Project('HIST'+cachename, var.ntuplename, '%s * (%s)' % (self.eventweight, cutstr))
-            if self.debug:
-                print("\nApplying TTreeFormula string:\n\n{0}->Project(\"{1}\",\"{2} * {3} * ( {4} )\")\n".format(self.tree.GetName(), var.ntuplename, self.baseweight, self.eventweight, cutstr))
-	else:
-            self.tree.Project('HIST'+cachename, var.ntuplename, '%s' % (cutstr))
-            if self.debug:
-                print("\nApplying TTreeFormula string:\n\n{0}->Project(\"{1}\",\"{2} * ( {3} )\")\n".format(self.tree.GetName(), var.ntuplename, self.baseweight, cutstr))
+        h = var.makeHist('HIST'+cachename, 'HIST'+cachename, category)
 
-        h = self.histcache[cachename].Clone()
-        h.SetName(self.histcache[cachename].GetName()+str(weight))
-        h.SetTitle(self.histcache[cachename].GetTitle()+str(weight))
+        if self.diskcache and self.diskcache.load(self.tree, var.ntuplename, selection, h):
+            self.histcache[cachename] = h
+        elif self.booking:
+            if not self.tree.GetTitle() in self.bookings or not cachename in self.bookings[self.tree.GetTitle()][1]:
+                self.book(cachename, 'HIST', h, var.ntuplename, self.eventweight, cutstr)
+            h = self.bookings[self.tree.GetTitle()][1][cachename][1].Clone()
+            h.SetName(h.GetName()+str(weight))
+            h.SetTitle(h.GetTitle()+str(weight))
+            return h
+        else:
+            self.histcache[cachename] = h
+            self.project(h, var.ntuplename, selection)
+            if self.debug:
+                if self.eventweight:
+                    print("\nApplying TTreeFormula string:\n\n{0}->Project(\"{1}\",\"{2} * {3} * ( {4} )\")\n".format(self.tree.GetName(), var.ntuplename, self.baseweight, self.eventweight, cutstr))
+                else:
+                    print("\nApplying TTreeFormula string:\n\n{0}->Project(\"{1}\",\"{2} * ( {3} )\")\n".format(self.tree.GetName(), var.ntuplename, self.baseweight, cutstr))
+            if self.diskcache:
+                self.diskcache.store(self.tree, var.ntuplename, selection, h)
+
+        cached = h # Just filled (and cached): not a lookup
+        h = cached.Clone()
+        h.SetName(cached.GetName()+str(weight))
+        h.SetTitle(cached.GetTitle()+str(weight))
         h.__imul__(self.baseweight * weight)
 
         return h
@@ -692,6 +1060,8 @@ class OperatorProcess(SubProcess):
         if self.operator == '*':
             return leftnum * rightnum
         if self.operator == '/':
+            if not rightnum and SubProcess.booking: # Placeholder numbers are all zero while booking
+                return 0.
             return leftnum / rightnum
         print "ERROR: Invalid operator", self.operator
 
@@ -713,6 +1083,8 @@ class OperatorProcess(SubProcess):
             if self.operator == '*':
                 return errfrac * leftnum*rightnum
             else:
+                if not rightnum and SubProcess.booking:
+                    return 0.
                 return errfrac * leftnum/rightnum
         print "ERROR: Invalid operator", self.operator
 
@@ -829,6 +1201,7 @@ class Background:
     rescaleXsecAndLumi = False
     style = {}
     readGFW2 = False
+    nworkers = 1
 
     def __init__(self, inputs, vardb):
         self.inputs      = inputs
@@ -943,10 +1316,8 @@ class Background:
 
         hbkg = {}
         bkg = (0., 0.)
-        for name in overridebackground:
-            process = self.getProcess(name, category=category, systematics=systematics, systematicsdirection=systematicsdirection)
-            process = process.subprocess(debug=any( proc in self.debugprocs for proc in [name,"ALL"]))
-            events, stats = process.numberstats(cut=cut, eventweight=eventweight)
+        yields = self.mapProcesses(lambda name: self.processNumberStats(name, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection), overridebackground)
+        for name, (events, stats) in zip(overridebackground, yields):
             hbkg[name] = (events, stats)
             bkg = bkg[0] + events, math.sqrt(bkg[1]**2. + stats**2.)
             if show: print "%40s : %.2f +- %.2f (stat)" % (name, round(events, 2), round(stats, 2))
@@ -955,10 +1326,8 @@ class Background:
 
         hobs = {}
         obs = (0., 0.)
-        for name in self.observed:
-            process = self.getProcess(name, category=category, systematics=systematics, systematicsdirection=systematicsdirection)
-            process = process.subprocess(debug=any( proc in self.debugprocs for proc in [name,"ALL"]))
-            events, stats = process.numberstats(cut=cut) # No extra event weight for data!
+        yields = self.mapProcesses(lambda name: self.processNumberStats(name, cut=cut, category=category, systematics=systematics, systematicsdirection=systematicsdirection), self.observed) # No extra event weight for data!
+        for name, (events, stats) in zip(self.observed, yields):
             hobs[name] = (events, stats)
             obs = obs[0] + events, math.sqrt(obs[1]**2. + stats**2.)
             if show: print "%40s : %.2f +- %.2f (stat)" % (name, round(events, 2), round(stats, 2))
@@ -968,49 +1337,100 @@ class Background:
         hsig = {}
         for h in hmass:
             sig = (0., 0.)
-            for name in self.signals:
-                options = {'hmass': h}
-                process = self.getProcess(name, category=category, systematics=systematics, systematicsdirection=systematicsdirection, options=options)
-                process = process.subprocess(debug=any( proc in self.debugprocs for proc in [name,"ALL"]))
-                events, stats = process.numberstats(cut=cut, eventweight=eventweight)
-                sig = sig[0] + events, math.sqrt(sig[2]**2. + stats**2.)
+            yields = self.mapProcesses(lambda name: self.processNumberStats(name, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, options={'hmass': h}), self.signals)
+            for name, (events, stats) in zip(self.signals, yields):
+                sig = sig[0] + events, math.sqrt(sig[1]**2. + stats**2.)
                 if show: print "%36s %3s : %.2f +- %.2f (stat)" % (name, h, round(events, 2), round(stats, 2))
             hsig[h] = sig
             if show: print "%40s : %.2f +- %.2f (stat)\n" % ('TOTAL SIGNAL', round(sig[0], 2), round(sig[1], 2))
 
         return hbkg, hobs, hsig
 
-    def sumhist(self, var, processes = [], cut = None, eventweight = None, category = None, systematics = None, systematicsdirection = None, scale = 1.0, overflowbins = False, options={}):
+    def processNumberStats(self, name, cut=None, eventweight=None, category=None, systematics=None, systematicsdirection=None, options={}):
 
-	tSum = None
-        histlist = []
+        # Yield and its statistical error for a single process
+
+        process = self.getProcess(name, category=category, systematics=systematics, systematicsdirection=systematicsdirection, options=options)
+        process = process.subprocess(debug=any( proc in self.debugprocs for proc in [name,"ALL"]))
+        return process.numberstats(cut=cut, eventweight=eventweight)
+
+    def processHist(self, name, var, cut=None, eventweight=None, category=None, systematics=None, systematicsdirection=None, scale=1.0, overflowbins=False, options={}):
+
+        # Histogram of a single process
+
+        process = self.getProcess(name, category=category, systematics=systematics, systematicsdirection=systematicsdirection, options=options) * scale
+
+        if eventweight:
+            weight = eventweight
+            if "$ISDATA$" in process.name: # Make sure no eventweight is applied if looking at data...
+                weight = None
+            process = process.subprocess(eventweight=weight)
+
+        # Check whether debug flag should be activated for *this* process
+
+        process = process.subprocess(debug=any( proc in self.debugprocs for proc in [name,"ALL"]))
+
+        h = process.hist(var, cut=cut, category=category)
+
+        if overflowbins and not isinstance(h,TH2):
+            lastbin = h.GetSize()-2
+            over, overerror = h.GetBinContent(lastbin+1), h.GetBinError(lastbin+1)
+            under, undererror = h.GetBinContent(0), h.GetBinError(0)
+            if '_ext' in var.shortname: # Convention for "extended" histograms: plot overflow, but not underflow
+                under, undererror = 0., 0.
+            h.SetBinContent(lastbin, h.GetBinContent(lastbin) + over)
+            h.SetBinError(lastbin, math.sqrt( h.GetBinError(lastbin)**2. + overerror**2.))
+            h.SetBinContent(1, h.GetBinContent(1) + under)
+            h.SetBinError(1, math.sqrt( h.GetBinError(1)**2. + undererror**2. ))
+
+        return h
 
-        for name in processes:
+    def mapProcesses(self, task, names):
 
-            process = self.getProcess(name, category=category, systematics=systematics, systematicsdirection=systematicsdirection, options=options) * scale
+        # Run task(name) for each process name, either serially or - if nworkers > 1 - on a pool of worker processes.
+        # In booking mode everything stays in this process, as the bookings must be collected here.
 
-            if eventweight:
-                weight = eventweight
-                if "$ISDATA$" in process.name: # Make sure no eventweight is applied if looking at data...
-                    weight = None
-                process = process.subprocess(eventweight=weight)
+        if self.nworkers > 1 and len(names) > 1 and not SubProcess.booking:
+            return self.runParallel(task, names)
+        return [ task(name) for name in names ]
 
-            # Check whether debug flag should be activated for *this* process
+    def runParallel(self, task, args):
 
-            process = process.subprocess(debug=any( proc in self.debugprocs for proc in [name,"ALL"]))
+        # Evaluate task(arg) for each arg on a pool of forked worker processes, and return the list of results.
+        # The histograms and yields projected by the workers are merged into the caches of this process.
 
-            h = process.hist(var, cut=cut, category=category)
+        # The counters of the entries read and of the disk cache are summed up as well.
+
+        global _paralleltask
+        _paralleltask = task
+        try:
+            outputs, failed = parallelMap(_runParallelTask, args, self.nworkers, initializer=_initParallelWorker, initargs=(self.inputs,))
+        finally:
+            _paralleltask = None
+        if failed:
+            raise Exception('Failed tasks in the worker processes: ' + ', '.join( '%s (%s)' % (args[i], failed[i]) for i in sorted(failed) ))
+
+        results = []
+        for result, newhists, newnums, stats in outputs:
+            for cachename, h in newhists.iteritems():
+                h.SetDirectory(0)
+                SubProcess.histcache[cachename] = h
+            SubProcess.numcache.update(newnums)
+            _addParallelStats(stats)
+            if isinstance(result, TH1):
+                result.SetDirectory(0)
+            results.append(result)
+        return results
+
+    def sumhist(self, var, processes = [], cut = None, eventweight = None, category = None, systematics = None, systematicsdirection = None, scale = 1.0, overflowbins = False, options={}):
+
+        tSum = None
+        histlist = []
+
+        hists = self.mapProcesses(lambda name: self.processHist(name, var, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, scale=scale, overflowbins=overflowbins, options=options), processes)
+
+        for name, h in zip(processes, hists):
 
-            if overflowbins and not isinstance(h,TH2):
-                lastbin = h.GetSize()-2
-                over, overerror = h.GetBinContent(lastbin+1), h.GetBinError(lastbin+1)
-                under, undererror = h.GetBinContent(0), h.GetBinError(0)
-                if '_ext' in var.shortname: # Convention for "extended" histograms: plot overflow, but not underflow
-                    under, undererror = 0., 0.
-                h.SetBinContent(lastbin, h.GetBinContent(lastbin) + over)
-                h.SetBinError(lastbin, math.sqrt( h.GetBinError(lastbin)**2. + overerror**2.))
-                h.SetBinContent(1, h.GetBinContent(1) + under)
-                h.SetBinError(1, math.sqrt( h.GetBinError(1)**2. + undererror**2. ))
             if not tSum:
                 tSum = h.Clone()
                 if cut: cutname = cut.cutname
@@ -1031,10 +1451,63 @@ class Background:
 
         return tSum, histlist
 
+    def bookPlots(self, varlist, cut = None, eventweight=None, category = None, signal = '125', signalfactor = 1., systematics = None, systematicsdirection = None, overridebackground = None, options = {}):
+
+        # Register the histograms that plot() will need for all the variables in the list,
+        # and fill them in one go w/ a single loop per TChain.
+        # The following calls to plot() w/ the same arguments will then be served from the histogram cache.
+
+        cut, category, systematics, overridebackground = self.parseArguments(cut, category, systematics, overridebackground)
+
+        SubProcess.startBooking()
+
+        for var in varlist:
+            if type(var) is str:
+                var = self.vardb.getVar(var)
+            self.var = var # Some processes add variable-specific cuts
+            self.sumhist(var, processes=self.observed, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection)
+            self.sumhist(var, processes=overridebackground, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, options=options)
+            options['hmass'] = signal
+            self.sumhist(var, processes=self.signals, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, scale=signalfactor, options=options)
+
+        SubProcess.fillBookings()
+
+    def bookSystematics(self, systlist, varlist, cut = None, eventweight=None, category = None, overridebackground = None):
+
+        # Register the histograms that plotSystematics() will need for all the systematics and variables in the lists:
+        # nominal, observed, signal and the UP/DOWN variations of all the weight-based systematics are then filled
+        # w/ a single loop per TChain, where each event is evaluated once and filled w/ the vector of its weights.
+        # Systematics w/ their own trees need a loop on those trees anyway: they are booked too, but in separate groups.
+
+        cut, category, dummy, overridebackground = self.parseArguments(cut, category, None, overridebackground)
+
+        SubProcess.startBooking()
+
+        for var in varlist:
+            if type(var) is str:
+                var = self.vardb.getVar(var)
+            self.var = var # Some processes add variable-specific cuts
+            self.sumhist(var, processes=overridebackground, cut=cut, eventweight=eventweight, category=category)
+            self.sumhist(var, processes=self.observed, cut=cut, eventweight=eventweight, category=category)
+            self.sumhist(var, processes=self.signals, cut=cut, eventweight=eventweight, category=category)
+            for systematics in systlist:
+                if type(systematics) is str:
+                    systematics = self.vardb.getSyst(systematics)
+                for direction in ['UP','DOWN']:
+                    self.sumhist(var, processes=overridebackground, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=direction)
+
+        SubProcess.fillBookings()
+
     def plot(self, var, cut = None, eventweight=None, category = None, signal = '125', signalfactor = 1., systematics = None, systematicsdirection = None, overridebackground = None, overflowbins = False, showratio = True, wait = False, save = ['.eps'], options = {}, normalise = False, log=False, logx=False, showyields=False, nolegs=False):
 
-	if not wait:
-            gROOT.SetBatch(True)
+        content = self.produce(var, cut=cut, eventweight=eventweight, category=category, signal=signal, signalfactor=signalfactor, systematics=systematics, systematicsdirection=systematicsdirection, overridebackground=overridebackground, overflowbins=overflowbins, options=options, normalise=normalise)
+        return self.render(content, signal=signal, signalfactor=signalfactor, showratio=showratio, wait=wait, save=save, log=log, logx=logx, showyields=showyields, nolegs=nolegs)
+
+    def produce(self, var, cut = None, eventweight=None, category = None, signal = '125', signalfactor = 1., systematics = None, systematicsdirection = None, overridebackground = None, overflowbins = False, options = {}, normalise = False):
+
+        # Production stage of plot(): all the projections, w/o any drawing. The returned PlotContent can either be
+        # rendered right away, or kept in a PlotStore and rendered later on (and restyled) w/o reading the ntuples again.
+
         cut, category, systematics, overridebackground = self.parseArguments(cut, category, systematics, overridebackground)
         if type(var) is str:
             var = self.vardb.getVar(var)
@@ -1043,19 +1516,66 @@ class Background:
 
         isvar2D = ( var.typeval in [TH2,TH2I,TH2F,TH2D] )
 
+        obs, obslist = self.sumhist(var, processes=self.observed, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, overflowbins=overflowbins)
+
+        tSum, bkglist = self.sumhist(var, processes=overridebackground, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, overflowbins=overflowbins, options=options)
+
+        if obs and bkglist and normalise:
+            if not isvar2D:
+                num_data = obs.GetEntries()
+                num_mc = 0.0
+                for b, bname in bkglist:
+                    for i in range(b.GetSize()):
+                        num_mc += b.GetBinContent(i)
+                if num_mc:
+                    normratio = num_data / num_mc
+                    for b, bname in bkglist:
+                        b *= normratio
+                    tSum *= normratio
+
+        options['hmass'] = signal
+        sig, siglist = self.sumhist(var, processes=self.signals, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, overflowbins=overflowbins, scale=signalfactor, options=options)
+
+        content = PlotContent(var)
+        if obs:
+            content.obs = obs
+            content.observed = ProcessInfo.fromProcess(obslist[0][1], isdata=( "$ISDATA$" in obslist[0][0].GetName() ))
+        content.tSum = tSum
+        content.bkglist = [ (h, ProcessInfo.fromProcess(process)) for h, process in bkglist ]
+        if sig:
+            content.sig = sig
+            content.signal = ProcessInfo.fromProcess(siglist[0][1])
+        return content
+
+    def render(self, content, signal = '125', signalfactor = 1., showratio = True, wait = False, save = ['.eps'], log=False, logx=False, showyields=False, nolegs=False):
+
+        # Rendering stage of plot(): draws the stack, the ratio pad and the legends of a PlotContent (see produce()),
+        # and saves the canvas in all the formats in save. Nothing is read from the ntuples here.
+
+        if not wait:
+            gROOT.SetBatch(True)
+
+        var = content.var
+        self.var = var
+
+        obs  = content.obs
+        tSum = content.tSum
+        sig  = content.sig
+        bkglist = content.bkglist
+
+        isvar2D = ( var.typeval in [TH2,TH2I,TH2F,TH2D] )
+
         if not isvar2D:
             c = TCanvas("c1","Temp",50,50,600,600)
-	else:
-	    c = TCanvas("c1","Temp",50,50,800,600)
+        else:
+            c = TCanvas("c1","Temp",50,50,800,600)
 
         legs = []
 
-        obs, obslist = self.sumhist(var, processes=self.observed, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, overflowbins=overflowbins)
-
-	if obs:
-            process = obslist[0][1]
+        if obs:
+            process = content.observed
             datagr = None
-            if not ( "$ISDATA$" in obslist[0][0].GetName() ):
+            if not process.isdata:
                 if not isvar2D:
                     datagr = TH1D(obs) # Equivalent to: datagr = makeMCErrors(obs)
                     datagr.SetLineStyle(2)
@@ -1073,39 +1593,24 @@ class Background:
             legobs = process.latexname + " ({0:.1f})".format(integrate(obs)) if showyields else process.latexname
             legs.append([datagr, legobs, "p"])
 
-        tSum, bkglist = self.sumhist(var, processes=overridebackground, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, overflowbins=overflowbins, options=options)
-
-        if obs and bkglist and normalise:
-            if not isvar2D:
-	    	num_data = obs.GetEntries()
-            	num_mc = 0.0
-            	for b, bname in bkglist:
-            	    for i in range(b.GetSize()):
-            		num_mc += b.GetBinContent(i)
-            	if num_mc:
-            	    normratio = num_data / num_mc
-            	    for b, bname in bkglist:
-            		b *= normratio
-            	    tSum *= normratio
-
         bkg = {}
-	if bkglist:
-	    stack = THStack('Stack'+tSum.GetName(), self.__class__.__name__+';'+tSum.GetXaxis().GetTitle()+';'+tSum.GetYaxis().GetTitle())
-	    for h, process in reversed(bkglist):
-	    	h.Draw()
-	    	h.SetLineWidth(self.style.get('BackgroundLineWidth', 2))
-	    	h.SetLineStyle(self.style.get('BackgroundLineStyle', 1))
-	    	pname = process.__class__.__name__
-	    	h.SetLineColor(self.style.get(pname+'LineColour', self.style.get('BackgroundLineColour', 1)))
-	    	h.SetFillColor(self.style.get(pname+'FillColour', process.colour))
-	    	h.SetFillStyle(self.style.get(pname+'FillStyle', 1001))
-	    	stack.Add(h)
+        if bkglist:
+            stack = THStack('Stack'+tSum.GetName(), self.__class__.__name__+';'+tSum.GetXaxis().GetTitle()+';'+tSum.GetYaxis().GetTitle())
+            for h, process in reversed(bkglist):
+                h.Draw()
+                h.SetLineWidth(self.style.get('BackgroundLineWidth', 2))
+                h.SetLineStyle(self.style.get('BackgroundLineStyle', 1))
+                pname = process.name
+                h.SetLineColor(self.style.get(pname+'LineColour', self.style.get('BackgroundLineColour', 1)))
+                h.SetFillColor(self.style.get(pname+'FillColour', process.colour))
+                h.SetFillStyle(self.style.get(pname+'FillStyle', 1001))
+                stack.Add(h)
                 legbkg = process.latexname + " ({0:.1f})".format(integrate(h)) if showyields else process.latexname
-	    	legs.append([h, legbkg, 'f'])
-	    	bkg[pname] = h
-	else:
-	    stack = None
-	    print "No Stack"
+                legs.append([h, legbkg, 'f'])
+                bkg[pname] = h
+        else:
+            stack = None
+            print "No Stack"
 
         if bkg:
             gStyle.SetHatchesLineWidth(1)
@@ -1118,11 +1623,8 @@ class Background:
         else:
             print "No background processes are plotted!"
 
-	options['hmass'] = signal
-        sig, siglist = self.sumhist(var, processes=self.signals, cut=cut, eventweight=eventweight, category=category, systematics=systematics, systematicsdirection=systematicsdirection, overflowbins=overflowbins, scale=signalfactor, options=options)
-
         if sig:
-            process = siglist[0][1]
+            process = content.signal
             sig.SetFillColor(self.style.get('SignalFillColour', 10))
             sig.SetFillStyle(self.style.get('SignalFillStyle', 1001))
             sig.SetLineWidth(self.style.get('SignalLineWidth', 2))
@@ -1157,7 +1659,7 @@ class Background:
                 pad2.SetLogx()
             pad1.Draw()
             pad2.Draw()
-	if not showratio:
+        if not showratio:
             if log or var.logaxis:
                 gPad.SetLogy()
                 stack.SetMinimum(0.1)
@@ -1169,7 +1671,7 @@ class Background:
                 gStyle.SetHatchesLineWidth(1)
                 gStyle.SetHatchesSpacing(0.4)
                 ratiomc_props = {
-                    "TitleY": "" if not ( "$ISDATA$" in obslist[0][0].GetName() ) else "Data/Exp.",
+                    "TitleY": "" if not content.observed.isdata else "Data/Exp.",
                     "TitleX": var.latexname,
                     "TitleSizeX":0.15,
                     "TitleSizeY":0.15,
@@ -1196,8 +1698,8 @@ class Background:
                     ratiodata.SetBinContent(i, obs.GetBinContent(i))
 
             ratiodata.SetMarkerSize(0.8) # (0.3)
-	    if not ( "$ISDATA$" in obslist[0][0].GetName() ):
-	         ratiodata.SetLineStyle(2)
+            if not content.observed.isdata:
+                ratiodata.SetLineStyle(2)
             ratiodata.SetLineWidth(1)
             ratiodata.Divide(tSum)
 
@@ -1282,41 +1784,41 @@ class Background:
 
         # Trick to rescale:
 
-	if stack:
-	   if not isvar2D:
-	      ymax_new = stack.GetMaximum()
-	      if obs and obs.GetMaximum() > ymax_new:
-	          ymax_new = obs.GetMaximum()
-	      if stack and stack.GetMaximum() > ymax_new:
-	          ymax_new = stack.GetMaximum()
-	      if showratio and bkg and obs:
-	          stack.SetMaximum(ymax_new*(2.-lower+0.075))
-	      else:
-	          stack.SetMaximum(ymax_new*(2.-lower+0.15))
-	      if log or var.logaxis:
-	          #stack.SetMaximum(stack.GetMaximum() * 10**(1.5))
-	          stack.SetMaximum(stack.GetMaximum() * 3*10**(2))
-
-	      stack.Draw('HIST')
-
-	      if showratio and obs and bkg:
-	          stack.GetHistogram().GetXaxis().SetLabelOffset(999)
-	          stack.GetHistogram().GetXaxis().SetLabelSize(0)
-	          stack.GetHistogram().GetYaxis().SetTitleSize(stack.GetHistogram().GetYaxis().GetTitleSize() * 1.2)
-	          stack.GetHistogram().GetYaxis().SetTitleOffset(1.20)
-	          #ratiomc.GetXaxis().SetNdivisions(8)
-	          ratiomc.GetXaxis().SetTitleSize(ratiomc.GetXaxis().GetTitleSize() * 1.2)
-	          ratiomc.GetYaxis().SetTitleSize(ratiomc.GetYaxis().GetTitleSize() * 1.2)
-	      else:
-	          stack.GetHistogram().GetXaxis().SetLabelSize(stack.GetHistogram().GetXaxis().GetLabelSize() * 0.75)
-	          stack.GetHistogram().GetYaxis().SetLabelSize(stack.GetHistogram().GetYaxis().GetLabelSize() * 0.75)
-	          if var.typeval is TH1I:
-	              stack.GetHistogram().GetXaxis().SetNdivisions(tSum.GetNbinsX())
-	              stack.GetHistogram().GetXaxis().CenterLabels(True)
-	   else:
-	      set_fancy_2D_style(57)
+        if stack:
+           if not isvar2D:
+              ymax_new = stack.GetMaximum()
+              if obs and obs.GetMaximum() > ymax_new:
+                  ymax_new = obs.GetMaximum()
+              if stack and stack.GetMaximum() > ymax_new:
+                  ymax_new = stack.GetMaximum()
+              if showratio and bkg and obs:
+                  stack.SetMaximum(ymax_new*(2.-lower+0.075))
+              else:
+                  stack.SetMaximum(ymax_new*(2.-lower+0.15))
+              if log or var.logaxis:
+                  #stack.SetMaximum(stack.GetMaximum() * 10**(1.5))
+                  stack.SetMaximum(stack.GetMaximum() * 3*10**(2))
+
+              stack.Draw('HIST')
+
+              if showratio and obs and bkg:
+                  stack.GetHistogram().GetXaxis().SetLabelOffset(999)
+                  stack.GetHistogram().GetXaxis().SetLabelSize(0)
+                  stack.GetHistogram().GetYaxis().SetTitleSize(stack.GetHistogram().GetYaxis().GetTitleSize() * 1.2)
+                  stack.GetHistogram().GetYaxis().SetTitleOffset(1.20)
+                  #ratiomc.GetXaxis().SetNdivisions(8)
+                  ratiomc.GetXaxis().SetTitleSize(ratiomc.GetXaxis().GetTitleSize() * 1.2)
+                  ratiomc.GetYaxis().SetTitleSize(ratiomc.GetYaxis().GetTitleSize() * 1.2)
+              else:
+                  stack.GetHistogram().GetXaxis().SetLabelSize(stack.GetHistogram().GetXaxis().GetLabelSize() * 0.75)
+                  stack.GetHistogram().GetYaxis().SetLabelSize(stack.GetHistogram().GetYaxis().GetLabelSize() * 0.75)
+                  if var.typeval is TH1I:
+                      stack.GetHistogram().GetXaxis().SetNdivisions(tSum.GetNbinsX())
+                      stack.GetHistogram().GetXaxis().CenterLabels(True)
+           else:
+              set_fancy_2D_style(57)
               gPad.SetRightMargin(0.2)
-	      stack.Draw(var.drawOpt2D)
+              stack.Draw(var.drawOpt2D)
               if False and var.binsX == var.binsY and not var.binsX == var.bins:
                   diagonal = TLine( stack.GetXaxis().GetBinLowEdge(1), stack.GetYaxis().GetBinLowEdge(1), stack.GetXaxis().GetBinLowEdge(stack.GetXaxis().GetNbins()+1), stack.GetYaxis().GetBinLowEdge(stack.GetYaxis().GetNbins()+1) )
                   diagonal.SetLineStyle(2)
@@ -1633,6 +2135,43 @@ class Background:
         return obs, nom, up, down, bkguplist, bkgdownlist
 
 
+# The worker processes of Background.runParallel() are forked: they inherit the task to run through this global,
+# so that only its arguments (process names) and its results need to be pickled
+
+_paralleltask = None
+
+def _initParallelWorker(inputs):
+    inputs.reopenTrees()
+
+def _runParallelTask(arg):
+    histkeys, numkeys = set(SubProcess.histcache.keys()), set(SubProcess.numcache.keys())
+    before = _parallelStats()
+    result = _paralleltask(arg)
+    newhists = dict( (k, SubProcess.histcache.hists[k]) for k in SubProcess.histcache.keys() if not k in histkeys )
+    newnums  = dict( (k, SubProcess.numcache[k]) for k in SubProcess.numcache.keys() if not k in numkeys )
+    stats = [ b - a for a, b in zip(before, _parallelStats()) ]
+    return result, newhists, newnums, stats
+
+def _parallelStats():
+    # Counters of a worker process to be summed up in the parent: entries read by the projections (ROOT and NumPy
+    # backend), hits, misses and size of the disk cache
+    diskcache, backend = SubProcess.diskcache, SubProcess.backend
+    return [ SubProcess.entriesread,
+             getattr(backend, 'entriesread', 0),
+             diskcache.hits if diskcache else 0,
+             diskcache.misses if diskcache else 0,
+             diskcache.size if diskcache else 0 ]
+
+def _addParallelStats(stats):
+    entriesread, backendread, hits, misses, size = stats
+    SubProcess.entriesread += entriesread
+    if backendread:
+        SubProcess.backend.entriesread += backendread
+    if SubProcess.diskcache:
+        SubProcess.diskcache.hits   += hits
+        SubProcess.diskcache.misses += misses
+        SubProcess.diskcache.size   += size
+
 def drawText(text, x, y, size=0.05, colour=1):
     l = TLatex()
     l.SetTextSize(size)
@@ -1735,7 +2274,7 @@ def SelfDivide( h_self, name = "Ratio", h_props = None ):
 
 # This function loads the samples metadata from the .csv file info
 
-def loadSamples(inputdir, samplescsv='Files/samples.csv', nomtree='physics', friendtrees=[], friendfile_extension=None, systrees=[], readGFW2=False):
+def loadSamples(inputdir, samplescsv='Files/samples.csv', nomtree='physics', friendtrees=[], friendfile_extension=None, systrees=[], readGFW2=False, metadatafile=None):
 
     # The datasat manager takes care of parsing the sample.csv files.
 
@@ -1753,6 +2292,12 @@ def loadSamples(inputdir, samplescsv='Files/samples.csv', nomtree='physics', fri
 
     inputs.readGFW2 = readGFW2
 
+    # The tree weights are cached in a sidecar file, by default in the input directory
+
+    if metadatafile is None:
+        metadatafile = inputdir + '/.treemetadata.json'
+    inputs.metadata = TreeMetadata(metadatafile)
+
     for s in samples:
 
 	sampleid = s['ID']
@@ -1773,6 +2318,8 @@ def loadSamples(inputdir, samplescsv='Files/samples.csv', nomtree='physics', fri
 
 	inputs.registerTree(filename, nomtree, systrees, ismc, isembedding, isdata, s)
 
+    inputs.metadata.save()
+
     return inputs
 
 # Function to set nice feats to 2D histograms
@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+
+""" Benchmark_HTopMultilep.py: benchmark of the BackgroundTools plotting pipeline on synthetic ntuples """
+
+__author__     = "Marco Milesi"
+__email__      = "marco.milesi@cern.ch"
+__maintainer__ = "Marco Milesi"
+
+import os, sys, time, random, array, json, resource
+
+sys.path.append(os.path.abspath(os.path.curdir))
+
+# -------------------------------
+# Parser for command line options
+# -------------------------------
+
+import argparse
+
+parser = argparse.ArgumentParser(description='Benchmark of the BackgroundTools plotting pipeline on synthetic ntuples. NB: must be run from the PlotUtils directory.')
+
+stages = ["register","events","sumhist","fakes","plot","systematics"]
+
+parser.add_argument('--workdir', dest='workdir', action='store', default='/tmp/'+os.environ.get('USER','benchmark')+'/HTopMultilepBenchmark', type=str,
+                    help='Directory where the synthetic ntuples and the samples csv are generated. Default is /tmp/$USER/HTopMultilepBenchmark')
+parser.add_argument('--nEvents', dest='nEvents', action='store', default=100000, type=int,
+                    help='Number of events in each synthetic sample. Default is 100000')
+parser.add_argument('--seed', dest='seed', action='store', default=1234, type=int,
+                    help='Seed for the generation of the synthetic ntuples. Default is 1234')
+parser.add_argument('--regenerate', dest='regenerate', action='store_true', default=False,
+                    help='Regenerate the synthetic ntuples even if they already exist.')
+parser.add_argument('--stages', dest='stages', action='store', default=stages, type=str, nargs='+', choices=stages,
+                    help='Stages of the pipeline to be benchmarked. Default is all of them: {0}'.format(stages))
+parser.add_argument('--warmCache', dest='warmCache', action='store_true', default=False,
+                    help='Keep the histogram/yield caches across stages. By default, caches are cleared before each stage, so that each stage measures the filling from the trees.')
+parser.add_argument('--bookHistograms', dest='bookHistograms', action='store_true', default=False,
+                    help='Use the single-pass booking mode in the plot and systematics stages.')
+parser.add_argument('--useEntryLists', dest='useEntryLists', action='store_true', default=False,
+                    help='Use the per-(tree, base cut) TEntryList preselection.')
+parser.add_argument('--nWorkers', dest='nWorkers', action='store', default=1, type=int,
+                    help='Number of worker processes for the process evaluation. Default is 1 (serial).')
+parser.add_argument('--backend', dest='backend', action='store', default='ROOT', type=str, choices=['ROOT','NumPy'],
+                    help='Backend used to fill histograms and yields. Default is \'ROOT\'.')
+parser.add_argument('--validateNumPy', dest='validateNumPy', action='store_true', default=False,
+                    help='Compare bin-by-bin the histograms filled by the NumPy backend w/ those of TTree::Project (for a set of mixed arithmetic/boolean formulas and for the variables of the benchmark), and exit w/ a non-zero code if any of them differs.')
+parser.add_argument('--output', dest='output', action='store', default=None, type=str,
+                    help='Path to a JSON file where to save the results of the benchmark.')
+parser.add_argument('--reference', dest='reference', action='store', default=None, type=str,
+                    help='Path to a JSON file w/ the results of a reference benchmark: stages slower than the reference by more than --tolerance are reported as regressions, and the script exits w/ a non-zero code.')
+parser.add_argument('--tolerance', dest='tolerance', action='store', default=0.2, type=float,
+                    help='Relative tolerance on the wall time of each stage w.r.t. the reference. Default is 0.2')
+
+args = parser.parse_args()
+
+# -----------------
+# Some ROOT imports
+# -----------------
+
+from ROOT import gROOT, TFile, TTree, TH1D, TH2D
+
+gROOT.SetBatch(True)
+
+from Plotter.BackgroundTools import loadSamples, SubProcess, VariableDB, Variable, Cut, Systematics
+from Plotter.NumPyTools import NumPyBackend, HAS_NUMPY
+from Plotter.Backgrounds_HTopMultilep import MyCategory, TTHBackgrounds
+
+# ----------------------------------------------------------------------
+# The synthetic samples: (ID, category, xsection, name, group, subgroup)
+# ----------------------------------------------------------------------
+
+samples = [
+    ('',       'Data',       '',        'physics_Main',        'Data', 'physics_Main'),
+    ('343365', 'Signal',     '0.05343', 'Synthetic_ttH_dilep', 'ttH',  'ttH_dil_Pythia8'),
+    ('410155', 'Background', '0.548300','Synthetic_ttW',       'tops', 'ttW_aMcAtNlo'),
+    ('410156', 'Background', '0.154990','Synthetic_ttZnunu',   'tops', 'ttZnunu_aMcAtNlo'),
+    ('410157', 'Background', '0.527710','Synthetic_ttZqq',     'tops', 'ttZqq_aMcAtNlo'),
+]
+
+# Scale factor branches: each gets an "up" and a "dn" variation, used for the weight-based systematics
+
+scalefactors = ['lepSFObjTight', 'lepSFTrigTight', 'JVT_EventWeight', 'MV2c10_70_EventWeight', 'lepSFObjTight_EL_', 'lepSFObjTight_MU_']
+
+def makeNtuple(filepath, ismc, nevents, rnd):
+
+    # A physics-style ntuple w/ scalar branches: two leptons, jets, tight/antitight flags, MM and QMisID weights, scale factors
+
+    f = TFile(filepath, 'RECREATE')
+    t = TTree('physics', 'physics')
+
+    buffers = {}
+    def branch(name, typecode):
+        buffers[name] = array.array(typecode, [0])
+        t.Branch(name, buffers[name], name + ( '/F' if typecode == 'f' else '/I' ))
+
+    for name in ['lep_Pt_0','lep_Pt_1','lep_Eta_0','lep_Eta_1','lep_EtaBE2_0','lep_EtaBE2_1','lep_Phi_0','lep_Phi_1','lep_ID_0','lep_ID_1','Mll01','MET_RefFinal_et','mcWeightOrg','pileupEventWeight_090','MMWeight','QMisIDWeight']:
+        branch(name, 'f')
+    for sf in scalefactors:
+        for suffix in ['','up','dn']:
+            if sf.endswith('_') and not suffix: continue # Systematic-only scale factors
+            branch(sf + suffix, 'f')
+    for name in ['RunNumber','dilep_type','isSS01','nJets_OR_T','nJets_OR_T_MV2c10_70','lep_isTightSelected_0','lep_isTightSelected_1','is_T_T','is_T_AntiT','is_AntiT_T','is_AntiT_AntiT','passEventCleaning']:
+        branch(name, 'i')
+
+    sumw = 0.
+    for i in range(nevents):
+        b = buffers
+        b['RunNumber'][0]  = 300000 + i % 1000
+        b['dilep_type'][0] = rnd.randint(1,3) # 1: mumu, 2: OF, 3: ee
+        ids = { 1 : (13,13), 2 : rnd.choice([(11,13),(13,11)]), 3 : (11,11) }[b['dilep_type'][0]]
+        signs = ( rnd.choice([-1,1]), rnd.choice([-1,1]) )
+        b['lep_ID_0'][0], b['lep_ID_1'][0] = ids[0]*signs[0], ids[1]*signs[1]
+        b['isSS01'][0] = int( signs[0] == signs[1] )
+        pts = sorted([ 10e3 + rnd.expovariate(1./30e3) for l in range(2) ], reverse=True)
+        b['lep_Pt_0'][0], b['lep_Pt_1'][0] = pts
+        for l in ['0','1']:
+            b['lep_Eta_'+l][0] = rnd.uniform(-2.5,2.5)
+            b['lep_EtaBE2_'+l][0] = b['lep_Eta_'+l][0]
+            b['lep_Phi_'+l][0] = rnd.uniform(-3.1416,3.1416)
+            b['lep_isTightSelected_'+l][0] = int( rnd.random() < 0.7 )
+        tight = ( b['lep_isTightSelected_0'][0], b['lep_isTightSelected_1'][0] )
+        b['is_T_T'][0], b['is_T_AntiT'][0], b['is_AntiT_T'][0], b['is_AntiT_AntiT'][0] = int(tight == (1,1)), int(tight == (1,0)), int(tight == (0,1)), int(tight == (0,0))
+        b['Mll01'][0] = rnd.uniform(12e3, 300e3)
+        b['MET_RefFinal_et'][0] = rnd.expovariate(1./50e3)
+        b['nJets_OR_T'][0] = min(int(rnd.expovariate(1./3.)), 12)
+        b['nJets_OR_T_MV2c10_70'][0] = min(int(rnd.expovariate(1.)), b['nJets_OR_T'][0])
+        b['passEventCleaning'][0] = int( rnd.random() < 0.99 )
+        b['mcWeightOrg'][0] = rnd.gauss(1., 0.1) if ismc else 1.
+        b['pileupEventWeight_090'][0] = rnd.gauss(1., 0.05) if ismc else 1.
+        b['MMWeight'][0] = rnd.gauss(0., 0.3)
+        b['QMisIDWeight'][0] = rnd.uniform(0., 1e-3)
+        for sf in scalefactors:
+            nominal = rnd.gauss(1., 0.02)
+            if not sf.endswith('_'):
+                b[sf][0] = nominal
+            b[sf+'up'][0] = nominal * 1.03
+            b[sf+'dn'][0] = nominal * 0.97
+        sumw += b['mcWeightOrg'][0]
+        t.Fill()
+
+    h = TH1D('TotalEventsW','TotalEventsW',2,0.,2.)
+    h.SetBinContent(2, sumw)
+
+    f.Write()
+    f.Close()
+
+def generate(workdir, nevents, seed, regenerate):
+
+    samplescsv = workdir + '/samples_Benchmark.csv'
+    rnd = random.Random(seed)
+
+    lines = ['ID,category,xsection,kfactor,efficiency,name,group,subgroup']
+    for sampleid, category, xsection, name, group, subgroup in samples:
+        ismc = ( category != 'Data' )
+        lines.append(','.join([sampleid, category, xsection, ('','1.0')[ismc], ('','1.0')[ismc], name, group, subgroup]))
+        if not os.path.exists(workdir + '/' + group):
+            os.makedirs(workdir + '/' + group)
+        filepath = workdir + '/' + group + '/' + sampleid + ('','.')[bool(sampleid)] + name + '.root'
+        if regenerate or not os.path.isfile(filepath):
+            print("Generating {0} events in {1}...".format(nevents, filepath))
+            makeNtuple(filepath, ismc, nevents, rnd)
+
+    with open(samplescsv, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    return samplescsv
+
+def makeDatabase():
+
+    # A representative subset of the 2LSS definitions of MakePlots_HTopMultilep.py
+
+    database = VariableDB()
+
+    database.registerCut( Cut('DummyCut',        '( 1 )') )
+    database.registerCut( Cut('EventCleaning',   '( passEventCleaning == 1 )') )
+    database.registerCut( Cut('2Lep_SS',         '( isSS01 == 1 )') )
+    database.registerCut( Cut('2Lep_pT',         '( lep_Pt_0 > 25e3 && lep_Pt_1 > 25e3 )') )
+    database.registerCut( Cut('2Lep_ElEl_Event', '( dilep_type == 3 )') )
+    database.registerCut( Cut('2Lep_MuMu_Event', '( dilep_type == 1 )') )
+    database.registerCut( Cut('2Lep_OF_Event',   '( dilep_type == 2 )') )
+    database.registerCut( Cut('2Lep_NJet_SR',    '( nJets_OR_T >= 4 && nJets_OR_T_MV2c10_70 >= 1 )') )
+    database.registerCut( Cut('2Lep_Zsidescut',  '( ( dilep_type != 3 ) || TMath::Abs( Mll01 - 91.2e3 ) > 10e3 )') )
+    database.registerCut( Cut('TT',              '( lep_isTightSelected_0 == 1 && lep_isTightSelected_1 == 1 )') )
+    database.registerCut( Cut('FakesSideband_TT','( is_T_T )') )
+    database.registerCut( Cut('FakesSideband_TL','( is_T_AntiT )') )
+    database.registerCut( Cut('FakesSideband_LT','( is_AntiT_T )') )
+    database.registerCut( Cut('FakesSideband_LL','( is_AntiT_AntiT )') )
+
+    database.registerVar( Variable(shortname = "Integral", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0, sysvar = True) )
+    database.registerVar( Variable(shortname = 'NJets', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 10, minval = -0.5, maxval = 9.5, weight = 'JVT_EventWeight', sysvar = True) )
+    database.registerVar( Variable(shortname = 'Lep0Pt', latexname = 'p_{T}^{lead lep} [GeV]', ntuplename = 'lep_Pt_0/1e3', bins = 36, minval = 10.0, maxval = 190.0, sysvar = True) )
+    database.registerVar( Variable(shortname = 'Lep0Eta', latexname = '#eta^{lead lep}', ntuplename = 'TMath::Abs( lep_EtaBE2_0 )', bins = 8, minval = 0.0, maxval = 2.6) )
+    database.registerVar( Variable(shortname = 'Mll01', latexname = 'm(l_{0}l_{1}) [GeV]', ntuplename = 'Mll01/1e3', bins = 15, minval = 0.0, maxval = 300.0) )
+    database.registerVar( Variable(shortname = 'MET_FinalTrk', latexname = 'E_{T}^{miss} [GeV]', ntuplename = 'MET_RefFinal_et/1e3', bins = 45, minval = 0.0, maxval = 180.0) )
+    database.registerVar( Variable(shortname = 'Lep0Pt_VS_Lep1Pt', latexnameX = 'p_{T}^{lead lep} [GeV]', latexnameY = 'p_{T}^{2nd lead lep} [GeV]', ntuplename = 'lep_Pt_1/1e3:lep_Pt_0/1e3', binsX = 20, minvalX = 0.0, maxvalX = 200.0, binsY = 20, minvalY = 0.0, maxvalY = 200.0, typeval = TH2D) )
+
+    database.registerSystematics( Systematics(name='Lep_El_SF', eventweight='lepSFObjTight_EL_', process=['TTBarH','TTBarW','TTBarZ']) )
+    database.registerSystematics( Systematics(name='Lep_Mu_SF', eventweight='lepSFObjTight_MU_', process=['TTBarH','TTBarW','TTBarZ']) )
+    database.registerSystematics( Systematics(name='JVT_SF',    eventweight='JVT_EventWeight',   process=['TTBarH','TTBarW','TTBarZ']) )
+
+    basecuts = ['EventCleaning','2Lep_pT','2Lep_SS','2Lep_Zsidescut','2Lep_NJet_SR']
+    weight   = 'lepSFObjTight * lepSFTrigTight * MV2c10_70_EventWeight'
+
+    database.registerCategory( MyCategory('SR - ee', cut = database.getCuts(basecuts + ['2Lep_ElEl_Event']), weight = weight) )
+    database.registerCategory( MyCategory('SR - mm', cut = database.getCuts(basecuts + ['2Lep_MuMu_Event']), weight = weight) )
+    database.registerCategory( MyCategory('SR - OF', cut = database.getCuts(basecuts + ['2Lep_OF_Event']), weight = weight) )
+
+    return database
+
+# Mixed arithmetic/boolean formulas, whose values depend on comparisons being evaluated as 0./1. doubles and on divisions by zero returning 0, as in TTreeFormula
+
+validationformulas = [
+    ('(nJets_OR_T >= 4) + (nJets_OR_T_MV2c10_70 >= 1)', 5, -0.5, 4.5),
+    ('lep_Pt_0/1e3 - (dilep_type == 1)',                 40, 0.0, 200.0),
+    ('-(isSS01 == 1)',                                   3, -1.5, 1.5),
+    ('!(isSS01 == 1) * 2 + (dilep_type != 3)',           5, -0.5, 4.5),
+    ('( lep_Pt_0 > 25e3 && lep_Pt_1 > 25e3 ) * nJets_OR_T', 10, -0.5, 9.5),
+    ('Mll01/(dilep_type - 2)',                           30, -300e3, 300e3),
+    ('nJets_OR_T % 3 + (MET_RefFinal_et/1e3 > 50)',      5, -0.5, 4.5),
+]
+
+def validateNumPy(inputs, database, tolerance=1e-6):
+
+    # Fill each formula (and each 1D variable of the benchmark) in each category w/ TTree::Project and w/ the NumPy backend,
+    # on every nominal tree, and compare the contents and errors of all the bins (under/overflow included).
+    # Returns the list of the ( tree, varexp, selection ) which differ or could not be filled w/ NumPy.
+
+    backend = NumPyBackend()
+    checks  = list(validationformulas) + [ (var.ntuplename, var.bins, var.minval, var.maxval) for var in database.varlist if var.typeval is TH1D ]
+    selections = ['1'] + [ SubProcess.selectionString(category.weight, category.cut.cutstr) for category in database.categorylist ]
+
+    failures = []
+    for group, subgroups in sorted(inputs.treespecs[inputs.nomtree].iteritems()):
+        for subgroup in sorted(subgroups):
+            tree = inputs.getTree(inputs.nomtree, group, subgroup)
+            for varexp, bins, minval, maxval in checks:
+                for selection in selections:
+                    href = TH1D('hvalidate_ref', '', bins, minval, maxval)
+                    href.Sumw2()
+                    tree.Project('hvalidate_ref', varexp, selection)
+                    hnp = TH1D('hvalidate_np', '', bins, minval, maxval)
+                    if not backend.project(tree, hnp, varexp, selection):
+                        failures.append( (tree.GetTitle(), varexp, selection, 'not filled w/ NumPy') )
+                    else:
+                        for ibin in range(bins+2):
+                            for ref, value in [ (href.GetBinContent(ibin), hnp.GetBinContent(ibin)), (href.GetBinError(ibin), hnp.GetBinError(ibin)) ]:
+                                if abs(ref - value) > tolerance * max(1., abs(ref)):
+                                    failures.append( (tree.GetTitle(), varexp, selection, 'bin {0}: {1} (TTree::Project) vs {2} (NumPy)'.format(ibin, ref, value)) )
+                    href.Delete()
+                    hnp.Delete()
+
+    print("\nNumPy backend validation: {0} tree(s) x {1} formula(s) x {2} selection(s), {3} mismatch(es)\n".format(sum( len(subgroups) for subgroups in inputs.treespecs[inputs.nomtree].itervalues() ), len(checks), len(selections), len(failures)))
+    for title, varexp, selection, reason in failures:
+        print("MISMATCH - tree: {0} - varexp: {1} - selection: {2} - {3}".format(title, varexp, selection, reason))
+    return failures
+
+def currentRSS():
+
+    # Current resident set size of this process in MB (from /proc, Linux only: None elsewhere)
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 1024.**2
+    except (IOError, ValueError, IndexError):
+        return None
+
+def entriesRead():
+
+    # Entries read from the trees so far, by the loops of BackgroundTools and by the NumPy backend
+
+    return SubProcess.entriesread + getattr(SubProcess.backend, 'entriesread', 0)
+
+class Stage:
+
+    # Measures wall time, bytes read from the input files, entries read from the trees (and per second), and the
+    # change of the RSS of a stage of the pipeline. The peak RSS is the one of the whole lifetime of the largest
+    # process so far (ru_maxrss can't be reset), not of the stage alone.
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if not args.warmCache:
+            SubProcess.histcache.clear()
+            SubProcess.numcache.clear()
+        self.bytesread = TFile.GetFileBytesRead()
+        self.entries   = entriesRead()
+        self.rss       = currentRSS()
+        self.start     = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        walltime  = time.time() - self.start
+        bytesread = TFile.GetFileBytesRead() - self.bytesread
+        nevents   = entriesRead() - self.entries
+        rss       = currentRSS()
+        peakrss   = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024.
+        results[self.name] = {
+            'walltime'   : walltime,
+            'bytesread'  : bytesread,
+            'events'     : nevents,
+            'eventsps'   : nevents / walltime if walltime else 0.,
+            'rss_MB'     : rss,
+            'rssdelta_MB': rss - self.rss if rss is not None and self.rss is not None else None,
+            'peakrss_MB' : peakrss,
+        }
+        return False
+
+def printResults(results, reference=None):
+
+    print("\n{0:>12} {1:>12} {2:>14} {3:>14} {4:>14} {5:>14} {6:>14} {7:>22}".format('Stage','Wall [s]','Read [MB]','Entries read','Entries/s','RSS [MB]','RSS diff [MB]','Lifetime peak RSS [MB]'))
+    regressions = []
+    for name in stages:
+        if not name in results: continue
+        r = results[name]
+        rss = [ '{0:.1f}'.format(r[key]) if r.get(key) is not None else 'n/a' for key in ['rss_MB','rssdelta_MB'] ]
+        line = "{0:>12} {1:>12.2f} {2:>14.1f} {3:>14d} {4:>14.0f} {5:>14} {6:>14} {7:>22.1f}".format(name, r['walltime'], r['bytesread']/1024.**2, r['events'], r['eventsps'], rss[0], rss[1], r['peakrss_MB'])
+        if reference and name in reference:
+            ratio = r['walltime'] / reference[name]['walltime'] if reference[name]['walltime'] else 1.
+            line += "   x{0:.2f} w.r.t. reference".format(ratio)
+            if ratio > 1. + args.tolerance:
+                line += "  <--- REGRESSION"
+                regressions.append(name)
+        print(line)
+    print("")
+    if args.nWorkers > 1:
+        print("NB: bytes and entries read by the worker processes are not included\n")
+    return regressions
+
+if __name__ == "__main__":
+
+    results = {}
+
+    samplescsv = generate(args.workdir, args.nEvents, args.seed, args.regenerate)
+
+    database = makeDatabase()
+
+    with Stage('register'):
+        inputs = loadSamples(inputdir=args.workdir, samplescsv=samplescsv, nomtree='physics')
+
+    if args.validateNumPy:
+        if not HAS_NUMPY:
+            print("ERROR: NumPy (or root_numpy) is not available, cannot validate the NumPy backend")
+            sys.exit(1)
+        if validateNumPy(inputs, database):
+            sys.exit(1)
+
+    ttH = TTHBackgrounds(inputs, database)
+    ttH.luminosity  = 36.1
+    ttH.eventweight = "mcWeightOrg * pileupEventWeight_090"
+    ttH.channel     = '2LSS'
+    ttH.observed    = ['Observed']
+    ttH.signals     = ['TTBarH']
+    ttH.backgrounds = ['TTBarW','TTBarZ','QMisID','FakesMM']
+    ttH.sub_backgrounds = []
+    ttH.nworkers    = args.nWorkers
+
+    SubProcess.useentrylists = args.useEntryLists
+    if args.backend == 'NumPy' and HAS_NUMPY:
+        SubProcess.backend = NumPyBackend()
+
+    categories = database.categorylist
+    variables  = database.varlist
+
+    if 'events' in args.stages:
+        with Stage('events'):
+            for category in categories:
+                ttH.events(eventweight=category.weight, category=category, hmass=['125'], overridebackground=ttH.backgrounds, show=False)
+
+    if 'sumhist' in args.stages:
+        with Stage('sumhist'):
+            for category in categories:
+                for var in variables:
+                    ttH.var = var
+                    ttH.sumhist(var, processes=['TTBarW','TTBarZ'], eventweight=category.weight, category=category)
+
+    if 'fakes' in args.stages:
+        with Stage('fakes'):
+            for category in categories:
+                for var in variables:
+                    ttH.var = var
+                    ttH.sumhist(var, processes=['FakesMM','QMisID'], eventweight=category.weight, category=category)
+
+    if 'plot' in args.stages:
+        with Stage('plot'):
+            for category in categories:
+                if args.bookHistograms:
+                    ttH.bookPlots(variables, eventweight=category.weight, category=category, signal='', signalfactor=1.0, overridebackground=ttH.backgrounds)
+                for var in variables:
+                    ttH.plot(var, eventweight=category.weight, category=category, signal='', signalfactor=1.0, overridebackground=ttH.backgrounds, wait=False, save=[])
+
+    if 'systematics' in args.stages:
+        with Stage('systematics'):
+            for category in categories:
+                sysvars = [ var for var in variables if var.sysvar ]
+                if args.bookHistograms:
+                    ttH.bookSystematics(database.systlist, sysvars, eventweight=category.weight, category=category, overridebackground=ttH.backgrounds)
+                for var in sysvars:
+                    ttH.var = var
+                    for syst in database.systlist:
+                        ttH.plotSystematics(syst, var=var, eventweight=category.weight, category=category, overridebackground=ttH.backgrounds, wait=False, save=[])
+
+    reference = None
+    if args.reference:
+        with open(args.reference) as f:
+            reference = json.load(f)['results']
+
+    regressions = printResults(results, reference)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({ 'options' : vars(args), 'results' : results }, f, indent=1, sort_keys=True)
+        print("Results saved in {0}".format(args.output))
+
+    if regressions:
+        print("Performance regressions in stages: {0}".format(regressions))
+        sys.exit(1)
@@ -0,0 +1,400 @@
+""" CacheTools.py: caches for the histograms and yields projected by BackgroundTools.SubProcess """
+
+__author__     = "Marco Milesi"
+__email__      = "marco.milesi@cern.ch"
+__maintainer__ = "Marco Milesi"
+
+import os, glob, hashlib, json, time
+
+from collections import OrderedDict
+
+from ROOT import TFile, TH1, gROOT
+
+class DiskCache:
+
+    # A persistent cache of projected histograms, shared across runs and PBS jobs.
+    #
+    # Each entry is a small ROOT file in the cache directory, named after a hash of:
+    #
+    #  -) the path, size and modification time of every file in the TChain (and in its friend chains)
+    #  -) the tree name
+    #  -) the projected expression, the resolved TTreeFormula selection (cut * event weight)
+    #  -) the binning of the histogram
+    #
+    # so that any change in the inputs, in the selection or in the binning automatically invalidates the entry.
+    # Entries are written atomically (write to a temporary file, then rename), and when the total size
+    # of the cache exceeds maxsize (in bytes), the least recently used entries are removed.
+    # Temporary files left behind by jobs killed while writing an entry are removed once older than tmpmaxage (in s).
+
+    extension = '.hcache.root'
+    tmpmaxage = 24*3600
+
+    def __init__(self, cachedir, maxsize=20*1024**3, debug=False):
+        self.cachedir = os.path.abspath(cachedir)
+        self.maxsize  = maxsize
+        self.debug    = debug
+        self.fingerprints = {}
+        self.hits   = 0
+        self.misses = 0
+        if not os.path.exists(self.cachedir):
+            try:
+                os.makedirs(self.cachedir)
+            except OSError:
+                pass # Might have been created in the meantime by another job
+        self.removeStaleTemporaries()
+        self.size = self.diskUsage()
+
+    def entries(self):
+        return glob.glob(self.cachedir + '/*' + self.extension)
+
+    def removeStaleTemporaries(self):
+
+        # Entries being written by running jobs are recent: only remove the temporary files older than tmpmaxage
+
+        removed = 0
+        for temp in glob.glob(self.cachedir + '/*' + self.extension + '.*.tmp'):
+            try:
+                if time.time() - os.path.getmtime(temp) > self.tmpmaxage:
+                    os.remove(temp)
+                    removed += 1
+            except OSError:
+                pass # Renamed or removed in the meantime
+        if removed and self.debug:
+            print("DiskCache: removed {0} stale temporary files".format(removed))
+
+    def diskUsage(self):
+        size = 0
+        for entry in self.entries():
+            try:
+                size += os.path.getsize(entry)
+            except OSError:
+                pass
+        return size
+
+    def treeFiles(self, tree):
+
+        # List of all the files read by a TChain, including those of its friends
+
+        files = []
+        if hasattr(tree, 'GetListOfFiles'):
+            for element in tree.GetListOfFiles():
+                files.append(element.GetTitle())
+        elif tree.GetCurrentFile():
+            files.append(tree.GetCurrentFile().GetName())
+        if tree.GetListOfFriends():
+            for friend in tree.GetListOfFriends():
+                files.extend(self.treeFiles(friend.GetTree()))
+        return files
+
+    def treeFingerprint(self, tree):
+
+        # Returns None if any of the input files cannot be stat'ed (e.g. remote files): these trees won't be cached
+
+        title = tree.GetTitle()
+        if not title in self.fingerprints:
+            tokens = [tree.GetName()]
+            for filepath in self.treeFiles(tree):
+                try:
+                    st = os.stat(filepath)
+                except OSError:
+                    tokens = None
+                    break
+                tokens.append('%s:%d:%d' % (os.path.abspath(filepath), st.st_size, int(st.st_mtime)))
+            self.fingerprints[title] = '|'.join(tokens) if tokens else None
+        return self.fingerprints[title]
+
+    @staticmethod
+    def binning(h):
+        tokens = [h.ClassName()]
+        for axis in [h.GetXaxis(), h.GetYaxis()][:h.GetDimension()]:
+            tokens.append(','.join('%.10g' % axis.GetBinLowEdge(i) for i in range(1, axis.GetNbins()+2)))
+        return '|'.join(tokens)
+
+    def key(self, tree, varexp, selection, h):
+        fingerprint = self.treeFingerprint(tree)
+        if not fingerprint:
+            return None
+        keystr = '\n'.join([fingerprint, str(varexp), str(selection), self.binning(h)])
+        return hashlib.sha1(keystr).hexdigest()
+
+    def path(self, key):
+        return self.cachedir + '/' + key + self.extension
+
+    def load(self, tree, varexp, selection, h):
+
+        # Fill h with the cached projection, if any. Returns True on a cache hit.
+
+        key = self.key(tree, varexp, selection, h)
+        if not key or not os.path.isfile(self.path(key)):
+            self.misses += 1
+            return False
+        f = TFile.Open(self.path(key))
+        if not f or f.IsZombie():
+            self.misses += 1
+            return False
+        cached = f.Get('h')
+        if not cached:
+            f.Close()
+            self.misses += 1
+            return False
+        h.Add(cached)
+        h.SetEntries(cached.GetEntries())
+        f.Close()
+        try:
+            os.utime(self.path(key), None) # Mark the entry as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        if self.debug:
+            print("DiskCache: hit for {0}".format(h.GetName()))
+        return True
+
+    def store(self, tree, varexp, selection, h):
+
+        key = self.key(tree, varexp, selection, h)
+        if not key:
+            return False
+        target = self.path(key)
+        temp = '%s.%d.tmp' % (target, os.getpid())
+        currentdir = gROOT.CurrentDirectory()
+        f = TFile.Open(temp, 'RECREATE')
+        if not f or f.IsZombie():
+            currentdir.cd()
+            return False
+        h.Write('h')
+        f.Close()
+        currentdir.cd()
+        os.rename(temp, target)
+        self.size += os.path.getsize(target)
+        if self.size > self.maxsize:
+            self.evict()
+        return True
+
+    def evict(self):
+
+        # Remove the least recently used entries until the cache is below 90% of its maximum size
+
+        self.removeStaleTemporaries()
+        entries = []
+        for entry in self.entries():
+            try:
+                st = os.stat(entry)
+            except OSError:
+                continue
+            entries.append( (st.st_mtime, st.st_size, entry) )
+        entries.sort()
+
+        self.size = sum( e[1] for e in entries )
+        target = 0.9 * self.maxsize
+        removed = 0
+        for mtime, size, entry in entries:
+            if self.size <= target:
+                break
+            try:
+                os.remove(entry)
+            except OSError:
+                continue
+            self.size -= size
+            removed += 1
+        if self.debug:
+            print("DiskCache: evicted {0} entries, current size: {1:.1f} MB".format(removed, self.size/1024.**2))
+
+    def printSummary(self):
+        print("\nDiskCache in {0}: {1} hits, {2} misses, size on disk: {3:.1f} MB\n".format(self.cachedir, self.hits, self.misses, self.size/1024.**2))
+
+class TreeMetadata:
+
+    # A sidecar file caching the metadata of the input files needed at tree registration
+    # (the weight of each tree, the sum of weights in TotalEventsW), so that the files don't need to be opened at every startup.
+    # Entries are invalidated by any change in the size or modification time of the file.
+    # The sidecar is a JSON dictionary keyed by the absolute path of the files, and it is rewritten atomically.
+
+    def __init__(self, path):
+        self.path    = path
+        self.entries = {}
+        self.dirty   = False
+        if os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except (IOError, ValueError), e:
+                print("WARNING: cannot read tree metadata from {0}, it will be rebuilt - {1}".format(path, e))
+
+    def stat(self, filepath):
+        st = os.stat(filepath)
+        return st.st_size, int(st.st_mtime)
+
+    def get(self, filepath):
+        entry = self.entries.get(os.path.abspath(filepath))
+        if not entry:
+            return None
+        try:
+            size, mtime = self.stat(filepath)
+        except OSError:
+            return None
+        if entry['size'] != size or entry['mtime'] != mtime:
+            return None
+        return entry
+
+    def set(self, filepath, entry):
+        entry['size'], entry['mtime'] = self.stat(filepath)
+        self.entries[os.path.abspath(filepath)] = entry
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        temp = '%s.%d.tmp' % (self.path, os.getpid())
+        try:
+            with open(temp, 'w') as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.rename(temp, self.path)
+            self.dirty = False
+        except (IOError, OSError), e:
+            print("WARNING: cannot write tree metadata to {0} - {1}".format(self.path, e))
+
+class PlotManifest:
+
+    # A manifest of the outputs of MakePlots, for make-style incremental re-plotting.
+    #
+    # For each plot it records a fingerprint of everything the plot is made of (input files, cuts, weights, binning,
+    # processes, options) and the list of its output files. A plot is up to date if its fingerprint hasn't changed
+    # and all its outputs still exist: only the plots which are not up to date need to be produced again.
+    # The manifest is a JSON dictionary keyed by the name of the plots. Since several batch jobs may share it,
+    # the entries updated by a job are merged into the current content of the file when saving, which is done atomically.
+
+    def __init__(self, path):
+        self.path    = path
+        self.entries = self.read()
+        self.updated = {}
+
+    def read(self):
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError), e:
+            print("WARNING: cannot read plot manifest from {0}, all the plots will be rebuilt - {1}".format(self.path, e))
+            return {}
+
+    @staticmethod
+    def fingerprint(tokens):
+        return hashlib.sha1(json.dumps(tokens, sort_keys=True)).hexdigest()
+
+    def isUpToDate(self, plotname, fingerprint, outputs):
+        entry = self.entries.get(plotname)
+        if not entry or entry['fingerprint'] != fingerprint:
+            return False
+        return all( os.path.isfile(output) for output in outputs )
+
+    def set(self, plotname, fingerprint, outputs):
+        self.updated[plotname] = { 'fingerprint' : fingerprint, 'outputs' : list(outputs) }
+
+    def save(self):
+        if not self.updated:
+            return
+        entries = self.read()
+        entries.update(self.updated)
+        temp = '%s.%d.tmp' % (self.path, os.getpid())
+        try:
+            with open(temp, 'w') as f:
+                json.dump(entries, f, indent=1, sort_keys=True)
+            os.rename(temp, self.path)
+            self.entries = entries
+            self.updated = {}
+        except (IOError, OSError), e:
+            print("WARNING: cannot write plot manifest to {0} - {1}".format(self.path, e))
+
+class HistCache:
+
+    # An in-memory, dict-like cache of histograms w/ a memory budget (in bytes).
+    #
+    # The size of each histogram is estimated from its number of cells, the size of its bin content type
+    # and the sum of squares of weights array. When the budget is exceeded, the least recently used
+    # histograms are dropped (and thus deleted, as the cache holds the only reference to them).
+    # A maxsize of None means no budget at all, i.e. the behaviour of a plain dictionary.
+    # Hits and misses are only counted by lookups (get() and []), not by membership tests.
+
+    overhead = 1024 # Rough estimate of the size of a TH1 object w/o its arrays
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.hists   = OrderedDict()
+        self.sizes   = {}
+        self.size    = 0
+        self.hits    = 0
+        self.misses  = 0
+        self.evicted = 0
+        self.evictedbytes = 0
+
+    def histSize(self, h):
+        if h.InheritsFrom('TArrayF') or h.InheritsFrom('TArrayI'):
+            cellsize = 4
+        elif h.InheritsFrom('TArrayS'):
+            cellsize = 2
+        elif h.InheritsFrom('TArrayC'):
+            cellsize = 1
+        else:
+            cellsize = 8
+        return self.overhead + h.GetSize() * cellsize + h.GetSumw2N() * 8
+
+    def __len__(self):
+        return len(self.hists)
+
+    def __contains__(self, key):
+        return key in self.hists
+
+    def __getitem__(self, key):
+        if not key in self.hists:
+            self.misses += 1
+            raise KeyError(key)
+        self.hits += 1
+        h = self.hists.pop(key)
+        self.hists[key] = h # Move to the most recently used end
+        return h
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, h):
+        if key in self.hists:
+            self.__delitem__(key)
+        self.hists[key] = h
+        self.sizes[key] = self.histSize(h)
+        self.size += self.sizes[key]
+        if self.maxsize is not None and self.size > self.maxsize:
+            self.evict(keep=key)
+
+    def __delitem__(self, key):
+        del self.hists[key]
+        self.size -= self.sizes.pop(key)
+
+    def keys(self):
+        return self.hists.keys()
+
+    def evict(self, keep=None):
+
+        # Drop the least recently used histograms until the cache fits the budget again.
+        # The histogram which has just been inserted (keep) is never dropped.
+
+        for key in list(self.hists.keys()):
+            if self.size <= self.maxsize:
+                break
+            if key == keep:
+                continue
+            self.evicted += 1
+            self.evictedbytes += self.sizes[key]
+            self.__delitem__(key)
+
+    def clear(self):
+        self.hists.clear()
+        self.sizes.clear()
+        self.size = 0
+
+    def printSummary(self):
+        budget = '{0:.1f} MB'.format(self.maxsize/1024.**2) if self.maxsize is not None else 'unlimited'
+        print("\nHistCache: {0} hits, {1} misses, {2} histograms evicted ({3:.1f} MB), current size: {4:.1f} MB in {5} histograms (budget: {6})\n".format(self.hits, self.misses, self.evicted, self.evictedbytes/1024.**2, self.size/1024.**2, len(self.hists), budget))
@@ -6,7 +6,11 @@ __author__     = "Marco Milesi, Francesco Nuti"
 __email__      = "marco.milesi@cern.ch, francesco.nuti@cern.ch"
 __maintainer__ = "Marco Milesi"
 
-import os, sys, math, array, string
+import os, sys, math, array, string, glob, hashlib, time, json
+
+# Time spent at each step of the startup (imports, input samples, definitions...), reported before producing the plots
+
+startup = [ ("start", time.time()) ]
 
 sys.path.append(os.path.abspath(os.path.curdir))
 
@@ -111,10 +115,56 @@ parser.add_argument('--debug', dest='debug', action='store_true', default=False,
                     help='Run in debug mode')
 parser.add_argument('--submitPBSVar', dest='submitPBSVar',action='store',const='Integral',default=None,type=str,nargs='?',
                     help='IF used, will make sure only the variable passed as command-line argument to this option is processed at a time. The default variable - if unspecified - is \'Integral\'')
+parser.add_argument('--variables', dest='variables', action='store', default=None, type=str, nargs='+',
+                    help='Only plot the variables in this list (by short name). Only the selected variables are built. Default is None (all the variables of the channel).')
 parser.add_argument('--useFriendTrees', dest='useFriendTrees', action='store_true', default=False,
                     help='Include also friend trees in the inputs.')
 parser.add_argument('--readGFW2', dest='readGFW2', action='store_true', default=False,
                     help='Take GFW2 ntuples as inputs.')
+parser.add_argument('--bookHistograms', dest='bookHistograms', action='store_true', default=False,
+                    help='Book the histograms for all the variables in a category first, then fill them with a single loop on each input TChain. Default is False.')
+parser.add_argument('--diskCache', dest='diskCache', action='store', default=None, type=str,
+                    help='Path to a directory where to keep a persistent cache of the projected histograms and yields, shared across runs. Default is None (no persistent cache).')
+parser.add_argument('--diskCacheSize', dest='diskCacheSize', action='store', default=20.0, type=float,
+                    help='Maximum size (in GB) of the persistent cache. Least recently used entries are removed beyond this size. Default is 20 GB.')
+parser.add_argument('--histCacheSize', dest='histCacheSize', action='store', default=None, type=float,
+                    help='Memory budget (in MB) for the in-memory histogram cache. Least recently used histograms are dropped beyond this size. Default is None (no limit).')
+parser.add_argument('--useEntryLists', dest='useEntryLists', action='store_true', default=False,
+                    help='Preselect the entries passing the base cut of each process w/ a TEntryList, computed once per (tree, base cut), and project all the variables only on those entries. Default is False.')
+parser.add_argument('--nWorkers', dest='nWorkers', action='store', default=1, type=int,
+                    help='Number of worker processes used to evaluate the processes of each plot/yield table concurrently. Default is 1 (serial).')
+parser.add_argument('--backend', dest='backend', action='store', default='ROOT', type=str, choices=['ROOT','NumPy'],
+                    help='Backend used to fill histograms and yields. \'NumPy\' loads the branches into NumPy arrays once per TChain and evaluates cuts and weights as vectorised expressions, falling back to TTree::Project for unsupported expressions. Default is \'ROOT\'.')
+parser.add_argument('--treeCacheSize', dest='treeCacheSize', action='store', default=None, type=float,
+                    help='Size (in MB) of the TTreeCache of each input TChain. 0 disables the cache. Default is None (ROOT default).')
+parser.add_argument('--learnEntries', dest='learnEntries', action='store', default=None, type=int,
+                    help='Number of entries of the learning phase of the TTreeCache, during which the branches to be cached are recorded. Default is None (ROOT default).')
+parser.add_argument('--prefetch', dest='prefetch', action='store_true', default=False,
+                    help='Prefetch the baskets asynchronously, and stream the following files of each TChain ahead of the loop in the background. Default is False.')
+parser.add_argument('--nPlotWorkers', dest='nPlotWorkers', action='store', default=1, type=int,
+                    help='Number of worker processes executing the task graph of the plots, each one a balanced partition of it. Default is 1 (serial).')
+parser.add_argument('--nBatches', dest='nBatches', action='store', default=1, type=int,
+                    help='Split the task graph of the plots in this number of balanced batches, and only execute the one selected w/ --batchIndex. Default is 1 (no split).')
+parser.add_argument('--batchIndex', dest='batchIndex', action='store', default=0, type=int,
+                    help='Index of the batch to be executed (from 0 to nBatches-1). Default is 0.')
+parser.add_argument('--dumpTaskGraph', dest='dumpTaskGraph', action='store', default=None, type=str,
+                    help='Write the planned task graph (and its batches, if --nBatches is set) to this JSON file, and exit w/o executing it. Default is None.')
+parser.add_argument('--taskPlan', dest='taskPlan', action='store', default=None, type=str,
+                    help='JSON file w/ the plan written by --dumpTaskGraph (e.g. at submission time), w/ the same options. The batch --batchIndex of that plan is executed, and w/ --incremental the plots up to date are those of the plan, so that all the batches of a submission share the same plan, whatever the other batches have produced in the meantime. Default is None (the plan is made by each batch).')
+parser.add_argument('--incremental', dest='incremental', action='store_true', default=False,
+                    help='Only produce the plots whose inputs (input files, cuts, weights, binning, processes, options) have changed since they were last produced, or whose outputs are missing. Default is False (all the plots are produced).')
+parser.add_argument('--plotStore', dest='plotStore', action='store', default=None, type=str,
+                    help='Path to a ROOT file where to keep the histograms of all the plots (one file per batch, if --nBatches is set). The plots are then rendered from this file in a separate stage, after all the histograms have been produced. Default is None (each plot is rendered as soon as it is produced).')
+parser.add_argument('--renderOnly', dest='renderOnly', action='store_true', default=False,
+                    help='Do not produce any histogram, only render (e.g. w/ a different style, or in other formats) the plots in the files given w/ --plotStore. Default is False.')
+parser.add_argument('--forceRender', dest='forceRender', action='store_true', default=None,
+                    help='Render all the plots from the plot store, even the formats which are newer than the store. Default w/ --renderOnly (e.g. to apply a new style), otherwise only the formats older than the store are rendered.')
+parser.add_argument('--noForceRender', dest='forceRender', action='store_false',
+                    help='W/ --renderOnly, only render the formats which are missing or older than the plot store.')
+parser.add_argument('--renderFormats', dest='renderFormats', action='store', default='png,pdf,eps', type=str,
+                    help='Comma-separated list of the formats in which the plots are rendered. Unless --forceRender is set, formats which are already up to date w/ respect to the plot store are not rendered again. Default is \'png,pdf,eps\'.')
+parser.add_argument('--nRenderWorkers', dest='nRenderWorkers', action='store', default=1, type=int,
+                    help='Number of worker processes rendering the plots from the plot store. Default is 1 (serial).')
 
 args = parser.parse_args()
 
@@ -231,7 +281,12 @@ def plot_significance( Z_dict, dim ):
 # Importing all the tools and the definitions used to produce the plots
 # ---------------------------------------------------------------------
 
-from Plotter.BackgroundTools import loadSamples, Category, Background, Process, VariableDB, Variable, Cut, Systematics, Category, set_fancy_2D_style
+from Plotter.BackgroundTools import loadSamples, Category, Background, Process, SubProcess, VariableDB, Variable, Cut, Systematics, Category, set_fancy_2D_style
+from Plotter.CacheTools import DiskCache, PlotManifest
+from Plotter.TaskGraph import TaskGraph
+from Plotter.PlotStore import PlotStore, renderPlots
+from Core import NTupleTools
+from Plotter.NumPyTools import NumPyBackend, HAS_NUMPY
 
 # ---------------------------------------------------------------------------
 # Importing the classes for the different processes.
@@ -240,6 +295,8 @@ from Plotter.BackgroundTools import loadSamples, Category, Background, Process,
 
 from Plotter.Backgrounds_HTopMultilep import MyCategory, TTHBackgrounds
 
+startup.append( ("imports", time.time()) )
+
 if __name__ == "__main__":
 
     do2LSS_SR               = bool( "2LSS_SR" in args.channel and not "CutFlowChallenge" in args.channel )
@@ -314,6 +371,11 @@ if __name__ == "__main__":
     # Retrieve the input samples
     # --------------------------
 
+    # Read-ahead on the input TChains
+
+    NTupleTools.configureInput(int(args.treeCacheSize*1024**2) if args.treeCacheSize is not None else None, args.learnEntries, args.prefetch)
+    readstats = NTupleTools.getReadStats()
+
     friendtrees = ["NN_physics"] if not args.readGFW2 else ["NN_nominal"]
 
     inputs = loadSamples(
@@ -344,6 +406,8 @@ if __name__ == "__main__":
     # with min, max, number of bins and ntuple name.
     # ------------------------------------------------------
 
+    startup.append( ("input samples", time.time()) )
+
     database = VariableDB()
 
     # -----------------------------------------------------
@@ -359,14 +423,14 @@ if __name__ == "__main__":
     # General cuts
     # ---------------------
 
-    database.registerCut( Cut('DummyCut', '( 1 )') )
+    database.declareCut( 'DummyCut', '( 1 )' )
 
-    #database.registerCut( Cut('BlindingCut', '( isBlinded == 0 )') ) # <--- use this cut to get blinded results!
-    database.registerCut( Cut('BlindingCut', '( 1 )') )
+    #database.declareCut( 'BlindingCut', '( isBlinded == 0 )' ) # <--- use this cut to get blinded results!
+    database.declareCut( 'BlindingCut', '( 1 )' )
     if args.doUnblinding:
         database.getCut('BlindingCut').cutstr = '( 1 )'
 
-    database.registerCut( Cut('IsMC', '( mc_channel_number != 0 )') )
+    database.declareCut( 'IsMC', '( mc_channel_number != 0 )' )
 
     # -------
     # Trigger
@@ -393,26 +457,26 @@ if __name__ == "__main__":
 
     if "SLT_OR_DLT" in args.trigger: # use ( DLT || SLT ) for all categories (includes trigger matching already!)
 
-        #database.registerCut( Cut("TrigDec", "( " + "( dilep_type == 1 && " + mm_DLT_OR_SLT + " )" + " || " + "( dilep_type == 2 && " + of_DLT_OR_SLT + " )" + " || " + "( dilep_type == 3 && " + ee_DLT_OR_SLT + " )" + " )" ) )
-        database.registerCut( Cut("TrigDec", '( ( ( RunYear == 2015 && ( HLT_mu20_iloose_L1MU15 || HLT_mu50 || HLT_e24_lhmedium_L1EM20VH || HLT_e60_lhmedium || HLT_e120_lhloose ) ) || ( RunYear == 2016 && ( HLT_mu26_ivarmedium || HLT_mu50 || HLT_e26_lhtight_nod0_ivarloose || HLT_e60_lhmedium_nod0 || HLT_e140_lhloose_nod0 ) ) ) || ( RunYear == 2015 && ( HLT_2e12_lhloose_L12EM10VH || HLT_e17_lhloose_mu14 || HLT_mu18_mu8noL1 ) ) || ( RunYear == 2016 && ( HLT_2e17_lhvloose_nod0 || HLT_e17_lhloose_nod0_mu14 || HLT_mu22_mu8noL1 ) ) )') )
+        #database.declareCut( "TrigDec", "( " + "( dilep_type == 1 && " + mm_DLT_OR_SLT + " )" + " || " + "( dilep_type == 2 && " + of_DLT_OR_SLT + " )" + " || " + "( dilep_type == 3 && " + ee_DLT_OR_SLT + " )" + " )" )
+        database.declareCut( "TrigDec", '( ( ( RunYear == 2015 && ( HLT_mu20_iloose_L1MU15 || HLT_mu50 || HLT_e24_lhmedium_L1EM20VH || HLT_e60_lhmedium || HLT_e120_lhloose ) ) || ( RunYear == 2016 && ( HLT_mu26_ivarmedium || HLT_mu50 || HLT_e26_lhtight_nod0_ivarloose || HLT_e60_lhmedium_nod0 || HLT_e140_lhloose_nod0 ) ) ) || ( RunYear == 2015 && ( HLT_2e12_lhloose_L12EM10VH || HLT_e17_lhloose_mu14 || HLT_mu18_mu8noL1 ) ) || ( RunYear == 2016 && ( HLT_2e17_lhvloose_nod0 || HLT_e17_lhloose_nod0_mu14 || HLT_mu22_mu8noL1 ) ) )' )
 
     elif "SLT" in args.trigger: # use SLT for all categories
 
-        database.registerCut( Cut("TrigDec", "( " + e_SLT + " || " + m_SLT + " )" ) )
+        database.declareCut( "TrigDec", "( " + e_SLT + " || " + m_SLT + " )" )
 
     elif "DLT" in args.trigger: # use DLT for all categories
 
-        database.registerCut( Cut("TrigDec", "( " + "( dilep_type == 1 && " + mm_DLT + " )" + " || " + "( dilep_type == 2 && " + of_DLT + " )" + " || " + "( dilep_type == 3 && " + ee_DLT + " )" + " )" ) )
+        database.declareCut( "TrigDec", "( " + "( dilep_type == 1 && " + mm_DLT + " )" + " || " + "( dilep_type == 2 && " + of_DLT + " )" + " || " + "( dilep_type == 3 && " + ee_DLT + " )" + " )" )
 
     if args.readGFW2:
         database.getCut("TrigDec").cutstr = "( 1 )" # GFW2 NTuples have the trigger cut already in the skimming selection...
 
-    database.registerCut( Cut('LargeNBJet',      '( nJets_OR_T_MV2c10_70 > 1 )') )
-    database.registerCut( Cut('VetoLargeNBJet',  '( nJets_OR_T_MV2c10_70 < 4 )') )
-    database.registerCut( Cut('BJetVeto',        '( nJets_OR_T_MV2c10_70 == 0 )') )
-    database.registerCut( Cut('OneBJet',         '( nJets_OR_T_MV2c10_70 == 1 )') )
-    database.registerCut( Cut('TauVeto',         '( nTaus_OR_Pt25 == 0 )') )
-    database.registerCut( Cut('OneTau',          '( nTaus_OR_Pt25 == 1 )') )
+    database.declareCut( 'LargeNBJet',      '( nJets_OR_T_MV2c10_70 > 1 )' )
+    database.declareCut( 'VetoLargeNBJet',  '( nJets_OR_T_MV2c10_70 < 4 )' )
+    database.declareCut( 'BJetVeto',        '( nJets_OR_T_MV2c10_70 == 0 )' )
+    database.declareCut( 'OneBJet',         '( nJets_OR_T_MV2c10_70 == 1 )' )
+    database.declareCut( 'TauVeto',         '( nTaus_OR_Pt25 == 0 )' )
+    database.declareCut( 'OneTau',          '( nTaus_OR_Pt25 == 1 )' )
 
     # ---------------------
     # 2Lep SS + 0 tau cuts
@@ -423,48 +487,48 @@ if __name__ == "__main__":
     # ----------------
 
     if "SLT_OR_DLT" in args.trigger:
-        #database.registerCut( Cut('2Lep_TrigMatch', '( 1 )') ) # trigger matching already implemented in trigger selection cut
-        database.registerCut( Cut('2Lep_TrigMatch', '( {0} || {1} )'.format( SLT_matching, DLT_matching ) ) )
+        #database.declareCut( '2Lep_TrigMatch', '( 1 )' ) # trigger matching already implemented in trigger selection cut
+        database.declareCut( '2Lep_TrigMatch', '( {0} || {1} )'.format( SLT_matching, DLT_matching ) )
     elif "SLT" in args.trigger:
-        database.registerCut( Cut('2Lep_TrigMatch', '( {0} )'.format( SLT_matching ) ) )
+        database.declareCut( '2Lep_TrigMatch', '( {0} )'.format( SLT_matching ) )
     elif "DLT" in args.trigger:
-        database.registerCut( Cut('2Lep_TrigMatch', '( {0} )'.format( DLT_matching ) ) )
+        database.declareCut( '2Lep_TrigMatch', '( {0} )'.format( DLT_matching ) )
 
     # For LH fit, use this cuts in order to introduce the trigger bias from SLT
     # This is safe as we will use the likelihood to fit fake muon efficiency in mm events
     # The following will work also if doing LH fit for fake muons in a (mm + OF) CR
 
-    database.registerCut( Cut('2Lep_BothTrigMatchSLT',       '( ( dilep_type == 1 && ( lep_isTrigMatch_0 == 1 && lep_isTrigMatch_1 == 1 ) ) || ( dilep_type == 2 && ( ( TMath::Abs( lep_ID_0 ) == 13 && lep_isTrigMatch_0 == 1 ) || ( TMath::Abs( lep_ID_1 ) == 13 && lep_isTrigMatch_1 == 1 ) ) ) )') )
-    database.registerCut( Cut('2Lep_BothAntiTrigMatchSLT',   '( ( dilep_type == 1 && ( lep_isTrigMatch_0 == 0 && lep_isTrigMatch_1 == 0 ) ) || ( dilep_type == 2 && ( ( TMath::Abs( lep_ID_0 ) == 13 && lep_isTrigMatch_0 == 0 ) || ( TMath::Abs( lep_ID_1 ) == 13 && lep_isTrigMatch_1 == 0 ) ) ) )') )
-
-    database.registerCut( Cut('2Lep_1BJet',               '( nJets_OR_T_MV2c10_70 == 1 )') )
-    database.registerCut( Cut('2Lep_2BJet',               '( nJets_OR_T_MV2c10_70 >= 2 )') )
-    database.registerCut( Cut('2Lep_NBJet',               '( nJets_OR_T_MV2c10_70 >= 1 )') )
-    database.registerCut( Cut('2Lep_NBJet_SR',		  '( nJets_OR_T_MV2c10_70 >= 1 && nJets_OR_T_MV2c10_70 <= 2 )') )
-    database.registerCut( Cut('2Lep_MinNJet',		  '( nJets_OR_T >= 2 )') )
-    database.registerCut( Cut('2Lep_NJet_SR',		  '( nJets_OR_T >= 4 )') )
-    database.registerCut( Cut('2Lep_NJet_CR',		  '( nJets_OR_T >= 2 && nJets_OR_T <= 3 )') )
-    database.registerCut( Cut('2Lep_SS',	          '( lep_ID_0 * lep_ID_1 > 0 )') )
-    database.registerCut( Cut('2Lep_OS',		  '( !( lep_ID_0 * lep_ID_1 > 0 ) )') )
-    database.registerCut( Cut('2Lep_NLep', 		  '( dilep_type > 0 )') )
-    #database.registerCut( Cut('2Lep_pT',		  '( lep_Pt_1 > 15e3 )') )
-    database.registerCut( Cut('2Lep_pT',		  '( lep_Pt_1 > 20e3 )') )
+    database.declareCut( '2Lep_BothTrigMatchSLT',       '( ( dilep_type == 1 && ( lep_isTrigMatch_0 == 1 && lep_isTrigMatch_1 == 1 ) ) || ( dilep_type == 2 && ( ( TMath::Abs( lep_ID_0 ) == 13 && lep_isTrigMatch_0 == 1 ) || ( TMath::Abs( lep_ID_1 ) == 13 && lep_isTrigMatch_1 == 1 ) ) ) )' )
+    database.declareCut( '2Lep_BothAntiTrigMatchSLT',   '( ( dilep_type == 1 && ( lep_isTrigMatch_0 == 0 && lep_isTrigMatch_1 == 0 ) ) || ( dilep_type == 2 && ( ( TMath::Abs( lep_ID_0 ) == 13 && lep_isTrigMatch_0 == 0 ) || ( TMath::Abs( lep_ID_1 ) == 13 && lep_isTrigMatch_1 == 0 ) ) ) )' )
+
+    database.declareCut( '2Lep_1BJet',               '( nJets_OR_T_MV2c10_70 == 1 )' )
+    database.declareCut( '2Lep_2BJet',               '( nJets_OR_T_MV2c10_70 >= 2 )' )
+    database.declareCut( '2Lep_NBJet',               '( nJets_OR_T_MV2c10_70 >= 1 )' )
+    database.declareCut( '2Lep_NBJet_SR',		  '( nJets_OR_T_MV2c10_70 >= 1 && nJets_OR_T_MV2c10_70 <= 2 )' )
+    database.declareCut( '2Lep_MinNJet',		  '( nJets_OR_T >= 2 )' )
+    database.declareCut( '2Lep_NJet_SR',		  '( nJets_OR_T >= 4 )' )
+    database.declareCut( '2Lep_NJet_CR',		  '( nJets_OR_T >= 2 && nJets_OR_T <= 3 )' )
+    database.declareCut( '2Lep_SS',	          '( lep_ID_0 * lep_ID_1 > 0 )' )
+    database.declareCut( '2Lep_OS',		  '( !( lep_ID_0 * lep_ID_1 > 0 ) )' )
+    database.declareCut( '2Lep_NLep', 		  '( dilep_type > 0 )' )
+    #database.declareCut( '2Lep_pT',		  '( lep_Pt_1 > 15e3 )' )
+    database.declareCut( '2Lep_pT',		  '( lep_Pt_1 > 20e3 )' )
     if args.ICHEPSelection:
         database.getCut('2Lep_pT').cutstr =  '( lep_Pt_1 > 25e3 )' # 2LSS SR cut - ICHEP 2016
-    database.registerCut( Cut('2Lep_pT_MMRates',	  '( lep_Pt_1 > 15e3 )') )
-    database.registerCut( Cut('2Lep_pT_Relaxed',	  '( lep_Pt_0 > 25e3 && lep_Pt_1 > 10e3 )') )
-    database.registerCut( Cut('2Lep_SF_Event',		  '( dilep_type == 1 || dilep_type == 3 )') )
-    database.registerCut( Cut('2Lep_MuMu_Event',	  '( dilep_type == 1 )') )
-    database.registerCut( Cut('2Lep_ElEl_Event',	  '( dilep_type == 3 )') )
-    database.registerCut( Cut('2Lep_OF_Event',		  '( dilep_type == 2 )') )
-    database.registerCut( Cut('2Lep_MuEl_Event',	  '( dilep_type == 2 && TMath::Abs( lep_ID_0 ) == 13  )') )
-    database.registerCut( Cut('2Lep_ElMu_Event',	  '( dilep_type == 2 && TMath::Abs( lep_ID_0 ) == 11  )') )
-    database.registerCut( Cut('2Lep_Zsidescut',           '( ( dilep_type != 3 ) || ( TMath::Abs( Mll01 - 91.2e3 ) > 10e3 ) )' ) )  # Use this to require 2 SF electrons to be outside Z peak
-    database.registerCut( Cut('2Lep_Zpeakcut',            '( ( dilep_type == 2 ) || ( TMath::Abs( Mll01 - 91.2e3 ) < 30e3  ) )' ) ) # Use this to require 2 SF leptons to be around Z peak
-    database.registerCut( Cut('2Lep_Zmincut',             '( ( dilep_type == 2 ) || ( Mll01  > 20e3 ) )' ) )                        # Remove J/Psi, Upsilon peak in SF events
+    database.declareCut( '2Lep_pT_MMRates',	  '( lep_Pt_1 > 15e3 )' )
+    database.declareCut( '2Lep_pT_Relaxed',	  '( lep_Pt_0 > 25e3 && lep_Pt_1 > 10e3 )' )
+    database.declareCut( '2Lep_SF_Event',		  '( dilep_type == 1 || dilep_type == 3 )' )
+    database.declareCut( '2Lep_MuMu_Event',	  '( dilep_type == 1 )' )
+    database.declareCut( '2Lep_ElEl_Event',	  '( dilep_type == 3 )' )
+    database.declareCut( '2Lep_OF_Event',		  '( dilep_type == 2 )' )
+    database.declareCut( '2Lep_MuEl_Event',	  '( dilep_type == 2 && TMath::Abs( lep_ID_0 ) == 13  )' )
+    database.declareCut( '2Lep_ElMu_Event',	  '( dilep_type == 2 && TMath::Abs( lep_ID_0 ) == 11  )' )
+    database.declareCut( '2Lep_Zsidescut',           '( ( dilep_type != 3 ) || ( TMath::Abs( Mll01 - 91.2e3 ) > 10e3 ) )' )  # Use this to require 2 SF electrons to be outside Z peak
+    database.declareCut( '2Lep_Zpeakcut',            '( ( dilep_type == 2 ) || ( TMath::Abs( Mll01 - 91.2e3 ) < 30e3  ) )' ) # Use this to require 2 SF leptons to be around Z peak
+    database.declareCut( '2Lep_Zmincut',             '( ( dilep_type == 2 ) || ( Mll01  > 20e3 ) )' )                        # Remove J/Psi, Upsilon peak in SF events
     gROOT.LoadMacro("$ROOTCOREBIN/user_scripts/HTopMultilepAnalysis/ROOT_TTreeFormulas/largeEtaEvent.cxx+")
     from ROOT import largeEtaEvent
-    database.registerCut( Cut('2Lep_ElEtaCut',            '( largeEtaEvent( dilep_type,lep_ID_0,lep_ID_1,lep_EtaBE2_0,lep_EtaBE2_1 ) == 0 )') )
+    database.declareCut( '2Lep_ElEtaCut',            '( largeEtaEvent( dilep_type,lep_ID_0,lep_ID_1,lep_EtaBE2_0,lep_EtaBE2_1 ) == 0 )' )
 
     # ------------------
     # Tag and probe cuts
@@ -474,23 +538,23 @@ if __name__ == "__main__":
 
         trig_tag = "SLT"
 
-        database.registerCut( Cut('2Lep_LepTagTightTrigMatched',   '( event_isBadTP_SLT == 0 )') ) # The presence of a T (& T.M.) lepton to tag the event is implemented in the MiniNTup code. The reason is b/c vector branches are used, and for the Real CR both leptons can be the tag.
-        database.registerCut( Cut('2Lep_LepTagTrigMatched',        '( lep_Tag_' + trig_tag + '_isTrigMatch == 1 )') )
-        database.registerCut( Cut('2Lep_LepProbeTrigMatched',      '( lep_Probe_' + trig_tag + '_isTrigMatch == 1 )') )
-        database.registerCut( Cut('2Lep_LepProbeAntiTrigMatched',  '( lep_Probe_' + trig_tag + '_isTrigMatch == 0 )') )
-        database.registerCut( Cut('2Lep_ElTag',                    '( TMath::Abs( lep_Tag_' + trig_tag + '_ID ) == 11 )') )
-        database.registerCut( Cut('2Lep_MuTag',                    '( TMath::Abs( lep_Tag_' + trig_tag + '_ID ) == 13 )') )
-        database.registerCut( Cut('2Lep_ElProbe',                  '( 1 )') ) # Now T&P uses vector branches for probe electron and muon: do not specify the flavour of the probe (this is particularly crucial for the Real CR, where in the ambiguous "both T&TM leptons" case there is no distinction between T&P)
-        database.registerCut( Cut('2Lep_MuProbe',                  '( 1 )') ) # Now T&P uses vector branches for probe electron and muon: do not specify the flavour of the probe (this is particularly crucial for the Real CR, where in the ambiguous "both T&TM leptons" case there is no distinction between T&P)
-        database.registerCut( Cut('2Lep_ProbeTight',               '( lep_Probe_' + trig_tag + '_isTightSelectedMVA == 1 )') )
-        database.registerCut( Cut('2Lep_ProbeAntiTight',           '( lep_Probe_' + trig_tag + '_isTightSelectedMVA == 0 )') )
-        database.registerCut( Cut('2Lep_TagAndProbe_GoodEvent',    '( event_isBadTP_' + trig_tag + ' == 0 )') )
-        database.registerCut( Cut('2Lep_ElTagEtaCut',              '( ( TMath::Abs( lep_Tag_' + trig_tag + '_ID ) == 13 ) || ( TMath::Abs( lep_Tag_' + trig_tag + '_ID ) == 11 && TMath::Abs( lep_Tag_' + trig_tag + '_EtaBE2 ) < 1.37 ) )') )
-        database.registerCut( Cut('2Lep_TagVeryTightSelected',     '( lep_Tag_' + trig_tag + '_ptVarcone30/lep_Tag_' + trig_tag + '_Pt < 0.01 )' ) ) # Tighten the track iso of the tag to increase fake purity for the probe (was used in v24)
+        database.declareCut( '2Lep_LepTagTightTrigMatched',   '( event_isBadTP_SLT == 0 )' ) # The presence of a T (& T.M.) lepton to tag the event is implemented in the MiniNTup code. The reason is b/c vector branches are used, and for the Real CR both leptons can be the tag.
+        database.declareCut( '2Lep_LepTagTrigMatched',        '( lep_Tag_' + trig_tag + '_isTrigMatch == 1 )' )
+        database.declareCut( '2Lep_LepProbeTrigMatched',      '( lep_Probe_' + trig_tag + '_isTrigMatch == 1 )' )
+        database.declareCut( '2Lep_LepProbeAntiTrigMatched',  '( lep_Probe_' + trig_tag + '_isTrigMatch == 0 )' )
+        database.declareCut( '2Lep_ElTag',                    '( TMath::Abs( lep_Tag_' + trig_tag + '_ID ) == 11 )' )
+        database.declareCut( '2Lep_MuTag',                    '( TMath::Abs( lep_Tag_' + trig_tag + '_ID ) == 13 )' )
+        database.declareCut( '2Lep_ElProbe',                  '( 1 )' ) # Now T&P uses vector branches for probe electron and muon: do not specify the flavour of the probe (this is particularly crucial for the Real CR, where in the ambiguous "both T&TM leptons" case there is no distinction between T&P)
+        database.declareCut( '2Lep_MuProbe',                  '( 1 )' ) # Now T&P uses vector branches for probe electron and muon: do not specify the flavour of the probe (this is particularly crucial for the Real CR, where in the ambiguous "both T&TM leptons" case there is no distinction between T&P)
+        database.declareCut( '2Lep_ProbeTight',               '( lep_Probe_' + trig_tag + '_isTightSelectedMVA == 1 )' )
+        database.declareCut( '2Lep_ProbeAntiTight',           '( lep_Probe_' + trig_tag + '_isTightSelectedMVA == 0 )' )
+        database.declareCut( '2Lep_TagAndProbe_GoodEvent',    '( event_isBadTP_' + trig_tag + ' == 0 )' )
+        database.declareCut( '2Lep_ElTagEtaCut',              '( ( TMath::Abs( lep_Tag_' + trig_tag + '_ID ) == 13 ) || ( TMath::Abs( lep_Tag_' + trig_tag + '_ID ) == 11 && TMath::Abs( lep_Tag_' + trig_tag + '_EtaBE2 ) < 1.37 ) )' )
+        database.declareCut( '2Lep_TagVeryTightSelected',     '( lep_Tag_' + trig_tag + '_ptVarcone30/lep_Tag_' + trig_tag + '_Pt < 0.01 )' ) # Tighten the track iso of the tag to increase fake purity for the probe (was used in v24)
         # gROOT.LoadMacro("$ROOTCOREBIN/user_scripts/HTopMultilepAnalysis/ROOT_TTreeFormulas/allElectronsQMisIDBDTLoose.cxx+")
         # from ROOT import allElectronsQMisIDBDTLoose
-        # database.registerCut( Cut('2Lep_ElQMisIDBDT',              '( allElectronsQMisIDBDTLoose( dilep_type, lep_ID_0, lep_ID_1, lep_chargeIDBDTLoose_0, lep_chargeIDBDTLoose_1, 0.10083 ) )') )
-        database.registerCut( Cut('2Lep_ElQMisIDBDT',              '( 1 )') )
+        # database.declareCut( '2Lep_ElQMisIDBDT',              '( allElectronsQMisIDBDTLoose( dilep_type, lep_ID_0, lep_ID_1, lep_chargeIDBDTLoose_0, lep_chargeIDBDTLoose_1, 0.10083 ) )' )
+        database.declareCut( '2Lep_ElQMisIDBDT',              '( 1 )' )
 
         if "TRUTH_TP" in args.channel or doFakeOriginFrac:
             database.getCut('2Lep_LepTagTightTrigMatched').cutstr = '( lep_Tag_' + trig_tag + '_isTightSelectedMVA == 1 && lep_Tag_' + trig_tag + '_isTrigMatch == 1 )'
@@ -513,11 +577,11 @@ if __name__ == "__main__":
     # Z peak [+- 15 GeV] veto in ee
     # MET > 50 GeV in ee
 
-    database.registerCut( Cut('2Lep_HTJ_ttW',        '( dilep_type == 1 || HT_jets > 220e3 )') )
-    database.registerCut( Cut('2Lep_MET_ttW',        '( dilep_type != 3 || ( MET_RefFinal_et > 50e3 ) )') )
-    database.registerCut( Cut('2Lep_Zsidescut_ttW',  '( dilep_type != 3 || ( Mll01 < 75e3 || Mll01 > 105e3 ) )') )
-    database.registerCut( Cut('2Lep_NJet_ttW',       '( nJets_OR_T >= 2 && nJets_OR_T <= 4 )') )
-    database.registerCut( Cut('2Lep_NBJet_ttW',      '( nJets_OR_T_MV2c10_70 >= 2 )') )
+    database.declareCut( '2Lep_HTJ_ttW',        '( dilep_type == 1 || HT_jets > 220e3 )' )
+    database.declareCut( '2Lep_MET_ttW',        '( dilep_type != 3 || ( MET_RefFinal_et > 50e3 ) )' )
+    database.declareCut( '2Lep_Zsidescut_ttW',  '( dilep_type != 3 || ( Mll01 < 75e3 || Mll01 > 105e3 ) )' )
+    database.declareCut( '2Lep_NJet_ttW',       '( nJets_OR_T >= 2 && nJets_OR_T <= 4 )' )
+    database.declareCut( '2Lep_NBJet_ttW',      '( nJets_OR_T_MV2c10_70 >= 2 )' )
 
     # -------------------
     # TRUTH MATCHING CUTS
@@ -580,7 +644,7 @@ if __name__ == "__main__":
 
     # cutstr_2Lep_TRUTH_PurePromptEvent = "( ( mc_channel_number == 0 ) || ( ( ( lep_isPrompt_0 == 1 || ( lep_isBrems_0 == 1 && lep_isQMisID_0 == 0 ) ) && ( lep_isPrompt_1 == 1 || ( lep_isBrems_1 == 1 && lep_isQMisID_1 == 0 ) ) ) && ( isQMisIDEvent == 0 ) ) )"
     cutstr_2Lep_TRUTH_PurePromptEvent = "( ( mc_channel_number == 0 ) || ( ( {0} || {1} || {2} ) && ( {3} || {4} || {5} ) && !{6} ) )".format(lep0_prompt,lep0_bremsprompt,lep0_gammastar,lep1_prompt,lep1_bremsprompt,lep1_gammastar,isqmisidevent)
-    database.registerCut( Cut("2Lep_TRUTH_PurePromptEvent", cutstr_2Lep_TRUTH_PurePromptEvent) )
+    database.declareCut( "2Lep_TRUTH_PurePromptEvent", cutstr_2Lep_TRUTH_PurePromptEvent )
 
     # 2.
     #
@@ -591,7 +655,7 @@ if __name__ == "__main__":
 
     ###cutsr_2Lep_TRUTH_NonPromptEvent = "( ( mc_channel_number == 0 ) || ( ( ( !{0} && !{1} ) || ( !{2} && !{3} ) ) && !{4} ) )".format(lep0_prompt,lep0_bremsprompt,lep1_prompt,lep1_bremsprompt,isqmisidevent)
     cutsr_2Lep_TRUTH_NonPromptEvent = "( ( mc_channel_number == 0 ) || ( ( !{0} || !{1} ) && !{2} ) )".format(lep0_prompt,lep1_prompt,isqmisidevent)
-    database.registerCut( Cut("2Lep_TRUTH_NonPromptEvent", cutsr_2Lep_TRUTH_NonPromptEvent) )
+    database.declareCut( "2Lep_TRUTH_NonPromptEvent", cutsr_2Lep_TRUTH_NonPromptEvent )
 
     # 3.
     #
@@ -599,7 +663,7 @@ if __name__ == "__main__":
 
     # cutsr_2Lep_TRUTH_QMisIDEvent = "( ( mc_channel_number == 0 ) || ( ( isQMisIDEvent == 1 ) ) )"
     cutsr_2Lep_TRUTH_QMisIDEvent = "( ( mc_channel_number == 0 ) || ( {0} ) )".format(isqmisidevent)
-    database.registerCut( Cut("2Lep_TRUTH_QMisIDEvent", cutsr_2Lep_TRUTH_QMisIDEvent) )
+    database.declareCut( "2Lep_TRUTH_QMisIDEvent", cutsr_2Lep_TRUTH_QMisIDEvent )
 
     # 4.
     #
@@ -607,7 +671,7 @@ if __name__ == "__main__":
 
     # cutstr_2Lep_TRUTH_QMisIDVeto = "( ( mc_channel_number == 0 ) || ( isQMisIDEvent == 0 ) )"
     cutstr_2Lep_TRUTH_QMisIDVeto = "( ( mc_channel_number == 0 ) || ( !{0} ) )".format(isqmisidevent)
-    database.registerCut( Cut("2Lep_TRUTH_QMisIDVeto", cutstr_2Lep_TRUTH_QMisIDVeto) )
+    database.declareCut( "2Lep_TRUTH_QMisIDVeto", cutstr_2Lep_TRUTH_QMisIDVeto )
 
     # ------------------------------------------------------------------------------
 
@@ -617,14 +681,14 @@ if __name__ == "__main__":
 
     cutsr_2Lep_TRUTH_1Prompt1NonPromptEvent = "( ( mc_channel_number == 0 ) || ( ( ( ( lep_isPrompt_1 == 0 && !( lep_isBrems_1 == 1 && lep_isQMisID_1 == 0 ) ) && ( lep_isPrompt_0 == 1 || ( lep_isBrems_0 == 1 && lep_isQMisID_0 == 0 ) ) ) || ( ( lep_isPrompt_0 == 0 && !( lep_isBrems_0 == 1 && lep_isQMisID_0 == 0 ) ) && ( lep_isPrompt_1 == 1 || ( lep_isBrems_1 == 1 && lep_isQMisID_1 == 0 ) ) ) ) && ( isQMisIDEvent == 0 ) ) )"
     #cutsr_2Lep_TRUTH_1Prompt1NonPromptEvent = "( ( mc_channel_number == 0 ) || ( ( ( lep_isPrompt_1 == 0 && lep_isPrompt_0 == 1 ) || ( lep_isPrompt_0 == 0 && lep_isPrompt_1 == 1 ) ) && ( isQMisIDEvent == 0 ) ) )"
-    database.registerCut( Cut("2Lep_TRUTH_1Prompt1NonPromptEvent", cutsr_2Lep_TRUTH_1Prompt1NonPromptEvent) )
+    database.declareCut( "2Lep_TRUTH_1Prompt1NonPromptEvent", cutsr_2Lep_TRUTH_1Prompt1NonPromptEvent )
 
     # 2b.
     #
     # Event passes this cut if ALL leptons are !prompt (MCTruthClassifier --> !Iso), and none is charge flip.
 
     cutsr_2Lep_TRUTH_2NonPromptEvent = "( ( mc_channel_number == 0 ) || ( ( lep_isPrompt_1 == 0 && !( lep_isBrems_1 == 1 && lep_isQMisID_1 == 0 ) ) && ( lep_isPrompt_0 == 0 && !( lep_isBrems_0 == 1 && lep_isQMisID_0 == 0 ) ) && ( isQMisIDEvent == 0 ) ) )"
-    database.registerCut( Cut("2Lep_TRUTH_2NonPromptEvent", cutsr_2Lep_TRUTH_2NonPromptEvent) )
+    database.declareCut( "2Lep_TRUTH_2NonPromptEvent", cutsr_2Lep_TRUTH_2NonPromptEvent )
 
     # 3a.
     #
@@ -632,52 +696,52 @@ if __name__ == "__main__":
 
     cutsr_2Lep_TRUTH_1Prompt1QMisIDEvent = "( ( mc_channel_number == 0 ) || ( ( lep_isQMisID_1 == 1 && ( lep_isPrompt_0 == 1 || ( lep_isBrems_0 == 1 && lep_isQMisID_0 == 0 ) ) ) || ( ( lep_isPrompt_1 == 1 || ( lep_isBrems_1 == 1 && lep_isQMisID_1 == 0 ) ) && lep_isQMisID_0 == 1 ) ) )"
     #cutsr_2Lep_TRUTH_1Prompt1QMisIDEvent = "( ( mc_channel_number == 0 ) || ( ( lep_isQMisID_1 == 1 && ( lep_isPrompt_0 == 1 ) ) || ( ( lep_isPrompt_1 == 1 ) && lep_isQMisID_0 == 1 ) ) )"
-    database.registerCut( Cut("2Lep_TRUTH_1Prompt1QMisIDEvent", cutsr_2Lep_TRUTH_1Prompt1QMisIDEvent) )
+    database.declareCut( "2Lep_TRUTH_1Prompt1QMisIDEvent", cutsr_2Lep_TRUTH_1Prompt1QMisIDEvent )
 
     # 3b.
     #
     # Event passes this cut if AT LEAST ONE lepton is (prompt and charge flip) (it will be a charge-misId charge flip)
 
     cutsr_2Lep_TRUTH_QMisIDPromptEvent = "( ( mc_channel_number == 0 ) || ( ( ( lep_isQMisID_0 == 1 && lep_isPrompt_0 == 1 ) || ( lep_isQMisID_1 == 1 && lep_isPrompt_1 == 1 ) ) ) )"
-    database.registerCut( Cut("2Lep_TRUTH_QMisIDPromptEvent", cutsr_2Lep_TRUTH_QMisIDPromptEvent) )
+    database.declareCut( "2Lep_TRUTH_QMisIDPromptEvent", cutsr_2Lep_TRUTH_QMisIDPromptEvent )
 
     # 3c.
     #
     # Event passes this cut if AT LEAST ONE object is charge flip from bremsstrahlung (this will be a trident charge flip)
 
     cutstr_2Lep_TRUTH_QMisIDBremEvent = "( ( mc_channel_number == 0 ) || ( ( ( lep_isBrems_0 == 1 && lep_isQMisID_0 == 1 ) || ( lep_isBrems_1 == 1 && lep_isQMisID_1 == 1 ) ) ) )"
-    database.registerCut( Cut("2Lep_TRUTH_QMisIDBremEvent", cutstr_2Lep_TRUTH_QMisIDBremEvent) )
+    database.declareCut( "2Lep_TRUTH_QMisIDBremEvent", cutstr_2Lep_TRUTH_QMisIDBremEvent )
 
     # 3d.
     #
     # Event passes this cut if AT LEAST ONE lepton is (!prompt and charge flip)
 
     cutstr_2Lep_TRUTH_QMisIDNonPromptEvent = "( ( mc_channel_number == 0 ) || ( ( ( lep_isQMisID_0 == 1 && lep_isPrompt_0 == 0 ) || ( lep_isQMisID_1 == 1 && lep_isPrompt_1 == 0 ) ) ) )"
-    database.registerCut( Cut("2Lep_TRUTH_QMisIDNonPromptEvent", cutstr_2Lep_TRUTH_QMisIDNonPromptEvent) )
+    database.declareCut( "2Lep_TRUTH_QMisIDNonPromptEvent", cutstr_2Lep_TRUTH_QMisIDNonPromptEvent )
 
     # 4.a
     #
     # Event passes this cut if NONE of the leptons is charge flip / from photon conversion
 
     cutstr_2Lep_TRUTH_QMisIDANDConvPhVeto = "( ( mc_channel_number == 0 ) || ( isQMisIDEvent == 0 && isLepFromPhEvent == 0 ) )"
-    database.registerCut( Cut("2Lep_TRUTH_QMisIDANDConvPhVeto", cutstr_2Lep_TRUTH_QMisIDANDConvPhVeto) )
+    database.declareCut( "2Lep_TRUTH_QMisIDANDConvPhVeto", cutstr_2Lep_TRUTH_QMisIDANDConvPhVeto )
 
     # 5.
     #
     # Event passes this cut if AT LEAST ONE lepton is from a primary photon conversion
 
-    database.registerCut( Cut("2Lep_TRUTH_LepFromPhEvent", "( ( mc_channel_number == 0 ) || ( isLepFromPhEvent == 1 ) )") )
+    database.declareCut( "2Lep_TRUTH_LepFromPhEvent", "( ( mc_channel_number == 0 ) || ( isLepFromPhEvent == 1 ) )" )
 
     # 6.
     #
     # Event passes this cut if AT LEAST ONE lepton is charge flip OR from a primary photon conversion
 
-    database.registerCut( Cut("2Lep_TRUTH_QMisIDORLepFromPhEvent", "( ( mc_channel_number == 0 ) || ( ( isQMisIDEvent == 1 || isLepFromPhEvent == 1 ) ) )") )
+    database.declareCut( "2Lep_TRUTH_QMisIDORLepFromPhEvent", "( ( mc_channel_number == 0 ) || ( ( isQMisIDEvent == 1 || isLepFromPhEvent == 1 ) ) )" )
 
     # 6a.
     # Event passes this cut if AT LEAST ONE lepton is coming from ISR/FSR photon
 
-    database.registerCut( Cut("2Lep_TRUTH_ISRPhEvent",  "( ( mc_channel_number == 0 ) || ( ( lep_isISRFSRPh_0 == 1 || lep_isISRFSRPh_1 == 1 ) ) )") )
+    database.declareCut( "2Lep_TRUTH_ISRPhEvent",  "( ( mc_channel_number == 0 ) || ( ( lep_isISRFSRPh_0 == 1 || lep_isISRFSRPh_1 == 1 ) ) )" )
 
 
     # ------------------------------------------------------------------------------
@@ -688,12 +752,12 @@ if __name__ == "__main__":
 
         trig_tag = "SLT"
 
-        # database.registerCut( Cut('2Lep_TRUTH_ProbePromptEvent',             '( ( mc_channel_number == 0 ) || ( ( ( lep_Probe_' + trig_tag + '_isPrompt == 1 || ( lep_Probe_' + trig_tag + '_isBrems == 1 && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) )') )
-        # database.registerCut( Cut('2Lep_TRUTH_ProbeNonPromptEvent',          '( ( mc_channel_number == 0 ) || ( ( ( lep_Probe_' + trig_tag + '_isPrompt == 0 && !( lep_Probe_' + trig_tag + '_isBrems == 1 && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) )') )
-        # database.registerCut( Cut('2Lep_TRUTH_ProbeNonPromptOrQMisIDEvent',  '( ( mc_channel_number == 0 ) || ( ( ( lep_Probe_' + trig_tag + '_isPrompt == 0 && !( lep_Probe_' + trig_tag + '_isBrems == 1 && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) || lep_Probe_' + trig_tag + '_isQMisID == 1 ) ) )') )
-        # database.registerCut( Cut('2Lep_TRUTH_ProbeQMisIDEvent',             '( ( mc_channel_number == 0 ) || ( ( lep_Probe_' + trig_tag + '_isQMisID == 1 ) ) )') )
-        # ## database.registerCut( Cut('2Lep_TRUTH_ProbeLepFromPhEvent',          '( ( mc_channel_number == 0 ) || ( ( lep_Probe_' + trig_tag + '_isConvPh == 1 || lep_Probe_' + trig_tag + '_isISRFSRPh == 1 ) ) )') )
-        # database.registerCut( Cut('2Lep_TRUTH_ProbeLepFromPhEvent',          '( ( mc_channel_number == 0 ) || ( ( lep_Probe_' + trig_tag + '_truthType == 4 && lep_Probe_' + trig_tag + '_truthOrigin == 5 && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) )') )
+        # database.declareCut( '2Lep_TRUTH_ProbePromptEvent',             '( ( mc_channel_number == 0 ) || ( ( ( lep_Probe_' + trig_tag + '_isPrompt == 1 || ( lep_Probe_' + trig_tag + '_isBrems == 1 && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) )' )
+        # database.declareCut( '2Lep_TRUTH_ProbeNonPromptEvent',          '( ( mc_channel_number == 0 ) || ( ( ( lep_Probe_' + trig_tag + '_isPrompt == 0 && !( lep_Probe_' + trig_tag + '_isBrems == 1 && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) )' )
+        # database.declareCut( '2Lep_TRUTH_ProbeNonPromptOrQMisIDEvent',  '( ( mc_channel_number == 0 ) || ( ( ( lep_Probe_' + trig_tag + '_isPrompt == 0 && !( lep_Probe_' + trig_tag + '_isBrems == 1 && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) || lep_Probe_' + trig_tag + '_isQMisID == 1 ) ) )' )
+        # database.declareCut( '2Lep_TRUTH_ProbeQMisIDEvent',             '( ( mc_channel_number == 0 ) || ( ( lep_Probe_' + trig_tag + '_isQMisID == 1 ) ) )' )
+        # ## database.declareCut( '2Lep_TRUTH_ProbeLepFromPhEvent',          '( ( mc_channel_number == 0 ) || ( ( lep_Probe_' + trig_tag + '_isConvPh == 1 || lep_Probe_' + trig_tag + '_isISRFSRPh == 1 ) ) )' )
+        # database.declareCut( '2Lep_TRUTH_ProbeLepFromPhEvent',          '( ( mc_channel_number == 0 ) || ( ( lep_Probe_' + trig_tag + '_truthType == 4 && lep_Probe_' + trig_tag + '_truthOrigin == 5 && lep_Probe_' + trig_tag + '_isQMisID == 0 ) ) )' )
 
         # lep_probe_prompt      = "( lep_Probe_" + trig_tag + "_isPrompt )"
         # lep_probe_bremsprompt = "( lep_Probe_" + trig_tag + "_truthType == 4 && lep_Probe_" + trig_tag + "_truthOrigin == 5 && lep_Probe_" + trig_tag + "_truthParentType == 2 && lep_Probe_" + trig_tag + "_truthParentOrigin == 10 && lep_Probe_" + trig_tag + "_ID/lep_Probe_" + trig_tag + "_truthParentPdgId == 1.0 )"
@@ -709,40 +773,40 @@ if __name__ == "__main__":
         lep_probe_fromjet     = "( !{0} && !{1} && !{2} && !{3} )".format(lep_probe_prompt,lep_probe_bremsprompt,lep_probe_qmisid,lep_probe_photonconv)
 
         cutstr_2Lep_TRUTH_ProbePromptEvent = "( ( mc_channel_number == 0 ) || ( ( {0} || {1} ) && !{2} ) )".format(lep_probe_prompt,lep_probe_bremsprompt,lep_probe_qmisid)
-        database.registerCut( Cut("2Lep_TRUTH_ProbePromptEvent", cutstr_2Lep_TRUTH_ProbePromptEvent) )
+        database.declareCut( "2Lep_TRUTH_ProbePromptEvent", cutstr_2Lep_TRUTH_ProbePromptEvent )
 
         cutsr_2Lep_TRUTH_ProbeNonPromptEvent = "( ( mc_channel_number == 0 ) || ( {0} ) )".format(lep_probe_nonprompt)
-        database.registerCut( Cut("2Lep_TRUTH_ProbeNonPromptEvent", cutsr_2Lep_TRUTH_ProbeNonPromptEvent) )
+        database.declareCut( "2Lep_TRUTH_ProbeNonPromptEvent", cutsr_2Lep_TRUTH_ProbeNonPromptEvent )
 
         cutsr_2Lep_TRUTH_ProbeQMisIDEvent = "( ( mc_channel_number == 0 ) || ( {0} ) )".format(lep_probe_qmisid)
-        database.registerCut( Cut("2Lep_TRUTH_ProbeQMisIDEvent", cutsr_2Lep_TRUTH_ProbeQMisIDEvent) )
+        database.declareCut( "2Lep_TRUTH_ProbeQMisIDEvent", cutsr_2Lep_TRUTH_ProbeQMisIDEvent )
 
         cutstr_2Lep_TRUTH_ProbeLepFromPhEvent = "( ( mc_channel_number == 0 ) || ( {0} ) )".format(lep_probe_photonconv)
-        database.registerCut( Cut("2Lep_TRUTH_ProbeLepFromPhEvent", cutstr_2Lep_TRUTH_ProbeLepFromPhEvent) )
+        database.declareCut( "2Lep_TRUTH_ProbeLepFromPhEvent", cutstr_2Lep_TRUTH_ProbeLepFromPhEvent )
 
         cutsr_2Lep_TRUTH_ProbeLepFromJetEvent = "( ( mc_channel_number == 0 ) || ( {0} ) )".format(lep_probe_fromjet)
-        database.registerCut( Cut("2Lep_TRUTH_ProbeLepFromJetEvent", cutsr_2Lep_TRUTH_ProbeLepFromJetEvent) )
+        database.declareCut( "2Lep_TRUTH_ProbeLepFromJetEvent", cutsr_2Lep_TRUTH_ProbeLepFromJetEvent )
 
 
     # ---------
     # 3lep cuts
     # ---------
 
-    database.registerCut( Cut('3Lep_NLep',         '( trilep_type > 0 )') )
-    database.registerCut( Cut('3Lep_pT',           '( lep_Pt_1 > 15e3 && lep_Pt_2 > 15e3 )') )
-    database.registerCut( Cut('3Lep_Charge',       '( TMath::Abs(total_charge) == 1 )') )
-    database.registerCut( Cut('3Lep_TT',           '( lep_isTightSelectedMVA_1 && lep_isTightSelectedMVA_2 )') )
+    database.declareCut( '3Lep_NLep',         '( trilep_type > 0 )' )
+    database.declareCut( '3Lep_pT',           '( lep_Pt_1 > 15e3 && lep_Pt_2 > 15e3 )' )
+    database.declareCut( '3Lep_Charge',       '( TMath::Abs(total_charge) == 1 )' )
+    database.declareCut( '3Lep_TT',           '( lep_isTightSelectedMVA_1 && lep_isTightSelectedMVA_2 )' )
     if "SLT_OR_DLT" in args.trigger:
-        # database.registerCut( Cut('3Lep_TrigMatch', '( 1 )') ) # trigger matching already implemented in trigger selection cut
-        database.registerCut( Cut('3Lep_TrigMatch', '( lep_isTrigMatch_0 || lep_isTrigMatch_1 || lep_isTrigMatch_2 || matchDLTll01 || matchDLTll02 || matchDLTll12 )') )
+        # database.declareCut( '3Lep_TrigMatch', '( 1 )' ) # trigger matching already implemented in trigger selection cut
+        database.declareCut( '3Lep_TrigMatch', '( lep_isTrigMatch_0 || lep_isTrigMatch_1 || lep_isTrigMatch_2 || matchDLTll01 || matchDLTll02 || matchDLTll12 )' )
     elif "SLT" in args.trigger:
-        database.registerCut( Cut('3Lep_TrigMatch', '( lep_isTrigMatch_0 || lep_isTrigMatch_1 || lep_isTrigMatch_2 )') )
+        database.declareCut( '3Lep_TrigMatch', '( lep_isTrigMatch_0 || lep_isTrigMatch_1 || lep_isTrigMatch_2 )' )
     elif "DLT" in args.trigger:
-        database.registerCut( Cut('3Lep_TrigMatch', '( matchDLTll01 || matchDLTll02 || matchDLTll12 )') )
-    database.registerCut( Cut('3Lep_ZVeto',        '( ( lep_ID_0 != -lep_ID_1 || TMath::Abs( Mll01 - 91.2e3 ) > 10e3 ) && ( lep_ID_0! = -lep_ID_2 || TMath::Abs( Mll02 - 91.2e3 ) > 10e3 ) )') )
-    database.registerCut( Cut('3Lep_MinZCut',      '( ( lep_ID_0 != -lep_ID_1 || Mll01 > 12e3 ) && ( lep_ID_0 != -lep_ID_2 || Mll02 > 12e3 ) )') )
-    database.registerCut( Cut('3Lep_ZllGammaVeto', '( TMath::Abs( Mlll012 - 91.2e3 ) > 10e3 )') )
-    database.registerCut( Cut('3Lep_NJets',        '( nJets_OR_T >= 2 && nJets_OR_T_MV2c10_70 >= 1 )') )
+        database.declareCut( '3Lep_TrigMatch', '( matchDLTll01 || matchDLTll02 || matchDLTll12 )' )
+    database.declareCut( '3Lep_ZVeto',        '( ( lep_ID_0 != -lep_ID_1 || TMath::Abs( Mll01 - 91.2e3 ) > 10e3 ) && ( lep_ID_0! = -lep_ID_2 || TMath::Abs( Mll02 - 91.2e3 ) > 10e3 ) )' )
+    database.declareCut( '3Lep_MinZCut',      '( ( lep_ID_0 != -lep_ID_1 || Mll01 > 12e3 ) && ( lep_ID_0 != -lep_ID_2 || Mll02 > 12e3 ) )' )
+    database.declareCut( '3Lep_ZllGammaVeto', '( TMath::Abs( Mlll012 - 91.2e3 ) > 10e3 )' )
+    database.declareCut( '3Lep_NJets',        '( nJets_OR_T >= 2 && nJets_OR_T_MV2c10_70 >= 1 )' )
 
     # -----------------------------
     # Event "tightness"
@@ -751,24 +815,24 @@ if __name__ == "__main__":
     # For 3L, use lep1,lep2
     # -----------------------------
 
-    database.registerCut( Cut('TT', '( is_TMVA_TMVA )') )
-    database.registerCut( Cut('TL', '( is_TMVA_AntiTMVA )') )
-    database.registerCut( Cut('LT', '( is_AntiTMVA_TMVA )') )
-    database.registerCut( Cut('LL', '( is_AntiTMVA_AntiTMVA )') )
+    database.declareCut( 'TT', '( is_TMVA_TMVA )' )
+    database.declareCut( 'TL', '( is_TMVA_AntiTMVA )' )
+    database.declareCut( 'LT', '( is_AntiTMVA_TMVA )' )
+    database.declareCut( 'LL', '( is_AntiTMVA_AntiTMVA )' )
 
     # ------------------------------
     # Sidebands definition for fakes
     # ------------------------------
 
-    database.registerCut( Cut('FakesSideband_TT',      '( is_TMVA_TMVA )') )
-    database.registerCut( Cut('FakesSideband_TL',      '( is_TMVA_AntiTMVA )') )
-    database.registerCut( Cut('FakesSideband_LT',      '( is_AntiTMVA_TMVA )') )
-    database.registerCut( Cut('FakesSideband_TL_LT',   '( is_TMVA_AntiTMVA || is_AntiTMVA_TMVA )') )
-    database.registerCut( Cut('FakesSideband_LL',      '( is_AntiTMVA_AntiTMVA )') )
-    database.registerCut( Cut('FakesSideband_TelLmu',  '( is_TMVAel_AntiTMVAmu )') )
-    database.registerCut( Cut('FakesSideband_LelTmu',  '( is_AntiTMVAel_TMVAmu )') )
-    database.registerCut( Cut('FakesSideband_TmuLel',  '( is_TMVAmu_AntiTMVAel )') )
-    database.registerCut( Cut('FakesSideband_LmuTel',  '( is_AntiTMVAmu_TMVAel )') )
+    database.declareCut( 'FakesSideband_TT',      '( is_TMVA_TMVA )' )
+    database.declareCut( 'FakesSideband_TL',      '( is_TMVA_AntiTMVA )' )
+    database.declareCut( 'FakesSideband_LT',      '( is_AntiTMVA_TMVA )' )
+    database.declareCut( 'FakesSideband_TL_LT',   '( is_TMVA_AntiTMVA || is_AntiTMVA_TMVA )' )
+    database.declareCut( 'FakesSideband_LL',      '( is_AntiTMVA_AntiTMVA )' )
+    database.declareCut( 'FakesSideband_TelLmu',  '( is_TMVAel_AntiTMVAmu )' )
+    database.declareCut( 'FakesSideband_LelTmu',  '( is_AntiTMVAel_TMVAmu )' )
+    database.declareCut( 'FakesSideband_TmuLel',  '( is_TMVAmu_AntiTMVAel )' )
+    database.declareCut( 'FakesSideband_LmuTel',  '( is_AntiTMVAmu_TMVAel )' )
 
     if args.cutBasedLepDef:
 
@@ -802,16 +866,16 @@ if __name__ == "__main__":
     # 2Lep SS + 1 tau cuts
     # ---------------------
 
-    database.registerCut( Cut('2Lep1Tau_NLep',         '( dilep_type > 0 )') )
-    database.registerCut( Cut('2Lep1Tau_TightLeptons', '( is_T_T == 1 )') )
-    database.registerCut( Cut('2Lep1Tau_pT',           '( lep_Pt_0 > 25e3 && lep_Pt_1 > 15e3  )') )
-    database.registerCut( Cut('2Lep1Tau_TrigMatch',    '( lep_isTrigMatch_0|| lep_isTrigMatch_1 )') )
-    database.registerCut( Cut('2Lep1Tau_SS',           '( lep_ID_0 * lep_ID_1 > 0 )') )
-    database.registerCut( Cut('2Lep1Tau_1Tau',         '( nTaus_OR_Pt25 == 1 && ( lep_ID_0 * tau_charge_0 ) < 0 )') )
-    database.registerCut( Cut('2Lep1Tau_Zsidescut',    '( dilep_type != 3 || TMath::Abs( Mll01 - 91.2e3 ) > 10e3 )' )  )
-    database.registerCut( Cut('2Lep1Tau_NJet_SR',      '( nJets_OR_T >= 4 )') )
-    database.registerCut( Cut('2Lep1Tau_NJet_CR',      '( nJets_OR_T > 1 && nJets_OR_T < 4 )') )
-    database.registerCut( Cut('2Lep1Tau_NBJet',        '( nJets_OR_T_MV2c10_70 > 0 )') )
+    database.declareCut( '2Lep1Tau_NLep',         '( dilep_type > 0 )' )
+    database.declareCut( '2Lep1Tau_TightLeptons', '( is_T_T == 1 )' )
+    database.declareCut( '2Lep1Tau_pT',           '( lep_Pt_0 > 25e3 && lep_Pt_1 > 15e3  )' )
+    database.declareCut( '2Lep1Tau_TrigMatch',    '( lep_isTrigMatch_0|| lep_isTrigMatch_1 )' )
+    database.declareCut( '2Lep1Tau_SS',           '( lep_ID_0 * lep_ID_1 > 0 )' )
+    database.declareCut( '2Lep1Tau_1Tau',         '( nTaus_OR_Pt25 == 1 && ( lep_ID_0 * tau_charge_0 ) < 0 )' )
+    database.declareCut( '2Lep1Tau_Zsidescut',    '( dilep_type != 3 || TMath::Abs( Mll01 - 91.2e3 ) > 10e3 )' )
+    database.declareCut( '2Lep1Tau_NJet_SR',      '( nJets_OR_T >= 4 )' )
+    database.declareCut( '2Lep1Tau_NJet_CR',      '( nJets_OR_T > 1 && nJets_OR_T < 4 )' )
+    database.declareCut( '2Lep1Tau_NBJet',        '( nJets_OR_T_MV2c10_70 > 0 )' )
 
     # ---------------------------
     # A list of variables to plot
@@ -849,140 +913,140 @@ if __name__ == "__main__":
 
     if doSR or do2LSS_LOWNJ_VR or do2LSS_HIGHNJ_BVETO_VR or doMMClosureTest:
         print ""
-        database.registerVar( Variable(shortname = "Integral", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0, sysvar = True) )
-        database.registerVar( Variable(shortname = 'NJets', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 10, minval = -0.5, maxval = 9.5, weight = 'JVT_EventWeight') )
-        database.registerVar( Variable(shortname = 'NJetsPlus10NBJets', latexname = 'N_{Jets}+10*N_{BJets}', ntuplename = 'nJets_OR_T+10.0*nJets_OR_T_MV2c10_70', bins = 40, minval = 0, maxval = 40, basecut = database.getCut('VetoLargeNBJet'), weight = 'JVT_EventWeight * MV2c10_Continuous_EventWeight') )
+        database.declareVar( shortname = "Integral", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0, sysvar = True )
+        database.declareVar( shortname = 'NJets', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 10, minval = -0.5, maxval = 9.5, weight = 'JVT_EventWeight' )
+        database.declareVar( shortname = 'NJetsPlus10NBJets', latexname = 'N_{Jets}+10*N_{BJets}', ntuplename = 'nJets_OR_T+10.0*nJets_OR_T_MV2c10_70', bins = 40, minval = 0, maxval = 40, basecut = database.getCut('VetoLargeNBJet'), weight = 'JVT_EventWeight * MV2c10_Continuous_EventWeight' )
         if "INCL_FLAV" in args.channel:
             print("Scheduling variables for {0}".format(args.channel))
-            database.registerVar( Variable(shortname = "LepFlavours", latexname = "Lepton flavour (2lSS0#tau)", ntuplename = "dilep_type", bins = 3, minval = 0.5, maxval = 3.5, binlabelsX = {1:"#mu#mu",2:"e#mu",3:"ee"}, sysvar = True) )
+            database.declareVar( shortname = "LepFlavours", latexname = "Lepton flavour (2lSS0#tau)", ntuplename = "dilep_type", bins = 3, minval = 0.5, maxval = 3.5, binlabelsX = {1:"#mu#mu",2:"e#mu",3:"ee"}, sysvar = True )
         if doSR or do2LSS_HIGHNJ_BVETO_VR or ( doMMClosureTest and "HIGHNJ" in args.channel ):
             print("Scheduling variables for {0}".format(args.channel))
-            database.registerVar( Variable(shortname = 'NJets4j', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 6, minval = 3.5, maxval = 9.5, weight = "JVT_EventWeight", sysvar = True) )
+            database.declareVar( shortname = 'NJets4j', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 6, minval = 3.5, maxval = 9.5, weight = "JVT_EventWeight", sysvar = True )
         elif do2LSS_LOWNJ_VR or ( doMMClosureTest and "LOWNJ" in args.channel ):
             print("Scheduling variables for {0}".format(args.channel))
-            database.registerVar( Variable(shortname = 'NJets2j3j', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 5, minval = 0.5, maxval = 5.5, weight = "JVT_EventWeight", sysvar = True) )
-        database.registerVar( Variable(shortname = "NBJets", latexname = "N_{b-tags}", ntuplename ="nJets_OR_T_MV2c10_70", bins = 5, minval = -0.5, maxval = 4.5, weight = "JVT_EventWeight * MV2c10_Continuous_EventWeight", sysvar = True) )
-        database.registerVar( Variable(shortname = "Mll01_inc", latexname = "m(l_{0}l_{1}) [GeV]", ntuplename = "Mll01/1e3", bins = 9, minval = 0.0, maxval = 225.0, logaxis = True, sysvar = True) )
-        database.registerVar( Variable(shortname = "MET_FinalTrk", latexname = "E_{T}^{miss} [GeV]", ntuplename = "MET_RefFinal_et/1e3", bins = 9, minval = 0.0, maxval = 225.0, logaxis = True, sysvar = True) )
-        database.registerVar( Variable(shortname = "deltaRLep0Lep1", latexname = "#DeltaR(l_{0},l_{1})", ntuplename = delta_R_lep0lep1, bins = 10, minval = 0.0, maxval = 5.0, logaxis = True, sysvar = True) )
-        database.registerVar( Variable(shortname = "deltaPhiLep0Lep1", latexname = "#Delta#phi(l_{0},l_{1})", ntuplename = delta_Phi_lep0lep1, bins = 10, minval = -3.14, maxval = 3.14, sysvar = True) )
-        database.registerVar( Variable(shortname = "TotLepCharge", latexname = "Tot. lep. charge", ntuplename = "total_charge", bins = 7, minval = -3.5, maxval = 3.5, sysvar = True) )
-        database.registerVar( Variable(shortname = "Lep0Pt", latexname = "p_{T}^{l_{0}} [GeV]", ntuplename = "lep_Pt_0/1e3", bins = 20, minval = 0.0, maxval = 200.0, sysvar = True ) )
-        database.registerVar( Variable(shortname = "Lep1Pt", latexname = "p_{T}^{l_{1}} [GeV]", ntuplename = "lep_Pt_1/1e3", bins = 10, minval = 0.0, maxval = 100.0, sysvar = True ) )
-        database.registerVar( Variable(shortname = "Lep0Eta", latexname = "#eta^{l_{0}}", ntuplename = "lep_Eta_0", manualbins = [-2.5,-1.9,-1.3,-0.7,-0.1,0.0,0.1,0.7,1.3,1.9,2.5], sysvar = True ) )
-        database.registerVar( Variable(shortname = "Lep1Eta", latexname = "#eta^{l_{1}}", ntuplename = "lep_Eta_1", manualbins = [-2.5,-1.9,-1.3,-0.7,-0.1,0.0,0.1,0.7,1.3,1.9,2.5], sysvar = True ) )
-        database.registerVar( Variable(shortname = "Lep0EtaBE2",latexname = "#eta^{l_{0}}", ntuplename = "lep_EtaBE2_0", manualbins = [-2.6,-2.0,-1.52,-1.37,-0.8,-0.5,0.0,0.5,0.8,1.37,1.52,2.0,2.6], sysvar = True ) )
-        database.registerVar( Variable(shortname = "Lep1EtaBE2",latexname = "#eta^{l_{1}}", ntuplename = "lep_EtaBE2_1", manualbins = [-2.6,-2.0,-1.52,-1.37,-0.8,-0.5,0.0,0.5,0.8,1.37,1.52,2.0,2.6], sysvar = True ) )
+            database.declareVar( shortname = 'NJets2j3j', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 5, minval = 0.5, maxval = 5.5, weight = "JVT_EventWeight", sysvar = True )
+        database.declareVar( shortname = "NBJets", latexname = "N_{b-tags}", ntuplename ="nJets_OR_T_MV2c10_70", bins = 5, minval = -0.5, maxval = 4.5, weight = "JVT_EventWeight * MV2c10_Continuous_EventWeight", sysvar = True )
+        database.declareVar( shortname = "Mll01_inc", latexname = "m(l_{0}l_{1}) [GeV]", ntuplename = "Mll01/1e3", bins = 9, minval = 0.0, maxval = 225.0, logaxis = True, sysvar = True )
+        database.declareVar( shortname = "MET_FinalTrk", latexname = "E_{T}^{miss} [GeV]", ntuplename = "MET_RefFinal_et/1e3", bins = 9, minval = 0.0, maxval = 225.0, logaxis = True, sysvar = True )
+        database.declareVar( shortname = "deltaRLep0Lep1", latexname = "#DeltaR(l_{0},l_{1})", ntuplename = delta_R_lep0lep1, bins = 10, minval = 0.0, maxval = 5.0, logaxis = True, sysvar = True )
+        database.declareVar( shortname = "deltaPhiLep0Lep1", latexname = "#Delta#phi(l_{0},l_{1})", ntuplename = delta_Phi_lep0lep1, bins = 10, minval = -3.14, maxval = 3.14, sysvar = True )
+        database.declareVar( shortname = "TotLepCharge", latexname = "Tot. lep. charge", ntuplename = "total_charge", bins = 7, minval = -3.5, maxval = 3.5, sysvar = True )
+        database.declareVar( shortname = "Lep0Pt", latexname = "p_{T}^{l_{0}} [GeV]", ntuplename = "lep_Pt_0/1e3", bins = 20, minval = 0.0, maxval = 200.0, sysvar = True )
+        database.declareVar( shortname = "Lep1Pt", latexname = "p_{T}^{l_{1}} [GeV]", ntuplename = "lep_Pt_1/1e3", bins = 10, minval = 0.0, maxval = 100.0, sysvar = True )
+        database.declareVar( shortname = "Lep0Eta", latexname = "#eta^{l_{0}}", ntuplename = "lep_Eta_0", manualbins = [-2.5,-1.9,-1.3,-0.7,-0.1,0.0,0.1,0.7,1.3,1.9,2.5], sysvar = True )
+        database.declareVar( shortname = "Lep1Eta", latexname = "#eta^{l_{1}}", ntuplename = "lep_Eta_1", manualbins = [-2.5,-1.9,-1.3,-0.7,-0.1,0.0,0.1,0.7,1.3,1.9,2.5], sysvar = True )
+        database.declareVar( shortname = "Lep0EtaBE2",latexname = "#eta^{l_{0}}", ntuplename = "lep_EtaBE2_0", manualbins = [-2.6,-2.0,-1.52,-1.37,-0.8,-0.5,0.0,0.5,0.8,1.37,1.52,2.0,2.6], sysvar = True )
+        database.declareVar( shortname = "Lep1EtaBE2",latexname = "#eta^{l_{1}}", ntuplename = "lep_EtaBE2_1", manualbins = [-2.6,-2.0,-1.52,-1.37,-0.8,-0.5,0.0,0.5,0.8,1.37,1.52,2.0,2.6], sysvar = True )
         if not args.readGFW2:
-            database.registerVar( Variable(shortname = "El0Pt", latexname = "p_{T}^{e_{0}} [GeV]", ntuplename = "electron_Pt[0]/1e3", bins = 20, minval = 0.0, maxval = 200.0, logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "El1Pt", latexname = "p_{T}^{e_{1}} [GeV]", ntuplename = "electron_Pt[1]/1e3", bins = 10, minval = 0.0, maxval = 100.0, logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "Mu0Pt", latexname = "p_{T}^{#mu_{0}} [GeV]", ntuplename = "muon_Pt[0]/1e3", bins = 20, minval = 0.0, maxval = 200.0, logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "Mu1Pt", latexname = "p_{T}^{#mu_{1}} [GeV]", ntuplename = "muon_Pt[1]/1e3", bins = 10, minval = 0.0, maxval = 100.0, logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "El0Eta",latexname = "#eta^{e_{0}}", ntuplename = "electron_EtaBE2[0]", manualbins = [-2.6,-2.0,-1.52,-1.37,-0.8,-0.5,0.0,0.5,0.8,1.37,1.52,2.0,2.6], logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "El1Eta",latexname = "#eta^{e_{1}}", ntuplename = "electron_EtaBE2[1]", manualbins = [-2.6,-2.0,-1.52,-1.37,-0.8,-0.5,0.0,0.5,0.8,1.37,1.52,2.0,2.6], logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "Mu0Eta",latexname = "#eta^{#mu_{0}}", ntuplename = "muon_Eta[0]", manualbins = [-2.5,-1.9,-1.3,-0.7,-0.1,0.0,0.1,0.7,1.3,1.9,2.5], logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "Mu1Eta",latexname = "#eta^{#mu_{1}}", ntuplename = "muon_Eta[1]", manualbins = [-2.5,-1.9,-1.3,-0.7,-0.1,0.0,0.1,0.7,1.3,1.9,2.5], logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "El0DeltaRClosestJet",latexname = "min #DeltaR(e_{0},j)", ntuplename = "electron_deltaRClosestJet[0]", bins = 9, minval = 0.0, maxval = 2.25, logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "El1DeltaRClosestJet",latexname = "min #DeltaR(e_{1},j)", ntuplename = "electron_deltaRClosestJet[1]", bins = 9, minval = 0.0, maxval = 2.25, logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "Mu0DeltaRClosestJet",latexname = "min #DeltaR(#mu_{0},j)", ntuplename = "muon_deltaRClosestJet[0]", bins = 9, minval = 0.0, maxval = 2.25, logaxis = True, sysvar = True) )
-            database.registerVar( Variable(shortname = "Mu1DeltaRClosestJet",latexname = "min #DeltaR(#mu_{1},j)", ntuplename = "muon_deltaRClosestJet[1]", bins = 9, minval = 0.0, maxval = 2.25, logaxis = True, sysvar = True) )
-            # database.registerVar( Variable(shortname = "El0DeltaRClosestJet",latexname = "#DeltaR{e_{0}, closest j}", ntuplename = "electron_deltaRClosestJet[0]", manualbins = [0.0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True ) )
-            # database.registerVar( Variable(shortname = "El1DeltaRClosestJet",latexname = "#DeltaR{e_{1}, closest j}", ntuplename = "electron_deltaRClosestJet[1]", manualbins = [0.0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True ) )
-            # database.registerVar( Variable(shortname = "Mu0DeltaRClosestJet",latexname = "#DeltaR{#mu_{0}, closest j}", ntuplename = "muon_deltaRClosestJet[0]", manualbins = [0,0.25,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True ) )
-            # database.registerVar( Variable(shortname = "Mu1DeltaRClosestJet",latexname = "#DeltaR{#mu_{1}, closest j}", ntuplename = "muon_deltaRClosestJet[1]", manualbins = [0,0.25,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True ) )
+            database.declareVar( shortname = "El0Pt", latexname = "p_{T}^{e_{0}} [GeV]", ntuplename = "electron_Pt[0]/1e3", bins = 20, minval = 0.0, maxval = 200.0, logaxis = True, sysvar = True )
+            database.declareVar( shortname = "El1Pt", latexname = "p_{T}^{e_{1}} [GeV]", ntuplename = "electron_Pt[1]/1e3", bins = 10, minval = 0.0, maxval = 100.0, logaxis = True, sysvar = True )
+            database.declareVar( shortname = "Mu0Pt", latexname = "p_{T}^{#mu_{0}} [GeV]", ntuplename = "muon_Pt[0]/1e3", bins = 20, minval = 0.0, maxval = 200.0, logaxis = True, sysvar = True )
+            database.declareVar( shortname = "Mu1Pt", latexname = "p_{T}^{#mu_{1}} [GeV]", ntuplename = "muon_Pt[1]/1e3", bins = 10, minval = 0.0, maxval = 100.0, logaxis = True, sysvar = True )
+            database.declareVar( shortname = "El0Eta",latexname = "#eta^{e_{0}}", ntuplename = "electron_EtaBE2[0]", manualbins = [-2.6,-2.0,-1.52,-1.37,-0.8,-0.5,0.0,0.5,0.8,1.37,1.52,2.0,2.6], logaxis = True, sysvar = True )
+            database.declareVar( shortname = "El1Eta",latexname = "#eta^{e_{1}}", ntuplename = "electron_EtaBE2[1]", manualbins = [-2.6,-2.0,-1.52,-1.37,-0.8,-0.5,0.0,0.5,0.8,1.37,1.52,2.0,2.6], logaxis = True, sysvar = True )
+            database.declareVar( shortname = "Mu0Eta",latexname = "#eta^{#mu_{0}}", ntuplename = "muon_Eta[0]", manualbins = [-2.5,-1.9,-1.3,-0.7,-0.1,0.0,0.1,0.7,1.3,1.9,2.5], logaxis = True, sysvar = True )
+            database.declareVar( shortname = "Mu1Eta",latexname = "#eta^{#mu_{1}}", ntuplename = "muon_Eta[1]", manualbins = [-2.5,-1.9,-1.3,-0.7,-0.1,0.0,0.1,0.7,1.3,1.9,2.5], logaxis = True, sysvar = True )
+            database.declareVar( shortname = "El0DeltaRClosestJet",latexname = "min #DeltaR(e_{0},j)", ntuplename = "electron_deltaRClosestJet[0]", bins = 9, minval = 0.0, maxval = 2.25, logaxis = True, sysvar = True )
+            database.declareVar( shortname = "El1DeltaRClosestJet",latexname = "min #DeltaR(e_{1},j)", ntuplename = "electron_deltaRClosestJet[1]", bins = 9, minval = 0.0, maxval = 2.25, logaxis = True, sysvar = True )
+            database.declareVar( shortname = "Mu0DeltaRClosestJet",latexname = "min #DeltaR(#mu_{0},j)", ntuplename = "muon_deltaRClosestJet[0]", bins = 9, minval = 0.0, maxval = 2.25, logaxis = True, sysvar = True )
+            database.declareVar( shortname = "Mu1DeltaRClosestJet",latexname = "min #DeltaR(#mu_{1},j)", ntuplename = "muon_deltaRClosestJet[1]", bins = 9, minval = 0.0, maxval = 2.25, logaxis = True, sysvar = True )
+            # database.declareVar( shortname = "El0DeltaRClosestJet",latexname = "#DeltaR{e_{0}, closest j}", ntuplename = "electron_deltaRClosestJet[0]", manualbins = [0.0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True )
+            # database.declareVar( shortname = "El1DeltaRClosestJet",latexname = "#DeltaR{e_{1}, closest j}", ntuplename = "electron_deltaRClosestJet[1]", manualbins = [0.0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True )
+            # database.declareVar( shortname = "Mu0DeltaRClosestJet",latexname = "#DeltaR{#mu_{0}, closest j}", ntuplename = "muon_deltaRClosestJet[0]", manualbins = [0,0.25,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True )
+            # database.declareVar( shortname = "Mu1DeltaRClosestJet",latexname = "#DeltaR{#mu_{1}, closest j}", ntuplename = "muon_deltaRClosestJet[1]", manualbins = [0,0.25,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True )
         if args.readGFW2:
-            database.registerVar( Variable(shortname = "Lep0DeltaRClosestJet",latexname = "#DeltaR{l_{0}, closest j}", ntuplename = "minDeltaR_LJ_0", manualbins = [0.0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True ) )
-            database.registerVar( Variable(shortname = "Lep1DeltaRClosestJet",latexname = "#DeltaR{l_{1}, closest j}", ntuplename = "minDeltaR_LJ_1", manualbins = [0.0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True ) )
-            # database.registerVar( Variable(shortname = "BDTGScore", latexname = "BDTG", ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0", manualbins = [-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], sysvar = True ) ) # <--- use this if pT(l) > 15 GeV
-            database.registerVar( Variable(shortname = "BDTGScore", latexname = "BDTG", ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0", manualbins = [-1,-0.1612,0.067,0.247,0.4142,0.5752,1], sysvar = True ) ) # <--- use this if pT(l) > 20 GeV
-            database.registerVar( Variable(shortname = "BDTGScore_ttH_ttbarDD", latexname = "BDTG (t#bar{t})", ntuplename = "MVA2lSSMarseille_weight_ttbar_2", bins = 20, minval = -1.0, maxval = 1.0, sysvar = True ) )
-            database.registerVar( Variable(shortname = "BDTGScore_ttH_ttV", latexname = "BDTG (ttV)", ntuplename = "MVA2lSSMarseille_weight_ttV_2", bins = 20, minval = -1.0, maxval = 1.0, sysvar = True, ) )
-            database.registerVar( Variable(shortname = 'BDTGScore_ttH_ttbarDD_VS_BDTGScore_ttH_ttV', latexnameX = 'BDTG (t#bar{t})', latexnameY = 'BDTG (ttV)', ntuplename = "MVA2lSSMarseille_weight_ttV_2:MVA2lSSMarseille_weight_ttbar_2", binsX = 20, minvalX = -1, maxvalX = 1, binsY = 20, minvalY = -1, maxvalY = 1, typeval = TH2D, drawOpt2D = "COLZ") )
+            database.declareVar( shortname = "Lep0DeltaRClosestJet",latexname = "#DeltaR{l_{0}, closest j}", ntuplename = "minDeltaR_LJ_0", manualbins = [0.0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True )
+            database.declareVar( shortname = "Lep1DeltaRClosestJet",latexname = "#DeltaR{l_{1}, closest j}", ntuplename = "minDeltaR_LJ_1", manualbins = [0.0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,2.5,3.0,5.0], sysvar = True )
+            # database.declareVar( shortname = "BDTGScore", latexname = "BDTG", ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0", manualbins = [-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], sysvar = True ) # <--- use this if pT(l) > 15 GeV
+            database.declareVar( shortname = "BDTGScore", latexname = "BDTG", ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0", manualbins = [-1,-0.1612,0.067,0.247,0.4142,0.5752,1], sysvar = True ) # <--- use this if pT(l) > 20 GeV
+            database.declareVar( shortname = "BDTGScore_ttH_ttbarDD", latexname = "BDTG (t#bar{t})", ntuplename = "MVA2lSSMarseille_weight_ttbar_2", bins = 20, minval = -1.0, maxval = 1.0, sysvar = True )
+            database.declareVar( shortname = "BDTGScore_ttH_ttV", latexname = "BDTG (ttV)", ntuplename = "MVA2lSSMarseille_weight_ttV_2", bins = 20, minval = -1.0, maxval = 1.0, sysvar = True, )
+            database.declareVar( shortname = 'BDTGScore_ttH_ttbarDD_VS_BDTGScore_ttH_ttV', latexnameX = 'BDTG (t#bar{t})', latexnameY = 'BDTG (ttV)', ntuplename = "MVA2lSSMarseille_weight_ttV_2:MVA2lSSMarseille_weight_ttbar_2", binsX = 20, minvalX = -1, maxvalX = 1, binsY = 20, minvalY = -1, maxvalY = 1, typeval = TH2D, drawOpt2D = "COLZ" )
         if args.useFriendTrees:
-            # database.registerVar( Variable(shortname = "NN_Rebinned", latexname = "NN", ntuplename = "output_bin", bins = 7, minval = -0.5, maxval = 6.5, sysvar = True ) )
-            # database.registerVar( Variable(shortname = "RNN_Rebinned", latexname = "RNN", ntuplename = "RNN_output_bin", bins = 7, minval = -0.5, maxval = 6.5, sysvar = True ) )
-            # database.registerVar( Variable(shortname = "NN_ttV", latexname = "NN_{ttV}", ntuplename = "output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
-            # database.registerVar( Variable(shortname = "NN_top", latexname = "NN_{top}", ntuplename = "output_top", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
-            # database.registerVar( Variable(shortname = "RNN_ttV", latexname = "RNN_{ttV}", ntuplename = "RNN_output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
-            # database.registerVar( Variable(shortname = "RNN_top", latexname = "RNN_{top}", ntuplename = "RNN_output_top", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
-            # database.registerVar( Variable(shortname = "NNComb", latexname = "NN Comb", ntuplename = dist_NN, bins = 18, minval = 0.10, maxval = 1.45, sysvar = True ) )
-            # database.registerVar( Variable(shortname = "RNNComb", latexname = "RNN Comb", ntuplename = dist_RNN, bins = 18, minval = 0.10, maxval = 1.45, sysvar = True ) )
+            # database.declareVar( shortname = "NN_Rebinned", latexname = "NN", ntuplename = "output_bin", bins = 7, minval = -0.5, maxval = 6.5, sysvar = True )
+            # database.declareVar( shortname = "RNN_Rebinned", latexname = "RNN", ntuplename = "RNN_output_bin", bins = 7, minval = -0.5, maxval = 6.5, sysvar = True )
+            # database.declareVar( shortname = "NN_ttV", latexname = "NN_{ttV}", ntuplename = "output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
+            # database.declareVar( shortname = "NN_top", latexname = "NN_{top}", ntuplename = "output_top", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
+            # database.declareVar( shortname = "RNN_ttV", latexname = "RNN_{ttV}", ntuplename = "RNN_output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
+            # database.declareVar( shortname = "RNN_top", latexname = "RNN_{top}", ntuplename = "RNN_output_top", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
+            # database.declareVar( shortname = "NNComb", latexname = "NN Comb", ntuplename = dist_NN, bins = 18, minval = 0.10, maxval = 1.45, sysvar = True )
+            # database.declareVar( shortname = "RNNComb", latexname = "RNN Comb", ntuplename = dist_RNN, bins = 18, minval = 0.10, maxval = 1.45, sysvar = True )
             #
-            database.registerVar( Variable(shortname = "NN_ttV", latexname = "NN_{ttV}", ntuplename = "output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
-            database.registerVar( Variable(shortname = "RNN_ttV", latexname = "RNN_{ttV}", ntuplename = "RNN_output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
-            database.registerVar( Variable(shortname = "NN_top", latexname = "NN_{top}", ntuplename = logistic_NN_top, bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
-            database.registerVar( Variable(shortname = "RNN_top", latexname = "RNN_{top}", ntuplename = logistic_RNN_top, bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
-            database.registerVar( Variable(shortname = "NNComb", latexname = "NN Comb", ntuplename = dist_NN,   bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
-            database.registerVar( Variable(shortname = "RNNComb", latexname = "RNN Comb", ntuplename = dist_RNN, bins = 10, minval = 0.0, maxval = 1.0, sysvar = True ) )
+            database.declareVar( shortname = "NN_ttV", latexname = "NN_{ttV}", ntuplename = "output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
+            database.declareVar( shortname = "RNN_ttV", latexname = "RNN_{ttV}", ntuplename = "RNN_output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
+            database.declareVar( shortname = "NN_top", latexname = "NN_{top}", ntuplename = logistic_NN_top, bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
+            database.declareVar( shortname = "RNN_top", latexname = "RNN_{top}", ntuplename = logistic_RNN_top, bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
+            database.declareVar( shortname = "NNComb", latexname = "NN Comb", ntuplename = dist_NN,   bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
+            database.declareVar( shortname = "RNNComb", latexname = "RNN Comb", ntuplename = dist_RNN, bins = 10, minval = 0.0, maxval = 1.0, sysvar = True )
             #
-            # database.registerVar( Variable(shortname = 'NN_ttV_VS_NN_top', latexnameX = 'NN_{ttV}', latexnameY = 'NN_{top}', ntuplename = 'output_top:output_ttV', bins = 10, minval = 0.0, maxval = 1.0, typeval = TH2F ) )
-            # database.registerVar( Variable(shortname = 'RNN_ttV_VS_RNN_top', latexnameX = 'NN_{ttV}', latexnameY = 'NN_{top}', ntuplename = 'RNN_output_top:RNN_output_ttV', bins = 10, minval = 0.0, maxval = 1.0, typeval = TH2F ) )
+            # database.declareVar( shortname = 'NN_ttV_VS_NN_top', latexnameX = 'NN_{ttV}', latexnameY = 'NN_{top}', ntuplename = 'output_top:output_ttV', bins = 10, minval = 0.0, maxval = 1.0, typeval = TH2F )
+            # database.declareVar( shortname = 'RNN_ttV_VS_RNN_top', latexnameX = 'NN_{ttV}', latexnameY = 'NN_{top}', ntuplename = 'RNN_output_top:RNN_output_ttV', bins = 10, minval = 0.0, maxval = 1.0, typeval = TH2F )
             #
-            # database.registerVar( Variable(shortname = "NN_ttV", latexname = "NN_{ttV}", ntuplename = "output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = False, basecut=Cut("NN_Cut","( output_ttV < 0.5 )") ) )
-            # database.registerVar( Variable(shortname = "NN_top", latexname = "NN_{top}", ntuplename = "output_top", bins = 10, minval = 0.0, maxval = 1.0, sysvar = False, basecut=Cut("NN_Cut","( output_top < 0.5 )") ) )
-            # database.registerVar( Variable(shortname = "RNN_ttV", latexname = "NN_{ttV}", ntuplename = "RNN_output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = False, basecut=Cut("NN_Cut","( RNN_output_ttV < 0.5 )") ) )
-            # database.registerVar( Variable(shortname = "RNN_top", latexname = "NN_{top}", ntuplename = "RNN_output_top", bins = 10, minval = 0.0, maxval = 1.0, sysvar = False, basecut=Cut("NN_Cut","( RNN_output_top < 0.5 )") ) )
-            # database.registerVar( Variable(shortname = 'NN_ttV_VS_NN_top', latexnameX = 'NN_{ttV}', latexnameY = 'NN_{top}', ntuplename = 'output_top:output_ttV', bins = 10, minval = 0.0, maxval = 1.0, typeval = TH2F, basecut=Cut("NN_Cut","( output_ttV < 0.5 && output_top < 0.5 )") ) )
+            # database.declareVar( shortname = "NN_ttV", latexname = "NN_{ttV}", ntuplename = "output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = False, basecut=Cut("NN_Cut","( output_ttV < 0.5 )") )
+            # database.declareVar( shortname = "NN_top", latexname = "NN_{top}", ntuplename = "output_top", bins = 10, minval = 0.0, maxval = 1.0, sysvar = False, basecut=Cut("NN_Cut","( output_top < 0.5 )") )
+            # database.declareVar( shortname = "RNN_ttV", latexname = "NN_{ttV}", ntuplename = "RNN_output_ttV", bins = 10, minval = 0.0, maxval = 1.0, sysvar = False, basecut=Cut("NN_Cut","( RNN_output_ttV < 0.5 )") )
+            # database.declareVar( shortname = "RNN_top", latexname = "NN_{top}", ntuplename = "RNN_output_top", bins = 10, minval = 0.0, maxval = 1.0, sysvar = False, basecut=Cut("NN_Cut","( RNN_output_top < 0.5 )") )
+            # database.declareVar( shortname = 'NN_ttV_VS_NN_top', latexnameX = 'NN_{ttV}', latexnameY = 'NN_{top}', ntuplename = 'output_top:output_ttV', bins = 10, minval = 0.0, maxval = 1.0, typeval = TH2F, basecut=Cut("NN_Cut","( output_ttV < 0.5 && output_top < 0.5 )") )
             # database.registerVar( Variable(shortname = 'RNN_ttV_VS_RNN_top', latexnameX = 'NN_{ttV}', latexnameY = 'NN_{top}', ntuplename = 'RNN_output_top:RNN_output_ttV', bins = 10, minval = 0.0, maxval = 1.0, typeval = TH2F, basecut=Cut("NN_Cut","( RNN_output_ttV < 0.5 && RNN_output_top < 0.5
 
     if doMMSidebands:
-        database.registerVar( Variable(shortname = 'MMWeight', latexname = 'MM weight', ntuplename = 'MMWeight', bins = 50, minval = -0.5, maxval = 0.5) )
-        # database.registerVar( Variable(shortname = 'Lep0Pt', latexname = 'p_{T}^{lead lep} [GeV]', ntuplename = 'lep_Pt_0/1e3', bins = 9, minval = 25.0, maxval = 205.0,) )
-        # database.registerVar( Variable(shortname = 'Lep0TM_VS_Lep1TM', latexnameX = 'lead lep TM', latexnameY = '2nd lead lep TM', ntuplename = 'lep_isTrigMatch_1:lep_isTrigMatch_0', bins = 2, minval = -0.5, maxval = 1.5, typeval = TH2F) )
+        database.declareVar( shortname = 'MMWeight', latexname = 'MM weight', ntuplename = 'MMWeight', bins = 50, minval = -0.5, maxval = 0.5 )
+        # database.declareVar( shortname = 'Lep0Pt', latexname = 'p_{T}^{lead lep} [GeV]', ntuplename = 'lep_Pt_0/1e3', bins = 9, minval = 25.0, maxval = 205.0, )
+        # database.declareVar( shortname = 'Lep0TM_VS_Lep1TM', latexnameX = 'lead lep TM', latexnameY = '2nd lead lep TM', ntuplename = 'lep_isTrigMatch_1:lep_isTrigMatch_0', bins = 2, minval = -0.5, maxval = 1.5, typeval = TH2F )
         if "HIGHNJ" in args.channel:
-            database.registerVar( Variable(shortname = 'NJets4j', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 6, minval = 3.5, maxval = 9.5, weight = 'JVT_EventWeight') )
+            database.declareVar( shortname = 'NJets4j', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 6, minval = 3.5, maxval = 9.5, weight = 'JVT_EventWeight' )
         elif "LOWNJ" in args.channel:
-            database.registerVar( Variable(shortname = 'NJets2j3j', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 5, minval = 0.5, maxval = 5.5, weight = 'JVT_EventWeight') )
+            database.declareVar( shortname = 'NJets2j3j', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 5, minval = 0.5, maxval = 5.5, weight = 'JVT_EventWeight' )
         elif "ALLNJ" in args.channel:
-            database.registerVar( Variable(shortname = 'NJets', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 8, minval = 1.5, maxval = 9.5, weight = 'JVT_EventWeight') )
+            database.declareVar( shortname = 'NJets', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 8, minval = 1.5, maxval = 9.5, weight = 'JVT_EventWeight' )
 
     if doMMClosureTest:
         print("Scheduling variables for {0}".format(args.channel))
         if args.readGFW2:
-            database.registerCut( Cut('Lep0_ElFake', '( TMath::Abs( lep_ID_0 ) == 11 && !( {0} || {1} ) )'.format(lep0_prompt,lep0_bremsprompt) ) )
-            database.registerCut( Cut('Lep0_MuFake', '( TMath::Abs( lep_ID_0 ) == 13 && !{0} )'.format(lep0_prompt) ) )
-            database.registerCut( Cut('Lep1_ElFake', '( TMath::Abs( lep_ID_1 ) == 11 && !( {0} || {1} ) )'.format(lep1_prompt,lep1_bremsprompt) ) )
-            database.registerCut( Cut('Lep1_MuFake', '( TMath::Abs( lep_ID_1 ) == 13 && !{0} )'.format(lep1_prompt) ) )
-            database.registerVar( Variable(shortname = 'El0Origin_VS_BDTGScore', latexnameX = 'truthOrigin^{lep}', latexnameY = 'BDTG', ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0:lep_truthOrigin_0", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], basecut = database.getCut('Lep0_ElFake'), typeval = TH2D) ) # Require El0 be fake
-            database.registerVar( Variable(shortname = 'Mu0Origin_VS_BDTGScore', latexnameX = 'truthOrigin^{lep}', latexnameY = 'BDTG', ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0:lep_truthOrigin_0", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], basecut = database.getCut('Lep0_MuFake'), typeval = TH2D) ) # Require Mu0 be fake
-            database.registerVar( Variable(shortname = 'El1Origin_VS_BDTGScore', latexnameX = 'truthOrigin^{lep}', latexnameY = 'BDTG', ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0:lep_truthOrigin_1", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], basecut = database.getCut('Lep1_ElFake'), typeval = TH2D) ) # Require El1 be fake
-            database.registerVar( Variable(shortname = 'Mu1Origin_VS_BDTGScore', latexnameX = 'truthOrigin^{lep}', latexnameY = 'BDTG', ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0:lep_truthOrigin_1", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], basecut = database.getCut('Lep1_MuFake'), typeval = TH2D) ) # Require Mu1 be fake
+            database.declareCut( 'Lep0_ElFake', '( TMath::Abs( lep_ID_0 ) == 11 && !( {0} || {1} ) )'.format(lep0_prompt,lep0_bremsprompt) )
+            database.declareCut( 'Lep0_MuFake', '( TMath::Abs( lep_ID_0 ) == 13 && !{0} )'.format(lep0_prompt) )
+            database.declareCut( 'Lep1_ElFake', '( TMath::Abs( lep_ID_1 ) == 11 && !( {0} || {1} ) )'.format(lep1_prompt,lep1_bremsprompt) )
+            database.declareCut( 'Lep1_MuFake', '( TMath::Abs( lep_ID_1 ) == 13 && !{0} )'.format(lep1_prompt) )
+            database.declareVar( shortname = 'El0Origin_VS_BDTGScore', latexnameX = 'truthOrigin^{lep}', latexnameY = 'BDTG', ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0:lep_truthOrigin_0", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], basecut = database.getCut('Lep0_ElFake'), typeval = TH2D ) # Require El0 be fake
+            database.declareVar( shortname = 'Mu0Origin_VS_BDTGScore', latexnameX = 'truthOrigin^{lep}', latexnameY = 'BDTG', ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0:lep_truthOrigin_0", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], basecut = database.getCut('Lep0_MuFake'), typeval = TH2D ) # Require Mu0 be fake
+            database.declareVar( shortname = 'El1Origin_VS_BDTGScore', latexnameX = 'truthOrigin^{lep}', latexnameY = 'BDTG', ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0:lep_truthOrigin_1", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], basecut = database.getCut('Lep1_ElFake'), typeval = TH2D ) # Require El1 be fake
+            database.declareVar( shortname = 'Mu1Origin_VS_BDTGScore', latexnameX = 'truthOrigin^{lep}', latexnameY = 'BDTG', ntuplename = "(MVA2lSSMarseille_weight_ttbar_2+MVA2lSSMarseille_weight_ttV_2)/2.0:lep_truthOrigin_1", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[-1,-0.1846,0.0342,0.221,0.3868,0.5594,1], basecut = database.getCut('Lep1_MuFake'), typeval = TH2D ) # Require Mu1 be fake
 
     if doZOSpeakCR or doZSSpeakCR:
         print ''
-        database.registerVar( Variable(shortname = 'Mll01_NarrowPeak', latexname = 'm(l_{0}l_{1}) [GeV]', ntuplename = 'Mll01/1e3', bins = 26, minval = 60.0, maxval = 125.0) )
+        database.declareVar( shortname = 'Mll01_NarrowPeak', latexname = 'm(l_{0}l_{1}) [GeV]', ntuplename = 'Mll01/1e3', bins = 26, minval = 60.0, maxval = 125.0 )
 
     if doCFChallenge:
         print ''
         if "MM" in args.channel:
-            database.registerVar( Variable(shortname = "ElProbePt", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_ProbeVec_SLT_Pt/1e3", bins = 42, minval = 0.0, maxval = 210.0) )
-            database.registerVar( Variable(shortname = "MuProbePt", latexname = "p_{T}^{#mu} [GeV]", ntuplename = "muon_ProbeVec_SLT_Pt/1e3", bins = 42, minval = 0.0, maxval = 210.0) )
+            database.declareVar( shortname = "ElProbePt", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_ProbeVec_SLT_Pt/1e3", bins = 42, minval = 0.0, maxval = 210.0 )
+            database.declareVar( shortname = "MuProbePt", latexname = "p_{T}^{#mu} [GeV]", ntuplename = "muon_ProbeVec_SLT_Pt/1e3", bins = 42, minval = 0.0, maxval = 210.0 )
         else:
-            database.registerVar( Variable(shortname = "Integral", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0) )
+            database.declareVar( shortname = "Integral", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0 )
 
     if makeStandardPlots:
         print ''
-        database.registerVar( Variable(shortname = "Integral", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0) )
-        database.registerVar( Variable(shortname = 'NJetsPlus10NBJets', latexname = 'N_{Jets}+10*N_{BJets}', ntuplename = 'nJets_OR_T+10.0*nJets_OR_T_MV2c10_70', bins = 40, minval = 0, maxval = 40, basecut = database.getCut('VetoLargeNBJet'), weight = 'JVT_EventWeight * MV2c10_Continuous_EventWeight') )
+        database.declareVar( shortname = "Integral", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0 )
+        database.declareVar( shortname = 'NJetsPlus10NBJets', latexname = 'N_{Jets}+10*N_{BJets}', ntuplename = 'nJets_OR_T+10.0*nJets_OR_T_MV2c10_70', bins = 40, minval = 0, maxval = 40, basecut = database.getCut('VetoLargeNBJet'), weight = 'JVT_EventWeight * MV2c10_Continuous_EventWeight' )
         #
         # Inclusive m(ll) plot
         #
-        database.registerVar( Variable(shortname = 'Mll01_inc', latexname = 'm(l_{0}l_{1}) [GeV]', ntuplename = 'Mll01/1e3', bins = 46, minval = 10.0, maxval = 240.0,) )
+        database.declareVar( shortname = 'Mll01_inc', latexname = 'm(l_{0}l_{1}) [GeV]', ntuplename = 'Mll01/1e3', bins = 46, minval = 10.0, maxval = 240.0, )
         #
         # Z peak plot
         #
-        database.registerVar( Variable(shortname = 'Mll01_peak', latexname = 'm(l_{0}l_{1}) [GeV]', ntuplename = 'Mll01/1e3', bins = 40, minval = 40.0, maxval = 120.0,) )
+        database.declareVar( shortname = 'Mll01_peak', latexname = 'm(l_{0}l_{1}) [GeV]', ntuplename = 'Mll01/1e3', bins = 40, minval = 40.0, maxval = 120.0, )
         #
-        database.registerVar( Variable(shortname = 'pT_Z', latexname = 'p_{T} Z (reco) [GeV]', ntuplename = pT_Z, bins = 100, minval = 0.0, maxval = 1000.0, logaxisX = True) )
-        database.registerVar( Variable(shortname = 'Mll12', latexname = 'm(l_{1}l_{2}) [GeV]', ntuplename = 'Mll12/1e3', bins = 15, minval = 0.0, maxval = 300.0,) )
-        database.registerVar( Variable(shortname = 'Jet0Pt', latexname = 'p_{T}^{lead jet} [GeV]', ntuplename = 'lead_jetPt/1e3', bins = 36, minval = 20.0, maxval = 200.0,) )
-        database.registerVar( Variable(shortname = 'Jet0Eta', latexname = '#eta^{lead jet}', ntuplename = 'lead_jetEta', bins = 50, minval = -5.0, maxval = 5.0) )
-        database.registerVar( Variable(shortname = 'avgint', latexname = 'Average Interactions Per Bunch Crossing', ntuplename = 'averageIntPerXing*1.16', bins = 50, minval = 0, maxval = 50, typeval = TH1I) )
-        database.registerVar( Variable(shortname = 'MET_FinalTrk', latexname = 'E_{T}^{miss} [GeV]', ntuplename = 'MET_RefFinal_et/1e3', bins = 40, minval = 0.0, maxval = 200.0,) )
-        database.registerVar( Variable(shortname = 'Tau0Pt', latexname = 'p_{T}^{lead tau} [GeV]', ntuplename = 'tau_pt_0', bins = 30, minval = 25.0, maxval = 100.0,) )
-        database.registerVar( Variable(shortname = 'deltaRLep0Lep1', latexname = '#DeltaR(l_{0},l_{1})', ntuplename = delta_R_lep0lep1, bins = 20, minval = 0.0, maxval = 5.0) )
-        database.registerVar( Variable(shortname = 'deltaRLep0Lep2', latexname = '#DeltaR(l_{0},l_{2})', ntuplename = delta_R_lep0lep2, bins = 20, minval = 0.0, maxval = 5.0) )
-        database.registerVar( Variable(shortname = 'deltaRLep1Lep2', latexname = '#DeltaR(l_{1},l_{2})', ntuplename = delta_R_lep1lep2, bins = 20, minval = 0.0, maxval = 5.0) )
+        database.declareVar( shortname = 'pT_Z', latexname = 'p_{T} Z (reco) [GeV]', ntuplename = pT_Z, bins = 100, minval = 0.0, maxval = 1000.0, logaxisX = True )
+        database.declareVar( shortname = 'Mll12', latexname = 'm(l_{1}l_{2}) [GeV]', ntuplename = 'Mll12/1e3', bins = 15, minval = 0.0, maxval = 300.0, )
+        database.declareVar( shortname = 'Jet0Pt', latexname = 'p_{T}^{lead jet} [GeV]', ntuplename = 'lead_jetPt/1e3', bins = 36, minval = 20.0, maxval = 200.0, )
+        database.declareVar( shortname = 'Jet0Eta', latexname = '#eta^{lead jet}', ntuplename = 'lead_jetEta', bins = 50, minval = -5.0, maxval = 5.0 )
+        database.declareVar( shortname = 'avgint', latexname = 'Average Interactions Per Bunch Crossing', ntuplename = 'averageIntPerXing*1.16', bins = 50, minval = 0, maxval = 50, typeval = TH1I )
+        database.declareVar( shortname = 'MET_FinalTrk', latexname = 'E_{T}^{miss} [GeV]', ntuplename = 'MET_RefFinal_et/1e3', bins = 40, minval = 0.0, maxval = 200.0, )
+        database.declareVar( shortname = 'Tau0Pt', latexname = 'p_{T}^{lead tau} [GeV]', ntuplename = 'tau_pt_0', bins = 30, minval = 25.0, maxval = 100.0, )
+        database.declareVar( shortname = 'deltaRLep0Lep1', latexname = '#DeltaR(l_{0},l_{1})', ntuplename = delta_R_lep0lep1, bins = 20, minval = 0.0, maxval = 5.0 )
+        database.declareVar( shortname = 'deltaRLep0Lep2', latexname = '#DeltaR(l_{0},l_{2})', ntuplename = delta_R_lep0lep2, bins = 20, minval = 0.0, maxval = 5.0 )
+        database.declareVar( shortname = 'deltaRLep1Lep2', latexname = '#DeltaR(l_{1},l_{2})', ntuplename = delta_R_lep1lep2, bins = 20, minval = 0.0, maxval = 5.0 )
 
     # -------------------------------------------------
     # Alterantive ranges and binning for the histograms
@@ -1287,24 +1351,24 @@ if __name__ == "__main__":
         # manualbins_el_fake_pt = [15,20,30,210] # This binnng comes from fit optimisation
         manualbins_el_fake_pt = [15,30,210] # This binnng comes from fit optimisation
 
-        # database.registerVar( Variable(shortname = "LepFakeType", latexname = "truthType^{lep}", ntuplename = "lep_Probe_SLT_truthType", bins = 21, minval = -0.5, maxval = 20.5 ) )
-        # database.registerVar( Variable(shortname = "LepFakeOrigin", latexname = "truthOrigin^{lep}", ntuplename = "lep_Probe_SLT_truthOrigin", bins = 41, minval = -0.5, maxval = 40.5 ) )
-        database.registerVar( Variable(shortname = 'LepFakeOrigin_VS_LepFakePt', latexnameX = 'truthOrigin^{lep}', latexnameY = 'p_{T}^{lep}', ntuplename = "lep_Probe_SLT_Pt/1e3:lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=manualbins_el_fake_pt, typeval = TH2D) )
+        # database.declareVar( shortname = "LepFakeType", latexname = "truthType^{lep}", ntuplename = "lep_Probe_SLT_truthType", bins = 21, minval = -0.5, maxval = 20.5 )
+        # database.declareVar( shortname = "LepFakeOrigin", latexname = "truthOrigin^{lep}", ntuplename = "lep_Probe_SLT_truthOrigin", bins = 41, minval = -0.5, maxval = 40.5 )
+        database.declareVar( shortname = 'LepFakeOrigin_VS_LepFakePt', latexnameX = 'truthOrigin^{lep}', latexnameY = 'p_{T}^{lep}', ntuplename = "lep_Probe_SLT_Pt/1e3:lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=manualbins_el_fake_pt, typeval = TH2D )
         #
-        # database.registerVar( Variable(shortname = 'LepFakeType_VS_LepFakeOrigin', latexnameX = 'truthType^{lep}', latexnameY = 'truthOrigin^{lep}', ntuplename = "lep_Probe_SLT_truthOrigin:lep_Probe_SLT_truthType", binsX = 21, minvalX = -0.5, maxvalX = 20.5, binsY = 41, minvalY = -0.5, maxvalY = 40.5, typeval = TH2D) )
-        # database.registerVar( Variable(shortname = 'LepFakeOrigin_VS_NJets', latexnameX = 'truthOrigin^{lep}', latexnameY = 'N_{jets}', ntuplename = "nJets_OR_T:lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, binsY = 10, minvalY = -0.5, maxvalY = 9.5, typeval = TH2D) )
-        # database.registerVar( Variable(shortname = 'LepFakeOrigin_VS_NBJets', latexnameX = 'truthOrigin^{lep}', latexnameY = 'N_{b-tags}', ntuplename = "nJets_OR_T_MV2c10_70:lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, binsY = 4, minvalY = -0.5, maxvalY = 3.5, typeval = TH2D) )
-        # database.registerVar( Variable(shortname = 'LepFakeOrigin_VS_LepFakeEta', latexnameX = 'truthOrigin^{lep}', latexnameY = '#eta^{lep}', ntuplename = "TMath::Abs(lep_Probe_SLT_Eta):lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[0.0,0.1,0.7,1.3,1.9,2.5], typeval = TH2D) )
-        # database.registerVar( Variable(shortname = 'LepFakeOrigin_VS_LepFakeEtaBE2', latexnameX = 'truthOrigin^{lep}', latexnameY = '#eta^{lep}', ntuplename = "TMath::Abs(lep_Probe_SLT_EtaBE2):lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[0.0,0.5,0.8,1.37,1.52,2.0,2.6], typeval = TH2D) )
-        # database.registerVar( Variable(shortname = 'LepFakeOrigin_VS_LepFakeDistanceClosestJet', latexnameX = 'truthOrigin^{lep}', latexnameY = '#DeltaR(lep, closest jet)', ntuplename = "lep_Probe_SLT_deltaRClosestJet:lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[0,0.75,1.5,3,5], typeval = TH2D) )
-        # database.registerVar( Variable(shortname = 'LepFakeOrigin_VS_DistanceOtherLep', latexnameX = 'truthOrigin^{lep}', latexnameY = '#DeltaR(l_{0},l_{1})', ntuplename = delta_R_lep0lep1 + ":lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY = [0.1,0.5,1.0,2.0,5.0], typeval = TH2D ) )
-        # database.registerVar( Variable(shortname = 'Lep2Origin_VS_DistanceOtherLep', latexnameX = 'truthOrigin^{lep}', latexnameY = '#DeltaR(l_{1},l_{2})', ntuplename = delta_R_lep1lep2 + ":lep_truthOrigin_2", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY = [0.1,0.5,1.0,2.0,5.0], typeval = TH2D ) )
+        # database.declareVar( shortname = 'LepFakeType_VS_LepFakeOrigin', latexnameX = 'truthType^{lep}', latexnameY = 'truthOrigin^{lep}', ntuplename = "lep_Probe_SLT_truthOrigin:lep_Probe_SLT_truthType", binsX = 21, minvalX = -0.5, maxvalX = 20.5, binsY = 41, minvalY = -0.5, maxvalY = 40.5, typeval = TH2D )
+        # database.declareVar( shortname = 'LepFakeOrigin_VS_NJets', latexnameX = 'truthOrigin^{lep}', latexnameY = 'N_{jets}', ntuplename = "nJets_OR_T:lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, binsY = 10, minvalY = -0.5, maxvalY = 9.5, typeval = TH2D )
+        # database.declareVar( shortname = 'LepFakeOrigin_VS_NBJets', latexnameX = 'truthOrigin^{lep}', latexnameY = 'N_{b-tags}', ntuplename = "nJets_OR_T_MV2c10_70:lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, binsY = 4, minvalY = -0.5, maxvalY = 3.5, typeval = TH2D )
+        # database.declareVar( shortname = 'LepFakeOrigin_VS_LepFakeEta', latexnameX = 'truthOrigin^{lep}', latexnameY = '#eta^{lep}', ntuplename = "TMath::Abs(lep_Probe_SLT_Eta):lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[0.0,0.1,0.7,1.3,1.9,2.5], typeval = TH2D )
+        # database.declareVar( shortname = 'LepFakeOrigin_VS_LepFakeEtaBE2', latexnameX = 'truthOrigin^{lep}', latexnameY = '#eta^{lep}', ntuplename = "TMath::Abs(lep_Probe_SLT_EtaBE2):lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[0.0,0.5,0.8,1.37,1.52,2.0,2.6], typeval = TH2D )
+        # database.declareVar( shortname = 'LepFakeOrigin_VS_LepFakeDistanceClosestJet', latexnameX = 'truthOrigin^{lep}', latexnameY = '#DeltaR(lep, closest jet)', ntuplename = "lep_Probe_SLT_deltaRClosestJet:lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY=[0,0.75,1.5,3,5], typeval = TH2D )
+        # database.declareVar( shortname = 'LepFakeOrigin_VS_DistanceOtherLep', latexnameX = 'truthOrigin^{lep}', latexnameY = '#DeltaR(l_{0},l_{1})', ntuplename = delta_R_lep0lep1 + ":lep_Probe_SLT_truthOrigin", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY = [0.1,0.5,1.0,2.0,5.0], typeval = TH2D )
+        # database.declareVar( shortname = 'Lep2Origin_VS_DistanceOtherLep', latexnameX = 'truthOrigin^{lep}', latexnameY = '#DeltaR(l_{1},l_{2})', ntuplename = delta_R_lep1lep2 + ":lep_truthOrigin_2", binsX = 41, minvalX = -0.5, maxvalX = 40.5, manualbinsY = [0.1,0.5,1.0,2.0,5.0], typeval = TH2D )
 
         cc_2Lep_list = ['TrigDec','BlindingCut','2Lep_TrigMatch','2Lep_NBJet_SR','2Lep_NLep','2Lep_pT','2Lep_SS','TauVeto','2Lep_ElEtaCut','2Lep_TRUTH_QMisIDVeto','TT','2Lep_TagAndProbe_GoodEvent'] # Leave NJets cut out
         common_cuts_2Lep = database.getCuts(cc_2Lep_list)
 
         # Add this cut for ee events only
-        database.registerCut( Cut('El0_Prompt', '( dilep_type !=3 || ( {0} || {1} ) )'.format(lep0_prompt,lep0_bremsprompt) ) )
+        database.declareCut( 'El0_Prompt', '( dilep_type !=3 || ( {0} || {1} ) )'.format(lep0_prompt,lep0_bremsprompt) )
 
         basename = "FakeOriginFrac_"
 
@@ -1557,52 +1621,52 @@ if __name__ == "__main__":
 
             # ------------------------------------------
 
-            database.registerVar( Variable(shortname = "Integral", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0) )
-            database.registerVar( Variable(shortname = "Integral_LOGY", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0, logaxis = True) )
-
-            database.registerVar( Variable(shortname = "ElProbePt", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", bins = 195, minval = 15.0, maxval = 210.0, sysvar = True) )
-            database.registerVar( Variable(shortname = "ElProbePt_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", bins = 195, minval = 15.0, maxval = 210.0, logaxis = True) )
-            database.registerVar( Variable(shortname = "ElProbePt_RealEffBinning", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", manualbins=manualbins_el_real_pt) )
-            database.registerVar( Variable(shortname = "ElProbePt_FakeEffBinning", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", manualbins=manualbins_el_fake_pt) )
-            database.registerVar( Variable(shortname = "ElProbePt_RealEffBinning_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", manualbins=manualbins_el_real_pt, logaxis = True) )
-            database.registerVar( Variable(shortname = "ElProbePt_FakeEffBinning_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", manualbins=manualbins_el_fake_pt, logaxis = True) )
-            database.registerVar( Variable(shortname = "ElProbeEta",latexname = "#eta^{e}", ntuplename = "TMath::Abs( " + el_probe + "EtaBE2 )", manualbins = manualbins_el_eta ) )
-            database.registerVar( Variable(shortname = "ElProbeDistanceClosestJet", latexname = '#DeltaR(e, closest jet)', ntuplename = el_probe + "deltaRClosestJet", bins = 50, minval = 0.0, maxval = 5.0, sysvar = True) )
-            database.registerVar( Variable(shortname = "ElProbeDistanceClosestBJet", latexname = '#DeltaR(e, closest b-jet)', ntuplename = el_probe + "deltaRClosestBJet", bins = 50, minval = 0.0, maxval = 5.0) )
-            database.registerVar( Variable(shortname = "ElProbeDistanceOtherLep", latexname = '#DeltaR(l_{0},l_{1})', ntuplename = delta_R_lep0lep1, bins = 50, minval = 0.0, maxval = 5.0) )
-            database.registerVar( Variable(shortname = 'ElProbeNJets', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 10, minval = -0.5, maxval = 9.5, weight = 'JVT_EventWeight') )
-            database.registerVar( Variable(shortname = "ElProbeNBJets", latexname = "N_{b-tags}", ntuplename ="nJets_OR_T_MV2c10_70", bins = 2, minval = 0.5, maxval = 2.5, weight = "JVT_EventWeight * MV2c10_Continuous_EventWeight") )
+            database.declareVar( shortname = "Integral", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0 )
+            database.declareVar( shortname = "Integral_LOGY", latexname = "", ntuplename = "0.5", bins = 1, minval = 0.0, maxval = 1.0, logaxis = True )
+
+            database.declareVar( shortname = "ElProbePt", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", bins = 195, minval = 15.0, maxval = 210.0, sysvar = True )
+            database.declareVar( shortname = "ElProbePt_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", bins = 195, minval = 15.0, maxval = 210.0, logaxis = True )
+            database.declareVar( shortname = "ElProbePt_RealEffBinning", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", manualbins=manualbins_el_real_pt )
+            database.declareVar( shortname = "ElProbePt_FakeEffBinning", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", manualbins=manualbins_el_fake_pt )
+            database.declareVar( shortname = "ElProbePt_RealEffBinning_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", manualbins=manualbins_el_real_pt, logaxis = True )
+            database.declareVar( shortname = "ElProbePt_FakeEffBinning_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = el_probe + "Pt/1e3", manualbins=manualbins_el_fake_pt, logaxis = True )
+            database.declareVar( shortname = "ElProbeEta",latexname = "#eta^{e}", ntuplename = "TMath::Abs( " + el_probe + "EtaBE2 )", manualbins = manualbins_el_eta )
+            database.declareVar( shortname = "ElProbeDistanceClosestJet", latexname = '#DeltaR(e, closest jet)', ntuplename = el_probe + "deltaRClosestJet", bins = 50, minval = 0.0, maxval = 5.0, sysvar = True )
+            database.declareVar( shortname = "ElProbeDistanceClosestBJet", latexname = '#DeltaR(e, closest b-jet)', ntuplename = el_probe + "deltaRClosestBJet", bins = 50, minval = 0.0, maxval = 5.0 )
+            database.declareVar( shortname = "ElProbeDistanceOtherLep", latexname = '#DeltaR(l_{0},l_{1})', ntuplename = delta_R_lep0lep1, bins = 50, minval = 0.0, maxval = 5.0 )
+            database.declareVar( shortname = 'ElProbeNJets', latexname = 'N_{jets}', ntuplename = 'nJets_OR_T', bins = 10, minval = -0.5, maxval = 9.5, weight = 'JVT_EventWeight' )
+            database.declareVar( shortname = "ElProbeNBJets", latexname = "N_{b-tags}", ntuplename ="nJets_OR_T_MV2c10_70", bins = 2, minval = 0.5, maxval = 2.5, weight = "JVT_EventWeight * MV2c10_Continuous_EventWeight" )
             #
             # 2D parametrisations
             #
-            database.registerVar( Variable(shortname = 'ElProbeNBJetsRAW_VS_ElProbePtRAW', latexnameX = 'N_{b-tags}', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":nJets_OR_T_MV2c10_70", binsX = 2, minvalX = 0.5, maxvalX = 2.5, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True) )
-            database.registerVar( Variable(shortname = 'ElProbeNBJets_VS_ElProbePt', latexnameX = 'N_{b-tags}', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":nJets_OR_T_MV2c10_70", binsX = 2, minvalX = 0.5, maxvalX = 2.5, manualbinsY = manualbins_el_fake_pt, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True) )
-            database.registerVar( Variable(shortname = 'ElProbeDistanceClosestJetRAW_VS_ElProbePtRAW', latexnameX = '#DeltaR(e, closest jet)', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":" +el_probe + "deltaRClosestJet", binsX = 50, minvalX = 0.0, maxvalX = 5.0, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True) )
-            database.registerVar( Variable(shortname = 'ElProbeDistanceClosestJet_VS_ElProbePt', latexnameX = '#DeltaR(e, closest jet)', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":" +el_probe + "deltaRClosestJet", manualbinsX = manualbins_el_fake_deltaRej, manualbinsY = manualbins_el_fake_pt, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True) )
-            database.registerVar( Variable(shortname = 'ElProbeEtaRAW_VS_ElProbePtRAW', latexnameX = '#eta^{e}', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":TMath::Abs( " + el_probe + "EtaBE2 )", manualbinsX = manualbins_el_eta, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text") )
+            database.declareVar( shortname = 'ElProbeNBJetsRAW_VS_ElProbePtRAW', latexnameX = 'N_{b-tags}', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":nJets_OR_T_MV2c10_70", binsX = 2, minvalX = 0.5, maxvalX = 2.5, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True )
+            database.declareVar( shortname = 'ElProbeNBJets_VS_ElProbePt', latexnameX = 'N_{b-tags}', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":nJets_OR_T_MV2c10_70", binsX = 2, minvalX = 0.5, maxvalX = 2.5, manualbinsY = manualbins_el_fake_pt, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True )
+            database.declareVar( shortname = 'ElProbeDistanceClosestJetRAW_VS_ElProbePtRAW', latexnameX = '#DeltaR(e, closest jet)', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":" +el_probe + "deltaRClosestJet", binsX = 50, minvalX = 0.0, maxvalX = 5.0, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True )
+            database.declareVar( shortname = 'ElProbeDistanceClosestJet_VS_ElProbePt', latexnameX = '#DeltaR(e, closest jet)', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":" +el_probe + "deltaRClosestJet", manualbinsX = manualbins_el_fake_deltaRej, manualbinsY = manualbins_el_fake_pt, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True )
+            database.declareVar( shortname = 'ElProbeEtaRAW_VS_ElProbePtRAW', latexnameX = '#eta^{e}', latexnameY = 'p_{T}^{e} [GeV]', ntuplename = el_probe + "Pt/1e3" + ":TMath::Abs( " + el_probe + "EtaBE2 )", manualbinsX = manualbins_el_eta, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text" )
 
             # # ------------------------------------------
 
-            database.registerVar( Variable(shortname = "MuProbePt", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", bins = 195, minval = 15.0, maxval = 210.0, sysvar = True) )
-            database.registerVar( Variable(shortname = "MuProbePt_LOGY", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", bins = 195, minval = 15.0, maxval = 210.0, logaxis = True) )
-            database.registerVar( Variable(shortname = "MuProbePt_RealEffBinning", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", manualbins=manualbins_mu_real_pt) )
-            database.registerVar( Variable(shortname = "MuProbePt_FakeEffBinning", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", manualbins=manualbins_mu_fake_pt) )
-            database.registerVar( Variable(shortname = "MuProbePt_RealEffBinning_LOGY", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", manualbins=manualbins_mu_real_pt, logaxis = True) )
-            database.registerVar( Variable(shortname = "MuProbePt_FakeEffBinning_LOGY", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", manualbins=manualbins_mu_fake_pt, logaxis = True) )
-            database.registerVar( Variable(shortname = "MuProbeEta",latexname = "#eta^{#mu}", ntuplename = "TMath::Abs( " + mu_probe + "Eta )", manualbins = manualbins_mu_eta ) )
-            database.registerVar( Variable(shortname = "MuProbeDistanceClosestJet", latexname = '#DeltaR(#mu, closest jet)', ntuplename = mu_probe + "deltaRClosestJet", bins = 50, minval = 0.0, maxval = 5.0, sysvar = True) )
-            database.registerVar( Variable(shortname = "MuProbeDistanceClosestBJet", latexname = '#DeltaR(#mu, closest b-jet)', ntuplename = mu_probe + "deltaRClosestBJet", bins = 50, minval = 0.0, maxval = 5.0) )
-            database.registerVar( Variable(shortname = "MuProbeDistanceOtherLep", latexname = '#DeltaR(l_{0},l_{1})', ntuplename = delta_R_lep0lep1, bins = 50, minval = 0.0, maxval = 5.0) )
-            database.registerVar( Variable(shortname = "MuProbeNJets", latexname = "N_{jets}", ntuplename = "nJets_OR_T", bins = 10, minval = -0.5, maxval = 9.5, weight = "JVT_EventWeight") )
-            database.registerVar( Variable(shortname = "MuProbeNBJets", latexname = "N_{b-tags}", ntuplename ="nJets_OR_T_MV2c10_70", bins = 2, minval = 0.5, maxval = 2.5, weight = "JVT_EventWeight * MV2c10_Continuous_EventWeight") )
+            database.declareVar( shortname = "MuProbePt", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", bins = 195, minval = 15.0, maxval = 210.0, sysvar = True )
+            database.declareVar( shortname = "MuProbePt_LOGY", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", bins = 195, minval = 15.0, maxval = 210.0, logaxis = True )
+            database.declareVar( shortname = "MuProbePt_RealEffBinning", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", manualbins=manualbins_mu_real_pt )
+            database.declareVar( shortname = "MuProbePt_FakeEffBinning", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", manualbins=manualbins_mu_fake_pt )
+            database.declareVar( shortname = "MuProbePt_RealEffBinning_LOGY", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", manualbins=manualbins_mu_real_pt, logaxis = True )
+            database.declareVar( shortname = "MuProbePt_FakeEffBinning_LOGY", latexname = "p_{T}^{#mu} [GeV]", ntuplename = mu_probe + "Pt/1e3", manualbins=manualbins_mu_fake_pt, logaxis = True )
+            database.declareVar( shortname = "MuProbeEta",latexname = "#eta^{#mu}", ntuplename = "TMath::Abs( " + mu_probe + "Eta )", manualbins = manualbins_mu_eta )
+            database.declareVar( shortname = "MuProbeDistanceClosestJet", latexname = '#DeltaR(#mu, closest jet)', ntuplename = mu_probe + "deltaRClosestJet", bins = 50, minval = 0.0, maxval = 5.0, sysvar = True )
+            database.declareVar( shortname = "MuProbeDistanceClosestBJet", latexname = '#DeltaR(#mu, closest b-jet)', ntuplename = mu_probe + "deltaRClosestBJet", bins = 50, minval = 0.0, maxval = 5.0 )
+            database.declareVar( shortname = "MuProbeDistanceOtherLep", latexname = '#DeltaR(l_{0},l_{1})', ntuplename = delta_R_lep0lep1, bins = 50, minval = 0.0, maxval = 5.0 )
+            database.declareVar( shortname = "MuProbeNJets", latexname = "N_{jets}", ntuplename = "nJets_OR_T", bins = 10, minval = -0.5, maxval = 9.5, weight = "JVT_EventWeight" )
+            database.declareVar( shortname = "MuProbeNBJets", latexname = "N_{b-tags}", ntuplename ="nJets_OR_T_MV2c10_70", bins = 2, minval = 0.5, maxval = 2.5, weight = "JVT_EventWeight * MV2c10_Continuous_EventWeight" )
             #
             # 2D parametrisations
             #
-            database.registerVar( Variable(shortname = 'MuProbeNBJetsRAW_VS_MuProbePtRAW', latexnameX = 'N_{b-tags}', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":nJets_OR_T_MV2c10_70", binsX = 2, minvalX = 0.5, maxvalX = 2.5, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True) )
-            database.registerVar( Variable(shortname = 'MuProbeNBJets_VS_MuProbePt', latexnameX = 'N_{b-tags}', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":nJets_OR_T_MV2c10_70", binsX = 2, minvalX = 0.5, maxvalX = 2.5, manualbinsY = manualbins_mu_fake_pt, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True) )
-            database.registerVar( Variable(shortname = 'MuProbeDistanceClosestJetRAW_VS_MuProbePtRAW', latexnameX = '#DeltaR(#mu, closest jet)', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":" +mu_probe + "deltaRClosestJet", binsX = 50, minvalX = 0.0, maxvalX = 5.0, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True) )
-            database.registerVar( Variable(shortname = 'MuProbeDistanceClosestJet_VS_MuProbePt', latexnameX = '#DeltaR(#mu, closest jet)', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":" +mu_probe + "deltaRClosestJet", manualbinsX = manualbins_mu_fake_deltaRmj, manualbinsY = manualbins_mu_fake_pt, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True) )
-            database.registerVar( Variable(shortname = 'MuProbeEtaRAW_VS_MuProbePtRAW', latexnameX = '#eta^{#mu}', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":TMath::Abs( " + mu_probe + "Eta )", manualbinsX = manualbins_mu_eta, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text") )
+            database.declareVar( shortname = 'MuProbeNBJetsRAW_VS_MuProbePtRAW', latexnameX = 'N_{b-tags}', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":nJets_OR_T_MV2c10_70", binsX = 2, minvalX = 0.5, maxvalX = 2.5, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True )
+            database.declareVar( shortname = 'MuProbeNBJets_VS_MuProbePt', latexnameX = 'N_{b-tags}', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":nJets_OR_T_MV2c10_70", binsX = 2, minvalX = 0.5, maxvalX = 2.5, manualbinsY = manualbins_mu_fake_pt, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True )
+            database.declareVar( shortname = 'MuProbeDistanceClosestJetRAW_VS_MuProbePtRAW', latexnameX = '#DeltaR(#mu, closest jet)', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":" +mu_probe + "deltaRClosestJet", binsX = 50, minvalX = 0.0, maxvalX = 5.0, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True )
+            database.declareVar( shortname = 'MuProbeDistanceClosestJet_VS_MuProbePt', latexnameX = '#DeltaR(#mu, closest jet)', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":" +mu_probe + "deltaRClosestJet", manualbinsX = manualbins_mu_fake_deltaRmj, manualbinsY = manualbins_mu_fake_pt, typeval = TH2D, drawOpt2D = "COLZ1 text", sysvar = True )
+            database.declareVar( shortname = 'MuProbeEtaRAW_VS_MuProbePtRAW', latexnameX = '#eta^{#mu}', latexnameY = 'p_{T}^{#mu} [GeV]', ntuplename = mu_probe + "Pt/1e3" + ":TMath::Abs( " + mu_probe + "Eta )", manualbinsX = manualbins_mu_eta, binsY = 210, minvalY = 0.0, maxvalY = 210.0, typeval = TH2D, drawOpt2D = "COLZ1 text" )
 
             # -----------------------------------------------------------------------------------------------------------------
             # MC subtraction: what gets plotted will be subtracted to data:
@@ -1875,8 +1939,8 @@ if __name__ == "__main__":
 
 	elif "LH" in args.channel:
 
-            database.registerVar( Variable(shortname = 'Lep0Pt_VS_Lep1Pt', latexnameX = 'p_{T}^{lead lep} [GeV]', latexnameY = 'p_{T}^{2nd lead lep} [GeV]', ntuplename = 'lep_Pt_1/1e3:lep_Pt_0/1e3', bins = 200, minval = 10.0, maxval = 210.0, typeval = TH2D) )
-            #database.registerVar( Variable(shortname = 'Lep0Pt_VS_Lep1Pt', latexnameX = 'p_{T}^{lead lep} [GeV]', latexnameY = 'p_{T}^{2nd lead lep} [GeV]', ntuplename = 'lep_Pt_1/1e3:lep_Pt_0/1e3', manualbinsX = [10,15,20,26,30,40,60,90,140,210], manualbinsY = [10,15,20,26,30,40,60,90,140,210], typeval = TH2D) )
+            database.declareVar( shortname = 'Lep0Pt_VS_Lep1Pt', latexnameX = 'p_{T}^{lead lep} [GeV]', latexnameY = 'p_{T}^{2nd lead lep} [GeV]', ntuplename = 'lep_Pt_1/1e3:lep_Pt_0/1e3', bins = 200, minval = 10.0, maxval = 210.0, typeval = TH2D )
+            #database.declareVar( shortname = 'Lep0Pt_VS_Lep1Pt', latexnameX = 'p_{T}^{lead lep} [GeV]', latexnameY = 'p_{T}^{2nd lead lep} [GeV]', ntuplename = 'lep_Pt_1/1e3:lep_Pt_0/1e3', manualbinsX = [10,15,20,26,30,40,60,90,140,210], manualbinsY = [10,15,20,26,30,40,60,90,140,210], typeval = TH2D )
 
             # For measurement in data: select MC events to be subtracted afterwards
 
@@ -1961,28 +2025,28 @@ if __name__ == "__main__":
         MassMuMu = "mLep0Lep1(muon_Pt[0],muon_Eta[0],muon_Phi[0],muon_Pt[1],muon_Eta[1],muon_Phi[1])"
         mTElMET  = "mTLepMET(electron_Pt[0],electron_EtaBE2[0],electron_Phi[0],MET_RefFinal_et,MET_RefFinal_phi)"
 
-        database.registerCut( Cut('ZMuMuEl_TP_TrigDec',    '( ( RunYear == 2015 && HLT_mu18_mu8noL1 ) || ( RunYear == 2016 && HLT_mu22_mu8noL1 ) )') )
-        database.registerCut( Cut('ZMuMuEl_TP_TrigMatch',  '( ( TMath::Abs( lep_ID_0 ) == 11 || ( TMath::Abs( lep_ID_0 ) == 13 && lep_isTrigMatchDLT_0 ) ) && ( TMath::Abs( lep_ID_1 ) == 11 || ( TMath::Abs( lep_ID_1 ) == 13 && lep_isTrigMatchDLT_1 ) ) && ( TMath::Abs( lep_ID_2 ) == 11 || ( TMath::Abs( lep_ID_2 ) == 13 && lep_isTrigMatchDLT_2 ) ) )') )
-        database.registerCut( Cut('ZMuMuEl_TP_NLep',       '( trilep_type == 2 )') )
-        database.registerCut( Cut('ZMuMuEl_TP_MuOS',       '( muon_ID[0] * muon_ID[1] < 0 )') )
-        database.registerCut( Cut('ZMuMuEl_TP_MuQuality',  '( muon_isTightSelected[0] && muon_isTightSelected[1] )') )
-        database.registerCut( Cut('ZMuMuEl_TP_MassMuMuEl', '( TMath::Abs( Mlll012 - 91.2e3 ) < 10e3 )') )
-        database.registerCut( Cut('ZMuMuEl_TP_MassMuMu',   '( {0} > 20e3 )'.format(MassMuMu) ) )
-        database.registerCut( Cut('ZMuMuEl_TP_mTElMET',    '( {0} < 40e3 )'.format(mTElMET) ) )
-        database.registerCut( Cut('ZMuMuEl_TP_MET',        '( MET_RefFinal_et < 75e3 )') )
-        database.registerCut( Cut('ZMuMuEl_TP_ProbeElT',     '( electron_isTightSelectedMVA[0] )') )
-        database.registerCut( Cut('ZMuMuEl_TP_ProbeElAntiT', '( !electron_isTightSelectedMVA[0] )') )
-
-        database.registerVar( Variable(shortname = "MassMuMuEl_LOGY", latexname = "m(e#mu#mu)", ntuplename = "Mlll012/1e3", bins = 20, minval = 60.0, maxval = 120.0, logaxis = True ) )
-        database.registerVar( Variable(shortname = "MassMuMu_LOGY", latexname = "m(#mu#mu)", ntuplename = MassMuMu+"/1e3", bins = 50, minval = 0.0, maxval = 150.0, logaxis = True ) )
-        database.registerVar( Variable(shortname = "mTElMET_LOGY", latexname = "m_{T}(e,E^{miss}_{T})", ntuplename = mTElMET+"/1e3", bins = 30, minval = 0.0, maxval = 90.0, logaxis = True ) )
-        database.registerVar( Variable(shortname = "ElProbePt", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_Pt[0]/1e3", bins = 200, minval = 10.0, maxval = 210.0 ) )
-        database.registerVar( Variable(shortname = "ElProbePt_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_Pt[0]/1e3", bins = 200, minval = 10.0, maxval = 210.0, logaxis = True ) )
-        database.registerVar( Variable(shortname = "ElProbePt_FakeEffBinning", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_Pt[0]/1e3", manualbins=[10,15,20,26,35,60,210]) )
-        database.registerVar( Variable(shortname = "ElProbePt_RealEffBinning_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_Pt[0]/1e3", manualbins=[10,15,20,26,30,40,60,90,140,210], logaxis = True) )
-        database.registerVar( Variable(shortname = "ElProbeEta", latexname = "#eta^{e}", ntuplename = "TMath::Abs( electron_EtaBE2[0] )", manualbins = [0.0,0.5,0.8,1.37,1.52,2.0,2.6] ) )
-        database.registerVar( Variable(shortname = "ElProbeEta_LOGY", latexname = "#eta^{e}", ntuplename = "TMath::Abs( electron_EtaBE2[0] )", manualbins = [0.0,0.5,0.8,1.37,1.52,2.0,2.6], logaxis = True ) )
-        # database.registerVar( Variable(shortname = "MassMuMuEl_VS_MassMuMu", latexnameX = "m(e#mu#mu)", latexnameY = "m(#mu#mu)",   ntuplename = MassMuMu+"/1e3" + ":" + "Mlll012/1e3", binsX = 120, minvalX = 0.0, maxvalX = 120.0, binsY = 120, minvalY = 0.0, maxvalY = 120.0, typeval = TH2D, drawOpt2D = "COLZ1" ) )
+        database.declareCut( 'ZMuMuEl_TP_TrigDec',    '( ( RunYear == 2015 && HLT_mu18_mu8noL1 ) || ( RunYear == 2016 && HLT_mu22_mu8noL1 ) )' )
+        database.declareCut( 'ZMuMuEl_TP_TrigMatch',  '( ( TMath::Abs( lep_ID_0 ) == 11 || ( TMath::Abs( lep_ID_0 ) == 13 && lep_isTrigMatchDLT_0 ) ) && ( TMath::Abs( lep_ID_1 ) == 11 || ( TMath::Abs( lep_ID_1 ) == 13 && lep_isTrigMatchDLT_1 ) ) && ( TMath::Abs( lep_ID_2 ) == 11 || ( TMath::Abs( lep_ID_2 ) == 13 && lep_isTrigMatchDLT_2 ) ) )' )
+        database.declareCut( 'ZMuMuEl_TP_NLep',       '( trilep_type == 2 )' )
+        database.declareCut( 'ZMuMuEl_TP_MuOS',       '( muon_ID[0] * muon_ID[1] < 0 )' )
+        database.declareCut( 'ZMuMuEl_TP_MuQuality',  '( muon_isTightSelected[0] && muon_isTightSelected[1] )' )
+        database.declareCut( 'ZMuMuEl_TP_MassMuMuEl', '( TMath::Abs( Mlll012 - 91.2e3 ) < 10e3 )' )
+        database.declareCut( 'ZMuMuEl_TP_MassMuMu',   '( {0} > 20e3 )'.format(MassMuMu) )
+        database.declareCut( 'ZMuMuEl_TP_mTElMET',    '( {0} < 40e3 )'.format(mTElMET) )
+        database.declareCut( 'ZMuMuEl_TP_MET',        '( MET_RefFinal_et < 75e3 )' )
+        database.declareCut( 'ZMuMuEl_TP_ProbeElT',     '( electron_isTightSelectedMVA[0] )' )
+        database.declareCut( 'ZMuMuEl_TP_ProbeElAntiT', '( !electron_isTightSelectedMVA[0] )' )
+
+        database.declareVar( shortname = "MassMuMuEl_LOGY", latexname = "m(e#mu#mu)", ntuplename = "Mlll012/1e3", bins = 20, minval = 60.0, maxval = 120.0, logaxis = True )
+        database.declareVar( shortname = "MassMuMu_LOGY", latexname = "m(#mu#mu)", ntuplename = MassMuMu+"/1e3", bins = 50, minval = 0.0, maxval = 150.0, logaxis = True )
+        database.declareVar( shortname = "mTElMET_LOGY", latexname = "m_{T}(e,E^{miss}_{T})", ntuplename = mTElMET+"/1e3", bins = 30, minval = 0.0, maxval = 90.0, logaxis = True )
+        database.declareVar( shortname = "ElProbePt", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_Pt[0]/1e3", bins = 200, minval = 10.0, maxval = 210.0 )
+        database.declareVar( shortname = "ElProbePt_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_Pt[0]/1e3", bins = 200, minval = 10.0, maxval = 210.0, logaxis = True )
+        database.declareVar( shortname = "ElProbePt_FakeEffBinning", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_Pt[0]/1e3", manualbins=[10,15,20,26,35,60,210] )
+        database.declareVar( shortname = "ElProbePt_RealEffBinning_LOGY", latexname = "p_{T}^{e} [GeV]", ntuplename = "electron_Pt[0]/1e3", manualbins=[10,15,20,26,30,40,60,90,140,210], logaxis = True )
+        database.declareVar( shortname = "ElProbeEta", latexname = "#eta^{e}", ntuplename = "TMath::Abs( electron_EtaBE2[0] )", manualbins = [0.0,0.5,0.8,1.37,1.52,2.0,2.6] )
+        database.declareVar( shortname = "ElProbeEta_LOGY", latexname = "#eta^{e}", ntuplename = "TMath::Abs( electron_EtaBE2[0] )", manualbins = [0.0,0.5,0.8,1.37,1.52,2.0,2.6], logaxis = True )
+        # database.declareVar( shortname = "MassMuMuEl_VS_MassMuMu", latexnameX = "m(e#mu#mu)", latexnameY = "m(#mu#mu)",   ntuplename = MassMuMu+"/1e3" + ":" + "Mlll012/1e3", binsX = 120, minvalX = 0.0, maxvalX = 120.0, binsY = 120, minvalY = 0.0, maxvalY = 120.0, typeval = TH2D, drawOpt2D = "COLZ1" )
 
         cc_PhotonConvElecRates_list = ['ZMuMuEl_TP_TrigDec','ZMuMuEl_TP_TrigMatch','ZMuMuEl_TP_NLep','ZMuMuEl_TP_MuOS','ZMuMuEl_TP_MuQuality','ZMuMuEl_TP_MassMuMuEl','ZMuMuEl_TP_MassMuMu','ZMuMuEl_TP_mTElMET','ZMuMuEl_TP_MET','BJetVeto']
         # cc_PhotonConvElecRates_list = ['ZMuMuEl_TP_TrigDec','ZMuMuEl_TP_TrigMatch','ZMuMuEl_TP_NLep','ZMuMuEl_TP_MuOS','ZMuMuEl_TP_MuQuality','ZMuMuEl_TP_mTElMET','ZMuMuEl_TP_MET','BJetVeto']
@@ -2122,10 +2186,32 @@ if __name__ == "__main__":
     #   will perform the background estimation
     # --------------------------------------------------------
 
+    startup.append( ("variables, cuts, categories", time.time()) )
+
     ttH = TTHBackgrounds(inputs, database)
 
     ttH.readGFW2 = args.readGFW2
 
+    ttH.nworkers = args.nWorkers
+
+    # ---------------------------------------------------
+    # Persistent cache of the projections (if requested)
+    # ---------------------------------------------------
+
+    if args.diskCache:
+        SubProcess.diskcache = DiskCache(args.diskCache, maxsize=int(args.diskCacheSize*1024**3), debug=args.debug)
+
+    if args.histCacheSize is not None:
+        SubProcess.histcache.maxsize = int(args.histCacheSize*1024**2)
+
+    SubProcess.useentrylists = args.useEntryLists
+
+    if args.backend == 'NumPy':
+        if HAS_NUMPY:
+            SubProcess.backend = NumPyBackend(debug=args.debug)
+        else:
+            print("WARNING: numpy/root_numpy not available, will use TTree::Project")
+
     # ------------------------------------
     # Set the integrated luminosity (fb-1)
     # ------------------------------------
@@ -2487,6 +2573,28 @@ if __name__ == "__main__":
     print "Processes:\n", histname
     print "Processes' colours:\n", histcolour
 
+    # ----------------------------------------------------------------------------------
+    # Plot store(s) where to keep the histograms of the plots, and formats to render them
+    # ----------------------------------------------------------------------------------
+
+    render_formats = [ '.' + fmt.strip().lstrip('.') for fmt in args.renderFormats.split(',') if fmt.strip() ]
+    if doCFChallenge:
+        render_formats = []
+
+    if args.plotStore:
+        storebase = args.plotStore[:-len('.root')] if args.plotStore.endswith('.root') else args.plotStore
+        storepath = args.plotStore if args.nBatches <= 1 else storebase + '_batch{0}.root'.format(args.batchIndex)
+
+    if args.renderOnly:
+        if not args.plotStore:
+            sys.exit("ERROR: --renderOnly needs the path of the plot store given w/ --plotStore")
+        storepaths = [ path for path in [args.plotStore] + sorted(glob.glob(storebase + '_batch*.root')) if os.path.isfile(path) ]
+        if not storepaths:
+            sys.exit("ERROR: no plot store found at {0}".format(args.plotStore))
+        nrendered = renderPlots(ttH, storepaths, render_formats, nworkers=args.nRenderWorkers, force=( args.forceRender is not False ))
+        print("\nRendered {0} plots from {1}\n".format(nrendered, ', '.join(storepaths)))
+        sys.exit(0)
+
     # ---------------------------------
     # Processing categories in sequence
     # ---------------------------------
@@ -2506,20 +2614,522 @@ if __name__ == "__main__":
     significance_dict = {}
 
     if args.submitPBSVar:
-        if not args.submitPBSVar in database.vardb.iterkeys():
+        if not args.submitPBSVar in database.varnames():
             os.sys.exit("ERROR: the input variable for the PBS job: {0} couldn't be found in the VariableDB!".format(args.submitPBSVar))
+    if args.variables:
+        for varname in args.variables:
+            if not varname in database.varnames():
+                os.sys.exit("ERROR: the input variable: {0} couldn't be found in the VariableDB!".format(varname))
+
+    # Only the selected variables will be built
+
+    if args.submitPBSVar:
+        database.select([args.submitPBSVar])
+    elif args.variables:
+        database.select(args.variables)
+
+    startup.append( ("processes", time.time()) )
+
+    print("\nStartup time: {0:.2f} s ({1})\n".format( startup[-1][1] - startup[0][1], ', '.join( "{0}: {1:.2f} s".format(label, t - startup[i][1]) for i, (label, t) in enumerate(startup[1:]) ) ))
+
+    # --------------------------------------------------------------------------------------------------
+    # The plots for all the categories, variables and systematics are first planned as a graph of tasks
+    # (see Plotter/TaskGraph.py), which is then executed: serially, on several worker processes,
+    # or only for one of its balanced partitions (e.g. in a batch job)
+    # --------------------------------------------------------------------------------------------------
+
+    graph = TaskGraph()
+
+    # Plot store the histograms are written into, if rendering is a separate stage: each worker process of the graph
+    # writes its own shard of the store, and the shards are then merged.
+    # W/ --incremental only the outdated plots are produced again: the existing store is updated, so that it keeps the others
+
+    plotstore = { 'store': None }
+    storemode = 'UPDATE' if args.plotStore and args.incremental and os.path.isfile(storepath) else 'RECREATE'
+
+    def storeShard(index):
+        return storebase + '_part{0}.root'.format(index) if args.nBatches <= 1 else storebase + '_batch{0}_part{1}.root'.format(args.batchIndex, index)
+
+    def openPlotStore(index=None):
+        plotstore['store'] = PlotStore(storepath, storemode) if index is None else PlotStore(storeShard(index), 'RECREATE')
+
+    def closePlotStore(index=None):
+        plotstore['store'].close()
+        plotstore['store'] = None
+
+    # Booking and filling of the histograms for all the variables in a category, shared by all the plots of the category
+
+    def bookCategory(category, mybackgrounds, bookvars):
+
+        ttH.bookPlots( bookvars,
+                       eventweight=category.weight,
+                       category=category,
+                       signal='',
+                       signalfactor=1.0,
+                       overridebackground=mybackgrounds
+                     )
+
+    # Table w/ event yields for a category
+
+    def eventYields(category):
+
+        events[category.name] = ttH.events(eventweight=category.weight, category=category, hmass=['125'])
+
+    # Nominal histograms of a ( category + variable ), rendering of the plot, and opening of its output files
+
+    def plotVariable(plot):
+
+        category, var, mybackgrounds = plot['category'], plot['var'], plot['mybackgrounds']
+
+        print ("\tPlotting variable:\t{0}\n\tNTup name:\t{1}\n".format(var.shortname, var.ntuplename))
+
+        total_weight = ttH.eventweight
+        if isinstance(total_weight, basestring):
+            if category.weight:
+                total_weight += ( " * " + category.weight )
+            if var.weight and not var.weight in category.weight:
+                total_weight += ( " * " + var.weight )
+
+        print ("\t-----------------------------------------------------------------------------------------------------------------------------\n")
+        print ("\tMC event weight for this (category, variable):\n\n\t\t{0}\n".format( total_weight ) )
+        print ("\t-----------------------------------------------------------------------------------------------------------------------------\n")
+
+        # ---------------------------------------------------------
+        # Creating a directory for the category if it doesn't exist
+        # ---------------------------------------------------------
+
+        dirname = plot['dirname']
+
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                pass # Might have been created in the meantime by another worker
+
+        # -----------------------------------------------
+        # Making a plot with ( category + variable ) name
+        # -----------------------------------------------
+
+        plotname = plot['plotname']
+
+        if ( args.debug ):
+            print ("\tPlotname: {0}\n".format( plotname ))
+
+        list_formats = [ plotname + fmt for fmt in render_formats ]
+
+        # Here is where the plotting is actually performed!
+
+        if plotstore['store']:
+
+            # Only produce the histograms: the plot is rendered later on from the store
+
+            content = ttH.produce( var,
+                                   eventweight=category.weight,
+                                   category=category,
+                                   signal='',
+                                   signalfactor=1.0,
+                                   overridebackground=mybackgrounds,
+                                   overflowbins=plot['merge_overflow']
+                                 )
+            plotstore['store'].put( plotname, content, { 'signal' : '',
+                                                         'signalfactor' : 1.0,
+                                                         'showratio' : plot['showRatio'],
+                                                         'log' : args.doLogScaleY,
+                                                         'logx' : args.doLogScaleX,
+                                                         'showyields' : False,
+                                                         'nolegs' : False
+                                                       } )
+            hists[category.name + ' ' + var.shortname] = ( content.backgrounds(), content.tSum, content.obs, content.sig, None )
+
+        else:
+
+            hists[category.name + ' ' + var.shortname] = ttH.plot( var,
+                                                                   eventweight=category.weight,
+                                                                   category=category,
+                                                                   signal='',#'125',
+                                                                   signalfactor=1.0,
+                                                                   overridebackground=mybackgrounds,
+                                                                   overflowbins=plot['merge_overflow'],
+                                                                   showratio=plot['showRatio'],
+                                                                   wait=False,
+                                                                   save=list_formats,
+                                                                   log=args.doLogScaleY,
+                                                                   logx=args.doLogScaleX,
+                                                                   showyields=False,
+                                                                   nolegs=False
+                                                                 )
+
+        # Creating a file with the observed and expected distributions and systematics.
+
+        plot['foutput'] = TFile(plotname + ".root","RECREATE")
+        if any( v in var.shortname for v in ["Mll01","NJets","ProbePt","Lep0Pt","Integral"] ) and not ( var.typeval in [TH2I,TH2D,TH2F] ):
+            plot['outfile'] = open(plotname + "_yields.txt", "w")
+
+    # Nominal and all the systematic variations of a ( category + variable ), filled w/ a single loop per input TChain
+
+    def bookVariableSystematics(plot):
+
+        ttH.bookSystematics(plot['systs'], [plot['var']], eventweight=plot['category'].weight, category=plot['category'], overridebackground=plot['mybackgrounds'])
+
+    # Systematic variation of a ( category + variable ): histograms saved in the ROOT file of the plot
+
+    def plotVariableSystematics(plot, syst):
+
+        category, var, mybackgrounds = plot['category'], plot['var'], plot['mybackgrounds']
+        merge_overflow  = plot['merge_overflow']
+        dirname         = plot['systdirname']
+        outfile         = plot.get('outfile')
+        histograms_syst = plot['histograms_syst']
+
+        plot['foutput'].cd()
+
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                pass # Might have been created in the meantime by another worker
+
+        plotname = dirname + "/" + category.name + "_" + var.shortname + "_" + syst.name
+
+        print("")
+        print ("\t\t-----------------------------------------------------------------------------------------------------------------------------\n")
+        print ("\t\tSystematic:\t{0}\n".format( syst.name ))
+        if args.debug:
+            print ("\t\tDirectory for systematic plot:\t{0}/".format( dirname ))
+        print ("\t\t-----------------------------------------------------------------------------------------------------------------------------\n")
+
+        list_formats_sys = [] # [ plotname + ".png"] # [ plotname + ".pdf" ]
+
+        # plotSystematics is the function which takes care of the systematics
+
+        systs[category.name + " " + var.shortname] = ttH.plotSystematics( syst,
+                                                                          var=var,
+                                                                          eventweight=category.weight,
+                                                                          category=category,
+                                                                          overridebackground=mybackgrounds,
+                                                                          overflowbins=merge_overflow,
+                                                                          showratio=True, # showRatio,
+                                                                          wait=False,
+                                                                          save=list_formats_sys,
+                                                                          log=args.doLogScaleY,
+                                                                          logx=args.doLogScaleX
+                                                                          )
+
+        # Obtaining histograms for processes and total expected histogram with a particular systematics shifted,
+        # and saving them in the ROOT file
+
+        systobs, systnom, systup, systdown, systlistup, systlistdown = systs[category.name + " " + var.shortname]
+
+        # The code does not consider systematics on the signal.
+        # Put the signal in the backgrounds list if you want systematics on it.
+
+        histograms_syst["Expected_"+syst.name+"_up"]=systup
+        histograms_syst["Expected_"+syst.name+"_up"].SetNameTitle(histname["Expected"][0]+"_"+syst.name+"_up","")
+        histograms_syst["Expected_"+syst.name+"_up"].SetLineColor(histcolour["Expected"])
+        histograms_syst["Expected_"+syst.name+"_up"].Write()
+        histograms_syst["Expected_"+syst.name+"_dn"]=systdown
+        histograms_syst["Expected_"+syst.name+"_dn"].SetNameTitle(histname["Expected"][0]+"_"+syst.name+"_dn","")
+        histograms_syst["Expected_"+syst.name+"_dn"].SetLineColor(histcolour["Expected"])
+        histograms_syst["Expected_"+syst.name+"_dn"].Write()
+
+        for sample in mybackgrounds:
+            if syst.process and not ( sample in syst.process ) :
+                continue
+            histograms_syst[sample+"_"+syst.name+"_up"] = systlistup[sample]
+            histograms_syst[sample+"_"+syst.name+"_up"].SetNameTitle(histname[sample][0]+"_"+syst.name+"_up","")
+            histograms_syst[sample+"_"+syst.name+"_up"].SetLineColor(histcolour[sample])
+            histograms_syst[sample+"_"+syst.name+"_up"].Write()
+            histograms_syst[sample+"_"+syst.name+"_dn"] = systlistdown[sample]
+            histograms_syst[sample+"_"+syst.name+"_dn"].SetNameTitle(histname[sample][0]+"_"+syst.name+"_dn","")
+            histograms_syst[sample+"_"+syst.name+"_dn"].SetLineColor(histcolour[sample])
+            histograms_syst[sample+"_"+syst.name+"_dn"].Write()
+
+        if any( v in var.shortname for v in ["Mll01","NJets","ProbePt","Lep0Pt"] ) and not ( var.typeval in [TH2I,TH2D,TH2F] ):
+            outfile.write("Integral syst: \n")
+            outfile.write("syst %s up:   delta_yields = %.2f \n" %(syst.name,(systup.Integral()-systnom.Integral())))
+            outfile.write("syst %s down: delta_yields = %.2f \n" %(syst.name,(systdown.Integral()-systnom.Integral())))
+            if ( args.debug ):
+                outfile.write("GetEntries syst: \n")
+                outfile.write("syst %s up:   delta_entries %.2f \n" %(syst.name,(systup.GetEntries()-systnom.GetEntries())))
+                outfile.write("syst %s down: delta_entries %.2f \n" %(syst.name,(systdown.GetEntries()-systnom.GetEntries())))
+
+        plot['total_syst']      += (systup.Integral()-systdown.Integral())/2.0*(systup.Integral()-systdown.Integral())/2.0
+        plot['total_syst_up']   += (systup.Integral()-systnom.Integral())*(systup.Integral()-systnom.Integral())
+        plot['total_syst_down'] += (systdown.Integral()-systnom.Integral())*(systdown.Integral()-systnom.Integral())
+
+    # Total systematics, normalised histograms and yields of a ( category + variable ), written to its output files
+
+    def writeVariable(plot):
+
+        category, var, mybackgrounds = plot['category'], plot['var'], plot['mybackgrounds']
+        merge_overflow = plot['merge_overflow']
+        foutput        = plot['foutput']
+        outfile        = plot.get('outfile')
+
+        foutput.cd()
+
+        if plot['dosyst']:
+
+            total_syst      = math.sqrt(plot['total_syst'])
+            total_syst_up   = math.sqrt(plot['total_syst_up'])
+            total_syst_down = math.sqrt(plot['total_syst_down'])
+
+            if any( v in var.shortname for v in ["Mll01","NJets","ProbePt","Lep0Pt"] ) and not ( var.typeval in [TH2I,TH2D,TH2F] ):
+                outfile.write("yields total syst UP: %.2f \n" %(total_syst_up))
+                outfile.write("yields total syst DN: %.2f \n" %(total_syst_down))
+                outfile.write("yields total syst: %.2f \n" %(total_syst))
+
+        # ------------------------------------------------------------------
+
+        # Obtain the histograms correctly normalized
+
+        bkghists, expected, observed, signal, _ = hists[category.name + " " + var.shortname]
+        histograms = {}
+
+        for sample in ttH.observed:
+
+            histograms[sample] = observed
+
+        if mybackgrounds or ttH.signals:
+
+            if mybackgrounds:
+                histograms["Expected"] = expected
+
+            # Store an additional histogram as the sum of all the purely-MC backgrounds (useful e.g. to get all "prompt" backgrounds in one go)
+            # Take the first *non-data-driven* sample in the background histograms list and clone it, then add all the others
+
+            allsim = TH1D()
+            (firstsim_idx, firstsim_name) = ttH.getFirstSimulatedProc(category, mybackgrounds=mybackgrounds)
+            if firstsim_name:
+                allsim = bkghists[firstsim_name].Clone(histname["AllSimulation"][0])
+
+            for idx, sample in enumerate(mybackgrounds):
+                histograms[sample] = bkghists[sample]
+                if False and idx != firstsim_idx  and ( not "QMisID" in sample ) and ( not "Fakes" in sample):
+                    allsim.Add(bkghists[sample].Clone(histname[sample][0]))
+
+            if mybackgrounds :
+                histograms["AllSimulation"] = allsim
+
+            if ttH.signals:
+                for sample in ttH.signals:
+                    histograms[sample] = signal
+
+            # ------------------------------------------------------------------
+
+            # Set basic properties for histograms
+
+            for sample in histograms.keys():
+                histograms[sample].SetNameTitle(histname[sample][0],"")
+                histograms[sample].SetLineColor(histcolour[sample])
+                histograms[sample].SetMarkerColor(histcolour[sample])
+
+            # ------------------------------------------------------------------
+
+            # Print yields
+
+            outfile_exists = False
+
+            if mybackgrounds and any( v in var.shortname for v in ["Mll01","NJets","ProbePt","Lep0Pt","Integral"] ) and not ( var.typeval in [TH2I,TH2D,TH2F] ):
+
+                outfile_exists = True
+
+                s = 0
+                err_s = Double(0)
+                err_b = Double(0)
+                if ttH.signals and "TTBarH" in ttH.signals:
+                    if merge_overflow:
+                        last_bin_idx_s = histograms["TTBarH"].GetNbinsX()
+                    else:
+                        last_bin_idx_s = histograms["TTBarH"].GetNbinsX()+1
+                    s = histograms["TTBarH"].IntegralAndError(0,last_bin_idx_s,err_s)
+
+                if merge_overflow:
+                    last_bin_idx_b = histograms["Expected"].GetNbinsX()
+                else:
+                    last_bin_idx_b = histograms["Expected"].GetNbinsX()+1
+                b = histograms["Expected"].IntegralAndError(0,last_bin_idx_b,err_b)
+
+                Z = (-1,-1)
+                if b > 0:
+                    Z = calculate_Z( s, b, err_s, err_b, method="SoverSqrtB" )
+
+                print (" ")
+                print ("\t\tCategory: {0} - Variable: {1}\n".format( category.name, var.shortname ))
+                print ("\t\tIntegral:\n")
+
+                outfile.write("Category: %s \n" %(category.name))
+                outfile.write("Variable: %s \n" %(var.shortname))
+                outfile.write("\n")
+                outfile.write("\\begin{table}\n\\begin{center}\n\\begin{tabular}{ccc}\n\\toprule\n & Yields & N/(Tot. bkg.) \\\\ \n\\midrule\n")
+
+                err=Double(0)  # integral error
+                value=0        # integral value
+
+                for sample in histograms.keys():
+
+                    # Include underflow, but if option merge_overflow = True, do not take overflow bin!
+                    # In fact, in that case, the last visible bin will contain the OFlow bin.
+
+                    if merge_overflow:
+                        last_bin_idx = histograms[sample].GetNbinsX()
+                    else:
+                        last_bin_idx = histograms[sample].GetNbinsX()+1
+
+                    value = histograms[sample].IntegralAndError(0,last_bin_idx,err)
+
+                    percentage_str = percentage_outfilestr = ""
+                    if b and not sample in ["Observed","TTBarH","Expected"]:
+                        percentage_str        = " ({0:.1f} % tot. bkg.)".format((value/b)*1e2)
+                        percentage_outfilestr = "{0:.1f} $\%$".format((value/b)*1e2)
+
+                    yields_outstream     = "\t\t{0}: {1:.2f} +- {2:.2f}".format(histname[sample][0], value, err) + percentage_str
+                    yields_outfilestream = "{0} & {1:.2f} $\pm$ {2:.2f} & ".format(histname[sample][1], value, err) + percentage_outfilestr + " \\\\ \n"
+
+                    print (yields_outstream)
+                    outfile.write(yields_outfilestream)
+
+                    # Print each bin content
+
+                    if "NJets" in var.shortname:
+
+                        # Neglect underflow, but not overflow!
+
+                        for bin in range(1,histograms[sample].GetNbinsX()+2):
+                            err_bin   = Double(0)
+                            value_bin = 0
+                            this_bin  = histograms[sample].GetBinCenter(bin)
+                            value_bin = histograms[sample].GetBinContent(bin)
+                            err_bin   = histograms[sample].GetBinError(bin)
+
+                            if (histograms[sample].IsBinOverflow(bin)):
+                                print ("\t\t  OVERFLOW BIN:")
+                                outfile.write("  OVERFLOW BIN:\n")
+
+                            # If it"s the last visible bin, and merge_overflow = True, subtract overflow from this bin
+
+                            if ( merge_overflow and histograms[sample].IsBinOverflow(bin+1) ):
+                                value_bin -= histograms[sample].GetBinContent(bin+1)
+                                err_bin   = 0
+                            print ("\t\t  {0}-jets bin: {1:.2f} +- {2:.2f}".format(this_bin, value_bin, err_bin))
+                            outfile.write("  %i-jets bin: %.2f +- %.2f \n" %(this_bin, value_bin, err_bin))
+
+                        # Get integral and error from njets>=5 bins (including OFlow) in one go!
+
+                        if ( var.shortname == "NJets" ):
+                            err_HJ   = Double(0)
+                            value_HJ = histograms[sample].IntegralAndError (6,last_bin_idx,err_HJ)
+                            print ("\n\t\t  >=5-jets bin: {0:.2f} +- {1:.2f}".format(value_HJ, err_HJ))
+                            outfile.write("\n  >=5-jets bin: %.2f +- %.2f \n" %(value_HJ, err_HJ))
+
+                if Z[0] >= 0:
+                    Z_outstream     = "\t\t{0}: {1:.2f} +- {2:.2f}".format("S/sqrt(B)", Z[0], Z[1])
+                    Z_outfilestream = "{0} & {1:.2f} $\pm$ {2:.2f} & ".format("S/$\\sqrt\\textrm{B}$", Z[0], Z[1]) + " \\\\ \n"
+                    print Z_outstream
+                    outfile.write(Z_outfilestream)
+
+                outfile.write("\\bottomrule\n\\end{tabular}\n\\end{center}\n\\end{table}\n")
+
+                print ("\n\t\tGetEntries:\n")
+                print ("\t\tNB 1): this is actually N = GetEntries()-2 \n\t\t       Still not understood why there's such an offset...\n")
+                print ("\t\tNB 2): this number does not take into account overflow bin. Better to look at the integral obtained with --noWeights option...\n")
+                outfile.write("\nGetEntries: \n")
+                for sample in histograms.keys():
+                    print ("\t\t{0}: {1}".format(histname[sample][0], histograms[sample].GetEntries()-2))
+                    outfile.write("entries %s: %f \n" %(histname[sample][0], histograms[sample].GetEntries()-2))
+
+            for sample in histograms.keys():
+                histograms[sample].Write()
+            foutput.Close()
+
+            if outfile_exists:
+                outfile.close()
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Manifest of the plots produced so far (see Plotter/CacheTools.py): a plot is up to date if the fingerprint
+    # of its inputs hasn't changed since it was last produced, and all its outputs still exist
+    # ------------------------------------------------------------------------------------------------------------
+
+    manifest = PlotManifest(basedirname + "plots_manifest.json")
+
+    # Options which only affect how the plots are produced, not their content
+
+    execution_options = ['debug','printEventYields','submitPBSVar','variables','bookHistograms','diskCache','diskCacheSize','histCacheSize','useEntryLists','nWorkers','backend',
+                         'treeCacheSize','learnEntries','prefetch','nPlotWorkers','nBatches','batchIndex','dumpTaskGraph','taskPlan','incremental','plotStore','renderOnly','forceRender','renderFormats','nRenderWorkers']
+
+    # What all the plots depend on: input files, options, event weight, definitions (and style) of the processes,
+    # and all the cuts of the database, as the processes read some of them by name (e.g. the fake-rate sidebands)
+
+    backgrounds_source = os.path.splitext(sys.modules[TTHBackgrounds.__module__].__file__)[0] + ".py"
+
+    setup_fingerprint = {
+        'inputs'      : inputs.fingerprint(),
+        'options'     : dict( (opt, val) for opt, val in vars(args).iteritems() if not opt in execution_options ),
+        'eventweight' : str(ttH.eventweight),
+        'processes'   : dict( (name, [process.latexname, process.colour]) for name, process in ttH.procmap.iteritems() ),
+        'definitions' : hashlib.sha1(open(backgrounds_source).read()).hexdigest(),
+        'cuts'        : dict( database.cutdecl.items() + [ (name, cut.canonicalstr) for name, cut in database.cutdb.iteritems() ] ),
+    }
+
+    def plotFingerprint(plot):
+
+        category, var = plot['category'], plot['var']
+        return PlotManifest.fingerprint({
+            'setup'     : setup_fingerprint,
+            'cut'       : category.cut.canonicalstr,
+            'weights'   : [ category.weight, var.weight ],
+            'variable'  : [ var.ntuplename, var.latexname, var.latexnameX, var.latexnameY, str(getattr(var.basecut, 'cutstr', var.basecut)), var.typeval.__name__,
+                            var.bins, var.minval, var.maxval, var.manualbins, var.binsX, var.minvalX, var.maxvalX, var.manualbinsX,
+                            var.binsY, var.minvalY, var.maxvalY, var.manualbinsY, var.binlabelsX, var.logaxis, var.logaxisX, var.drawOpt2D,
+                            category.overridebins.get(var.shortname) if category.overridebins else None ],
+            'processes' : [ plot['mybackgrounds'], ttH.signals, ttH.observed ],
+            'plot'      : [ plot['showRatio'], plot['merge_overflow'], plot['dosyst'] ],
+            'systs'     : [ [ syst.name, syst.treename, syst.eventweight, syst.process, syst.categorytokens ] for syst in plot['systs'] ],
+        })
+
+    def categorySystematics(category):
+
+        # The systematic variations in the DB which are relevant for a category
+
+        systs = []
+        for syst in database.systlist:
+            if "RealCR" in category.name and any( s in syst.name for s in ["TTV","VV","OtherPromptSS","QMisID"] ): continue
+            if "FakeCR" in category.name and any( s in syst.name for s in ["FakesOS"] ): continue
+
+            if "2Lep_MuMu_Event" in category.cut.cutname and "_El_" in syst.name: continue
+            if "2Lep_ElEl_Event" in category.cut.cutname and "_Mu_" in syst.name: continue
+            systs.append(syst)
+        return systs
+
+    planned  = []
+    uptodate = 0
+
+    # W/ a frozen plan, the plots up to date are those of the plan, not those of the manifest as it is now
+
+    taskplan = None
+    if args.taskPlan:
+        with open(args.taskPlan) as f:
+            taskplan = json.load(f)
+        print("\nUsing the task plan in {0}\n".format(args.taskPlan))
+    elif args.incremental and args.nBatches > 1:
+        print("\nWARNING: each batch plans the incremental plots from the manifest as it is when the batch starts. Use --taskPlan w/ a plan written by --dumpTaskGraph at submission, so that all the batches share the same plan\n")
+    uptodateplots = []
+
+    # ----------------------------
+    # Planning categories in order
+    # ----------------------------
 
     for category in sorted(database.categorylist, key=(lambda category: category.name) ):
 
         print ("\n*********************************************\n")
-        print ("Making plots in category:\t{0}\n".format( category.name ))
+        print ("Planning plots in category:\t{0}\n".format( category.name ))
 
         # -------------------------------------------------------
         # Reset the weight for *this* category to None if neeeded
         # -------------------------------------------------------
 
         if args.noWeights or args.noCorrections:
-	    print("Resetting category weight to empty string...\n")
+            print("Resetting category weight to empty string...\n")
             category.weight = ""
 
         # ------------------------------------------
@@ -2536,6 +3146,42 @@ if __name__ == "__main__":
         if showRatio and category.ratiolims:
             showRatio = category.ratiolims
 
+        mybackgrounds = ttH.backgrounds
+
+        # For some categories, make sure non-relevant processes are removed from the proc list!
+
+        if "RealCR" in category.name or ( "LH" in args.channel and "OS_" in category.name ):
+            if "DATAMC" in args.channel:
+                mybackgrounds = [ bkg for bkg in mybackgrounds if bkg != "FakesMC" ]
+            else:
+                mybackgrounds = [ bkg for bkg in mybackgrounds if ( "FakesMC" not in mybackgrounds or bkg == "FakesMC" ) ]
+        if "FakeCR" in category.name or ( "LH" in args.channel and "SS_" in category.name ):
+            mybackgrounds = [ bkg for bkg in mybackgrounds if not bkg == "FakesMC" ]
+            if "LH" in args.channel:
+                mybackgrounds = [ bkg for bkg in mybackgrounds if not bkg == "TTBar" ]
+
+        # Relative cost of the tasks, in units of the projection of one process
+
+        nprocs = len(mybackgrounds) + len(ttH.signals) + len(ttH.observed)
+
+        # Register all the histograms needed for this category, and fill them w/ one loop per input tree
+
+        categorydeps = []
+
+        if args.bookHistograms:
+
+            bookvars = [ var for var in database.varlist if ( not args.submitPBSVar or var.shortname == args.submitPBSVar ) ]
+            for var in bookvars:
+                if args.noWeights or ( args.noCorrections and var.weight ):
+                    var.weight = None
+
+            categorydeps = ['book:' + category.name] # Added to the graph only when the first plot of the category needs it
+
+            # In incremental mode, only the variables whose plots are not up to date are booked (added while planning them)
+
+            if args.incremental:
+                bookvars = []
+
         # ------------------------------
         # Processing different variables
         # ------------------------------
@@ -2599,30 +3245,6 @@ if __name__ == "__main__":
                     print ("\tSkipping variable:\t{0}\n".format( var.shortname ))
                     continue
 
-            print ("\tPlotting variable:\t{0}\n\tNTup name:\t{1}\n".format(var.shortname, var.ntuplename))
-
-            total_weight = ttH.eventweight
-            if isinstance(total_weight, basestring):
-                if category.weight:
-                    total_weight += ( " * " + category.weight )
-                if var.weight and not var.weight in category.weight:
-                    total_weight += ( " * " + var.weight )
-
-            print ("\t-----------------------------------------------------------------------------------------------------------------------------\n")
-            print ("\tMC event weight for this (category, variable):\n\n\t\t{0}\n".format( total_weight ) )
-            print ("\t-----------------------------------------------------------------------------------------------------------------------------\n")
-
-            # Get table w/ event yields for *this* category. Do it only for the first variable in the list
-
-            if ( args.printEventYields and idx is 0 ):
-                events[category.name] = ttH.events(eventweight=category.weight, category=category, hmass=['125'])
-
-            #"""
-
-            # ---------------------------------------------------------
-            # Creating a directory for the category if it doesn't exist
-            # ---------------------------------------------------------
-
             dirname = basedirname + category.name
 
             if args.doLogScaleX:
@@ -2630,63 +3252,68 @@ if __name__ == "__main__":
             if args.doLogScaleY:
                 dirname += "_LOGY"
 
-            if not os.path.exists(dirname):
-                os.makedirs(dirname)
-
-            # -----------------------------------------------
-            # Making a plot with ( category + variable ) name
-            # -----------------------------------------------
-
-            plotname = dirname + "/" + category.name + "_" + var.shortname
-
-            if ( args.debug ):
-                print ("\tPlotname: {0}\n".format( plotname ))
-
-            # If this option is set True, the last visible bin of the histogram will contain ALSO the overflow
-
-            merge_overflow = args.mergeOverflow
-
-            list_formats = [ plotname + ".png", plotname + ".pdf", plotname + ".eps" ]
-            if doCFChallenge:
-                list_formats = []
+            # If merge_overflow is True, the last visible bin of the histogram will contain ALSO the overflow
+
+            plot = {
+                'category'        : category,
+                'var'             : var,
+                'mybackgrounds'   : mybackgrounds,
+                'showRatio'       : showRatio,
+                'merge_overflow'  : args.mergeOverflow,
+                'dirname'         : dirname,
+                'systdirname'     : dirname + "_Syst", # Systematics go into a different folder
+                'plotname'        : dirname + "/" + category.name + "_" + var.shortname,
+                'dosyst'          : bool( args.doSyst and var.sysvar ),
+                'systs'           : categorySystematics(category) if ( args.doSyst and var.sysvar ) else [],
+                'histograms_syst' : {},
+                'total_syst'      : 0.0,
+                'total_syst_up'   : 0.0,
+                'total_syst_down' : 0.0,
+            }
+            key = category.name + " " + var.shortname
+
+            plot['fingerprint'] = plotFingerprint(plot)
+            plot['outputs']     = [ plot['plotname'] + ".root" ] + [ plot['plotname'] + fmt for fmt in render_formats ]
+
+            # Skip the plot if it's up to date (unless the event yields of the category are needed from this variable)
+
+            if taskplan is not None:
+                isuptodate = args.incremental and plot['plotname'] in taskplan.get('uptodate', [])
+            else:
+                isuptodate = args.incremental and manifest.isUpToDate(plot['plotname'], plot['fingerprint'], plot['outputs'])
+            if isuptodate:
+                uptodateplots.append(plot['plotname'])
+            doyields   = args.printEventYields and idx is 0
+
+            if isuptodate and not doyields:
+                print ("\tUp to date, skipping variable:\t{0}\n".format( var.shortname ))
+                uptodate += 1
+                continue
 
-            # Here is where the plotting is actually performed!
+            if args.bookHistograms and not categorydeps[0] in graph:
+                graph.add('book:' + category.name, 'book', bookCategory, (category, mybackgrounds, bookvars), cost=nprocs*(1.0 + 0.1*len(bookvars)))
 
-            mybackgrounds = ttH.backgrounds
+            # Get table w/ event yields for *this* category. Do it only for the first variable in the list
 
-            # For some categories, make sure non-relevant processes are removed from the proc list!
+            plotdeps = list(categorydeps)
+            if doyields:
+                graph.add('yields:' + category.name, 'yields', eventYields, (category,), deps=categorydeps, cost=nprocs)
+                plotdeps.append('yields:' + category.name)
 
-            if "RealCR" in category.name or ( "LH" in args.channel and "OS_" in category.name ):
-                if "DATAMC" in args.channel:
-                    mybackgrounds = [ bkg for bkg in mybackgrounds if bkg != "FakesMC" ]
-                else:
-                    mybackgrounds = [ bkg for bkg in mybackgrounds if ( "FakesMC" not in mybackgrounds or bkg == "FakesMC" ) ]
-            if "FakeCR" in category.name or ( "LH" in args.channel and "SS_" in category.name ):
-                mybackgrounds = [ bkg for bkg in mybackgrounds if not bkg == "FakesMC" ]
-                if "LH" in args.channel:
-                    mybackgrounds = [ bkg for bkg in mybackgrounds if not bkg == "TTBar" ]
+            if isuptodate:
+                print ("\tUp to date, skipping variable:\t{0}\n".format( var.shortname ))
+                uptodate += 1
+                continue
 
-            hists[category.name + ' ' + var.shortname] = ttH.plot( var,
-                                                                   eventweight=category.weight,
-                                                                   category=category,
-                                                                   signal='',#'125',
-                                                                   signalfactor=1.0,
-                                                                   overridebackground=mybackgrounds,
-                                                                   overflowbins=merge_overflow,
-                                                                   showratio=showRatio,
-                                                                   wait=False,
-                                                                   save=list_formats,
-                                                                   log=args.doLogScaleY,
-                                                                   logx=args.doLogScaleX,
-                                                                   showyields=False,
-                                                                   nolegs=False
-                                                                 )
+            plot['key'] = key
+            planned.append(plot)
 
-            # Creating a file with the observed and expected distributions and systematics.
+            if args.bookHistograms and args.incremental:
+                bookvars.append(var)
+                graph.tasks[categorydeps[0]].cost = nprocs*(1.0 + 0.1*len(bookvars))
 
-            foutput = TFile(plotname + ".root","RECREATE")
-            if any( v in var.shortname for v in ["Mll01","NJets","ProbePt","Lep0Pt","Integral"] ) and not ( var.typeval in [TH2I,TH2D,TH2F] ):
-                outfile = open(plotname + "_yields.txt", "w")
+            graph.add('plot:' + key, 'plot', plotVariable, (plot,), deps=plotdeps, cost=1.0 if args.bookHistograms else nprocs)
+            writedeps = ['plot:' + key]
 
             if args.doSyst and not var.sysvar:
 
@@ -2694,271 +3321,83 @@ if __name__ == "__main__":
 
             elif args.doSyst and var.sysvar:
 
-                # Systematics go into a different folder
-
-                dirname += "_Syst"
-
-                # Loop on the defined systematics
-
-                total_syst      = 0.0
-                total_syst_up   = 0.0
-                total_syst_down = 0.0
-                histograms_syst = {}
-
-                for syst in database.systlist:
-
-                    # Skip systematic variations in the DB which are not relevant for *this* category
-
-                    if "RealCR" in category.name and any( s in syst.name for s in ["TTV","VV","OtherPromptSS","QMisID"] ): continue
-                    if "FakeCR" in category.name and any( s in syst.name for s in ["FakesOS"] ): continue
-
-                    if "2Lep_MuMu_Event" in category.cut.cutname and "_El_" in syst.name: continue
-                    if "2Lep_ElEl_Event" in category.cut.cutname and "_Mu_" in syst.name: continue
-
-                    if not os.path.exists(dirname):
-                        os.makedirs(dirname)
-
-                    plotname = dirname + "/" + category.name + "_" + var.shortname + "_" + syst.name
-
-                    print("")
-		    print ("\t\t-----------------------------------------------------------------------------------------------------------------------------\n")
-                    print ("\t\tSystematic:\t{0}\n".format( syst.name ))
-                    if args.debug:
-		        print ("\t\tDirectory for systematic plot:\t{0}/".format( dirname ))
-                    print ("\t\t-----------------------------------------------------------------------------------------------------------------------------\n")
-
-                    list_formats_sys = [] # [ plotname + ".png"] # [ plotname + ".pdf" ]
-
-                    # plotSystematics is the function which takes care of the systematics
-
-                    systs[category.name + " " + var.shortname] = ttH.plotSystematics( syst,
-                                                                                      var=var,
-                                                                                      eventweight=category.weight,
-                                                                                      category=category,
-                                                                                      overridebackground=mybackgrounds,
-                                                                                      overflowbins=merge_overflow,
-                                                                                      showratio=True, # showRatio,
-                                                                                      wait=False,
-                                                                                      save=list_formats_sys,
-                                                                                      log=args.doLogScaleY,
-                                                                                      logx=args.doLogScaleX
-                                                                                      )
-
-                    # Obtaining histograms for processes and total expected histogram with a particular systematics shifted,
-                    # and saving them in the ROOT file
-
-                    systobs, systnom, systup, systdown, systlistup, systlistdown = systs[category.name + " " + var.shortname]
-
-                    # The code does not consider systematics on the signal.
-                    # Put the signal in the backgrounds list if you want systematics on it.
-
-                    histograms_syst["Expected_"+syst.name+"_up"]=systup
-                    histograms_syst["Expected_"+syst.name+"_up"].SetNameTitle(histname["Expected"][0]+"_"+syst.name+"_up","")
-                    histograms_syst["Expected_"+syst.name+"_up"].SetLineColor(histcolour["Expected"])
-                    histograms_syst["Expected_"+syst.name+"_up"].Write()
-                    histograms_syst["Expected_"+syst.name+"_dn"]=systdown
-                    histograms_syst["Expected_"+syst.name+"_dn"].SetNameTitle(histname["Expected"][0]+"_"+syst.name+"_dn","")
-                    histograms_syst["Expected_"+syst.name+"_dn"].SetLineColor(histcolour["Expected"])
-                    histograms_syst["Expected_"+syst.name+"_dn"].Write()
-
-                    for sample in mybackgrounds:
-                        if syst.process and not ( sample in syst.process ) :
-                            continue
-                        histograms_syst[sample+"_"+syst.name+"_up"] = systlistup[sample]
-                        histograms_syst[sample+"_"+syst.name+"_up"].SetNameTitle(histname[sample][0]+"_"+syst.name+"_up","")
-                        histograms_syst[sample+"_"+syst.name+"_up"].SetLineColor(histcolour[sample])
-                        histograms_syst[sample+"_"+syst.name+"_up"].Write()
-                        histograms_syst[sample+"_"+syst.name+"_dn"] = systlistdown[sample]
-                        histograms_syst[sample+"_"+syst.name+"_dn"].SetNameTitle(histname[sample][0]+"_"+syst.name+"_dn","")
-                        histograms_syst[sample+"_"+syst.name+"_dn"].SetLineColor(histcolour[sample])
-                        histograms_syst[sample+"_"+syst.name+"_dn"].Write()
-
-                    if any( v in var.shortname for v in ["Mll01","NJets","ProbePt","Lep0Pt"] ) and not ( var.typeval in [TH2I,TH2D,TH2F] ):
-                        outfile.write("Integral syst: \n")
-                        outfile.write("syst %s up:   delta_yields = %.2f \n" %(syst.name,(systup.Integral()-systnom.Integral())))
-                        outfile.write("syst %s down: delta_yields = %.2f \n" %(syst.name,(systdown.Integral()-systnom.Integral())))
-                        if ( args.debug ):
-                            outfile.write("GetEntries syst: \n")
-                            outfile.write("syst %s up:   delta_entries %.2f \n" %(syst.name,(systup.GetEntries()-systnom.GetEntries())))
-                            outfile.write("syst %s down: delta_entries %.2f \n" %(syst.name,(systdown.GetEntries()-systnom.GetEntries())))
-
-                    total_syst      += (systup.Integral()-systdown.Integral())/2.0*(systup.Integral()-systdown.Integral())/2.0
-                    total_syst_up   += (systup.Integral()-systnom.Integral())*(systup.Integral()-systnom.Integral())
-                    total_syst_down += (systdown.Integral()-systnom.Integral())*(systdown.Integral()-systnom.Integral())
-
-                total_syst      = math.sqrt(total_syst)
-                total_syst_up   = math.sqrt(total_syst_up)
-                total_syst_down = math.sqrt(total_syst_down)
-
-                if any( v in var.shortname for v in ["Mll01","NJets","ProbePt","Lep0Pt"] ) and not ( var.typeval in [TH2I,TH2D,TH2F] ):
-                    outfile.write("yields total syst UP: %.2f \n" %(total_syst_up))
-                    outfile.write("yields total syst DN: %.2f \n" %(total_syst_down))
-                    outfile.write("yields total syst: %.2f \n" %(total_syst))
-
-            # ------------------------------------------------------------------
-
-            # Obtain the histograms correctly normalized
-
-            bkghists, expected, observed, signal, _ = hists[category.name + " " + var.shortname]
-            histograms = {}
-
-            for sample in ttH.observed:
-
-                histograms[sample] = observed
-
-            if mybackgrounds or ttH.signals:
-
-                if mybackgrounds:
-                    histograms["Expected"] = expected
-
-                # Store an additional histogram as the sum of all the purely-MC backgrounds (useful e.g. to get all "prompt" backgrounds in one go)
-                # Take the first *non-data-driven* sample in the background histograms list and clone it, then add all the others
-
-                allsim = TH1D()
-                (firstsim_idx, firstsim_name) = ttH.getFirstSimulatedProc(category, mybackgrounds=mybackgrounds)
-                if firstsim_name:
-                    allsim = bkghists[firstsim_name].Clone(histname["AllSimulation"][0])
-
-                for idx, sample in enumerate(mybackgrounds):
-                    histograms[sample] = bkghists[sample]
-                    if False and idx != firstsim_idx  and ( not "QMisID" in sample ) and ( not "Fakes" in sample):
-                        allsim.Add(bkghists[sample].Clone(histname[sample][0]))
-
-                if mybackgrounds :
-                    histograms["AllSimulation"] = allsim
-
-                if ttH.signals:
-                    for sample in ttH.signals:
-                        histograms[sample] = signal
-
-                # ------------------------------------------------------------------
-
-                # Set basic properties for histograms
-
-                for sample in histograms.keys():
-                    histograms[sample].SetNameTitle(histname[sample][0],"")
-                    histograms[sample].SetLineColor(histcolour[sample])
-                    histograms[sample].SetMarkerColor(histcolour[sample])
-
-                # ------------------------------------------------------------------
+                # Fill nominal and all the systematic variations w/ a single loop per input TChain
 
-                # Print yields
+                systdeps = ['plot:' + key]
+                if args.bookHistograms:
+                    graph.add('booksyst:' + key, 'book', bookVariableSystematics, (plot,), deps=systdeps, cost=nprocs)
+                    systdeps = ['booksyst:' + key]
 
-                outfile_exists = False
+                # Only the systematic variations in the DB which are relevant for *this* category
 
-                if mybackgrounds and any( v in var.shortname for v in ["Mll01","NJets","ProbePt","Lep0Pt","Integral"] ) and not ( var.typeval in [TH2I,TH2D,TH2F] ):
+                for syst in plot['systs']:
 
-                    outfile_exists = True
+                    graph.add('syst:' + key + ' ' + syst.name, 'systematics', plotVariableSystematics, (plot, syst), deps=systdeps, cost=1.0 if args.bookHistograms else 2*nprocs)
+                    writedeps.append('syst:' + key + ' ' + syst.name)
 
-                    s = 0
-                    err_s = Double(0)
-                    err_b = Double(0)
-                    if ttH.signals and "TTBarH" in ttH.signals:
-                        if merge_overflow:
-                            last_bin_idx_s = histograms["TTBarH"].GetNbinsX()
-                        else:
-                            last_bin_idx_s = histograms["TTBarH"].GetNbinsX()+1
-                        s = histograms["TTBarH"].IntegralAndError(0,last_bin_idx_s,err_s)
+            graph.add('write:' + key, 'write', writeVariable, (plot,), deps=writedeps, cost=1.0)
 
-                    if merge_overflow:
-                        last_bin_idx_b = histograms["Expected"].GetNbinsX()
-                    else:
-                        last_bin_idx_b = histograms["Expected"].GetNbinsX()+1
-                    b = histograms["Expected"].IntegralAndError(0,last_bin_idx_b,err_b)
-
-                    Z = (-1,-1)
-                    if b > 0:
-                        Z = calculate_Z( s, b, err_s, err_b, method="SoverSqrtB" )
-
-                    print (" ")
-                    print ("\t\tCategory: {0} - Variable: {1}\n".format( category.name, var.shortname ))
-                    print ("\t\tIntegral:\n")
-
-                    outfile.write("Category: %s \n" %(category.name))
-                    outfile.write("Variable: %s \n" %(var.shortname))
-                    outfile.write("\n")
-                    outfile.write("\\begin{table}\n\\begin{center}\n\\begin{tabular}{ccc}\n\\toprule\n & Yields & N/(Tot. bkg.) \\\\ \n\\midrule\n")
-
-                    err=Double(0)  # integral error
-                    value=0        # integral value
-
-		    for sample in histograms.keys():
-
-			# Include underflow, but if option merge_overflow = True, do not take overflow bin!
-                        # In fact, in that case, the last visible bin will contain the OFlow bin.
-
-                        if merge_overflow:
-                            last_bin_idx = histograms[sample].GetNbinsX()
-                        else:
-                            last_bin_idx = histograms[sample].GetNbinsX()+1
-
-                        value = histograms[sample].IntegralAndError(0,last_bin_idx,err)
-
-                        percentage_str = percentage_outfilestr = ""
-                        if b and not sample in ["Observed","TTBarH","Expected"]:
-			    percentage_str        = " ({0:.1f} % tot. bkg.)".format((value/b)*1e2)
-			    percentage_outfilestr = "{0:.1f} $\%$".format((value/b)*1e2)
-
-			yields_outstream     = "\t\t{0}: {1:.2f} +- {2:.2f}".format(histname[sample][0], value, err) + percentage_str
-			yields_outfilestream = "{0} & {1:.2f} $\pm$ {2:.2f} & ".format(histname[sample][1], value, err) + percentage_outfilestr + " \\\\ \n"
-
-			print (yields_outstream)
-                        outfile.write(yields_outfilestream)
-
-                        # Print each bin content
-
-			if "NJets" in var.shortname:
-
-                            # Neglect underflow, but not overflow!
-
-                            for bin in range(1,histograms[sample].GetNbinsX()+2):
-                                err_bin   = Double(0)
-                                value_bin = 0
-                                this_bin  = histograms[sample].GetBinCenter(bin)
-                                value_bin = histograms[sample].GetBinContent(bin)
-                                err_bin   = histograms[sample].GetBinError(bin)
-
-                                if (histograms[sample].IsBinOverflow(bin)):
-                                    print ("\t\t  OVERFLOW BIN:")
-                                    outfile.write("  OVERFLOW BIN:\n")
-
-                                # If it"s the last visible bin, and merge_overflow = True, subtract overflow from this bin
-
-                                if ( merge_overflow and histograms[sample].IsBinOverflow(bin+1) ):
-                                    value_bin -= histograms[sample].GetBinContent(bin+1)
-                                    err_bin   = 0
-                                print ("\t\t  {0}-jets bin: {1:.2f} +- {2:.2f}".format(this_bin, value_bin, err_bin))
-                                outfile.write("  %i-jets bin: %.2f +- %.2f \n" %(this_bin, value_bin, err_bin))
-
-                            # Get integral and error from njets>=5 bins (including OFlow) in one go!
-
-                            if ( var.shortname == "NJets" ):
-                                err_HJ   = Double(0)
-                                value_HJ = histograms[sample].IntegralAndError (6,last_bin_idx,err_HJ)
-                                print ("\n\t\t  >=5-jets bin: {0:.2f} +- {1:.2f}".format(value_HJ, err_HJ))
-                                outfile.write("\n  >=5-jets bin: %.2f +- %.2f \n" %(value_HJ, err_HJ))
-
-                    if Z[0] >= 0:
-                        Z_outstream     = "\t\t{0}: {1:.2f} +- {2:.2f}".format("S/sqrt(B)", Z[0], Z[1])
-                        Z_outfilestream = "{0} & {1:.2f} $\pm$ {2:.2f} & ".format("S/$\\sqrt\\textrm{B}$", Z[0], Z[1]) + " \\\\ \n"
-			print Z_outstream
-                        outfile.write(Z_outfilestream)
-
-                    outfile.write("\\bottomrule\n\\end{tabular}\n\\end{center}\n\\end{table}\n")
-
-                    print ("\n\t\tGetEntries:\n")
-                    print ("\t\tNB 1): this is actually N = GetEntries()-2 \n\t\t       Still not understood why there's such an offset...\n")
-                    print ("\t\tNB 2): this number does not take into account overflow bin. Better to look at the integral obtained with --noWeights option...\n")
-                    outfile.write("\nGetEntries: \n")
-                    for sample in histograms.keys():
-                        print ("\t\t{0}: {1}".format(histname[sample][0], histograms[sample].GetEntries()-2))
-                        outfile.write("entries %s: %f \n" %(histname[sample][0], histograms[sample].GetEntries()-2))
-
-                for sample in histograms.keys():
-                    histograms[sample].Write()
-                foutput.Close()
-
-                if outfile_exists:
-                    outfile.close()
+    # -------------------------------------------------------------
+    # Execute the graph (or only the partition for this batch job)
+    # -------------------------------------------------------------
 
-            #"""
+    if taskplan is not None:
+        planned_keys = set( task['key'] for task in taskplan['tasks'] )
+        if planned_keys != set(graph.tasks.keys()):
+            print("ERROR: the task plan in {0} doesn't match the plots planned w/ the current options and definitions ({1} tasks planned, {2} in the plan)".format(args.taskPlan, len(graph), len(planned_keys)))
+            sys.exit(1)
+        partitions = taskplan.get('partitions') if args.nBatches > 1 else None
+        if args.nBatches > 1 and ( partitions is None or len(partitions) > args.nBatches ):
+            print("ERROR: the task plan in {0} has not been split in {1} batches".format(args.taskPlan, args.nBatches))
+            sys.exit(1)
+    else:
+        partitions = graph.partition(args.nBatches) if args.nBatches > 1 else None
+
+    if args.dumpTaskGraph:
+        graph.dump(args.dumpTaskGraph, partitions, extra={'uptodate' : sorted(uptodateplots)} if args.incremental else None)
+        print("\nTask graph w/ {0} tasks written to {1}\n".format(len(graph), args.dumpTaskGraph))
+        sys.exit(0)
+
+    keys = None
+    if partitions is not None:
+        keys = partitions[args.batchIndex] if args.batchIndex < len(partitions) else []
+        print("\nExecuting batch {0} of {1}: {2} tasks out of {3}\n".format(args.batchIndex, args.nBatches, len(keys), len(graph)))
+
+    if args.plotStore:
+        if args.nPlotWorkers <= 1:
+            openPlotStore()
+            graph.run(keys=keys)
+            closePlotStore()
+        else:
+            nshards = graph.run(nworkers=args.nPlotWorkers, keys=keys, initializer=openPlotStore, finalizer=closePlotStore)
+            store = PlotStore(storepath, storemode)
+            for index in range(nshards):
+                store.merge(storeShard(index))
+                os.remove(storeShard(index))
+            store.close()
+    else:
+        graph.run(nworkers=args.nPlotWorkers, keys=keys)
+    graph.printSummary()
+    database.printSummary()
+
+    if args.plotStore:
+        nrendered = renderPlots(ttH, storepath, render_formats, nworkers=args.nRenderWorkers, force=bool(args.forceRender))
+        print("\nRendered {0} plots from {1}\n".format(nrendered, storepath))
+
+    # Record the plots produced by this job in the manifest
+
+    executed = set(graph.closure(keys)) if keys is not None else None
+    produced = [ plot for plot in planned if executed is None or 'write:' + plot['key'] in executed ]
+    for plot in produced:
+        manifest.set(plot['plotname'], plot['fingerprint'], plot['outputs'])
+    manifest.save()
+
+    if args.incremental:
+        print("\n{0} plots up to date (skipped), {1} plots produced\n".format(uptodate, len(produced)))
+
+    SubProcess.histcache.printSummary()
+    NTupleTools.printReadStats(since=readstats)
+    if SubProcess.backend:
+        SubProcess.backend.printSummary()
+    if SubProcess.diskcache:
+        SubProcess.diskcache.printSummary()
@@ -0,0 +1,362 @@
+""" NumPyTools.py: vectorised NumPy backend to fill the histograms and yields of BackgroundTools.SubProcess """
+
+__author__     = "Marco Milesi"
+__email__      = "marco.milesi@cern.ch"
+__maintainer__ = "Marco Milesi"
+
+import re
+
+from collections import OrderedDict
+
+try:
+    import numpy
+    from root_numpy import tree2array
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+class FormulaError(Exception):
+    pass
+
+class FormulaTranslator:
+
+    # Translates a TTreeFormula expression (as used in Cut strings, event weights and variables) into an equivalent
+    # Python expression on NumPy arrays.
+    #
+    # The expression is parsed w/ the C operator precedence and every operation is written out w/ explicit
+    # parentheses, so that the different precedence of the Python bitwise operators does not matter.
+    # As in TTreeFormula, everything is evaluated in double precision: comparisons and logical operations return 0./1.
+    # (never NumPy booleans, whose arithmetic differs: True + True is True), and a division by zero returns 0.
+    #
+    # Anything which is not supported (array branches, aliases, special variables like Entry$, functions not listed below...)
+    # raises a FormulaError: in that case the caller is expected to fall back to TTree::Project.
+
+    functions = {
+        'TMath::Abs'   : 'numpy.abs',     'abs'   : 'numpy.abs',   'fabs'  : 'numpy.abs',
+        'TMath::Sqrt'  : 'numpy.sqrt',    'sqrt'  : 'numpy.sqrt',
+        'TMath::Exp'   : 'numpy.exp',     'exp'   : 'numpy.exp',
+        'TMath::Log'   : 'numpy.log',     'log'   : 'numpy.log',
+        'TMath::Log10' : 'numpy.log10',   'log10' : 'numpy.log10',
+        'TMath::Power' : 'numpy.power',   'pow'   : 'numpy.power',
+        'TMath::Cos'   : 'numpy.cos',     'cos'   : 'numpy.cos',
+        'TMath::Sin'   : 'numpy.sin',     'sin'   : 'numpy.sin',
+        'TMath::Tan'   : 'numpy.tan',     'tan'   : 'numpy.tan',
+        'TMath::ACos'  : 'numpy.arccos',  'acos'  : 'numpy.arccos',
+        'TMath::ASin'  : 'numpy.arcsin',  'asin'  : 'numpy.arcsin',
+        'TMath::ATan'  : 'numpy.arctan',  'atan'  : 'numpy.arctan',
+        'TMath::ATan2' : 'numpy.arctan2', 'atan2' : 'numpy.arctan2',
+        'TMath::CosH'  : 'numpy.cosh',    'cosh'  : 'numpy.cosh',
+        'TMath::SinH'  : 'numpy.sinh',    'sinh'  : 'numpy.sinh',
+        'TMath::TanH'  : 'numpy.tanh',    'tanh'  : 'numpy.tanh',
+        'TMath::Min'   : 'numpy.minimum',
+        'TMath::Max'   : 'numpy.maximum',
+        'TMath::Pi'    : 'numpy.pi',
+    }
+
+    tokenizer = re.compile(r'\s*(?:(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)|(?P<name>[A-Za-z_][\w$]*(?:(?:::|\.)[A-Za-z_]\w*)*)|(?P<op>\|\||&&|==|!=|<=|>=|[-+*/%<>!(),?:\[\]]))')
+
+    # Binary operators, from the lowest to the highest precedence
+
+    binaryops = [
+        ['||'],
+        ['&&'],
+        ['==', '!='],
+        ['<', '<=', '>', '>='],
+        ['+', '-'],
+        ['*', '/', '%'],
+    ]
+
+    def __init__(self, formula):
+        self.formula  = formula
+        self.tokens   = self.tokenize(formula)
+        self.pos      = 0
+        self.branches = set()
+        self.expression = self.parseBinary(0)
+        if self.pos != len(self.tokens):
+            raise FormulaError('Unexpected token \'%s\' in: %s' % (self.tokens[self.pos][1], formula))
+
+    def tokenize(self, formula):
+        tokens = []
+        pos = 0
+        formula = formula.rstrip()
+        while pos < len(formula):
+            match = self.tokenizer.match(formula, pos)
+            if not match or match.end() == pos:
+                raise FormulaError('Cannot parse: %s' % formula)
+            kind = match.lastgroup
+            tokens.append( (kind, match.group(kind)) )
+            pos = match.end()
+        return tokens
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def expect(self, op):
+        if self.peek() != ('op', op):
+            raise FormulaError('Expected \'%s\' in: %s' % (op, self.formula))
+        self.pos += 1
+
+    def parseBinary(self, level):
+        if level == len(self.binaryops):
+            return self.parseUnary()
+        left = self.parseBinary(level+1)
+        while self.peek()[0] == 'op' and self.peek()[1] in self.binaryops[level]:
+            op = self.peek()[1]
+            self.pos += 1
+            right = self.parseBinary(level+1)
+            if op == '||':
+                left = self.asdouble('numpy.logical_or(%s, %s)' % (left, right))
+            elif op == '&&':
+                left = self.asdouble('numpy.logical_and(%s, %s)' % (left, right))
+            elif op == '%':
+                left = 'numpy.fmod(numpy.trunc(%s), numpy.trunc(%s))' % (left, right) # Integer modulo, as in TTreeFormula
+            elif op == '/':
+                left = 'divide(%s, %s)' % (left, right)
+            elif op in ['+', '-', '*']:
+                left = '(%s %s %s)' % (left, op, right)
+            else:
+                left = self.asdouble('(%s %s %s)' % (left, op, right))
+        return left
+
+    @staticmethod
+    def asdouble(expression):
+        return 'numpy.asarray(%s, dtype=numpy.float64)' % expression
+
+    def parseUnary(self):
+        kind, value = self.peek()
+        if kind == 'op' and value in ['!', '-', '+']:
+            self.pos += 1
+            operand = self.parseUnary()
+            if value == '!':
+                return self.asdouble('numpy.logical_not(%s)' % operand)
+            return '(%s%s)' % (value, operand)
+        return self.parsePrimary()
+
+    def parsePrimary(self):
+        kind, value = self.peek()
+        self.pos += 1
+        if kind == 'number':
+            return 'numpy.float64(%s)' % value
+        if kind == 'op' and value == '(':
+            expression = self.parseBinary(0)
+            self.expect(')')
+            return '(%s)' % expression
+        if kind == 'name':
+            if self.peek() == ('op', '('):
+                self.pos += 1
+                if not value in self.functions:
+                    raise FormulaError('Function %s is not supported' % value)
+                args = []
+                if self.peek() != ('op', ')'):
+                    args.append(self.parseBinary(0))
+                    while self.peek() == ('op', ','):
+                        self.pos += 1
+                        args.append(self.parseBinary(0))
+                self.expect(')')
+                if not args:
+                    return self.functions[value]
+                return '%s(%s)' % (self.functions[value], ', '.join(args))
+            if self.peek() == ('op', '['):
+                raise FormulaError('Array branches are not supported: %s' % value)
+            if '$' in value or '::' in value or '.' in value:
+                raise FormulaError('Unsupported identifier: %s' % value)
+            if value in ['true', 'false']:
+                return 'numpy.float64(%d)' % (value == 'true')
+            self.branches.add(value)
+            return 'branches[\'%s\']' % value
+        raise FormulaError('Unexpected token \'%s\' in: %s' % (value, self.formula))
+
+def divide(numerator, denominator):
+
+    # Division as in TTreeFormula: 0 where the denominator is 0
+
+    numerator, denominator = numpy.broadcast_arrays(numpy.asarray(numerator, dtype=numpy.float64), numpy.asarray(denominator, dtype=numpy.float64))
+    result = numpy.zeros(numerator.shape, dtype=numpy.float64)
+    numpy.divide(numerator, denominator, out=result, where=( denominator != 0. ))
+    return result
+
+def splitVarexp(varexp):
+
+    # Split a "y:x" TTree::Draw expression, skipping the "::" scope operator
+
+    i = 0
+    while i < len(varexp):
+        if varexp[i] == ':':
+            if varexp[i+1:i+2] == ':':
+                i += 2
+                continue
+            return varexp[:i], varexp[i+1:]
+        i += 1
+    return None, varexp
+
+class NumPyBackend:
+
+    # Loads the branches needed by a projection into NumPy arrays (once per TChain and branch, w/ a memory budget
+    # in bytes: when it is exceeded, the arrays of the least recently used TChains are dropped),
+    # evaluates the variable and the selection as vectorised expressions, and fills the histogram
+    # w/ numpy.histogram/histogram2d.
+    #
+    # To reproduce TTree::Project bin-by-bin, the bin edges are extended w/ -inf/+inf, so that out-of-range values
+    # end up in the underflow/overflow bins, and each entry is weighted by the weight of the tree it belongs to in the TChain.
+    # project() returns False whenever the projection cannot be done this way, so that the caller can fall back to TTree::Project.
+
+    def __init__(self, debug=False, maxsize=2*1024**3):
+        self.debug    = debug
+        self.maxsize  = maxsize
+        self.arrays   = OrderedDict()
+        self.weights  = {}
+        self.formulas = {}
+        self.filled   = 0
+        self.fallbacks = 0
+        self.entriesread = 0
+
+    def translate(self, formula):
+        if not formula in self.formulas:
+            try:
+                self.formulas[formula] = FormulaTranslator(formula)
+            except FormulaError, e:
+                self.formulas[formula] = e
+        return self.formulas[formula]
+
+    def isScalar(self, tree, branchname):
+        if tree.GetAlias(branchname):
+            return False
+        branch = tree.GetBranch(branchname)
+        if not branch or branch.GetClassName():
+            return False
+        leaves = branch.GetListOfLeaves()
+        if leaves.GetEntries() != 1:
+            return False
+        return leaves.At(0).GetLenStatic() == 1 and not leaves.At(0).GetLeafCount()
+
+    def treeWeights(self, tree):
+
+        # Per-entry weight of the trees in the chain, as applied by TTree::Project
+
+        title = tree.GetTitle()
+        if not title in self.weights:
+            nentries = tree.GetEntries()
+            weights = numpy.ones(nentries, dtype=numpy.float64)
+            if hasattr(tree, 'GetTreeOffset') and tree.GetNtrees():
+                offsets = tree.GetTreeOffset()
+                for i in range(tree.GetNtrees()):
+                    start = offsets[i]
+                    end = offsets[i+1] if i+1 < tree.GetNtrees() else nentries
+                    if end <= start: continue
+                    tree.LoadTree(start)
+                    weights[start:end] = tree.GetWeight()
+            else:
+                weights *= tree.GetWeight()
+            self.weights[title] = weights
+        return self.weights[title]
+
+    def loadBranches(self, tree, branches):
+        title = tree.GetTitle()
+        arrays = self.arrays.pop(title, {})
+        self.arrays[title] = arrays # Move to the most recently used end
+        missing = sorted( b for b in branches if not b in arrays )
+        if missing:
+            if self.debug:
+                print("NumPyBackend: loading branches {0} from tree {1}".format(missing, title))
+            data = tree2array(tree, branches=missing)
+            self.entriesread += len(data)
+            for b in missing:
+                arrays[b] = numpy.asarray(data[b], dtype=numpy.float64)
+            self.evict(keep=title)
+        return arrays
+
+    def size(self):
+        return sum( a.nbytes for arrays in self.arrays.itervalues() for a in arrays.itervalues() )
+
+    def evict(self, keep=None):
+
+        # Drop the arrays of the least recently used TChains until the budget is met again (never those of keep)
+
+        if self.maxsize is None:
+            return
+        for title in list(self.arrays.keys()):
+            if self.size() <= self.maxsize:
+                break
+            if title == keep:
+                continue
+            if self.debug:
+                print("NumPyBackend: dropping the arrays of tree {0}".format(title))
+            del self.arrays[title]
+            self.weights.pop(title, None)
+
+    def evaluate(self, translator, branches, nentries):
+        values = eval(translator.expression, {'numpy' : numpy, 'divide' : divide}, {'branches' : branches})
+        return numpy.broadcast_to(numpy.asarray(values, dtype=numpy.float64), (nentries,))
+
+    def edges(self, axis):
+        edges = numpy.array([ axis.GetBinLowEdge(i) for i in range(1, axis.GetNbins()+2) ], dtype=numpy.float64)
+        return numpy.concatenate(( [-numpy.inf], edges, [numpy.inf] ))
+
+    def project(self, tree, h, varexp, selection):
+
+        # Fill h as tree.Project(h.GetName(), varexp, selection) would. Returns False if not possible.
+
+        expY, expX = splitVarexp(varexp)
+        if ( h.GetDimension() == 2 ) != ( expY is not None ) or h.GetDimension() > 2:
+            self.fallbacks += 1
+            return False
+
+        translators = [ self.translate(exp) for exp in [expX, expY, selection or '1'] if exp is not None ]
+        if any( isinstance(t, FormulaError) for t in translators ):
+            if self.debug:
+                print("NumPyBackend: falling back to TTree::Project for {0} - {1}".format(h.GetName(), [ str(t) for t in translators if isinstance(t, FormulaError) ]))
+            self.fallbacks += 1
+            return False
+
+        needed = set()
+        for t in translators:
+            needed |= t.branches
+        if not all( self.isScalar(tree, b) for b in needed ):
+            self.fallbacks += 1
+            return False
+
+        try:
+            branches = self.loadBranches(tree, needed)
+        except Exception, e:
+            print("NumPyBackend: cannot load branches {0} from tree {1}, falling back to TTree::Project - {2}".format(sorted(needed), tree.GetTitle(), e))
+            self.fallbacks += 1
+            return False
+        nentries = len(self.treeWeights(tree))
+
+        try:
+            x = self.evaluate(translators[0], branches, nentries)
+            w = self.evaluate(translators[-1], branches, nentries) * self.treeWeights(tree)
+
+            # As in TTree::Project, entries w/ a null weight are not filled at all
+
+            filled = ( w != 0. )
+            x, w = x[filled], w[filled]
+
+            if h.GetDimension() == 2:
+                y = self.evaluate(translators[1], branches, nentries)[filled]
+                sumw,  ex, ey = numpy.histogram2d(x, y, bins=[self.edges(h.GetXaxis()), self.edges(h.GetYaxis())], weights=w)
+                sumw2, ex, ey = numpy.histogram2d(x, y, bins=[self.edges(h.GetXaxis()), self.edges(h.GetYaxis())], weights=w*w)
+                sumw, sumw2 = sumw.flatten(order='F'), sumw2.flatten(order='F') # Global bin = binx + (nbinsx+2) * biny
+            else:
+                sumw,  e = numpy.histogram(x, bins=self.edges(h.GetXaxis()), weights=w)
+                sumw2, e = numpy.histogram(x, bins=self.edges(h.GetXaxis()), weights=w*w)
+        except Exception, e:
+            print("NumPyBackend: cannot evaluate {0}, falling back to TTree::Project - {1}".format(h.GetName(), e))
+            self.fallbacks += 1
+            return False
+
+        h.Reset()
+        if not h.GetSumw2N():
+            h.Sumw2()
+        for ibin in range(len(sumw)):
+            h.SetBinContent(ibin, sumw[ibin])
+            h.SetBinError(ibin, numpy.sqrt(sumw2[ibin]))
+        h.SetEntries(len(w))
+
+        self.filled += 1
+        return True
+
+    def printSummary(self):
+        print("\nNumPyBackend: {0} projections filled w/ NumPy, {1} fell back to TTree::Project, {2:.1f} MB of arrays in memory\n".format(self.filled, self.fallbacks, self.size()/1024.**2))
@@ -0,0 +1,250 @@
+""" PlotStore.py: consolidated ROOT file w/ the contents of all the plots of a run, and parallel rendering of the plots it stores """
+
+__author__     = "Marco Milesi"
+__email__      = "marco.milesi@cern.ch"
+__maintainer__ = "Marco Milesi"
+
+import os, json
+
+from collections import OrderedDict
+
+from ROOT import TFile, TObjString, TObject, gROOT
+
+from Core import parallelMap
+
+class ProcessInfo:
+
+    # What the rendering of a plot needs to know about a process
+
+    def __init__(self, name, latexname, colour, isdata=False):
+        self.name      = name
+        self.latexname = latexname
+        self.colour    = colour
+        self.isdata    = isdata
+
+    @classmethod
+    def fromProcess(cls, process, isdata=False):
+        return cls(process.__class__.__name__, process.latexname, process.colour, isdata)
+
+    @classmethod
+    def fromDict(cls, d):
+        return cls(d['name'], d['latexname'], d['colour'], d.get('isdata', False))
+
+    def toDict(self):
+        return {'name': self.name, 'latexname': self.latexname, 'colour': self.colour, 'isdata': self.isdata}
+
+class PlotContent:
+
+    # The histograms of a plot, as produced by Background.produce and drawn by Background.render:
+    # the observed and the signal histograms, the sum of the backgrounds and the list of ( histogram, ProcessInfo ) of each background
+
+    def __init__(self, var):
+        self.var      = var
+        self.obs      = None
+        self.observed = None
+        self.tSum     = None
+        self.bkglist  = []
+        self.sig      = None
+        self.signal   = None
+
+    def backgrounds(self):
+        return dict( (process.name, h) for h, process in self.bkglist )
+
+class PlotStore:
+
+    # A single ROOT file w/ the contents of all the plots of a run. The histograms of each plot are kept in their
+    # own directory, and the index (a JSON TObjString) maps the name of each plot to its directory, the variable,
+    # the processes and the options it has to be rendered with.
+
+    def __init__(self, path, mode='READ'):
+        self.path  = path
+        self.mode  = mode.upper()
+        self.index = OrderedDict()
+        currentdir = gROOT.CurrentDirectory()
+        self.f = TFile.Open(path, mode)
+        currentdir.cd()
+        if not self.f or self.f.IsZombie():
+            raise IOError("Cannot open plot store {0}".format(path))
+        index = self.f.Get('index')
+        if index:
+            self.index = json.loads(index.GetString().Data(), object_pairs_hook=OrderedDict)
+
+    def keys(self):
+        return self.index.keys()
+
+    def __contains__(self, plotname):
+        return plotname in self.index
+
+    def put(self, plotname, content, options={}):
+
+        # Store a PlotContent, w/ the options (keyword arguments of Background.render) to render it with
+
+        if plotname in self.index:
+            dirname = self.index[plotname]['dir']
+        else:
+            dirname = 'plot{0}'.format(len(self.index))
+        currentdir = gROOT.CurrentDirectory()
+        d = self.f.GetDirectory(dirname) or self.f.mkdir(dirname)
+        d.cd()
+        for name, h in [('obs', content.obs), ('tSum', content.tSum), ('sig', content.sig)] + [ ('bkg{0}'.format(i), h) for i, (h, process) in enumerate(content.bkglist) ]:
+            if h:
+                h.Write(name, TObject.kOverwrite)
+        currentdir.cd()
+
+        self.index[plotname] = OrderedDict([
+            ('dir',         dirname),
+            ('var',         content.var.shortname),
+            ('observed',    content.observed.toDict() if content.observed else None),
+            ('signal',      content.signal.toDict() if content.signal else None),
+            ('backgrounds', [ process.toDict() for h, process in content.bkglist ]),
+            ('options',     options),
+        ])
+
+    def get(self, plotname, background):
+
+        # Read back a PlotContent and its rendering options. The variable is taken from the VariableDB of background,
+        # and the latex names and colours of the processes from its current definitions (when available), so that
+        # any change to the style is picked up w/o producing the histograms again.
+
+        entry = self.index[plotname]
+        content = PlotContent(background.vardb.getVar(entry['var']))
+
+        def histogram(name):
+            h = self.f.Get(entry['dir'] + '/' + name)
+            if h:
+                h.SetDirectory(0)
+            return h
+
+        def process(d):
+            info = ProcessInfo.fromDict(d)
+            current = background.procmap.get(info.name)
+            if current:
+                info.latexname, info.colour = current.latexname, current.colour
+            return info
+
+        if entry['observed']:
+            content.obs      = histogram('obs')
+            content.observed = process(entry['observed'])
+        if entry['signal']:
+            content.sig    = histogram('sig')
+            content.signal = process(entry['signal'])
+        content.tSum    = histogram('tSum')
+        content.bkglist = [ (histogram('bkg{0}'.format(i)), process(d)) for i, d in enumerate(entry['backgrounds']) ]
+
+        options = dict(entry['options'])
+        if isinstance(options.get('showratio'), list):
+            options['showratio'] = tuple(options['showratio'])
+        return content, options
+
+    def merge(self, path):
+
+        # Copy all the plots of another store into this one
+
+        other = PlotStore(path)
+        for plotname, entry in other.index.iteritems():
+            if plotname in self.index:
+                dirname = self.index[plotname]['dir']
+            else:
+                dirname = 'plot{0}'.format(len(self.index))
+            currentdir = gROOT.CurrentDirectory()
+            d = self.f.GetDirectory(dirname) or self.f.mkdir(dirname)
+            for key in other.f.GetDirectory(entry['dir']).GetListOfKeys():
+                h = key.ReadObj()
+                d.cd()
+                h.Write(key.GetName(), TObject.kOverwrite)
+            currentdir.cd()
+            self.index[plotname] = OrderedDict(entry)
+            self.index[plotname]['dir'] = dirname
+        other.close()
+
+    def close(self):
+        if self.mode in ['RECREATE', 'UPDATE', 'NEW', 'CREATE']:
+            currentdir = gROOT.CurrentDirectory()
+            self.f.cd()
+            TObjString(json.dumps(self.index)).Write('index', TObject.kOverwrite)
+            currentdir.cd()
+        self.f.Close()
+
+# ---------------
+# Rendering stage
+# ---------------
+
+_renderbackground = None
+
+def renderPlots(background, paths, formats, nworkers=1, plotnames=None, force=False):
+
+    # Render the plots kept in the stores (all of them, or only plotnames) w/ background.render, saving each of them
+    # as plotname + format for each of the requested formats (e.g. ['.png', '.pdf']). Formats are produced lazily:
+    # outputs newer than their store are not rendered again, unless force is set.
+    # Returns the number of plots rendered. The plots whose rendering failed (or killed its worker) are reported.
+
+    global _renderbackground
+
+    if type(paths) is str:
+        paths = [paths]
+
+    jobs = []
+    for path in paths:
+        store = PlotStore(path)
+        for plotname in store.keys():
+            if plotnames is None or plotname in plotnames:
+                jobs.append( (path, plotname, formats, force) )
+        store.close()
+
+    if not jobs or not formats:
+        return 0
+
+    print("\nRendering {0} plots in formats {1} w/ {2} worker(s)...\n".format(len(jobs), ', '.join(formats), nworkers))
+
+    _renderbackground = background
+    if nworkers > 1:
+        rendered, failed = parallelMap(_renderJob, jobs, nworkers)
+        if failed:
+            print("\nERROR: the rendering of {0} plots failed:".format(len(failed)))
+            for index in sorted(failed):
+                print("  {0} from {1}: {2}".format(jobs[index][1], jobs[index][0], failed[index]))
+            print("")
+        rendered = [ n for n in rendered if n ]
+    else:
+        try:
+            rendered = map(_renderJob, jobs)
+        finally:
+            _closeRenderStores()
+    _renderbackground = None
+
+    return sum(rendered)
+
+_renderstores = {}
+
+def _renderJob(job):
+
+    path, plotname, formats, force = job
+
+    save = []
+    for fmt in formats:
+        target = plotname + fmt
+        if force or not os.path.isfile(target) or os.path.getmtime(target) < os.path.getmtime(path):
+            save.append(target)
+    if not save:
+        return 0
+
+    # The jobs come store by store: keep only the store being rendered open
+    if not path in _renderstores:
+        _closeRenderStores()
+        _renderstores[path] = PlotStore(path)
+    content, options = _renderstores[path].get(plotname, _renderbackground)
+
+    dirname = os.path.dirname(plotname)
+    if dirname and not os.path.exists(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            pass # Might have been created in the meantime by another worker
+
+    _renderbackground.render(content, save=save, wait=False, **options)
+    return 1
+
+def _closeRenderStores():
+    for store in _renderstores.itervalues():
+        store.close()
+    _renderstores.clear()
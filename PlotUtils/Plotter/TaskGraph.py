@@ -0,0 +1,188 @@
+""" TaskGraph.py: a graph of tasks w/ deduplication of the shared ones, a local scheduler and a partitioner for batch jobs """
+
+__author__     = "Marco Milesi"
+__email__      = "marco.milesi@cern.ch"
+__maintainer__ = "Marco Milesi"
+
+import os, sys, time, json, multiprocessing
+
+from collections import OrderedDict
+
+class Task:
+
+    # A node of the graph: func(*args) is executed once all the tasks it depends on have been executed.
+    # The cost is a relative estimate of the execution time, used to balance the partitions of the graph.
+
+    def __init__(self, key, kind, func, args=(), deps=[], cost=1.0):
+        self.key      = key
+        self.kind     = kind
+        self.func     = func
+        self.args     = args
+        self.deps     = list(deps)
+        self.cost     = cost
+        self.done     = False
+        self.walltime = None
+
+class TaskGraph:
+
+    # Tasks are identified by their key. Adding a task whose key is already in the graph returns the existing task,
+    # so that the tasks shared by several others (e.g. the booking of all the histograms of a category,
+    # needed by every plot in that category) are planned, and executed, only once.
+    #
+    # Tasks must be added after their dependencies, hence the insertion order is a topological order:
+    # the serial execution follows it, and gives the same sequence of operations as the nested loops it replaces.
+
+    def __init__(self):
+        self.tasks  = OrderedDict()
+        self.shared = 0
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __contains__(self, key):
+        return key in self.tasks
+
+    def add(self, key, kind, func, args=(), deps=[], cost=1.0):
+        if key in self.tasks:
+            self.shared += 1
+            return self.tasks[key]
+        for dep in deps:
+            if not dep in self.tasks:
+                raise KeyError("Task {0} depends on {1}, which is not in the graph (yet)".format(key, dep))
+        self.tasks[key] = Task(key, kind, func, args, deps, cost)
+        return self.tasks[key]
+
+    def targets(self):
+
+        # The tasks no other task depends on
+
+        needed = set( dep for task in self.tasks.itervalues() for dep in task.deps )
+        return [ key for key in self.tasks if not key in needed ]
+
+    def closure(self, keys):
+
+        # The tasks in keys and all their dependencies, in topological order
+
+        selected = set()
+        stack = list(keys)
+        while stack:
+            key = stack.pop()
+            if key in selected:
+                continue
+            selected.add(key)
+            stack.extend(self.tasks[key].deps)
+        return [ key for key in self.tasks if key in selected ]
+
+    def partition(self, nparts):
+
+        # Split the graph into (at most) nparts partitions w/ balanced costs. Each partition is a set of targets w/ all
+        # their dependencies, so that it can be executed on its own (in a worker process, or in a batch job).
+        # Targets are assigned by decreasing cost, each to the partition whose cost would increase the least,
+        # counting only the dependencies which that partition doesn't have yet: targets sharing dependencies thus tend
+        # to end up together, and the shared tasks are executed in as few partitions as possible.
+
+        closures = dict( (t, self.closure([t])) for t in self.targets() )
+        targets = [ (sum( self.tasks[k].cost for k in closures[t] ), t) for t in closures ]
+        targets.sort(key=lambda target: (-target[0], target[1]))
+
+        parts = [ {'keys': set(), 'cost': 0.} for i in range(min(nparts, len(targets))) ]
+        for cost, target in targets:
+            best, bestcost = None, None
+            for part in parts:
+                extra = sum( self.tasks[k].cost for k in closures[target] if not k in part['keys'] )
+                if best is None or part['cost'] + extra < bestcost:
+                    best, bestcost = part, part['cost'] + extra
+            best['keys'].update(closures[target])
+            best['cost'] = bestcost
+
+        return [ [ key for key in self.tasks if key in part['keys'] ] for part in parts ]
+
+    def execute(self, keys=None):
+
+        # Execute the tasks (by default all of them) in topological order, in this process
+
+        if keys is None:
+            keys = self.tasks.keys()
+        for key in self.closure(keys):
+            task = self.tasks[key]
+            if task.done:
+                continue
+            start = time.time()
+            task.func(*task.args)
+            task.walltime = time.time() - start
+            task.done = True
+
+    def work(self, keys, index, initializer=None, finalizer=None):
+
+        # Body of a worker process of run()
+
+        if initializer:
+            initializer(index)
+        self.execute(keys)
+        if finalizer:
+            finalizer(index)
+
+    def run(self, nworkers=1, keys=None, initializer=None, finalizer=None):
+
+        # Execute the tasks (by default all of them) either in this process, or - if nworkers > 1 - on nworkers
+        # forked processes, each executing a balanced partition of the graph. The results of the tasks are not
+        # sent back: in parallel mode, only the tasks writing their output to disk make sense.
+        # initializer(index) and finalizer(index) are called in each worker process, before and after its partition
+        # (e.g. to open and close an output file per worker). Returns the number of worker processes used.
+
+        if keys is not None:
+            graph = TaskGraph()
+            for key in self.closure(keys):
+                graph.tasks[key] = self.tasks[key]
+        else:
+            graph = self
+
+        if nworkers <= 1:
+            graph.execute()
+            return 1
+
+        partitions = graph.partition(nworkers)
+        print("\nExecuting {0} tasks in {1} worker processes: {2}\n".format(len(graph), len(partitions), ', '.join( '{0} tasks (cost: {1:.0f})'.format(len(p), sum( graph.tasks[k].cost for k in p )) for p in partitions )))
+
+        sys.stdout.flush()
+        workers = []
+        for index, part in enumerate(partitions):
+            worker = multiprocessing.Process(target=graph.work, args=(part, index, initializer, finalizer))
+            worker.start()
+            workers.append(worker)
+        failed = 0
+        for worker in workers:
+            worker.join()
+            if worker.exitcode:
+                failed += 1
+        if failed:
+            raise RuntimeError("{0} out of {1} worker processes of the task graph have failed".format(failed, len(workers)))
+        for key in graph.tasks:
+            graph.tasks[key].done = True
+        return len(workers)
+
+    def dump(self, path, partitions=None, extra=None):
+
+        # Write the plan (the tasks w/ their kind, dependencies and cost, and optionally the partitions) to a JSON file,
+        # w/ any extra entries the execution of the plan depends on
+
+        plan = { 'tasks': [ {'key': t.key, 'kind': t.kind, 'deps': t.deps, 'cost': t.cost} for t in self.tasks.itervalues() ] }
+        if partitions is not None:
+            plan['partitions'] = partitions
+        if extra:
+            plan.update(extra)
+        with open(path, 'w') as f:
+            json.dump(plan, f, indent=1)
+
+    def printSummary(self):
+        kinds = OrderedDict()
+        for task in self.tasks.itervalues():
+            stats = kinds.setdefault(task.kind, [0, 0, 0.])
+            stats[0] += 1
+            if task.walltime is not None:
+                stats[1] += 1
+                stats[2] += task.walltime
+        print("\nTaskGraph: {0} tasks ({1} requests for shared tasks deduplicated)".format(len(self.tasks), self.shared))
+        for kind, (ntasks, nexecuted, walltime) in kinds.iteritems():
+            print("\t{0:<12} {1:>6} tasks, {2:>6} executed here, {3:.1f} s".format(kind, ntasks, nexecuted, walltime))
+        print("")
@@ -6,9 +6,9 @@ __author__     = "Marco Milesi"
 __email__      = "marco.milesi@cern.ch"
 __maintainer__ = "Marco Milesi"
 
-import glob, os, sys, subprocess, shutil, string, argparse
+import glob, os, sys, subprocess, shutil, string, argparse, json, time, socket, tempfile
 
-parser = argparse.ArgumentParser(description="PBS plot making submission script for HTopMultilepAnalysis. Will submit a single main PBS job made up of an array of subjobs, one for each variable we want to plot.")
+parser = argparse.ArgumentParser(description="PBS plot making submission script for HTopMultilepAnalysis. Will submit a single main PBS job made up of an array of subjobs, each one plotting one or more of the variables we want to plot.")
 
 parser.add_argument("--outputdir", dest="outputdir", action="store", default="PLOTS_TEST", type=str,
                     help="The base directory where output of each job will be stored,, e.g. PLOTS_25ns_v27,...  (default: PLOTS_TEST)")
@@ -24,6 +24,16 @@ parser.add_argument("--queue", dest="queue", action="store", default="long", typ
                     help="The PBS batch queue type to be used (\"short\",\"long\", default: queue=\"long\")")
 parser.add_argument("--showvars", dest="showvars", action="store", const="-1", default=None, type=str, nargs='?',
                     help="Show on screen the list of variable names, with their corresponding indexes in the job array, then exit. If no argument is given to the option ( or using --showvars -1 ), will print the entire list. If the user gives one ore more comma-separated indexes as option, only the corresponding variable names will be printed.)")
+parser.add_argument("--njobs", dest="njobs", action="store", default=None, type=int,
+                    help="The number of subjobs in the array. The variables are packed into the subjobs so that their estimated costs are balanced (default: one subjob per variable)")
+parser.add_argument("--timings", dest="timings", action="store", default=None, type=str,
+                    help="Directory w/ the timings of the subjobs of previous submissions, used to estimate the cost of each variable (default: the \"timings/\" directory in the output path, if any)")
+parser.add_argument("--taskgraph", dest="taskgraph", action="store", default=None, type=str,
+                    help="JSON file w/ the plan of all the plots, as written by \'python Plotter/MakePlots_HTopMultilep.py <options> --dumpTaskGraph <file>\', used to estimate the cost of the variables w/o previous timings (default: None, i.e. all these variables have the same cost)")
+parser.add_argument("--backend", dest="backend", action="store", default="pbs", type=str, choices=["pbs","local"],
+                    help="Where to run the array of subjobs: \"pbs\" submits it w/ qsub, \"local\" runs the subjobs as processes on this machine, e.g. for testing (default: backend=\"pbs\")")
+parser.add_argument("--nlocalprocs", dest="nlocalprocs", action="store", default=1, type=int,
+                    help="The number of subjobs running concurrently w/ the local backend (default: 1)")
 parser.add_argument("--dry", dest="dry", action="store_true", default=False,
                     help="Dry-run")
 
@@ -67,17 +77,93 @@ def copy_source(subdir = string.Template("$TMPDIR").substitute(os.environ), forc
         print("Good! Tarball of code already exists in submission directory...")
 
 
+def estimate_costs(varlist, timingsdir=None, taskgraph=None):
+
+    # Relative cost of each variable, from the plan of all the plots (sum of the costs of the tasks of the variable,
+    # in units of the projection of one process, w/ the tasks shared by a category split among its variables).
+    # W/o a plan, all variables have the same cost.
+
+    prior = dict( (var, 1.0) for var in varlist )
+
+    if taskgraph:
+        with open(taskgraph) as f:
+            tasks = json.load(f)["tasks"]
+        prior = dict( (var, 0.0) for var in varlist )
+        shared = {}
+        catvars = {}
+        for task in tasks:
+            kind, name = task["key"].split(":",1)
+            if kind in ["book","yields"]:
+                shared[name] = shared.get(name, 0.0) + task["cost"]
+                continue
+            tokens = name.split(" ")
+            category, var = tokens[0], tokens[1]
+            catvars.setdefault(category, set()).add(var)
+            if var in prior:
+                prior[var] += task["cost"]
+        for category, cost in shared.iteritems():
+            for var in catvars.get(category, []):
+                if var in prior:
+                    prior[var] += cost / len(catvars[category])
+        for var in varlist:
+            if not prior[var]:
+                print("WARNING: variable {0} is not in the plan {1}, using the average cost".format(var,taskgraph))
+        average = sum( prior.itervalues() ) / max( 1, len([ c for c in prior.itervalues() if c ]) )
+        for var in varlist:
+            prior[var] = prior[var] or average
+
+    # Measured time (in seconds) of each variable, from the latest successful subjob where it was plotted.
+    # The time of a subjob w/ several variables is split among them according to their relative cost.
+
+    measured = {}
+    if timingsdir and os.path.isdir(timingsdir):
+        for path in sorted(glob.glob(timingsdir + "/timing_*.json"), key=os.path.getmtime):
+            try:
+                with open(path) as f:
+                    timing = json.load(f)
+            except (IOError, ValueError), e:
+                print("WARNING: cannot read timing from {0} - {1}".format(path,e))
+                continue
+            if timing["exitcode"]:
+                continue
+            total = sum( prior.get(var, 1.0) for var in timing["vars"] )
+            for var in timing["vars"]:
+                measured[var] = timing["walltime"] * prior.get(var, 1.0) / total
+
+    # Express everything in seconds, if any variable has been timed already
+
+    known = [ var for var in varlist if var in measured ]
+    if not known:
+        return prior, False
+    scale = sum( measured[var] for var in known ) / sum( prior[var] for var in known )
+    return dict( (var, measured[var] if var in measured else prior[var] * scale) for var in varlist ), True
+
+def pack_jobs(varlist, costs, njobs):
+
+    # Pack the variables into (at most) njobs subjobs w/ balanced costs: each variable, in order of decreasing cost,
+    # goes to the subjob w/ the lowest cost so far (longest processing time first).
+
+    jobs = [ {"vars" : [], "cost" : 0.0} for i in range(min(njobs, len(varlist))) ]
+    for var in sorted(varlist, key=lambda var: (-costs[var], varlist.index(var))):
+        job = min(jobs, key=lambda job: job["cost"])
+        job["vars"].append(var)
+        job["cost"] += costs[var]
+    for job in jobs:
+        job["vars"].sort(key=varlist.index)
+    jobs.sort(key=lambda job: -job["cost"])
+    return jobs
+
 def create_jobs(params):
 
     job_list = []
 
-    params.update( {"njobs" : len(params["varlist"]) })
-    params.update( {"upperjobidx" : len(params["varlist"])-1 })
+    params.update( {"njobs" : len(params["joblist"]) })
+    params.update( {"upperjobidx" : len(params["joblist"])-1 })
 
-    # Transform the plotting variable list into a single string of space-separated variable names
+    # Transform the list of subjobs into a single string of space-separated elements (the variables of each subjob, comma-separated)
     # to pass as an argument to the PBS job script.
 
-    vars_str = " ".join( params["varlist"] )
+    vars_str = " ".join( ",".join(job["vars"]) for job in params["joblist"] )
     params.update( {"vars" : vars_str} )
 
     # Here would go an hypotethical loop over systematics...
@@ -92,7 +178,7 @@ def create_jobs(params):
 
     print("Creating job submission scripts w/ parameters:\n")
     for key,value in params.iteritems():
-        if key == "steer_job" : continue
+        if key in ["steer_job","joblist"] : continue
         print("{0} : {1}".format(key,value))
     print("")
 
@@ -100,11 +186,50 @@ def create_jobs(params):
 
     return job_list
 
-def submit_jobs(jobs):
+def submit_jobs(jobs, njobs, backend="pbs", nlocalprocs=1):
 
     for job in jobs:
-        print("\nSubmitting steering job script {0} to PBS node...".format(job))
-        subprocess.call(["qsub",job])
+        if backend == "local":
+            print("\nRunning steering job script {0} w/ {1} local processes...".format(job,nlocalprocs))
+            run_local(job, njobs, nlocalprocs)
+        else:
+            print("\nSubmitting steering job script {0} to PBS node...".format(job))
+            subprocess.call(["qsub",job])
+
+def run_local(job, njobs, nprocs):
+
+    # Stand-in for qsub: run each subjob of the array as a local process, w/ the environment PBS would set up for it.
+    # The output of each subjob goes to <job>.o<index>, as w/ "#PBS -j oe".
+
+    nodefile = os.path.abspath(job + ".nodes")
+    with open(nodefile, "w") as f:
+        f.write(socket.gethostname() + "\n")
+
+    pending = range(njobs)
+    running = []
+    failed  = []
+    while pending or running:
+        while pending and len(running) < nprocs:
+            idx = pending.pop(0)
+            env = dict(os.environ)
+            env.update( { "PBS_ARRAYID" : str(idx), "PBS_O_WORKDIR" : os.getcwd(), "PBS_NODEFILE" : nodefile, "PBS_JOBID" : "local[{0}]".format(idx) } )
+            env.setdefault("TMPDIR", tempfile.gettempdir())
+            log = open("{0}.o{1}".format(job,idx), "w")
+            running.append( (idx, subprocess.Popen(["bash",job], env=env, stdout=log, stderr=subprocess.STDOUT), log) )
+            print("Started subjob {0}".format(idx))
+        for item in list(running):
+            idx, proc, log = item
+            if proc.poll() is None:
+                continue
+            log.close()
+            running.remove(item)
+            print("Subjob {0} finished w/ exit code {1}".format(idx,proc.returncode))
+            if proc.returncode:
+                failed.append(idx)
+        time.sleep(1)
+
+    if failed:
+        print("\nWARNING: {0} subjobs failed: {1}".format(len(failed),failed))
 
 if __name__ == '__main__':
 
@@ -326,16 +451,26 @@ exit 0
         # "ElProbeEta_LOGY",
         ]
 
+    outputdir  = args.outputdir
+    outputpath = "/coepp/cephfs/mel/mmilesi/ttH/PlotVault/" + outputdir
+
+    # Pack the variables into the subjobs, balancing their estimated costs
+
+    costs, inseconds = estimate_costs(varlist, timingsdir = args.timings or outputpath + "/timings", taskgraph = args.taskgraph)
+    joblist = pack_jobs(varlist, costs, args.njobs or len(varlist))
+
+    unit = "s" if inseconds else "(relative units)"
+    print("Packed {0} variables into {1} subjobs - estimated total cost: {2:.0f} {4}, longest subjob: {3:.0f} {4} (w/ one subjob per variable: {5:.0f} {4})\n".format(len(varlist), len(joblist), sum( costs.itervalues() ), joblist[0]["cost"], unit, max( costs.itervalues() )))
+
     if args.showvars:
         showvars = [ int(s) for s in args.showvars.split(',') ]
         print("List of plotting variables and their indexes in job list:\n")
-        for idx, s in enumerate(varlist):
+        for idx, job in enumerate(joblist):
             if not ( len(showvars) == 1 and showvars[0] == -1 ):
                 if idx not in showvars: continue
-            print("job[{0}]={1}".format(idx,s))
+            print("job[{0}]={1} (estimated cost: {2:.0f} {3})".format(idx,",".join(job["vars"]),job["cost"],unit))
         sys.exit()
 
-    outputdir  = args.outputdir
     print("outputdir: {0}".format(outputdir))
     release  = args.release
     queue    = args.queue
@@ -352,8 +487,9 @@ exit 0
     job_params = {
 	"release"     :  release,
 	"varlist"     :  varlist,
+	"joblist"     :  joblist,
 	"subdir"      :  "/coepp/cephfs/mel/mmilesi/ttH/PBS/Plotting/" + outputdir + "_PBS" + tag,  # The path to the submission node (NB: must NOT be under /home : PBS cannot read/write into it!!)
-	"outputpath"  :  "/coepp/cephfs/mel/mmilesi/ttH/PlotVault/" + outputdir,
+	"outputpath"  :  outputpath,
         "optstr"      :  optstr,
 	"steer_job"   :  steer_job_script,
 	"queue"       :  queue,
@@ -376,4 +512,4 @@ exit 0
     # Finally, execute the PBS script
 
     if not args.dry:
-        submit_jobs(jobs)
+        submit_jobs(jobs, job_params["njobs"], backend = args.backend, nlocalprocs = args.nlocalprocs)
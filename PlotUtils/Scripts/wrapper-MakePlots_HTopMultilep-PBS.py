@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 
-import glob, os, sys, subprocess, shutil, string, argparse
+import glob, os, sys, subprocess, shutil, string, argparse, time, json
 
-parser = argparse.ArgumentParser(description="Wrapper script for MakePlots_HTopMultilep.py. This gets called on the PBS worker node via the PBS script generated by submit-PBS-ARRAY-MakePlots_HTopMultilep.py. The variable to be plotted gets retrieved via the PBS_ARRAYID index.")
+parser = argparse.ArgumentParser(description="Wrapper script for MakePlots_HTopMultilep.py. This gets called on the PBS worker node via the PBS script generated by submit-PBS-ARRAY-MakePlots_HTopMultilep.py. The variable(s) to be plotted get retrieved via the PBS_ARRAYID index: each element of the list is either a single variable, or a comma-separated group of variables plotted by the same subjob.")
 
 parser.add_argument("--optstr", dest="optstr", action="store", type=str)
 parser.add_argument("--varlist", dest="varlist", action="store", type=str, nargs="+")
@@ -22,6 +22,7 @@ if __name__ == '__main__':
     pbs_array_idx = int(os.getenv('PBS_ARRAYID'))
 
     var = varlist[pbs_array_idx]
+    jobvars = var.split(',')
 
     print("Current job index PBS_ARRAYID={0}, var={1}".format(pbs_array_idx,var))
 
@@ -35,12 +36,17 @@ if __name__ == '__main__':
     plotscript = os.path.abspath(os.path.curdir) + "/Plotter/MakePlots_HTopMultilep.py"
     optlist = args.optstr.split(' ')
 
-    cmdlist = ['python',plotscript] + optlist + ['--submitPBSVar',var]
+    if len(jobvars) == 1:
+        cmdlist = ['python',plotscript] + optlist + ['--submitPBSVar',var]
+    else:
+        cmdlist = ['python',plotscript] + optlist + ['--variables'] + jobvars
     cmd = " ".join( "{0}".format(c) for c in cmdlist )
 
     print("Executng command:\n{0}".format(cmd))
 
-    subprocess.call( cmd, shell = True )
+    start = time.time()
+    exitcode = subprocess.call( cmd, shell = True )
+    walltime = time.time() - start
 
     # Now move the output to the target directory
 
@@ -58,3 +64,15 @@ if __name__ == '__main__':
             thisdir = thisdir[:-1]
         subprocess.call( ['rsync','-azP',thisdir,outputpath] )
         shutil.rmtree(thisdir)
+
+    # Record the time taken by this subjob: the submission script uses it to balance the jobs of the following submissions
+
+    timingsdir = outputpath + "timings/"
+    if not os.path.exists(timingsdir):
+        try:
+            os.makedirs(timingsdir)
+        except OSError:
+            pass # Might have been created in the meantime by another subjob
+
+    with open(timingsdir + "timing_" + "+".join(jobvars) + ".json", "w") as timing:
+        json.dump( { "vars" : jobvars, "walltime" : walltime, "exitcode" : exitcode }, timing )